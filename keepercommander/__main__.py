@@ -76,6 +76,9 @@ def get_params_from_config(config_filename=None, launched_with_shortcut=False):
                         params.plugins = params.config['plugins']
                     if params.config.get('debug') is True:
                         params.debug = True
+                    background_sync = params.config.get('background_sync')
+                    if background_sync is True or (isinstance(background_sync, int) and background_sync > 0):
+                        params.background_sync = background_sync
             except loader.SecureStorageException as sse:
                 logging.error('Unable to load configuration from secure storage:\n%s',
                               '\033[1m' + str(sse) + '\033[0m')
@@ -18,13 +18,14 @@ import math
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Tuple, Iterable, List, Dict, Any
 
 import google
 from Cryptodome.PublicKey import RSA
 
-from . import constants, rest_api, loginv3, utils, crypto, vault
+from . import constants, rest_api, loginv3, utils, crypto, vault, key_cache
 from .display import bcolors
 from .enterprise import query_enterprise as qe
 from .error import KeeperApiError
@@ -51,6 +52,14 @@ decode_uid_to_str = lambda uid: base64.urlsafe_b64encode(uid).decode().rstrip('=
 
 LOCALE = 'en_US'
 
+# vault/get_records_details accepts up to 999 records. Chunks are requested in parallel.
+RECORD_SHARES_CHUNK_SIZE = 999
+RECORD_SHARES_MAX_WORKERS = 4
+
+# team_get_keys accepts up to 90 teams. Chunks are requested in parallel.
+TEAM_KEYS_CHUNK_SIZE = 90
+TEAM_KEYS_MAX_WORKERS = 4
+
 
 def run_command(params, request):
     # type: (KeeperParams, dict) -> dict
@@ -300,10 +309,19 @@ def load_user_public_keys(params, emails, send_invites=False):  # type: (KeeperP
     if not s:
         return
 
+    store = key_cache.get_key_store(params)
+    if store:
+        cached_keys = store.get_keys(x for x in s if x != params.user)
+        params.key_cache.update(cached_keys)
+        s.difference_update(cached_keys.keys())
+        if not s:
+            return
+
     emails_to_load = list(s)
     rq = APIRequest_pb2.GetPublicKeysRequest()
     rq.usernames.extend(emails_to_load)
     need_share_accept = []
+    loaded_keys = {}    # type: Dict[str, PublicKeys]
     rs = communicate_rest(params, rq, 'vault/get_public_keys', rs_type=APIRequest_pb2.GetPublicKeysResponse)
     for pk in rs.keyResponses:
         email = pk.username
@@ -312,8 +330,13 @@ def load_user_public_keys(params, emails, send_invites=False):  # type: (KeeperP
             ec = pk.publicEccKey
             aes = params.data_key if email == params.user else None
             params.key_cache[email] = PublicKeys(aes=aes, rsa=rsa, ec=ec)
+            if email != params.user:
+                loaded_keys[email] = params.key_cache[email]
         elif pk.errorCode == 'no_active_share_exist':
             need_share_accept.append(pk.username)
+    if store:
+        store.put_keys(loaded_keys)
+        store.delete_keys(x for x in emails_to_load if x not in params.key_cache)
     if len(need_share_accept) > 0 and send_invites:
         for email in need_share_accept:
             rq = APIRequest_pb2.SendShareInviteRequest()
@@ -325,6 +348,19 @@ def load_user_public_keys(params, emails, send_invites=False):  # type: (KeeperP
         return need_share_accept
 
 
+def get_enterprise_team_index(params):   # type: (KeeperParams) -> Dict[str, dict]
+    """Team UID to enterprise team lookup
+
+    The index is rebuilt when the enterprise team list is replaced or its size changes.
+    """
+    teams = (params.enterprise.get('teams') or []) if params.enterprise else []
+    index = params.enterprise_team_index
+    if index is None or index[0] is not teams or index[1] != len(teams):
+        index = (teams, len(teams), {x.get('team_uid'): x for x in teams})
+        params.enterprise_team_index = index
+    return index[2]
+
+
 def load_team_keys(params, team_uids):          # type: (KeeperParams, List[str]) -> None
     s = set(team_uids)
     s.difference_update(params.key_cache.keys())
@@ -334,9 +370,10 @@ def load_team_keys(params, team_uids):          # type: (KeeperParams, List[str]
     if params.enterprise:
         logging.debug('Resolve team keys shared with enterprise')
         tree_key = params.enterprise['unencrypted_tree_key']
-        for t in params.enterprise.get('teams', []):
-            team_uid = t.get('team_uid')
-            if team_uid in s:
+        enterprise_teams = get_enterprise_team_index(params)
+        for team_uid in list(s):
+            t = enterprise_teams.get(team_uid)
+            if t:
                 try:
                     encrypted_team_key = t.get('encrypted_team_key')
                     if encrypted_team_key:
@@ -349,17 +386,28 @@ def load_team_keys(params, team_uids):          # type: (KeeperParams, List[str]
     if not s:
         return
 
+    store = key_cache.get_key_store(params)
+    if store:
+        cached_keys = store.get_keys(s)
+        params.key_cache.update(cached_keys)
+        s.difference_update(cached_keys.keys())
+        if not s:
+            return
+
     logging.debug('Loading %d team keys', len(s))
     uids_to_load = list(s)
+    chunks = [uids_to_load[i:i + TEAM_KEYS_CHUNK_SIZE] for i in range(0, len(uids_to_load), TEAM_KEYS_CHUNK_SIZE)]
 
-    while len(uids_to_load) > 0:
-        uids = uids_to_load[:90]
-        uids_to_load = uids_to_load[90:]
+    def fetch_chunk(uids):
         rq = {
             'command': 'team_get_keys',
             'teams': uids
         }
-        rs = communicate(params, rq)
+        return communicate(params, rq)
+
+    loaded_keys = {}    # type: Dict[str, PublicKeys]
+
+    def load_keys(rs):
         if 'keys' in rs:
             for tk in rs['keys']:
                 if 'key' in tk:
@@ -383,9 +431,21 @@ def load_team_keys(params, team_uids):          # type: (KeeperParams, List[str]
                         elif key_type == -3:
                             rsa = encrypted_key
                         params.key_cache[team_uid] = PublicKeys(rsa=rsa, aes=aes, ec=ec)
+                        loaded_keys[team_uid] = params.key_cache[team_uid]
                     except Exception as e:
                         logging.debug(e)
 
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(len(chunks), TEAM_KEYS_MAX_WORKERS)) as executor:
+            for rs in executor.map(fetch_chunk, chunks):
+                load_keys(rs)
+    else:
+        for chunk in chunks:
+            load_keys(fetch_chunk(chunk))
+
+    if store:
+        store.put_keys(loaded_keys)
+
 
 def load_available_teams(params):
     if params.available_team_cache is not None:
@@ -700,6 +760,8 @@ def communicate(params, request, retry_on_throttle=True):
     try:
         response_json = run_command(params, request)
         if response_json['result'] != 'success':
+            if response_json.get('result_code') == 'throttled':
+                params.rest_context.throttle_count += 1
             if retry_on_throttle and response_json.get('result_code') == 'throttled':
                 logging.info('Throttled. sleeping for 10 seconds')
                 time.sleep(10)
@@ -743,6 +805,7 @@ def execute_batch(params, requests):
                     error_rs = results[-1]
                     throttled = error_rs.get('result') != 'success' and error_rs.get('result_code') == 'throttled'
                     if throttled:
+                        params.rest_context.throttle_count += 1
                         delay_next_batch = True
                         results.pop()
                 responses.extend(results)
@@ -1255,55 +1318,69 @@ def get_record_shares(params, record_uids, is_share_admin=False):
     def need_share_info(uid):
         if uid in params.record_cache:
             r = params.record_cache[uid]
-            return 'shares' not in r
+            if 'shares' not in r:
+                return True
+            revision = r['shares'].get('record_revision')
+            return revision is not None and revision != r.get('revision')
         return is_share_admin
 
+    def fetch_chunk(chunk):
+        rq = record_pb2.GetRecordDataWithAccessInfoRequest()
+        rq.clientTime = utils.current_milli_time()
+        rq.recordUid.extend([utils.base64_url_decode(x) for x in chunk])
+        rq.recordDetailsInclude = record_pb2.SHARE_ONLY
+        return communicate_rest(params, rq, 'vault/get_records_details',
+                                rs_type=record_pb2.GetRecordDataWithAccessInfoResponse)
+
+    def load_shares(rs):
+        for info in rs.recordDataWithAccessInfo:
+            record_uid = utils.base64_url_encode(info.recordUid)
+            rec = params.record_cache[record_uid] if record_uid in params.record_cache else {'record_uid': record_uid}  # type: dict
+            rec['shares'] = {
+                'user_permissions': [],
+                'shared_folder_permissions': [],
+            }
+            if 'revision' in rec:
+                rec['shares']['record_revision'] = rec['revision']
+            for up in info.userPermission:
+                oup = {
+                    'username': up.username,
+                    'owner': up.owner,
+                    'share_admin': up.shareAdmin,
+                    'shareable': up.sharable,
+                    'editable': up.editable,
+                }
+                if up.awaitingApproval:
+                    oup['awaiting_approval'] = up.awaitingApproval
+                if up.expiration > 0:
+                    oup['expiration'] = up.expiration
+                rec['shares']['user_permissions'].append(oup)
+            for sp in info.sharedFolderPermission:
+                osp = {
+                    'shared_folder_uid': utils.base64_url_encode(sp.sharedFolderUid),
+                    'reshareable': sp.resharable,
+                    'editable': sp.editable,
+                    'revision': sp.revision,
+                }
+                if sp.expiration > 0:
+                    osp['expiration'] = sp.expiration
+                rec['shares']['shared_folder_permissions'].append(osp)
+
+            if record_uid not in params.record_cache:
+                result.append(rec)
+
     result = []
     unique = set(record_uids)
     uids = [x for x in unique if need_share_info(x)]
+    chunks = [uids[i:i + RECORD_SHARES_CHUNK_SIZE] for i in range(0, len(uids), RECORD_SHARES_CHUNK_SIZE)]
     try:
-        while len(uids) > 0:
-            chunk = uids[:999]
-            uids = uids[999:]
-            rq = record_pb2.GetRecordDataWithAccessInfoRequest()
-            rq.clientTime = utils.current_milli_time()
-            rq.recordUid.extend([utils.base64_url_decode(x) for x in chunk])
-            rq.recordDetailsInclude = record_pb2.SHARE_ONLY
-            rs = communicate_rest(params, rq, 'vault/get_records_details',
-                                  rs_type=record_pb2.GetRecordDataWithAccessInfoResponse)
-            for info in rs.recordDataWithAccessInfo:
-                record_uid = utils.base64_url_encode(info.recordUid)
-                rec = params.record_cache[record_uid] if record_uid in params.record_cache else {'record_uid': record_uid}  # type: dict
-                if 'shares' not in rec:
-                    rec['shares'] = {}
-                rec['shares']['user_permissions'] = []
-                rec['shares']['shared_folder_permissions'] = []
-                for up in info.userPermission:
-                    oup = {
-                        'username': up.username,
-                        'owner': up.owner,
-                        'share_admin': up.shareAdmin,
-                        'shareable': up.sharable,
-                        'editable': up.editable,
-                    }
-                    if up.awaitingApproval:
-                        oup['awaiting_approval'] = up.awaitingApproval
-                    if up.expiration > 0:
-                        oup['expiration'] = up.expiration
-                    rec['shares']['user_permissions'].append(oup)
-                for sp in info.sharedFolderPermission:
-                    osp = {
-                        'shared_folder_uid': utils.base64_url_encode(sp.sharedFolderUid),
-                        'reshareable': sp.resharable,
-                        'editable': sp.editable,
-                        'revision': sp.revision,
-                    }
-                    if sp.expiration > 0:
-                        osp['expiration'] = sp.expiration
-                    rec['shares']['shared_folder_permissions'].append(osp)
-
-                if record_uid not in params.record_cache:
-                    result.append(rec)
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), RECORD_SHARES_MAX_WORKERS)) as executor:
+                for rs in executor.map(fetch_chunk, chunks):
+                    load_shares(rs)
+        else:
+            for chunk in chunks:
+                load_shares(fetch_chunk(chunk))
     except Exception as e:
         logging.error(e)
 
@@ -15,7 +15,7 @@ import logging
 import mimetypes
 import os
 import shutil
-from typing import BinaryIO, Iterator, Optional, List, Union, Dict
+from typing import BinaryIO, Iterator, Optional, List, Union, Dict, Iterable, Tuple
 
 import requests
 
@@ -25,6 +25,11 @@ from .proto import record_pb2
 from .record_facades import FileRefRecordFacade
 from .vault import KeeperRecord, PasswordRecord, TypedRecord, FileRecord, AttachmentFile, AttachmentFileThumb
 
+# vault/files_download requests are sent in chunks of this size
+FILES_DOWNLOAD_CHUNK_SIZE = 100
+# request_download commands are passed to api.execute_batch in chunks of this size
+REQUEST_DOWNLOAD_CHUNK_SIZE = 500
+
 
 def prepare_attachment_download(params, record_uid, attachment_name=None):
     # type: (KeeperParams, str, Optional[str]) -> Iterator[AttachmentDownloadRequest]
@@ -95,6 +100,82 @@ def prepare_attachment_download(params, record_uid, attachment_name=None):
                         yield adr
 
 
+def prepare_attachment_downloads(params, record_uids):
+    # type: (KeeperParams, Iterable[str]) -> Iterator[AttachmentDownloadRequest]
+    """Requests download URLs for every attachment of the records
+
+    Unlike prepare_attachment_download, the URLs are requested in batches: file records of
+    typed records in vault/files_download chunks and legacy attachments in "execute" batches.
+    Attachments whose URL could not be requested are logged and skipped.
+    """
+    file_records = {}      # type: Dict[str, FileRecord]
+    v2_requests = []       # type: List[dict]
+    v2_attachments = []    # type: List[Tuple[str, List[AttachmentFile]]]
+    for record_uid in record_uids:
+        record = KeeperRecord.load(params, record_uid)
+        if isinstance(record, FileRecord):
+            file_records[record.record_uid] = record
+        elif isinstance(record, TypedRecord):
+            typed_field = record.get_typed_field('fileRef')
+            if typed_field and isinstance(typed_field.value, list):
+                for file_uid in typed_field.value:
+                    if file_uid not in file_records:
+                        file_record = KeeperRecord.load(params, file_uid)
+                        if isinstance(file_record, FileRecord):
+                            file_records[file_uid] = file_record
+        elif isinstance(record, PasswordRecord):
+            if record.attachments:
+                rq = {
+                    'command': 'request_download',
+                    'file_ids': [x.id for x in record.attachments],
+                }
+                api.resolve_record_access_path(params, record_uid, path=rq)
+                v2_requests.append(rq)
+                v2_attachments.append((record_uid, record.attachments))
+
+    file_uids = list(file_records.keys())
+    for i in range(0, len(file_uids), FILES_DOWNLOAD_CHUNK_SIZE):
+        rq = record_pb2.FilesGetRequest()
+        rq.for_thumbnails = False
+        rq.record_uids.extend((utils.base64_url_decode(x) for x in file_uids[i:i + FILES_DOWNLOAD_CHUNK_SIZE]))
+        rs = api.communicate_rest(params, rq, 'vault/files_download', rs_type=record_pb2.FilesGetResponse)
+        for file_status in rs.files:
+            file_uid = utils.base64_url_encode(file_status.record_uid)
+            file_record = file_records.get(file_uid)
+            if file_status.status == record_pb2.FG_SUCCESS and file_record:
+                adr = AttachmentDownloadRequest()
+                adr.file_id = file_uid
+                adr.url = file_status.url
+                adr.success_status_code = file_status.success_status_code
+                adr.encryption_key = file_record.record_key
+                adr.title = file_record.name
+                adr.is_gcm_encrypted = file_status.fileKeyType == record_pb2.ENCRYPTED_BY_DATA_KEY_GCM
+                yield adr
+            else:
+                logging.warning('Error requesting download URL for file \"%s\"', file_uid)
+
+    # A chunk fits into one "execute" call of api.execute_batch. If the call fails, execute_batch
+    # returns the responses it got so far, so the responses are matched to the first requests of the chunk.
+    for i in range(0, len(v2_requests), REQUEST_DOWNLOAD_CHUNK_SIZE):
+        responses = api.execute_batch(params, v2_requests[i:i + REQUEST_DOWNLOAD_CHUNK_SIZE])
+        for j, (record_uid, attachments) in enumerate(v2_attachments[i:i + REQUEST_DOWNLOAD_CHUNK_SIZE]):
+            rs = responses[j] if j < len(responses) else None
+            if not rs or rs.get('result') != 'success':
+                logging.warning('Error requesting download URLs for record \"%s\"', record_uid)
+                continue
+            for atta, dl in zip(attachments, rs.get('downloads') or []):
+                if 'url' in dl:
+                    adr = AttachmentDownloadRequest()
+                    adr.file_id = atta.id
+                    adr.title = atta.name
+                    adr.url = dl['url']
+                    adr.encryption_key = utils.base64_url_decode(atta.key)
+                    adr.is_gcm_encrypted = False
+                    yield adr
+                else:
+                    logging.warning('Error requesting download URL for file \"%s\"', atta.id)
+
+
 class AttachmentDownloadRequest:
     def __init__(self):
         self.file_id = ''
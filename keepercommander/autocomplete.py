@@ -16,7 +16,7 @@ import shlex
 
 from prompt_toolkit.completion import Completion, Completer
 
-from . import vault
+from . import background_sync, vault
 from .params import KeeperParams
 from .commands.folder import mv_parser
 from .commands.base import GroupCommand, Command
@@ -128,6 +128,17 @@ class CommandCompleter(Completer):
         return txt
 
     def get_completions(self, document, complete_event):
+        # Vault caches are not read while a background sync is applying changes to them
+        lock = background_sync.command_lock(self.params)
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            completions = list(self.get_vault_completions(document, complete_event))
+        finally:
+            lock.release()
+        yield from completions
+
+    def get_vault_completions(self, document, complete_event):
         try:
             if document.is_cursor_at_the_end:
                 pos = document.text.find(' ')
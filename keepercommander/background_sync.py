@@ -0,0 +1,203 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2024 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from . import api
+from .params import KeeperParams
+
+# Sync interval used when "background_sync" is set to true in the configuration
+DEFAULT_SYNC_INTERVAL = 300
+
+_no_worker_lock = threading.RLock()
+
+
+class BackgroundSync:
+    """Refreshes the vault caches from a worker thread
+
+    A sync runs when a command changes the vault (params.sync_data is set), when notify_changed is called
+    by a source of server-side change notifications, and on a schedule if interval is set.
+    sync_down and command execution are serialized by the lock, so a command never reads half-applied sync data.
+    A command that needs a fresh vault waits for the sync requested by a previous command (see cli.do_command).
+    """
+    def __init__(self, params, interval=0):    # type: (KeeperParams, int) -> None
+        self.params = params
+        self.interval = interval
+        self.lock = threading.RLock()
+        self.last_sync = 0.0
+        self.last_error = None     # type: Optional[Exception]
+        self._condition = threading.Condition()
+        self._requested = 0
+        self._completed = 0
+        self._stopped = False
+        self._thread = None        # type: Optional[threading.Thread]
+
+    @property
+    def is_running(self):    # type: () -> bool
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_pending(self):    # type: () -> bool
+        """A requested sync is not applied yet"""
+        with self._condition:
+            return self._requested > self._completed
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='BackgroundSync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def request_sync(self):
+        with self._condition:
+            self._requested += 1
+            self._condition.notify_all()
+
+    def notify_changed(self):
+        """Called when the server signals that the vault has changed"""
+        self.request_sync()
+
+    def wait(self, timeout=None):    # type: (Optional[float]) -> bool
+        """Blocks until the syncs requested so far are applied"""
+        with self._condition:
+            requested = self._requested
+            return self._condition.wait_for(lambda: self._completed >= requested or self._stopped, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._requested > self._completed or self._stopped,
+                                         self.interval if self.interval > 0 else None)
+                if self._stopped:
+                    break
+                requested = self._requested
+            try:
+                if self.params.session_token:
+                    with self.lock:
+                        api.sync_down(self.params)
+                    self.last_sync = time.time()
+                    self.last_error = None
+            except Exception as e:
+                self.last_error = e
+                logging.debug('Background sync error: %s', e)
+            finally:
+                with self._condition:
+                    self._completed = max(self._completed, requested)
+                    self._condition.notify_all()
+
+
+class CacheGate:
+    """Guards the vault caches while run-batch commands run concurrently
+
+    Commands hold the gate shared while they run. sync_down rebuilds the caches, so it takes the gate exclusively:
+    it waits until no other command is running, and commands that start meanwhile wait until the sync is applied.
+    A command that syncs gives up its shared hold for the duration of the sync.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._shared = 0
+        self._waiting = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive and self._waiting == 0)
+            self._shared += 1
+        self._local.shared = True
+        try:
+            yield
+        finally:
+            self._local.shared = False
+            with self._condition:
+                self._shared -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        if getattr(self._local, 'exclusive', False):
+            yield
+            return
+        is_shared = getattr(self._local, 'shared', False)
+        with self._condition:
+            if is_shared:
+                self._shared -= 1
+            self._waiting += 1
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: not self._exclusive and self._shared == 0)
+            self._waiting -= 1
+            self._exclusive = True
+        self._local.exclusive = True
+        try:
+            yield
+        finally:
+            self._local.exclusive = False
+            with self._condition:
+                self._exclusive = False
+                if is_shared:
+                    self._shared += 1
+                self._condition.notify_all()
+
+
+def get_worker(params):    # type: (KeeperParams) -> Optional[BackgroundSync]
+    """Returns the running sync worker, starting it when background sync is enabled for a logged in session"""
+    worker = params.sync_worker    # type: Optional[BackgroundSync]
+    if worker is None or not worker.is_running:
+        if not params.background_sync or not params.session_token:
+            return None
+        interval = DEFAULT_SYNC_INTERVAL if params.background_sync is True else int(params.background_sync)
+        worker = BackgroundSync(params, interval)
+        worker.start()
+        params.sync_worker = worker
+    return worker
+
+
+def stop_worker(params):    # type: (KeeperParams) -> None
+    worker = params.sync_worker    # type: Optional[BackgroundSync]
+    if worker is not None:
+        worker.stop()
+        params.sync_worker = None
+
+
+def command_lock(params):    # type: (KeeperParams) -> threading.RLock
+    """Lock held while a command runs. A background sync is not applied in the middle of a command."""
+    worker = params.sync_worker    # type: Optional[BackgroundSync]
+    return worker.lock if worker is not None else _no_worker_lock
+
+
+def request_sync(params):    # type: (KeeperParams) -> bool
+    """Queues a sync on the background worker. Returns False if background sync is not enabled."""
+    worker = get_worker(params)
+    if worker is None:
+        return False
+    worker.request_sync()
+    return True
+
+
+def wait_for_sync(params, timeout=None):    # type: (KeeperParams, Optional[float]) -> None
+    """Blocks until the queued background sync, if any, is applied"""
+    worker = params.sync_worker    # type: Optional[BackgroundSync]
+    if worker is not None and worker.is_running and worker.is_pending:
+        worker.wait(timeout)
@@ -18,14 +18,14 @@ import sys
 import threading
 import time
 from collections import OrderedDict
-from typing import Union
+from typing import Any, Union
 
 from keepercommander.commands.utils import LoginCommand
 from prompt_toolkit import PromptSession
 from prompt_toolkit.enums import EditingMode
 from prompt_toolkit.shortcuts import CompleteStyle
 
-from . import api, display, ttk
+from . import api, background_sync, display, ttk
 from . import versioning
 from .autocomplete import CommandCompleter
 from .commands import (
@@ -137,7 +137,34 @@ def command_and_args_from_cmd(command_line):
     return cmd, args
 
 
-def do_command(params, command_line):
+def post_command(params):    # type: (KeeperParams) -> None
+    """Posts the client audit events collected by commands and syncs the vault if it has changed"""
+    if params.session_token:
+        if params.event_queue:
+            try:
+                rq = {
+                    'command': 'audit_event_client_logging',
+                    'item_logs': params.event_queue
+                }
+                api.communicate(params, rq)
+            except Exception as e:
+                logging.debug('Post client events error: %s', e)
+            params.event_queue.clear()
+        if params.sync_data:
+            if not background_sync.request_sync(params):
+                api.sync_down(params)
+
+
+def do_command(params, command_line, concurrent=False):
+    # type: (KeeperParams, str, bool) -> Any
+    """Executes a command line.
+
+    concurrent is set when the command runs on a run-batch worker thread. The caller holds the command lock,
+    and posts events and syncs the vault with post_command once the concurrent commands complete.
+    Otherwise a command that needs_fresh_vault waits for the vault sync queued by the previous command,
+    so it sees that command's changes. Other commands read the vault as it is.
+    """
+
     def is_msp(params_local):
         if params_local.enterprise:
             if 'licenses' in params_local.enterprise:
@@ -266,21 +293,14 @@ def do_command(params, command_line):
                             logging.error(not_msp_admin_error_msg)
                             return
 
+                if concurrent:
+                    return command.execute_args(params, args, command=orig_cmd)
+                if command.needs_fresh_vault():
+                    background_sync.wait_for_sync(params)
                 params.event_queue.clear()
-                result = command.execute_args(params, args, command=orig_cmd)
-                if params.session_token:
-                    if params.event_queue:
-                        try:
-                            rq = {
-                                'command': 'audit_event_client_logging',
-                                'item_logs': params.event_queue
-                            }
-                            api.communicate(params, rq)
-                        except Exception as e:
-                            logging.debug('Post client events error: %s', e)
-                        params.event_queue.clear()
-                    if params.sync_data:
-                        api.sync_down(params)
+                with background_sync.command_lock(params):
+                    result = command.execute_args(params, args, command=orig_cmd)
+                post_command(params)
                 return result
             else:
                 display_command_help(show_enterprise=(params.enterprise is not None))
@@ -451,6 +471,7 @@ def loop(params):  # type: (KeeperParams) -> int
         if params.batch_mode and error_no != 0 and not suppress_errno:
             break
 
+    background_sync.stop_worker(params)
     if not params.batch_mode:
         logging.info('\nGoodbye.\n')
 
@@ -21,10 +21,12 @@ import json
 import logging
 import os
 import platform
+import queue
 import re
 import socket
 import ssl
 import sys
+import threading
 import time
 from functools import partial
 from typing import Optional, List, Union, Dict, Set, Any, Tuple
@@ -32,9 +34,10 @@ from urllib.parse import urlparse
 
 import requests
 
-from .base import user_choice, suppress_exit, raise_parse_exception, dump_report_data, Command, field_to_title
+from .base import user_choice, suppress_exit, raise_parse_exception, dump_report_data, Command, field_to_title, \
+    stream_report_data
 from .enterprise_common import EnterpriseCommand
-from .helpers import audit_report
+from .helpers import audit_report, audit_store
 from .transfer_account import EnterpriseTransferUserCommand
 from .. import api, vault, record_management
 from ..constants import EMAIL_PATTERN
@@ -89,6 +92,11 @@ audit_report_parser.add_argument('--shared-folder-uid', dest='shared_folder_uid'
                                  help='Filter: Shared Folder UID')
 help_text = 'allow retrieval of additional record-detail data if not in cache'
 audit_report_parser.add_argument('--max-record-details', dest='max_record_details', action='store_true', help=help_text)
+local_cache_help = 'answer raw, span, hour and day reports from the local encrypted event cache. ' \
+                   'Requires a --created filter with a start date. New events are downloaded incrementally'
+audit_report_parser.add_argument('--local-cache', dest='local_cache', action='store_true', help=local_cache_help)
+audit_report_parser.add_argument('--rebuild-cache', dest='rebuild_cache', action='store_true',
+                                 help='clear the local event cache before running the report')
 # Ignored / superfluous flag (kept for backward-compatibility)
 audit_report_parser.add_argument('--minimal', action='store_true', help=argparse.SUPPRESS)
 search_help = 'limit results to rows that contain the specified string'
@@ -174,6 +182,9 @@ syslog_templates = None  # type: Optional[List[str]]
 API_EVENT_SUMMARY_ROW_LIMIT = 2000
 API_EVENT_RAW_ROW_LIMIT = 1000
 
+AUDIT_LOG_QUEUE_SIZE = 8
+AUDIT_LOG_CHECKPOINT_INTERVAL = 60
+
 
 def load_syslog_templates(params):
     global syslog_templates
@@ -195,15 +206,27 @@ class AuditLogBaseExport(abc.ABC):
     def __init__(self):
         self.store_record = False
         self.should_cancel = False
+        self._session = None     # type: Optional[requests.Session]
 
     def chunk_size(self):
         return 1000
 
+    def supports_checkpoint(self):
+        # Exporters that deliver events only in finalize_export must not advance "last_event_time" before then
+        return True
+
     def finalize_export(self, props):  # type: (dict)  -> None
         pass
 
     def clean_up(self):
-        pass
+        if self._session:
+            self._session.close()
+            self._session = None
+
+    def get_session(self):  # type: () -> requests.Session
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
 
     @abc.abstractmethod
     def default_record_title(self):
@@ -405,7 +428,7 @@ class AuditLogSplunkExport(AuditLogBaseExport):
         auth = { 'Authorization': 'Splunk {0}'.format(props['token']) }
         try:
             logging.captureWarnings(True)
-            rs = requests.post(props['hec_url'], data='\n'.join(events), headers=auth, verify=False)
+            rs = self.get_session().post(props['hec_url'], data='\n'.join(events), headers=auth, verify=False)
         finally:
             logging.captureWarnings(False)
 
@@ -477,6 +500,7 @@ class AuditLogSyslogFileExport(AuditLogSyslogBaseExport):
 class AuditLogSyslogPortExport(AuditLogSyslogBaseExport):
     def __init__(self):
         super(AuditLogSyslogPortExport, self).__init__()
+        self.sock = None    # type: Optional[socket.socket]
 
     def default_record_title(self):
         return 'Audit Log: Syslog Port'
@@ -549,26 +573,57 @@ class AuditLogSyslogPortExport(AuditLogSyslogBaseExport):
         props['port'] = port
         props['is_octet_counting'] = is_octet_counting
 
-    def export_events(self, props, events):
+    def connect(self, props):
+        is_udp = props['is_udp']
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM if not is_udp else socket.SOCK_DGRAM)
         try:
-            is_udp = props['is_udp']
-            is_octet_counting = props.get('is_octet_counting', False)
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM if not is_udp else socket.SOCK_DGRAM) as sock:
-                sock.settimeout(1)
-                hostname = props['host']
-                if props['is_ssl']:
-                    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT | ssl.OP_NO_TLSv1_1 | ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3)
-                    s = context.wrap_socket(sock, server_hostname=hostname)
+            sock.settimeout(1)
+            hostname = props['host']
+            if props['is_ssl']:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT | ssl.OP_NO_TLSv1_1 | ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3)
+                s = context.wrap_socket(sock, server_hostname=hostname)
+            else:
+                s = sock
+            s.connect((hostname, props['port']))
+            return s
+        except:
+            sock.close()
+            raise
+
+    def export_events(self, props, events):
+        is_octet_counting = props.get('is_octet_counting', False)
+        payload = []
+        for line in events:
+            syslog_event = f'{len(line)} {line}' if is_octet_counting else f'{line}\n'
+            payload.append(syslog_event.encode('utf-8'))
+
+        # The connection is kept open across chunks. A broken connection is re-established once.
+        for attempt in range(2):
+            try:
+                if self.sock is None:
+                    self.sock = self.connect(props)
+                if props['is_udp']:
+                    for data in payload:
+                        self.sock.send(data)
                 else:
-                    s = sock
-                port = props['port']
-                s.connect((hostname, port))
-                for line in events:
-                    syslog_event = f'{len(line)} {line}' if is_octet_counting else f'{line}\n'
-                    s.send(syslog_event.encode('utf-8'))
-        except Exception as e:
-            logging.debug(e)
-            self.should_cancel = True
+                    self.sock.sendall(b''.join(payload))
+                return
+            except Exception as e:
+                logging.debug(e)
+                self.close_socket()
+        self.should_cancel = True
+
+    def close_socket(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception as e:
+                logging.debug(e)
+            self.sock = None
+
+    def clean_up(self):
+        super(AuditLogSyslogPortExport, self).clean_up()
+        self.close_socket()
 
 
 class AuditLogSumologicExport(AuditLogBaseExport):
@@ -601,7 +656,7 @@ class AuditLogSumologicExport(AuditLogBaseExport):
         str = '\n'.join(events)
 
         headers = {"Content-type": "application/text"}
-        rs = requests.post(props['url'], data=str.encode('utf-8'), headers=headers)
+        rs = self.get_session().post(props['url'], data=str.encode('utf-8'), headers=headers)
         if rs.status_code == 200:
             self.store_record = True
         else:
@@ -663,12 +718,16 @@ class AuditLogJsonExport(AuditLogBaseExport):
         ndjson_fp = props['ndjson_fp']
         AuditLogJsonExport.extend_ndjson_file(events, ndjson_fp)
 
+    def supports_checkpoint(self):
+        return False
+
     def finalize_export(self, props):  # type: (dict)  -> None
         filename = props['filename']
         ndjson_fp = props['ndjson_fp']
         AuditLogJsonExport.ndjson_to_json_file(ndjson_fp, filename)
 
     def clean_up(self):
+        super(AuditLogJsonExport, self).clean_up()
         if self.temp_fp and os.path.exists(self.temp_fp):
             os.remove(self.temp_fp)
 
@@ -719,7 +778,7 @@ class AuditLogAzureLogAnalyticsExport(AuditLogBaseExport):
             "Log-Type": "Keeper",
             "x-ms-date": dt
         }
-        rs = requests.post(url, data=data.encode('utf-8'), headers=headers)
+        rs = self.get_session().post(url, data=data.encode('utf-8'), headers=headers)
         if rs.status_code == 200:
             self.store_record = True
         else:
@@ -860,10 +919,7 @@ class AuditLogCommand(EnterpriseCommand):
                 except:
                     pass
 
-        events = []
-        finished = False
         num_exported = 0
-        logged_ids = set()
         chunk_length = log_export.chunk_size()
 
         anonymize = bool(kwargs.get('anonymize'))
@@ -902,54 +958,123 @@ class AuditLogCommand(EnterpriseCommand):
             logging.info('No events to export')
             return
 
-        while not finished:
-            finished = True
+        # Pages are fetched on a background thread while the export target consumes converted chunks.
+        # The bounded queue keeps the fetcher at most AUDIT_LOG_QUEUE_SIZE chunks ahead of the target.
+        chunks = queue.Queue(maxsize=AUDIT_LOG_QUEUE_SIZE)
+        stop_fetch = threading.Event()
+        # Held by the fetcher while it talks to the server; the checkpoint is stored with the fetcher paused
+        fetch_lock = threading.Lock()
+        fetch_status = {'last_event_time': last_event_time, 'error': None}
 
-            if last_event_time > 0:
-                created_filter['min'] = last_event_time
+        def put_chunk(chunk):
+            while not stop_fetch.is_set():
+                try:
+                    chunks.put(chunk, timeout=1)
+                    return
+                except queue.Full:
+                    pass
 
-            rs = api.communicate(params, rq)
-            if rs['result'] == 'success':
-                finished = True
-                if 'audit_event_overview_report_rows' in rs:
-                    audit_events = rs['audit_event_overview_report_rows']
-                    event_count = len(audit_events)
-                    last_event_time = int(audit_events[-1]['created']) if event_count else now_ts
-
-                    # Ensure that no event is exported more than once with this command call
-                    new_events = [e for e in audit_events if e['id'] not in logged_ids]
-                    for event in new_events:
-                        logged_ids.add(event['id'])
-                        if anonymize:
-                            uname = event.get('email') or event.get('username') or ''
-                            ent_uid = self.resolve_uid(ent_user_ids, uname)
-                            event['username'] = ent_uid
-                            event['email'] = ent_uid
-                            to_uname = event.get('to_username') or ''
-                            if to_uname:
-                                event['to_username'] = self.resolve_uid(ent_user_ids, to_uname)
-                            from_uname = event.get('from_username') or ''
-                            if from_uname:
-                                event['from_username'] = self.resolve_uid(ent_user_ids, from_uname)
-                        events.append(log_export.convert_event(props, event))
-                    finished = created_filter['max'] <= last_event_time
-
-                    # Narrow event-age filter if the last filter/request gave no new events AND we have more to fetch
-                    if not new_events and not finished:
-                        last_event_time += 1
-
-            while len(events) > 0:
-                to_store = events[:chunk_length]
-                events = events[chunk_length:]
+        def fetch_events():
+            event_time = last_event_time
+            logged_ids = set()
+            events = []
+            chunk_event_time = 0
+            finished = False
+            try:
+                while not finished and not stop_fetch.is_set():
+                    if event_time > 0:
+                        created_filter['min'] = event_time
+
+                    with fetch_lock:
+                        if stop_fetch.is_set():
+                            break
+                        rs = api.communicate(params, rq)
+                    finished = True
+                    if rs['result'] == 'success' and 'audit_event_overview_report_rows' in rs:
+                        audit_events = rs['audit_event_overview_report_rows']
+                        event_count = len(audit_events)
+                        event_time = int(audit_events[-1]['created']) if event_count else now_ts
+
+                        # Ensure that no event is exported more than once with this command call
+                        new_events = [e for e in audit_events if e['id'] not in logged_ids]
+                        for event in new_events:
+                            logged_ids.add(event['id'])
+                            if anonymize:
+                                uname = event.get('email') or event.get('username') or ''
+                                ent_uid = self.resolve_uid(ent_user_ids, uname)
+                                event['username'] = ent_uid
+                                event['email'] = ent_uid
+                                to_uname = event.get('to_username') or ''
+                                if to_uname:
+                                    event['to_username'] = self.resolve_uid(ent_user_ids, to_uname)
+                                from_uname = event.get('from_username') or ''
+                                if from_uname:
+                                    event['from_username'] = self.resolve_uid(ent_user_ids, from_uname)
+                            chunk_event_time = int(event['created'])
+                            events.append(log_export.convert_event(props, event))
+                            if len(events) >= chunk_length:
+                                put_chunk((events, chunk_event_time))
+                                events = []
+                        finished = created_filter['max'] <= event_time
+
+                        # Narrow event-age filter if the last filter/request gave no new events AND we have more to fetch
+                        if not new_events and not finished:
+                            event_time += 1
+
+                if events:
+                    put_chunk((events, chunk_event_time))
+                fetch_status['last_event_time'] = event_time
+            except Exception as e:
+                fetch_status['error'] = e
+            finally:
+                put_chunk(None)
+
+        fetcher = threading.Thread(target=fetch_events, daemon=True)
+        fetcher.start()
+
+        can_checkpoint = log_export.supports_checkpoint()
+        checkpoint_time = 0
+        checkpoint_stored = time.time()
+        export_failed = True
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                to_store, chunk_event_time = chunk
                 log_export.export_events(props, to_store)
                 if log_export.should_cancel:
-                    finished = True
                     break
                 num_exported += len(to_store)
-                percent_done = num_exported / total_events * 100
-                percent_done = '%.1f' % percent_done
+                checkpoint_time = chunk_event_time
+                if can_checkpoint:
+                    AuditLogBaseExport.set_record_custom(record, 'last_event_time', str(checkpoint_time))
+                    if time.time() - checkpoint_stored >= AUDIT_LOG_CHECKPOINT_INTERVAL:
+                        with fetch_lock:
+                            record = self.store_checkpoint(params, record)
+                        checkpoint_stored = time.time()
+                percent_done = num_exported / total_events * 100 if total_events else 100
+                percent_done = '%.1f' % min(percent_done, 100)
                 print(f'Exporting events.... {percent_done}% DONE', file=sys.stderr, end='\r', flush=True)
-
+            export_failed = False
+        finally:
+            stop_fetch.set()
+            # The export target failed: the next run resumes after the last chunk the target accepted
+            if export_failed and can_checkpoint and num_exported > 0:
+                try:
+                    with fetch_lock:
+                        self.store_checkpoint(params, record)
+                except Exception as e:
+                    logging.warning('Audit log export: failed to store the last exported event time: %s', e)
+
+        fetcher.join()
+        if fetch_status['error']:
+            if can_checkpoint and num_exported > 0:
+                self.store_checkpoint(params, record)
+            raise fetch_status['error']
+
+        # A cancelled export resumes after the last batch acknowledged by the target
+        last_event_time = checkpoint_time if log_export.should_cancel else fetch_status['last_event_time']
         if last_event_time > 0:
             logging.info('')
             logging.info('Exported %d audit event(s)', num_exported)
@@ -959,6 +1084,13 @@ class AuditLogCommand(EnterpriseCommand):
                 record_management.update_record(params, record)
                 params.sync_data = True
 
+    @staticmethod
+    def store_checkpoint(params, record):
+        # type: (KeeperParams, Union[vault.PasswordRecord, vault.TypedRecord]) -> Union[vault.PasswordRecord, vault.TypedRecord]
+        record_management.update_record(params, record)
+        api.sync_down(params)
+        return vault.KeeperRecord.load(params, record.record_uid)
+
 
 audit_report_description = '''
 Audit Report Command Syntax Description:
@@ -1042,6 +1174,13 @@ class AuditReportCommand(Command):
         self.sox_data = None    # type: Union[None, sox_data.SoxData]
         self.allow_sox_data_fetch = False
         self.lookup = {}
+        self.audit_store = None    # type: Optional[audit_store.AuditEventStore]
+
+    def clean_up(self):
+        super(AuditReportCommand, self).clean_up()
+        if self.audit_store:
+            self.audit_store.close()
+            self.audit_store = None
 
     def get_sox_data(self, params):
         if not self.sox_data and is_compliance_reporting_enabled(params):
@@ -1195,14 +1334,15 @@ class AuditReportCommand(Command):
             AuditReportCommand.CachedUsername = params.user
 
     @staticmethod
-    def load_audit_dimension(params, dimension):  # type: (KeeperParams, str) -> list[dict]
+    def load_audit_dimension(params, dimension, store=None):
+        # type: (KeeperParams, str, Optional[audit_store.AuditEventStore]) -> list[dict]
         AuditReportCommand.ensure_same_user(params)
         if dimension in AuditReportCommand.DimensionCache:
             return AuditReportCommand.DimensionCache[dimension]
         dimensions = None  # type: Optional[list]
         if dimension in AuditReportCommand.VirtualDimensions:
             keeper_dimension = AuditReportCommand.load_audit_dimension(
-                params, AuditReportCommand.VirtualDimensions[dimension])
+                params, AuditReportCommand.VirtualDimensions[dimension], store=store)
             if dimension == 'geo_location':
                 geo_dim = {}
                 for geo in keeper_dimension:
@@ -1237,32 +1377,36 @@ class AuditReportCommand(Command):
                 dimensions = list(device_dim.values())
                 dimensions.sort(key=lambda x: x.get('type_name', ' '), reverse=False)
         else:
-            rq = {
-                'command': 'get_audit_event_dimensions',
-                'report_type': 'dim',
-                'columns': [dimension],
-                'limit': 2000,
-                'scope': 'enterprise' if params.enterprise else 'user'
-            }
-            rs = api.communicate(params, rq)
-            dimensions = rs['dimensions'][dimension]
-            for row in dimensions:
+            dimensions = store.get_dimension(dimension) if store else None
+            if dimensions is None:
+                rq = {
+                    'command': 'get_audit_event_dimensions',
+                    'report_type': 'dim',
+                    'columns': [dimension],
+                    'limit': 2000,
+                    'scope': 'enterprise' if params.enterprise else 'user'
+                }
+                rs = api.communicate(params, rq)
+                dimensions = rs['dimensions'][dimension]
+                for row in dimensions:
+                    if dimension == 'ip_address':
+                        city = row.get('city', '')
+                        region = row.get('region', '')
+                        country = row.get('country_code', '')
+                        if city or region or country:
+                            row['geo_location'] = ', '.join((city, region, country))
                 if dimension == 'ip_address':
-                    city = row.get('city', '')
-                    region = row.get('region', '')
-                    country = row.get('country_code', '')
-                    if city or region or country:
-                        row['geo_location'] = ', '.join((city, region, country))
-            if dimension == 'ip_address':
-                dimensions.sort(key=lambda x: f'{x.get("country_code", " ")}|{x.get("region", " ")}|{x.get("city", " ")}',
-                                reverse=False)
-            elif dimension == 'keeper_version':
-                dimensions.sort(key=lambda x: x.get('version_id', 0), reverse=False)
-
-            elif dimension in {'username', 'to_username', 'from_username'}:
-                pattern = re.compile(EMAIL_PATTERN, re.IGNORECASE)
-                dimensions = [x for x in dimensions if pattern.match(x)]
-                dimensions.sort()
+                    dimensions.sort(key=lambda x: f'{x.get("country_code", " ")}|{x.get("region", " ")}|{x.get("city", " ")}',
+                                    reverse=False)
+                elif dimension == 'keeper_version':
+                    dimensions.sort(key=lambda x: x.get('version_id', 0), reverse=False)
+
+                elif dimension in {'username', 'to_username', 'from_username'}:
+                    pattern = re.compile(EMAIL_PATTERN, re.IGNORECASE)
+                    dimensions = [x for x in dimensions if pattern.match(x)]
+                    dimensions.sort()
+                if store and dimensions:
+                    store.put_dimension(dimension, dimensions)
         if dimensions:
             AuditReportCommand.DimensionCache[dimension] = dimensions
             return dimensions
@@ -1280,6 +1424,13 @@ class AuditReportCommand(Command):
                     logging.info('{0:>10d}:  {1}'.format(event_id, event_name))
             return
 
+        if self.audit_store:
+            self.audit_store.close()
+            self.audit_store = None
+        if kwargs.get('local_cache') or kwargs.get('rebuild_cache'):
+            self.audit_store = AuditReportCommand.get_audit_store(params, rebuild=kwargs.get('rebuild_cache'))
+        store = self.audit_store
+
         has_aram = True
         licenses = params.enterprise.get('licenses')
         if isinstance(licenses, list) and licenses:
@@ -1299,7 +1450,7 @@ class AuditReportCommand(Command):
             if not isinstance(columns, list):
                 raise CommandError('audit-report', "'columns' parameter is missing")
             for column in columns:
-                dimension = AuditReportCommand.load_audit_dimension(params, column)
+                dimension = AuditReportCommand.load_audit_dimension(params, column, store=store)
                 if dimension:
                     table = []
                     if column == 'audit_event_type':
@@ -1437,7 +1588,7 @@ class AuditReportCommand(Command):
                 raise CommandError('audit-report', "'geo_location' filter misses country")
             region = (geo_location_comps.pop() if geo_location_comps else '').strip().lower()
             city = (geo_location_comps.pop() if geo_location_comps else '').strip().lower()
-            geo_dimension = AuditReportCommand.load_audit_dimension(params, 'geo_location')
+            geo_dimension = AuditReportCommand.load_audit_dimension(params, 'geo_location', store=store)
             for geo in geo_dimension:
                 if geo.get('country_code', '').lower() != country:
                     continue
@@ -1469,7 +1620,7 @@ class AuditReportCommand(Command):
             if not device_type and not version:
                 raise CommandError('audit-report', "'device_type' filter: empty")
 
-            version_dimension = AuditReportCommand.load_audit_dimension(params, 'keeper_version')
+            version_dimension = AuditReportCommand.load_audit_dimension(params, 'keeper_version', store=store)
             for ver in version_dimension:
                 if device_type:
                     type_name = ver.get('type_name', '').lower()
@@ -1504,7 +1655,11 @@ class AuditReportCommand(Command):
         if audit_filter:
             rq['filter'] = audit_filter
 
-        rs = api.communicate(params, rq)
+        local_rows = self.query_audit_store(params, store, rq, user_limit) if store else None
+        if local_rows is not None:
+            rs = {'audit_event_overview_report_rows': local_rows}
+        else:
+            rs = api.communicate(params, rq)
         fields = []
         table = []
 
@@ -1515,61 +1670,74 @@ class AuditReportCommand(Command):
         details = kwargs.get('details') or False
         if report_type == 'raw':
             fields.extend(audit_report.RAW_FIELDS)
-            misc_fields = list(audit_report.MISC_FIELDS) if kwargs.get('report_format') == 'fields' else ['message']
-            incomplete = True
-            while incomplete:
-                events = rs.get('audit_event_overview_report_rows')
-                for event in events:
-                    if misc_fields:
-                        lenf = len(fields)
-                        for mf in misc_fields:
-                            if mf == 'message':
-                                fields.append(mf)
-                            elif mf in event:
-                                val = event.get(mf)
-                                if val:
-                                    fields.append(mf)
-                                    if mf in audit_report.lookup_types:
-                                        fields.extend(audit_report.lookup_types[mf].fields)
-                        if len(fields) > lenf:
-                            for f in fields[lenf:]:
-                                if f not in audit_report.fields_to_uid_name:
-                                    misc_fields.remove(f)
-
-                    row = []
-                    for field in fields:
-                        value = self.get_value(params, field, event)
-                        row.append(self.convert_value(field, value, details=details, params=params))
-                    table.append(row)
-                incomplete = len(events) >= API_EVENT_RAW_ROW_LIMIT
-                if incomplete:
-                    asc = rq.get('order') == 'ascending'
-                    first_key, last_key = ('min', 'max') if asc else ('max', 'min')
-                    rq_filter = rq.get('filter', {})
-                    rq_period = rq_filter.get('created', {})
-                    period = {first_key: int(events[-1]['created'])}
-                    if not isinstance(rq_period, dict) or rq_period.get(last_key) is None:
-                        last_rq = {**rq}
-                        reverse = 'descending' if asc else 'ascending'
-                        last_rq['order'] = reverse
-                        last_rq['limit'] = 1
-                        rs = api.communicate(params, last_rq)
-                        last_row = rs.get('audit_event_overview_report_rows')[0]
-                        period[last_key] = int(last_row['created'])
-                    else:
-                        period[last_key] = rq_period.get(last_key)
-                    rq_filter['created'] = period
-                    rq['filter'] = rq_filter
-                    if user_limit and user_limit >= API_EVENT_RAW_ROW_LIMIT:
-                        missing = user_limit - len(table)
-                        if missing < API_EVENT_RAW_ROW_LIMIT:
-                            if missing > 0:
-                                rq['limit'] = missing
-                            else:
-                                break
-                    rs = api.communicate(params, rq)
-            table = filter_rows(table, pattern)
-            return dump_report_data(table, fields, fmt=kwargs.get('format'), filename=kwargs.get('output'))
+            discover_fields = kwargs.get('report_format') == 'fields'
+            if discover_fields:
+                misc_fields = list(audit_report.MISC_FIELDS)
+            else:
+                fields.append('message')
+                misc_fields = []
+
+            def get_rows():
+                nonlocal rs
+                row_count = 0
+                incomplete = True
+                while incomplete:
+                    events = rs.get('audit_event_overview_report_rows')
+                    for event in events:
+                        if misc_fields:
+                            lenf = len(fields)
+                            for mf in misc_fields:
+                                if mf in event:
+                                    val = event.get(mf)
+                                    if val:
+                                        fields.append(mf)
+                                        if mf in audit_report.lookup_types:
+                                            fields.extend(audit_report.lookup_types[mf].fields)
+                            if len(fields) > lenf:
+                                for f in fields[lenf:]:
+                                    if f not in audit_report.fields_to_uid_name:
+                                        misc_fields.remove(f)
+
+                        row = []
+                        for field in fields:
+                            value = self.get_value(params, field, event)
+                            row.append(self.convert_value(field, value, details=details, params=params))
+                        row_count += 1
+                        if not pattern or any(1 for f in row if f and str(f).lower().find(pattern) >= 0):
+                            yield row
+                    incomplete = local_rows is None and len(events) >= API_EVENT_RAW_ROW_LIMIT
+                    if incomplete:
+                        asc = rq.get('order') == 'ascending'
+                        first_key, last_key = ('min', 'max') if asc else ('max', 'min')
+                        rq_filter = rq.get('filter', {})
+                        rq_period = rq_filter.get('created', {})
+                        period = {first_key: int(events[-1]['created'])}
+                        if not isinstance(rq_period, dict) or rq_period.get(last_key) is None:
+                            last_rq = {**rq}
+                            reverse = 'descending' if asc else 'ascending'
+                            last_rq['order'] = reverse
+                            last_rq['limit'] = 1
+                            rs = api.communicate(params, last_rq)
+                            last_row = rs.get('audit_event_overview_report_rows')[0]
+                            period[last_key] = int(last_row['created'])
+                        else:
+                            period[last_key] = rq_period.get(last_key)
+                        rq_filter['created'] = period
+                        rq['filter'] = rq_filter
+                        if user_limit and user_limit >= API_EVENT_RAW_ROW_LIMIT:
+                            missing = user_limit - row_count
+                            if missing < API_EVENT_RAW_ROW_LIMIT:
+                                if missing > 0:
+                                    rq['limit'] = missing
+                                else:
+                                    break
+                        rs = api.communicate(params, rq)
+
+            rows = get_rows()
+            if discover_fields:
+                # report columns are added while the events are read
+                rows = list(rows)
+            return stream_report_data(rows, fields, fmt=kwargs.get('format'), filename=kwargs.get('output'))
         else:
             if aggregates:
                 fields.extend(aggregates)
@@ -1594,6 +1762,63 @@ class AuditReportCommand(Command):
             table = filter_rows(table, pattern)
             return dump_report_data(table, fields, fmt=kwargs.get('format'), filename=kwargs.get('output'))
 
+    @staticmethod
+    def get_audit_store(params, rebuild=False):    # type: (KeeperParams, bool) -> audit_store.AuditEventStore
+        if not params.enterprise:
+            raise CommandError('audit-report', 'Local event cache is available to enterprise administrators only')
+        enterprise_id = next(((x['node_id'] >> 32) for x in params.enterprise['nodes']), 0)
+        database_name = audit_store.get_audit_store_name(params.config_filename, enterprise_id)
+        store = audit_store.AuditEventStore(database_name, params.enterprise['unencrypted_tree_key'])
+        if rebuild:
+            store.clear()
+        return store
+
+    def query_audit_store(self, params, store, rq, user_limit):
+        # type: (KeeperParams, audit_store.AuditEventStore, dict, Optional[int]) -> Optional[List[dict]]
+        audit_filter = rq.get('filter') or {}
+        if rq.get('report_type') not in audit_store.LOCAL_REPORT_TYPES or \
+                any(x not in audit_store.LOCAL_FILTERS for x in audit_filter):
+            logging.info('This report cannot be answered from the local event cache. Querying Keeper server.')
+            return None
+
+        event_types = audit_filter.get('audit_event_type')
+        if event_types and any(isinstance(x, int) for x in event_types):
+            event_type_dimension = AuditReportCommand.load_audit_dimension(params, 'audit_event_type', store=store)
+            event_type_names = {x['id']: x['name'] for x in event_type_dimension or []}
+            audit_filter = {
+                **audit_filter,
+                'audit_event_type': [event_type_names.get(x, x) if isinstance(x, int) else x for x in event_types]
+            }
+            rq = {**rq, 'filter': audit_filter}
+
+        # The cache holds only the ingested time range: reports without a start date cover all time on the server
+        min_ts, max_ts = audit_store.get_created_range(audit_filter.get('created'))
+        if min_ts is None:
+            logging.info('The local event cache requires a "--created" filter with a start date. '
+                         'Querying Keeper server.')
+            return None
+        now_ts = int(datetime.datetime.now().timestamp())
+        max_ts = now_ts if max_ts is None else min(max_ts, now_ts)
+
+        def fetch_page(page_min, page_max):
+            page_rq = {
+                'command': 'get_audit_event_reports',
+                'report_type': 'raw',
+                'scope': rq.get('scope') or 'enterprise',
+                'limit': API_EVENT_RAW_ROW_LIMIT,
+                'order': 'ascending',
+                'filter': {'created': {'min': page_min, 'max': page_max}}
+            }
+            page_rs = api.communicate(params, page_rq)
+            return page_rs.get('audit_event_overview_report_rows') or []
+
+        if min_ts <= max_ts:
+            ingested = store.ingest(fetch_page, min_ts, max_ts)
+            logging.debug('Local event cache: %d event(s) downloaded', ingested)
+
+        limit = 50 if user_limit is None else max(user_limit, 0)
+        return audit_store.query_local_events(store, rq, limit)
+
     @staticmethod
     def convert_date(value):
         try:
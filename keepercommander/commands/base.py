@@ -14,13 +14,17 @@ import argparse
 import collections
 import csv
 import datetime
+import heapq
+import importlib
 import io
 import itertools
 import json
 import logging
 import os
+import pickle
 import re
 import shlex
+import tempfile
 from collections import OrderedDict
 from typing import Optional, Sequence, Callable, List, Any, Iterable, Dict, Set
 
@@ -31,10 +35,50 @@ from .. import api, crypto, utils, vault
 from ..params import KeeperParams
 from ..subfolder import try_resolve_path, BaseFolderNode
 
-aliases = {}                 # type: Dict[str, str]
-commands = {}                # type: Dict[str, Command]
-enterprise_commands = {}     # type: Dict[str, Command]
-msp_commands = {}            # type: Dict[str, Command]
+
+class LazyCommand:
+    """Placeholder for a command whose module is imported when the command is used for the first time"""
+    def __init__(self, module_name, class_name):   # type: (str, str) -> None
+        self.module_name = module_name
+        self.class_name = class_name
+
+    def load(self):    # type: () -> CliCommand
+        module = importlib.import_module(self.module_name, __package__)
+        return getattr(module, self.class_name)()
+
+
+class CommandRegistry(dict):
+    """Command dictionary that replaces lazy commands with command instances when they are accessed"""
+    def __getitem__(self, key):
+        command = super(CommandRegistry, self).__getitem__(key)
+        if isinstance(command, LazyCommand):
+            command = command.load()
+            super(CommandRegistry, self).__setitem__(key, command)
+        return command
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[x] for x in self]
+
+    def items(self):
+        return [(x, self[x]) for x in self]
+
+    def is_loaded(self, key):    # type: (str) -> bool
+        return not isinstance(super(CommandRegistry, self).get(key), LazyCommand)
+
+
+def register_lazy_command(commands, name, module_name, class_name):
+    # type: (Dict[str, Any], str, str, str) -> None
+    lazy_command = LazyCommand(module_name, class_name)
+    commands[name] = lazy_command if isinstance(commands, CommandRegistry) else lazy_command.load()
+
+
+aliases = {}                               # type: Dict[str, str]
+commands = CommandRegistry()               # type: Dict[str, Command]
+enterprise_commands = CommandRegistry()    # type: Dict[str, Command]
+msp_commands = CommandRegistry()           # type: Dict[str, Command]
 command_info = OrderedDict()
 
 
@@ -115,9 +159,9 @@ def register_commands(commands, aliases, command_info):
     command_info['2fa'] = '2FA management'
 
     if sys.version_info.major == 3 and 8 <= sys.version_info.minor < 13:
-        from . import discoveryrotation
-        discoveryrotation.register_commands(commands)
-        discoveryrotation.register_command_info(aliases, command_info)
+        # PAM commands pull in WebRTC and the DAG modules; import them when "pam" is used
+        register_lazy_command(commands, 'pam', '.discoveryrotation', 'PAMControllerCommand')
+        command_info['pam'] = 'Manage PAM Components.'
 
 
 def register_pam_legacy_commands():
@@ -444,6 +488,114 @@ def dump_report_data(data, headers, title=None, fmt='', filename=None, append=Fa
         print(tabulate(expanded_data, headers=headers, tablefmt=tablefmt, colalign=colalign if expanded_data else None))
 
 
+# Number of rows sorted in memory by stream_report_data before they are spilled to a temporary file
+REPORT_SORT_CHUNK_SIZE = 100000
+
+
+def read_spilled_rows(fd):   # type: (Any) -> Iterable[List]
+    fd.seek(0)
+    while True:
+        try:
+            yield pickle.load(fd)
+        except EOFError:
+            break
+
+
+def sort_report_rows(rows, sort_by, reverse=False, chunk_size=REPORT_SORT_CHUNK_SIZE):
+    # type: (Iterable[Sequence], int, bool, int) -> Iterable[Sequence]
+    """Sorts rows that may not fit in memory
+
+    Rows are sorted in chunks. Every sorted chunk but the last one is written to a temporary file,
+    and the chunks are merged while the sorted rows are read. The column type is detected on the first chunk.
+    """
+    row_iter = iter(rows)
+    chunk = list(itertools.islice(row_iter, chunk_size))
+    key_fn = detect_column_type((x[sort_by] for x in chunk if 0 <= sort_by < len(x)))
+    if not callable(key_fn):
+        yield from chunk
+        yield from row_iter
+        return
+
+    def row_key(r):
+        return key_fn(r[sort_by] if 0 <= sort_by < len(r) else None)
+
+    spilled = []
+    try:
+        while True:
+            chunk.sort(key=row_key, reverse=reverse)
+            next_chunk = list(itertools.islice(row_iter, chunk_size))
+            if not next_chunk and not spilled:
+                yield from chunk
+                return
+            fd = tempfile.TemporaryFile()
+            spilled.append(fd)
+            for row in chunk:
+                pickle.dump(row, fd, protocol=pickle.HIGHEST_PROTOCOL)
+            chunk = next_chunk
+            if not chunk:
+                break
+        yield from heapq.merge(*(read_spilled_rows(x) for x in spilled), key=row_key, reverse=reverse)
+    finally:
+        for fd in spilled:
+            fd.close()
+
+
+def stream_report_data(rows, headers, title=None, fmt='', filename=None, append=False, **kwargs):
+    # type: (Iterable[Sequence], Sequence[str], Optional[str], Optional[str], Optional[str], bool, ...) -> Optional[str]
+    """Writes a report without holding all rows in memory
+
+    Rows are read from an iterator and written to the CSV or JSON file one at a time.
+    The output is the same as dump_report_data produces. Sorting and grouping use an external sort.
+    Table format and reports that are returned as a string are passed to dump_report_data.
+    kwargs: see dump_report_data
+    """
+    if fmt not in ('csv', 'json') or not filename:
+        return dump_report_data(list(rows), headers, title=title, fmt=fmt, filename=filename, append=append, **kwargs)
+
+    sort_by = kwargs.get('sort_by')
+    group_by = kwargs.get('group_by')
+    if group_by is not None:
+        sort_by = int(group_by)
+    if isinstance(sort_by, int):
+        rows = sort_report_rows(rows, sort_by, reverse=kwargs.get('sort_desc') is True)
+
+    _, ext = os.path.splitext(filename)
+    if not ext:
+        filename += '.' + fmt
+    logging.info('Report path: %s', os.path.abspath(filename))
+    if fmt == 'csv':
+        with open(filename, 'a' if append else 'w', newline='', encoding='utf-8') as fd:
+            csv_writer = csv.writer(fd)
+            if title:
+                csv_writer.writerow([])
+                csv_writer.writerow([title])
+                csv_writer.writerow([])
+            elif append:
+                csv_writer.writerow([])
+
+            starting_column = 0
+            if headers:
+                if headers[0] == '#':
+                    starting_column = 1
+                csv_writer.writerow(headers[starting_column:])
+            for row in rows:
+                row = ['\n'.join(x) if isinstance(x, list) else x for x in row]
+                csv_writer.writerow(row[starting_column:])
+    else:
+        with open(filename, 'a' if append else 'w') as fd:
+            row_no = 0
+            for row in rows:
+                obj = {}
+                for index, column in filter(lambda x: is_json_value_field(x[1]), enumerate(row)):
+                    name = headers[index] if headers and index < len(headers) else "#{:0>2}".format(index)
+                    if name != '#':
+                        obj[name] = column
+                fd.write(',\n  ' if row_no > 0 else '[\n  ')
+                fd.write(json.dumps(obj, indent=2, default=json_serialized).replace('\n', '\n  '))
+                row_no += 1
+            fd.write('\n]' if row_no > 0 else '[]')
+
+
 parameter_pattern = re.compile(r'\${(\w+)}')
 
 
@@ -505,6 +657,10 @@ class CliCommand(abc.ABC):
     def is_authorised(self):
         return True
 
+    def needs_fresh_vault(self):
+        # The command waits until the background sync queued by the previous command is applied
+        return False
+
 
 class Command(CliCommand):
     def __init__(self):
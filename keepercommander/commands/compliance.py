@@ -7,7 +7,7 @@ import operator
 from functools import partial
 from typing import Optional, Dict, Tuple, List, Any, Iterable, Union
 
-from keepercommander.commands.base import GroupCommand, dump_report_data, field_to_title
+from keepercommander.commands.base import GroupCommand, field_to_title, stream_report_data
 from keepercommander.commands.enterprise_common import EnterpriseCommand
 from keepercommander.sox.sox_types import RecordPermissions
 from .. import sox, api
@@ -154,8 +154,8 @@ class BaseComplianceReportCommand(EnterpriseCommand):
         report_fmt = kwargs.get('format', 'table')
         report_data = self.generate_report_data(params, kwargs, sd, report_fmt, node_id, root_node_id)
         headers = self.report_headers if report_fmt == 'json' else [field_to_title(h) for h in self.report_headers]
-        report = dump_report_data(report_data, headers, title=self.title, fmt=report_fmt, filename=kwargs.get('output'),
-                                  column_width=32, group_by=self.group_by_column)
+        report = stream_report_data(report_data, headers, title=self.title, fmt=report_fmt,
+                                    filename=kwargs.get('output'), column_width=32, group_by=self.group_by_column)
         return report
 
 
@@ -200,7 +200,7 @@ class ComplianceReportCommand(BaseComplianceReportCommand):
         logging.info(help_txt)
 
     def generate_report_data(self, params, kwargs, sox_data, report_fmt, node, root_node):
-        # type: (KeeperParams, Dict[str, Any], SoxData, str, int, int) -> List[List[Union[str, Any]]]
+        # type: (KeeperParams, Dict[str, Any], SoxData, str, int, int) -> Iterable[List[Union[str, Any]]]
         def filter_owners(rec_owners):
             def filter_by_teams(users, teams):
                 enterprise_teams = params.enterprise.get('teams', [])
@@ -269,14 +269,13 @@ class ComplianceReportCommand(BaseComplianceReportCommand):
                 for user_uid, permission_bits in record.user_permissions.items():
                     user = sox_data.get_user(user_uid)
                     update_permissions_lookup(permissions_lookup, r_uid, user, permission_bits)
-                for folder in shared_folders.values():
-                    for rp in folder.record_permissions:
-                        if rp.record_uid == r_uid:
-                            for user in sox_data.get_users(folder.users).values():
-                                update_permissions_lookup(permissions_lookup, r_uid, user, rp.permission_bits)
-                            for team in sox_data.get_teams(folder.teams).values():
-                                for team_user in sox_data.get_users(team.users).values():
-                                    update_permissions_lookup(permissions_lookup, r_uid, team_user, rp.permission_bits)
+                for sf_uid, permission_bits in sox_data.get_record_sf_permissions(r_uid).items():
+                    folder = shared_folders.get(sf_uid)
+                    for user in sox_data.get_users(folder.users).values():
+                        update_permissions_lookup(permissions_lookup, r_uid, user, permission_bits)
+                    for team in sox_data.get_teams(folder.teams).values():
+                        for team_user in sox_data.get_users(team.users).values():
+                            update_permissions_lookup(permissions_lookup, r_uid, team_user, permission_bits)
 
         table = []
         for key, permission_bits in permissions_lookup.items():
@@ -288,7 +287,6 @@ class ComplianceReportCommand(BaseComplianceReportCommand):
             rows.sort(key=lambda item: item.get('permissions') & 1, reverse=True)
             rows.sort(key=operator.itemgetter('record_uid'))
             last_rec_uid = ''
-            formatted_rows = []
             record_lookup = sox_data.get_records()
             for row in rows:
                 rec_uid = row.get('record_uid')
@@ -302,9 +300,8 @@ class ComplianceReportCommand(BaseComplianceReportCommand):
                 u_email = row.get('email')
                 permissions = RecordPermissions.to_permissions_str(row.get('permissions'))
                 fmt_row = [formatted_rec_uid, r_title, r_type, u_email, permissions, r_url.rstrip('/'), rec.in_trash, rec_sfs]
-                formatted_rows.append(fmt_row)
+                yield fmt_row
                 last_rec_uid = rec_uid
-            return formatted_rows
 
         report_data = format_table(table)
         return report_data
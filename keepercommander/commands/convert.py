@@ -11,11 +11,17 @@
 
 import argparse
 import fnmatch
+import functools
 import json
 import logging
+import pickle
 import re
+import sys
+import time
 from collections import OrderedDict
-from typing import Optional, Tuple, Dict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple, Dict, List, Set, Iterator
 
 from ..utils import is_url, is_email
 from .base import raise_parse_exception, suppress_exit, Command
@@ -23,7 +29,13 @@ from .folder import get_folder_path
 from .. import api, crypto, loginv3, utils
 from ..params import KeeperParams
 from ..proto import record_pb2
-from ..subfolder import try_resolve_path, find_parent_top_folder
+from ..subfolder import try_resolve_path, SharedFolderNode, SharedFolderFolderNode
+
+# Record conversions are encrypted in worker processes in chunks of this size
+CONVERT_CHUNK_SIZE = 100
+CONVERT_MAX_WORKERS = 4
+# vault/records_convert3 accepts up to 999 records
+CONVERT_BATCH_SIZE = 999
 
 
 def register_commands(commands):
@@ -108,6 +120,150 @@ def recurse_folder(params, folder_uid, folder_path, records_by_folder, regex, ur
             recurse_folder(params, subfolder_uid, folder_path, records_by_folder, regex, url_regex, recurse, attachments, ignore_owner)
 
 
+def get_record_shared_folders(params, record_uids):    # type: (KeeperParams, Set[str]) -> Dict[str, List[str]]
+    """Returns UIDs of the shared folders that contain the records
+
+    This is subfolder.find_parent_top_folder for many records: the folder cache is scanned once.
+    """
+    result = {}    # type: Dict[str, List[str]]
+    for folder_uid, folder_record_uids in params.subfolder_record_cache.items():
+        if not folder_uid:
+            continue
+        folder = params.folder_cache.get(folder_uid)
+        if isinstance(folder, SharedFolderNode):
+            shared_folder_uid = folder.uid
+        elif isinstance(folder, SharedFolderFolderNode):
+            shared_folder_uid = folder.shared_folder_uid
+        else:
+            continue
+        for record_uid in folder_record_uids:
+            if record_uid in record_uids:
+                shared_folder_uids = result.setdefault(record_uid, [])
+                if shared_folder_uid not in shared_folder_uids:
+                    shared_folder_uids.append(shared_folder_uid)
+    return result
+
+
+def encrypt_conversion_chunk(jobs, enterprise_ec_key=None):
+    # type: (List[dict], Optional[bytes]) -> List[bytes]
+    """Encrypts record conversions. Returns serialized RecordConvertToV3 messages
+
+    This function runs in worker processes: it gets plain data and does not use KeeperParams.
+    A job carries only the keys of its own record; everything encrypted with the account data key
+    or a shared folder key is prepared by prepare_conversion_job in the main process.
+    """
+    ec_key = crypto.load_ec_public_key(enterprise_ec_key) if enterprise_ec_key else None
+    result = []
+    for job in jobs:
+        record_key = job['record_key']
+        v3_data = job['v3_data']
+        file_info = job['file_info']
+
+        rc = record_pb2.RecordConvertToV3()
+        rc.record_uid = utils.base64_url_decode(job['record_uid'])
+        rc.client_modified_time = utils.current_milli_time()
+        rc.revision = job['revision']
+
+        if file_info:
+            file_ref = next((x for x in v3_data['fields'] if x.get('type') == 'fileRef'), None)
+            if file_ref is None:
+                file_ref = {'type': 'fileRef'}
+                v3_data['fields'].append(file_ref)
+            if not isinstance(file_ref.get('value'), list):
+                file_ref['value'] = []
+
+            for f_info in file_info:
+                file_uid = utils.generate_uid()
+                file_ref['value'].append(file_uid)
+                file_key = utils.base64_url_decode(f_info['key'])
+
+                data = {}
+                for k in ('name', 'size', 'title', 'lastModified', 'type'):
+                    data[k] = f_info[k]
+
+                rf = record_pb2.RecordFileForConversion()
+                rf.record_uid = utils.base64_url_decode(file_uid)
+                rf.file_file_id = f_info['id']
+                if 'thumbs' in f_info:
+                    thumbs = f_info['thumbs']
+                    if len(thumbs) > 0:
+                        thumb = next((x for x in thumbs if isinstance(x, dict)), None)
+                        if thumb:
+                            rf.thumb_file_id = thumbs[0]['id']
+                rf.data = crypto.encrypt_aes_v2(json.dumps(data).encode('utf-8'), file_key)
+                rf.record_key = f_info['encrypted_key']
+                rf.link_key = crypto.encrypt_aes_v2(file_key, record_key)
+                rc.record_file.append(rf)
+        rc.data = crypto.encrypt_aes_v2(api.get_record_data_json_bytes(v3_data), record_key)
+
+        for shared_folder_uid, record_folder_key in job['folder_keys']:
+            folder_key = record_pb2.RecordFolderForConversion()
+            folder_key.folder_uid = utils.base64_url_decode(shared_folder_uid)
+            folder_key.record_folder_key = record_folder_key
+            rc.folder_key.append(folder_key)
+
+        audit_data = job.get('audit_data')
+        if ec_key and audit_data:
+            rc.audit.data = crypto.encrypt_ec(json.dumps(audit_data).encode('utf-8'), ec_key)
+
+        result.append(rc.SerializeToString())
+    return result
+
+
+def prepare_conversion_job(params, record_uid, v3_data, file_info, shared_folder_uids):
+    # type: (KeeperParams, str, dict, List[dict], List[str]) -> dict
+    """Builds the encryption job of a record conversion
+
+    The file keys are encrypted with the account data key, and the record key with the shared folder keys, here:
+    the data key and the shared folder keys are never sent to worker processes.
+    """
+    record_key = params.record_cache[record_uid]['record_key_unencrypted']
+    files = []
+    for f_info in file_info:
+        file_key = utils.base64_url_decode(f_info['key'])
+        files.append({**f_info, 'encrypted_key': crypto.encrypt_aes_v2(file_key, params.data_key)})
+    folder_keys = []
+    for shared_folder_uid in shared_folder_uids:
+        shared_folder_key = params.shared_folder_cache[shared_folder_uid]['shared_folder_key_unencrypted']
+        folder_keys.append((shared_folder_uid, crypto.encrypt_aes_v2(record_key, shared_folder_key)))
+    return {
+        'record_uid': record_uid,
+        'record_key': record_key,
+        'v3_data': v3_data,
+        'file_info': files,
+        'folder_keys': folder_keys,
+    }
+
+
+def encrypt_conversions(jobs, enterprise_ec_key=None):
+    # type: (List[dict], Optional[bytes]) -> Iterator[record_pb2.RecordConvertToV3]
+    """Yields encrypted record conversions in order
+
+    Chunks are encrypted in worker processes. The frozen application, or a failed process pool,
+    encrypts the remaining chunks in-process.
+    """
+    chunks = [jobs[i:i + CONVERT_CHUNK_SIZE] for i in range(0, len(jobs), CONVERT_CHUNK_SIZE)]
+    encrypt = functools.partial(encrypt_conversion_chunk, enterprise_ec_key=enterprise_ec_key)
+    done = 0
+    if len(chunks) > 1 and not getattr(sys, 'frozen', False):
+        try:
+            with ProcessPoolExecutor(max_workers=min(len(chunks), CONVERT_MAX_WORKERS)) as executor:
+                for chunk_result in executor.map(encrypt, chunks):
+                    done += 1
+                    for rc_bytes in chunk_result:
+                        rc = record_pb2.RecordConvertToV3()
+                        rc.ParseFromString(rc_bytes)
+                        yield rc
+        except (BrokenProcessPool, OSError, pickle.PicklingError) as e:
+            logging.debug('Record encryption in worker processes failed: %s', e)
+
+    for chunk in chunks[done:]:
+        for rc_bytes in encrypt(chunk):
+            rc = record_pb2.RecordConvertToV3()
+            rc.ParseFromString(rc_bytes)
+            yield rc
+
+
 class ConvertCommand(Command):
     def get_parser(self):
         return convert_parser
@@ -196,63 +352,19 @@ class ConvertCommand(Command):
 
             print('\n'.join(f' {k}  {v}' for k, v in record_names.items()))
         else:
-            records = []
+            quiet = kwargs.get('quiet', False)
+            record_shared_folders = get_record_shared_folders(params, record_uids)
+            jobs = []
             for record_uid in record_uids:
                 convert_result = ConvertCommand.convert_to_record_type_data(record_uid, params, type_info)
                 if not convert_result:
                     logging.warning(f'Conversion failed for {record_names[record_uid]} ({record_uid})\n')
                     continue
                 v3_data, file_info = convert_result
-                record_key = params.record_cache[record_uid]['record_key_unencrypted']
-
-                rc = record_pb2.RecordConvertToV3()
-                rc.record_uid = loginv3.CommonHelperMethods.url_safe_str_to_bytes(record_uid)
-                rc.client_modified_time = api.current_milli_time()
                 record = api.get_record(params, record_uid)
-                rc.revision = record.revision
-
-                if file_info:
-                    file_ref = next((x for x in v3_data['fields'] if x.get('type') == 'fileRef'), None)
-                    if file_ref is None:
-                        file_ref = {'type': 'fileRef'}
-                        v3_data['fields'].append(file_ref)
-                    if not isinstance(file_ref.get('value'), list):
-                        file_ref['value'] = []
-
-                    for f_info in file_info:
-                        file_uid = utils.generate_uid()
-                        file_ref['value'].append(file_uid)
-                        file_key = utils.base64_url_decode(f_info['key'])
-
-                        data = {}
-                        for k in ('name', 'size', 'title', 'lastModified', 'type'):
-                            data[k] = f_info[k]
-
-                        rf = record_pb2.RecordFileForConversion()
-                        rf.record_uid = utils.base64_url_decode(file_uid)
-                        rf.file_file_id = f_info['id']
-                        if 'thumbs' in f_info:
-                            thumbs = f_info['thumbs']
-                            if len(thumbs) > 0:
-                                thumb = next((x for x in thumbs if isinstance(x, dict)), None)
-                                if thumb:
-                                    rf.thumb_file_id = thumbs[0]['id']
-                        rf.data = crypto.encrypt_aes_v2(json.dumps(data).encode('utf-8'), file_key)
-                        rf.record_key = crypto.encrypt_aes_v2(file_key, params.data_key)
-                        rf.link_key = crypto.encrypt_aes_v2(file_key, record_key)
-                        rc.record_file.append(rf)
-                rc.data = crypto.encrypt_aes_v2(api.get_record_data_json_bytes(v3_data), record_key)
-
-                # Get share folder of the record so that we can convert the Record Folder Key
-                shared_folders = find_parent_top_folder(params, record_uid)
-
-                for shared_folder in shared_folders:
-                    sf = params.shared_folder_cache[shared_folder.uid]
-                    folder_key = record_pb2.RecordFolderForConversion()
-                    folder_key.folder_uid = utils.base64_url_decode(shared_folder.uid)
-                    folder_key.record_folder_key = crypto.encrypt_aes_v2(record_key, sf['shared_folder_key_unencrypted'])
-                    rc.folder_key.append(folder_key)
-
+                job = prepare_conversion_job(params, record_uid, v3_data, file_info,
+                                             record_shared_folders.get(record_uid) or [])
+                job['revision'] = record.revision
                 if params.enterprise_ec_key:
                     audit_data = {
                         'title': record.title or '',
@@ -260,28 +372,31 @@ class ConvertCommand(Command):
                     }
                     if record.login_url:
                         audit_data['url'] = utils.url_strip(record.login_url)
-                    rc.audit.data = crypto.encrypt_ec(json.dumps(audit_data).encode('utf-8'), params.enterprise_ec_key)
-
-                records.append(rc)
+                    job['audit_data'] = audit_data
+                jobs.append(job)
 
-            quiet = kwargs.get('quiet', False)
             if not quiet:
                 logging.info(f'Matched {len(record_uids)} record(s)')
 
-            if len(records) == 0:
+            if len(jobs) == 0:
                 if not quiet:
                     logging.info('No records successfully converted')
                 return
 
-            while len(records) > 0:
-                rq = record_pb2.RecordsConvertToV3Request()
-                rq.records.extend(records[:999])
-                records = records[999:]
+            started = time.time()
+            converted = 0
+            sent = 0
 
+            def send_batch(batch):
+                nonlocal converted, sent
+                rq = record_pb2.RecordsConvertToV3Request()
+                rq.records.extend(batch)
                 params.sync_data = True
                 rq.client_time = api.current_milli_time()
                 records_modify_rs = api.communicate_rest(params, rq, 'vault/records_convert3',
                                                          rs_type=record_pb2.RecordsModifyResponse)
+                sent += len(batch)
+                converted += sum(1 for x in records_modify_rs.records if x.status == record_pb2.RS_SUCCESS)
                 if not quiet:
                     converted_record_names = [
                         f' {utils.base64_url_encode(r.record_uid)}  {record_names[loginv3.CommonHelperMethods.bytes_to_url_safe_str(r.record_uid)]}'
@@ -296,6 +411,26 @@ class ConvertCommand(Command):
                     if len(convert_errors) > 0:
                         logging.warning(f'Failed to convert the following {len(convert_errors)} record(s):')
                         logging.warning('\n'.join((f'{x[0]} : {x[1]}' for x in convert_errors)))
+                    if len(jobs) > CONVERT_BATCH_SIZE:
+                        elapsed = time.time() - started
+                        logging.info('Sent %d of %d record(s) in %.1f seconds (%.0f records/s)',
+                                     sent, len(jobs), elapsed, sent / elapsed if elapsed > 0 else 0)
+
+            # Batches are sent as they fill while the following records are still being encrypted
+            records = []
+            ec_key = crypto.unload_ec_public_key(params.enterprise_ec_key) if params.enterprise_ec_key else None
+            for rc in encrypt_conversions(jobs, ec_key):
+                records.append(rc)
+                if len(records) >= CONVERT_BATCH_SIZE:
+                    send_batch(records)
+                    records = []
+            if len(records) > 0:
+                send_batch(records)
+
+            if not quiet:
+                elapsed = time.time() - started
+                logging.info('Converted %d of %d record(s) in %.1f seconds (%.0f records/s)',
+                             converted, len(jobs), elapsed, len(jobs) / elapsed if elapsed > 0 else 0)
 
     @staticmethod
     def get_v3_field_type(field_value):
@@ -54,7 +54,7 @@ from .pam.router_helper import router_send_action_to_gateway, print_router_respo
 from .record_edit import RecordEditMixin
 from .tunnel.port_forward.endpoint import WebRTCConnection, TunnelEntrance, READ_TIMEOUT, \
     find_open_port, CloseConnectionReasons, SOCKS5Server, TunnelDAG, get_config_uid, MAIN_NONCE_LENGTH, \
-    SYMMETRIC_KEY_LENGTH, get_keeper_tokens
+    SYMMETRIC_KEY_LENGTH, SCHEDULER_MAX_QUEUE_SIZE, get_keeper_tokens
 from .. import api, utils, vault_extensions, crypto, vault, record_management, attachment, record_facades
 from ..display import bcolors
 from ..error import CommandError, KeeperApiError
@@ -2339,8 +2339,31 @@ class PAMCreateGatewayCommand(Command):
 
 
 # TUNNELING
+def get_tunnel_stats_rows(entrance):  # type: (TunnelEntrance) -> List[List[Any]]
+    rows = []
+    buffered_amount = utils.size_to_str(entrance.get_buffered_amount())
+    for con_no, stats in entrance.get_stats().items():
+        rtt = stats['round_trip_latency']
+        rows.append([entrance.pc.endpoint_name, con_no,
+                     utils.size_to_str(stats['transfer_size']), utils.size_to_str(stats['receive_size']),
+                     utils.size_to_str(int(stats['transfer_rate'])) + '/s',
+                     utils.size_to_str(int(stats['receive_rate'])) + '/s',
+                     f'{rtt:.1f}' if rtt is not None else '',
+                     f"{stats['queue_messages']} / {utils.size_to_str(stats['queue_size'])}",
+                     utils.size_to_str(stats.get('scheduled_size', 0)),
+                     buffered_amount])
+    return rows
+
+
+TUNNEL_STATS_HEADERS = ['Tunnel ID', 'Connection', 'Sent', 'Received', 'Send Rate', 'Receive Rate', 'RTT (ms)',
+                        'In Flight', 'Queued', 'Buffered']
+TUNNEL_STATS_INTERVAL = 5
+
+
 class PAMTunnelListCommand(Command):
     pam_cmd_parser = argparse.ArgumentParser(prog='pam tunnel list')
+    pam_cmd_parser.add_argument('--stats', '-s', dest='stats', action='store_true',
+                                help='Show throughput, latency and queue depth of the tunnel connections')
 
     def get_parser(self):
         return PAMTunnelListCommand.pam_cmd_parser
@@ -2403,6 +2426,17 @@ class PAMTunnelListCommand(Command):
 
         dump_report_data(table, headers, fmt='table', filename="", row_number=False, column_width=None)
 
+        if kwargs.get('stats'):
+            table = []
+            for convo_id in params.tunnel_threads:
+                entrance = params.tunnel_threads[convo_id].get('entrance')
+                if entrance is not None:
+                    table.extend(get_tunnel_stats_rows(entrance))
+            if table:
+                print('')
+                dump_report_data(table, TUNNEL_STATS_HEADERS, fmt='table', filename="", row_number=False,
+                                 column_width=None)
+
 
 def clean_up_tunnel(params, convo_id):
     tunnel_data = None
@@ -2461,6 +2495,8 @@ class PAMTunnelStopCommand(Command):
 
 class PAMTunnelTailCommand(Command):
     pam_cmd_parser = argparse.ArgumentParser(prog='pam tunnel tail')
+    pam_cmd_parser.add_argument('--stats', '-s', dest='stats', action='store_true',
+                                help=f'Print connection stats every {TUNNEL_STATS_INTERVAL} seconds')
     pam_cmd_parser.add_argument('uid', type=str, action='store', help='The Tunnel UID')
 
     def get_parser(self):
@@ -2490,11 +2526,19 @@ class PAMTunnelTailCommand(Command):
         logging.getLogger('aioice').setLevel(logging.DEBUG)
         logging.getLogger(tunnel_data.pc.endpoint_name).setLevel(logging.DEBUG)
 
+        show_stats = kwargs.get('stats') is True
         if log_queue:
             try:
+                stats_time = time.time()
                 while True:
                     while not log_queue.empty():
                         print(f'    {bcolors.OKBLUE}{log_queue.get()}{bcolors.ENDC}')
+                    if show_stats and time.time() - stats_time >= TUNNEL_STATS_INTERVAL:
+                        stats_time = time.time()
+                        rows = get_tunnel_stats_rows(tunnel_data)
+                        if rows:
+                            dump_report_data(rows, TUNNEL_STATS_HEADERS, fmt='table', filename="",
+                                             row_number=False, column_width=None)
             except KeyboardInterrupt:
                 print(f'    {bcolors.WARNING}Exiting tail command{bcolors.ENDC}')
                 return
@@ -2759,6 +2803,13 @@ class PAMTunnelStartCommand(Command):
                                 type=int, default=0,
                                 help='The port number on which the server will be listening for incoming connections. '
                                      'If not set, random open port on the machine will be used.')
+    pam_cmd_parser.add_argument('--priority', dest='priority', action='append', metavar='PORT:PRIORITY',
+                                help='Share of the tunnel for connections to the destination port. A connection with '
+                                     'priority 2 may send twice as much data per round as one with the default '
+                                     'priority 1. Can be repeated.')
+    pam_cmd_parser.add_argument('--max-in-flight', dest='max_in_flight', action='store', type=int,
+                                help=f'Bytes a connection may have queued in the tunnel before it waits. '
+                                     f'Default: {SCHEDULER_MAX_QUEUE_SIZE}')
 
     def get_parser(self):
         return PAMTunnelStartCommand.pam_cmd_parser
@@ -2789,7 +2840,8 @@ class PAMTunnelStartCommand(Command):
         return logger
 
     async def connect(self, params, record_uid, gateway_uid, convo_num, host, port,
-                      log_queue, seed, target_host, target_port, socks):
+                      log_queue, seed, target_host, target_port, socks, priorities=None,
+                      max_queue_size=SCHEDULER_MAX_QUEUE_SIZE):
 
         # Setup custom logging to put logs into log_queue
         logger = self.setup_logging(str(convo_num), log_queue, logging.getLogger().getEffectiveLevel())
@@ -2835,13 +2887,15 @@ class PAMTunnelStartCommand(Command):
                                           logger=logger,
                                           connect_task=params.tunnel_threads[convo_num].get("connect_task", None),
                                           kill_server_event=kill_server_event, target_host=target_host,
-                                          target_port=target_port)
+                                          target_port=target_port,
+                                          priorities=priorities, max_queue_size=max_queue_size)
         else:
             private_tunnel = TunnelEntrance(host=host, port=port, pc=pc, print_ready_event=print_ready_event,
                                             logger=logger,
                                             connect_task=params.tunnel_threads[convo_num].get("connect_task", None),
                                             kill_server_event=kill_server_event, target_host=target_host,
-                                            target_port=target_port)
+                                            target_port=target_port,
+                                            priorities=priorities, max_queue_size=max_queue_size)
 
         t1 = asyncio.create_task(private_tunnel.start_server())
         params.tunnel_threads[convo_num].update({"server": t1, "entrance": private_tunnel,
@@ -2856,7 +2910,7 @@ class PAMTunnelStartCommand(Command):
             logger.debug("--> STOP LISTENING FOR MESSAGES FROM GATEWAY --------")
 
     def pre_connect(self, params, record_uid, gateway_uid, convo_num, host, port,
-                    seed, target_host, target_port, socks):
+                    seed, target_host, target_port, socks, priorities=None, max_queue_size=SCHEDULER_MAX_QUEUE_SIZE):
         tunnel_name = f"{convo_num}"
 
         def custom_exception_handler(_loop, context):
@@ -2892,7 +2946,9 @@ class PAMTunnelStartCommand(Command):
                     seed=seed,
                     target_host=target_host,
                     target_port=target_port,
-                    socks=socks
+                    socks=socks,
+                    priorities=priorities,
+                    max_queue_size=max_queue_size
                 )
             )
             params.tunnel_threads[convo_num].update({"connect_task": connect_task})
@@ -2965,6 +3021,21 @@ class PAMTunnelStartCommand(Command):
             return
 
         record_uid = kwargs.get('uid')
+        priorities = {}
+        for priority in kwargs.get('priority') or []:
+            dest_port, sep, value = priority.partition(':')
+            if not (sep and dest_port.isdigit() and value.isdigit() and int(value) > 0):
+                print(f"{bcolors.FAIL}Invalid priority \"{priority}\". Expected PORT:PRIORITY, "
+                      f"priority is a positive integer.{bcolors.ENDC}")
+                return
+            priorities[int(dest_port)] = int(value)
+        max_queue_size = kwargs.get('max_in_flight')
+        if max_queue_size is None:
+            max_queue_size = SCHEDULER_MAX_QUEUE_SIZE
+        elif max_queue_size <= 0:
+            print(f"{bcolors.FAIL}--max-in-flight must be a positive number of bytes.{bcolors.ENDC}")
+            return
+
         convo_num = len(params.tunnel_threads)
         params.tunnel_threads[convo_num] = {}
         host = kwargs.get('host')
@@ -3039,7 +3110,8 @@ class PAMTunnelStartCommand(Command):
             return
 
         t = threading.Thread(target=self.pre_connect, args=(params, record_uid, gateway_uid, convo_num,
-                                                            host, port, seed, target_host, target_port, socks)
+                                                            host, port, seed, target_host, target_port, socks,
+                                                            priorities, max_queue_size)
                              )
 
         # Setting the thread as a daemon thread
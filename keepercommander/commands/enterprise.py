@@ -37,7 +37,7 @@ from . import aram, audit_alerts, security_audit
 from . import compliance
 from .aram import ActionReportCommand, API_EVENT_SUMMARY_ROW_LIMIT
 from .base import user_choice, suppress_exit, raise_parse_exception, dump_report_data, Command, field_to_title, \
-    report_output_parser
+    report_output_parser, stream_report_data
 from .enterprise_common import EnterpriseCommand
 from .enterprise_push import EnterprisePushCommand, enterprise_push_parser
 from .transfer_account import EnterpriseTransferUserCommand, transfer_user_parser
@@ -3421,41 +3421,41 @@ class UserReportCommand(EnterpriseCommand):
         user_list.sort(key=lambda x: x['username'].lower())
 
         last_login_report = kwargs.get('last_login')
-        rows = []
         headers_basic = ['email', 'name', 'status', 'transfer_status', 'last_login']
         headers_extra = [*headers_basic, 'node', 'roles', 'teams']
         headers = headers_basic if last_login_report else headers_extra
-        for user in user_list:
-            status_dict = get_user_status_dict(user)
-
-            acct_status = status_dict['acct_status']
-            acct_transfer_status = status_dict['acct_transfer_status']
-
-            path = self.get_node_path(params, user['node_id'])
-            teams = self.user_teams.get(user['enterprise_user_id']) or []
-            roles = self.user_roles.get(user['enterprise_user_id']) or []
-            teams.sort(key=str.lower)
-            roles.sort(key=str.lower)
-            ll = user.get('last_login')
-            last_log = str(ll) if ll else ''
-            row_basic = [
-                user['username'],  # email
-                user['name'],  # name
-                acct_status,  # status == acct_status
-                acct_transfer_status,  # acct_transfer_status
-                last_log,  # last_login
-            ]
-            row_extra = [
-                *row_basic,
-                path,  # node
-                roles,  # roles
-                teams  # teams
-            ]
-            rows.append(row_basic if last_login_report else row_extra)
+        def get_rows():
+            for user in user_list:
+                status_dict = get_user_status_dict(user)
+
+                acct_status = status_dict['acct_status']
+                acct_transfer_status = status_dict['acct_transfer_status']
+
+                path = self.get_node_path(params, user['node_id'])
+                teams = self.user_teams.get(user['enterprise_user_id']) or []
+                roles = self.user_roles.get(user['enterprise_user_id']) or []
+                teams.sort(key=str.lower)
+                roles.sort(key=str.lower)
+                ll = user.get('last_login')
+                last_log = str(ll) if ll else ''
+                row_basic = [
+                    user['username'],  # email
+                    user['name'],  # name
+                    acct_status,  # status == acct_status
+                    acct_transfer_status,  # acct_transfer_status
+                    last_log,  # last_login
+                ]
+                row_extra = [
+                    *row_basic,
+                    path,  # node
+                    roles,  # roles
+                    teams  # teams
+                ]
+                yield row_basic if last_login_report else row_extra
 
         if kwargs.get('format') != 'json':
             headers = [field_to_title(x) for x in headers]
-        return dump_report_data(rows, headers, fmt=kwargs.get('format'), filename=kwargs.get('output'))
+        return stream_report_data(get_rows(), headers, fmt=kwargs.get('format'), filename=kwargs.get('output'))
 
     @staticmethod
     def get_user_status(user):
@@ -29,7 +29,7 @@ from .base import user_choice, dump_report_data, suppress_exit, raise_parse_exce
     RecordMixin, FolderMixin
 from .utils import SyncDownCommand
 from .. import api, display, vault, vault_extensions, crypto, utils
-from ..error import CommandError
+from ..error import CommandError, KeeperApiError
 from ..params import KeeperParams
 from ..params import LAST_SHARED_FOLDER_UID, LAST_FOLDER_UID
 from ..proto import folder_pb2
@@ -37,6 +37,9 @@ from ..record import Record
 from ..subfolder import BaseFolderNode, SharedFolderNode, UserFolderNode, SharedFolderFolderNode, try_resolve_path, \
     find_folders, get_contained_record_uids, get_contained_folder_uids
 
+# Maximum number of objects in a single move or pre_delete request
+FOLDER_BATCH_SIZE = 990
+
 
 def register_commands(commands):
     commands['ls'] = FolderListCommand()
@@ -132,8 +135,8 @@ mv_parser.add_argument('-e', '--can-edit', dest='can_edit', action='store_true',
 group = mv_parser.add_mutually_exclusive_group()
 group.add_argument('--shared-folder', dest='shared_folder', action='store_true', help='apply search pattern to shared folders')
 group.add_argument('--user-folder', dest='user_folder', action='store_true', help='apply search pattern to user folders')
-mv_parser.add_argument('src', nargs='?', type=str, action='store',
-                       help='source path to folder/record, search pattern or record UID')
+mv_parser.add_argument('src', nargs='*', type=str, action='store',
+                       help='source paths to folder/record, search patterns or record UIDs')
 mv_parser.add_argument('dst', nargs='?', type=str, action='store', help='destination folder or UID')
 mv_parser.error = raise_parse_exception
 mv_parser.exit = suppress_exit
@@ -143,8 +146,8 @@ ln_parser = argparse.ArgumentParser(prog='ln', description='Create a link betwee
 ln_parser.add_argument('-f', '--force', dest='force', action='store_true', help='do not prompt')
 ln_parser.add_argument('-s', '--can-reshare', dest='can_reshare', action='store_true', help='anyone can reshare records')
 ln_parser.add_argument('-e', '--can-edit', dest='can_edit', action='store_true', help='anyone can edit records')
-ln_parser.add_argument('src', nargs='?', type=str, action='store',
-                       help='source path to folder/record, search pattern or record UID')
+ln_parser.add_argument('src', nargs='*', type=str, action='store',
+                       help='source paths to folder/record, search patterns or record UIDs')
 ln_parser.add_argument('dst', nargs='?', type=str, action='store', help='destination folder or UID')
 ln_parser.error = raise_parse_exception
 ln_parser.exit = suppress_exit
@@ -661,28 +664,53 @@ class FolderRemoveCommand(Command):
                 if not quiet or not force:
                     user_folder_names = [get_folder_path(params, uid) for uid in user_folder_objects]
                     print(f'\nThe following user folder(s) will be removed:\n{", ".join(user_folder_names)}')
-                rq = {
-                    'command': 'pre_delete',
-                    'objects': list(user_folder_objects.values())
-                }
-                rs = api.communicate(params, rq)
-                if rs['result'] == 'success':
-                    pdr = rs['pre_delete_response']
-
-                    if not force or not quiet:
-                        summary = pdr['would_delete']['deletion_summary']
-                        for x in summary:
-                            print(x)
-
+                objects = list(user_folder_objects.values())
+                chunks = [objects[i:i + FOLDER_BATCH_SIZE] for i in range(0, len(objects), FOLDER_BATCH_SIZE)]
+                pre_delete_tokens = []    # type: List[Tuple[str, int]]
+                failed = 0
+                for chunk in chunks:
+                    rq = {
+                        'command': 'pre_delete',
+                        'objects': chunk
+                    }
+                    if len(chunks) == 1:
+                        rs = api.communicate(params, rq)
+                    else:
+                        try:
+                            rs = api.communicate(params, rq)
+                        except KeeperApiError as e:
+                            failed += len(chunk)
+                            logging.warning('%d folder(s) cannot be removed: %s', len(chunk), e)
+                            continue
+                    if rs['result'] == 'success':
+                        pdr = rs['pre_delete_response']
+
+                        if not force or not quiet:
+                            summary = pdr['would_delete']['deletion_summary']
+                            for x in summary:
+                                print(x)
+                        pre_delete_tokens.append((pdr['pre_delete_token'], len(chunk)))
+
+                if pre_delete_tokens:
                     prompt_msg = 'Do you want to proceed with the user folder deletion?'
                     np = 'y' if force else user_choice(f'\n{prompt_msg}', 'yn', default='n')
                     if np.lower() == 'y':
-                        rq = {
-                            'command': 'delete',
-                            'pre_delete_token': pdr['pre_delete_token']
-                        }
-                        api.communicate(params, rq)
+                        for pre_delete_token, count in pre_delete_tokens:
+                            rq = {
+                                'command': 'delete',
+                                'pre_delete_token': pre_delete_token
+                            }
+                            if len(chunks) == 1:
+                                api.communicate(params, rq)
+                            else:
+                                try:
+                                    api.communicate(params, rq)
+                                except KeeperApiError as e:
+                                    failed += count
+                                    logging.warning('%d folder(s) cannot be removed: %s', count, e)
                         params.sync_data = True
+                        if len(chunks) > 1:
+                            logging.info('%d folder(s) removed. %d failed', user_folder_count - failed, failed)
 
 
 class FolderMoveCommand(Command):
@@ -718,31 +746,9 @@ class FolderMoveCommand(Command):
                     'key': transition_key
                 })
 
-    def get_parser(self):
-        return mv_parser
-
-    def is_move(self):
-        return True
-
-    def execute(self, params, **kwargs):
-        src_path = kwargs['src'] if 'src' in kwargs else None
-        dst_path = kwargs['dst'] if 'dst' in kwargs else None
-
-        if not src_path or not dst_path:
-            parser = self.get_parser()
-            parser.print_help()
-            return
-
-        if dst_path in params.folder_cache:
-            dst_folder = params.folder_cache[dst_path]
-        else:
-            dst = try_resolve_path(params, dst_path)
-            if dst is None:
-                raise CommandError('mv', 'Destination path should be existing folder')
-            dst_folder, name = dst
-            if len(name) > 0:
-                raise CommandError('mv', 'Destination path should be existing folder')
-
+    @staticmethod
+    def resolve_source(params, src_path, dst_folder, **kwargs):
+        # type: (KeeperParams, str, BaseFolderNode, Any) -> List[Tuple[BaseFolderNode, Optional[str]]]
         source = []    # type: List[Tuple[BaseFolderNode, Optional[str]]]   # (folder, record_uid)
         if src_path in params.record_cache:    # record UID
             record_uid = src_path
@@ -804,23 +810,62 @@ class FolderMoveCommand(Command):
 
             if len(source) == 0:
                 raise CommandError('mv', f'Record "{name}" not found')
+        return source
 
-        rq = {
-            'command': 'move',
-            'link': not self.is_move(),
-            'move': []
-        }
-        if dst_folder.type == BaseFolderNode.RootFolderType:
-            rq['to_type'] = BaseFolderNode.UserFolderType
+    def get_parser(self):
+        return mv_parser
+
+    def is_move(self):
+        return True
+
+    def execute(self, params, **kwargs):
+        src_paths = kwargs.get('src')
+        dst_path = kwargs.get('dst')
+        if isinstance(src_paths, str):
+            src_paths = [src_paths]
+        src_paths = list(src_paths or [])
+        if not dst_path and len(src_paths) > 1:
+            dst_path = src_paths.pop()
+
+        if not src_paths or not dst_path:
+            parser = self.get_parser()
+            parser.print_help()
+            return
+
+        if dst_path in params.folder_cache:
+            dst_folder = params.folder_cache[dst_path]
         else:
-            rq['to_type'] = dst_folder.type
-            rq['to_uid'] = dst_folder.uid
+            dst = try_resolve_path(params, dst_path)
+            if dst is None:
+                raise CommandError('mv', 'Destination path should be existing folder')
+            dst_folder, name = dst
+            if len(name) > 0:
+                raise CommandError('mv', 'Destination path should be existing folder')
 
-        transition_keys = []
+        source = []    # type: List[Tuple[BaseFolderNode, Optional[str]]]   # (folder, record_uid)
+        for src_path in src_paths:
+            try:
+                source.extend(FolderMoveCommand.resolve_source(params, src_path, dst_folder, **kwargs))
+            except CommandError as e:
+                if len(src_paths) == 1:
+                    raise
+                logging.warning('%s: %s', src_path, e.message)
+        if len(source) == 0:
+            raise CommandError('mv', 'Source path should be existing record or folder')
+
+        batches = []    # type: List[Tuple[List[dict], List[dict]]]   # (moves, transition keys)
+        moves = []      # type: List[dict]
+        transition_keys = []    # type: List[dict]
+        queued = set()
         for src_folder, record_uid in source:
-            if len(rq['move']) > 990:
-                logging.info('The command limit has been reached. Please repeat this command to resume operation.')
-                break
+            source_key = (src_folder.uid, record_uid)
+            if source_key in queued:
+                continue
+            queued.add(source_key)
+            if len(moves) >= FOLDER_BATCH_SIZE:
+                batches.append((moves, transition_keys))
+                moves = []
+                transition_keys = []
 
             if not record_uid:   # move folder
                 if src_folder.type == BaseFolderNode.RootFolderType:
@@ -847,7 +892,7 @@ class FolderMoveCommand(Command):
                     move['from_type'] = parent_folder.type
                     move['from_uid'] = parent_folder.uid
 
-                rq['move'].append(move)
+                moves.append(move)
                 if src_folder.type == BaseFolderNode.UserFolderType:
                     if dst_folder.type in {BaseFolderNode.SharedFolderType, BaseFolderNode.SharedFolderFolderType}:
                         shf_uid = dst_folder.uid if dst_folder.type == BaseFolderNode.SharedFolderType else dst_folder.shared_folder_uid
@@ -881,7 +926,7 @@ class FolderMoveCommand(Command):
                     for flag in ['can_reshare', 'can_edit']:
                         if flag in kwargs and kwargs[flag]:
                             move[flag] = True
-                rq['move'].append(move)
+                moves.append(move)
 
                 transition_key = None
                 rec = params.record_cache[record_uid]
@@ -908,11 +953,36 @@ class FolderMoveCommand(Command):
                         'uid': record_uid,
                         'key': transition_key
                     })
-        if transition_keys:
-            rq['transition_keys'] = transition_keys
+        if moves:
+            batches.append((moves, transition_keys))
 
-        api.communicate(params, rq)
+        failed = 0
+        for moves, transition_keys in batches:
+            rq = {
+                'command': 'move',
+                'link': not self.is_move(),
+                'move': moves
+            }
+            if dst_folder.type == BaseFolderNode.RootFolderType:
+                rq['to_type'] = BaseFolderNode.UserFolderType
+            else:
+                rq['to_type'] = dst_folder.type
+                rq['to_uid'] = dst_folder.uid
+            if transition_keys:
+                rq['transition_keys'] = transition_keys
+            if len(batches) == 1:
+                api.communicate(params, rq)
+            else:
+                try:
+                    api.communicate(params, rq)
+                except KeeperApiError as e:
+                    failed += len(moves)
+                    logging.warning('%d item(s) could not be %s: %s', len(moves),
+                                    'moved' if self.is_move() else 'linked', e)
         params.sync_data = True
+        if len(batches) > 1:
+            total = sum(len(x[0]) for x in batches)
+            logging.info('%d item(s) %s. %d failed', total - failed, 'moved' if self.is_move() else 'linked', failed)
 
 
 class FolderLinkCommand(FolderMoveCommand):
@@ -0,0 +1,304 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2024 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional, List, Dict, Any, Iterable, Tuple, Union
+
+from ... import crypto
+
+# Events that reach the server late are picked up by re-reading this many seconds before the last ingested event
+INGEST_OVERLAP = 3600
+DIMENSION_TTL = 24 * 60 * 60
+
+LOCAL_REPORT_TYPES = {'raw', 'span', 'hour', 'day'}
+LOCAL_FILTERS = {'created', 'audit_event_type', 'username', 'to_username', 'record_uid', 'shared_folder_uid',
+                 'ip_address'}
+PREDEFINED_CREATED = ('today', 'yesterday', 'last_7_days', 'last_30_days', 'month_to_date', 'last_month',
+                      'year_to_date', 'last_year')
+
+
+def get_created_range(created_filter, now=None):
+    # type: (Union[str, int, dict, None], Optional[datetime.datetime]) -> Tuple[Optional[int], Optional[int]]
+    """Converts an audit-report "created" filter into an inclusive (min, max) epoch range"""
+    if created_filter is None:
+        return None, None
+    if isinstance(created_filter, int):
+        return created_filter, created_filter
+    if isinstance(created_filter, dict):
+        min_ts = created_filter.get('min')
+        max_ts = created_filter.get('max')
+        if min_ts is not None and created_filter.get('exclude_min'):
+            min_ts += 1
+        if max_ts is not None and created_filter.get('exclude_max'):
+            max_ts -= 1
+        return min_ts, max_ts
+
+    now = now or datetime.datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = None    # type: Optional[datetime.datetime]
+    if created_filter == 'today':
+        start = today
+    elif created_filter == 'yesterday':
+        start = today - datetime.timedelta(days=1)
+        end = today
+    elif created_filter == 'last_7_days':
+        start = today - datetime.timedelta(days=7)
+    elif created_filter == 'last_30_days':
+        start = today - datetime.timedelta(days=30)
+    elif created_filter == 'month_to_date':
+        start = today.replace(day=1)
+    elif created_filter == 'last_month':
+        end = today.replace(day=1)
+        start = (end - datetime.timedelta(days=1)).replace(day=1)
+    elif created_filter == 'year_to_date':
+        start = today.replace(month=1, day=1)
+    elif created_filter == 'last_year':
+        end = today.replace(month=1, day=1)
+        start = end.replace(year=end.year - 1)
+    else:
+        raise ValueError(f'Unsupported "created" filter: {created_filter}')
+    return int(start.timestamp()), int(end.timestamp()) - 1 if end else None
+
+
+def match_filter(value, event_filter):   # type: (Any, Any) -> bool
+    if isinstance(event_filter, list):
+        return value in event_filter
+    if isinstance(event_filter, dict):
+        if value is None:
+            return False
+        min_value = event_filter.get('min')
+        if min_value is not None:
+            if value < min_value or (event_filter.get('exclude_min') and value == min_value):
+                return False
+        max_value = event_filter.get('max')
+        if max_value is not None:
+            if value > max_value or (event_filter.get('exclude_max') and value == max_value):
+                return False
+        return True
+    return value == event_filter
+
+
+class AuditEventStore:
+    """Local encrypted store of raw enterprise audit events
+
+    Events are ingested incrementally by their "created" time. The store keeps the contiguous time range it
+    covers, so repeated reports over the same window are answered without querying the server.
+    The event payload is encrypted with the enterprise tree key. Only the event ID, time and type are kept in clear
+    to allow range and type lookups.
+    """
+    def __init__(self, database_name, encryption_key):   # type: (str, bytes) -> None
+        self.database_name = database_name
+        self.encryption_key = encryption_key
+        self._connection = None    # type: Optional[sqlite3.Connection]
+        self.create_database()
+
+    def get_connection(self):   # type: () -> sqlite3.Connection
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.database_name)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def create_database(self):
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS audit_event ('
+                           'id INTEGER PRIMARY KEY, created INTEGER NOT NULL, audit_event_type TEXT, data BLOB)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS audit_event_created ON audit_event (created)')
+            cursor.execute('CREATE TABLE IF NOT EXISTS audit_dimension ('
+                           'name TEXT PRIMARY KEY, loaded INTEGER NOT NULL, data BLOB)')
+            cursor.execute('CREATE TABLE IF NOT EXISTS audit_metadata (name TEXT PRIMARY KEY, value INTEGER)')
+        connection.commit()
+
+    def clear(self):
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('DELETE FROM audit_event')
+            cursor.execute('DELETE FROM audit_dimension')
+            cursor.execute('DELETE FROM audit_metadata')
+        connection.commit()
+
+    def get_covered_range(self):   # type: () -> Tuple[Optional[int], Optional[int]]
+        with closing(self.get_connection().cursor()) as cursor:
+            rows = dict(cursor.execute('SELECT name, value FROM audit_metadata').fetchall())
+        return rows.get('covered_min'), rows.get('covered_max')
+
+    def set_covered_range(self, min_ts, max_ts):   # type: (int, int) -> None
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.executemany('INSERT OR REPLACE INTO audit_metadata (name, value) VALUES (?, ?)',
+                               (('covered_min', min_ts), ('covered_max', max_ts)))
+        connection.commit()
+
+    def put_events(self, events):   # type: (Iterable[dict]) -> int
+        rows = [(int(x['id']), int(x['created']), x.get('audit_event_type'),
+                 crypto.encrypt_aes_v2(json.dumps(x).encode('utf-8'), self.encryption_key)) for x in events]
+        if rows:
+            connection = self.get_connection()
+            with closing(connection.cursor()) as cursor:
+                cursor.executemany('INSERT OR IGNORE INTO audit_event (id, created, audit_event_type, data) '
+                                   'VALUES (?, ?, ?, ?)', rows)
+            connection.commit()
+        return len(rows)
+
+    def get_events(self, min_ts=None, max_ts=None, event_types=None, descending=True):
+        # type: (Optional[int], Optional[int], Optional[List[str]], bool) -> Iterable[dict]
+        sql = 'SELECT data FROM audit_event'
+        where = []
+        args = []     # type: List[Any]
+        if min_ts is not None:
+            where.append('created >= ?')
+            args.append(min_ts)
+        if max_ts is not None:
+            where.append('created <= ?')
+            args.append(max_ts)
+        if event_types:
+            where.append(f'audit_event_type IN ({", ".join("?" for _ in event_types)})')
+            args.extend(event_types)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY created DESC, id DESC' if descending else ' ORDER BY created, id'
+        with closing(self.get_connection().cursor()) as cursor:
+            for row in cursor.execute(sql, args):
+                yield json.loads(crypto.decrypt_aes_v2(row[0], self.encryption_key))
+
+    def get_dimension(self, name):   # type: (str) -> Optional[list]
+        with closing(self.get_connection().cursor()) as cursor:
+            row = cursor.execute('SELECT loaded, data FROM audit_dimension WHERE name = ?', (name,)).fetchone()
+        if row and row[0] + DIMENSION_TTL > int(time.time()):
+            return json.loads(crypto.decrypt_aes_v2(row[1], self.encryption_key))
+
+    def put_dimension(self, name, dimension):   # type: (str, list) -> None
+        data = crypto.encrypt_aes_v2(json.dumps(dimension).encode('utf-8'), self.encryption_key)
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('INSERT OR REPLACE INTO audit_dimension (name, loaded, data) VALUES (?, ?, ?)',
+                           (name, int(time.time()), data))
+        connection.commit()
+
+    def ingest(self, fetch_page, min_ts, max_ts):
+        # type: (Any, int, int) -> int
+        """Loads events in [min_ts, max_ts] that are not covered yet.
+
+        fetch_page(min_ts, max_ts) returns up to one page of raw events in ascending "created" order.
+        """
+        covered_min, covered_max = self.get_covered_range()
+        ranges = []
+        if covered_min is None or covered_max is None:
+            self.clear_events()
+            ranges.append((min_ts, max_ts))
+            covered_min, covered_max = min_ts, max_ts
+        else:
+            if min_ts < covered_min:
+                ranges.append((min_ts, covered_min))
+                covered_min = min_ts
+            if max_ts > covered_max:
+                ranges.append((max(covered_max - INGEST_OVERLAP, covered_min), max_ts))
+                covered_max = max_ts
+
+        total = 0
+        for range_min, range_max in ranges:
+            total += self._ingest_range(fetch_page, range_min, range_max)
+        self.set_covered_range(covered_min, covered_max)
+        return total
+
+    def clear_events(self):
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('DELETE FROM audit_event')
+        connection.commit()
+
+    def _ingest_range(self, fetch_page, min_ts, max_ts):
+        total = 0
+        logged_ids = set()
+        while min_ts <= max_ts:
+            events = fetch_page(min_ts, max_ts)
+            if not events:
+                break
+            new_events = [x for x in events if x['id'] not in logged_ids]
+            logged_ids.update((x['id'] for x in new_events))
+            total += self.put_events(new_events)
+            last_created = int(events[-1]['created'])
+            if not new_events:
+                last_created += 1
+            min_ts = last_created
+            logging.debug('Audit event store: ingested %d events up to %s', total,
+                          datetime.datetime.fromtimestamp(min_ts))
+        return total
+
+
+def get_audit_store_name(config_filename, enterprise_id):   # type: (Optional[str], int) -> str
+    path = os.path.dirname(os.path.abspath(config_filename or '1'))
+    return os.path.join(path, f'audit_{enterprise_id}.db')
+
+
+def query_local_events(store, rq, limit=0):
+    # type: (AuditEventStore, dict, int) -> List[Dict[str, Any]]
+    """Answers a get_audit_event_reports request from the local event store"""
+    report_type = rq.get('report_type') or 'raw'
+    audit_filter = dict(rq.get('filter') or {})
+    min_ts, max_ts = get_created_range(audit_filter.pop('created', None))
+    event_types = audit_filter.get('audit_event_type')
+    if isinstance(event_types, list) and all(isinstance(x, str) for x in event_types):
+        audit_filter.pop('audit_event_type')
+    else:
+        event_types = None
+    descending = rq.get('order') != 'ascending'
+
+    def filtered_events():
+        for evt in store.get_events(min_ts, max_ts, event_types=event_types, descending=descending):
+            if all(match_filter(evt.get(key), value) for key, value in audit_filter.items()):
+                yield evt
+
+    if report_type == 'raw':
+        rows = []
+        for event in filtered_events():
+            rows.append(event)
+            if 0 < limit <= len(rows):
+                break
+        return rows
+
+    columns = rq.get('columns') or []
+    aggregates = rq.get('aggregate') or ['occurrences']
+    groups = {}     # type: Dict[tuple, Dict[str, Any]]
+    for event in filtered_events():
+        created = int(event['created'])
+        key = tuple(event.get(x) for x in columns)
+        if report_type == 'hour':
+            key += (created - created % 3600, )
+        elif report_type == 'day':
+            key += (created - created % 86400, )
+        group = groups.get(key)
+        if group is None:
+            group = {x: event.get(x) for x in columns if x in event}
+            if report_type != 'span':
+                group['created'] = key[-1]
+            group['occurrences'] = 0
+            group['first_created'] = created
+            group['last_created'] = created
+            groups[key] = group
+        group['occurrences'] += 1
+        group['first_created'] = min(group['first_created'], created)
+        group['last_created'] = max(group['last_created'], created)
+
+    rows = list(groups.values())
+    rows.sort(key=lambda x: x[aggregates[0]], reverse=descending)
+    if limit > 0:
+        rows = rows[:limit]
+    return rows
@@ -0,0 +1,88 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2024 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+import datetime
+import json
+import os
+import sqlite3
+from contextlib import closing
+from typing import Optional
+
+from ... import crypto
+
+# Daily snapshots of the last day of a month are reported during the next day
+CLOSED_MONTH_DELAY = datetime.timedelta(days=2)
+
+
+def is_closed_month(year, month, now=None):   # type: (int, int, Optional[datetime.datetime]) -> bool
+    """Snapshots of a closed month do not change any more"""
+    now = now or datetime.datetime.now(tz=datetime.timezone.utc)
+    if month == 12:
+        month_end = datetime.datetime(year + 1, 1, 1, tzinfo=datetime.timezone.utc)
+    else:
+        month_end = datetime.datetime(year, month + 1, 1, tzinfo=datetime.timezone.utc)
+    return month_end + CLOSED_MONTH_DELAY <= now
+
+
+class BillingSnapshotStore:
+    """Local encrypted store of MSP daily snapshots
+
+    Only closed months are stored. The month data is encrypted with the enterprise tree key.
+    """
+    def __init__(self, database_name, encryption_key):   # type: (str, bytes) -> None
+        self.database_name = database_name
+        self.encryption_key = encryption_key
+        self._connection = None    # type: Optional[sqlite3.Connection]
+        self.create_database()
+
+    def get_connection(self):   # type: () -> sqlite3.Connection
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.database_name)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def create_database(self):
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS billing_month (year INTEGER NOT NULL, month INTEGER NOT NULL, '
+                           'data BLOB, PRIMARY KEY (year, month))')
+        connection.commit()
+
+    def clear(self):
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('DELETE FROM billing_month')
+        connection.commit()
+
+    def get_month(self, year, month):   # type: (int, int) -> Optional[dict]
+        with closing(self.get_connection().cursor()) as cursor:
+            row = cursor.execute('SELECT data FROM billing_month WHERE year = ? AND month = ?',
+                                 (year, month)).fetchone()
+        if row:
+            return json.loads(crypto.decrypt_aes_v2(row[0], self.encryption_key))
+
+    def put_month(self, year, month, data):   # type: (int, int, dict) -> None
+        if not is_closed_month(year, month):
+            return
+        encrypted_data = crypto.encrypt_aes_v2(json.dumps(data).encode('utf-8'), self.encryption_key)
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('INSERT OR REPLACE INTO billing_month (year, month, data) VALUES (?, ?, ?)',
+                           (year, month, encrypted_data))
+        connection.commit()
+
+
+def get_billing_store_name(config_filename, enterprise_id):   # type: (Optional[str], int) -> str
+    path = os.path.dirname(os.path.abspath(config_filename or '1'))
+    return os.path.join(path, f'msp_billing_{enterprise_id}.db')
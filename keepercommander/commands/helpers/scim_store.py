@@ -0,0 +1,106 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2024 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Optional, Dict, Any, Iterable, Tuple
+
+from ... import crypto
+
+# The Keeper side of the snapshot is re-read from the SCIM endpoint when it is older than this
+KEEPER_SNAPSHOT_TTL = 24 * 60 * 60
+
+SOURCE_USER = 'source_user'
+SOURCE_GROUP = 'source_group'
+KEEPER_USER = 'keeper_user'
+KEEPER_GROUP = 'keeper_group'
+
+
+class ScimSnapshotStore:
+    """Local encrypted snapshot of the last successful "scim push"
+
+    The store keeps the users and groups read from the source and the resulting Keeper SCIM directory.
+    The snapshot belongs to a SCIM record and source; it is ignored when either changes.
+    Entities are encrypted with the enterprise tree key.
+    """
+    def __init__(self, database_name, encryption_key):   # type: (str, bytes) -> None
+        self.database_name = database_name
+        self.encryption_key = encryption_key
+        self._connection = None    # type: Optional[sqlite3.Connection]
+        self.create_database()
+
+    def get_connection(self):   # type: () -> sqlite3.Connection
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.database_name)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def create_database(self):
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('CREATE TABLE IF NOT EXISTS scim_entity ('
+                           'kind TEXT NOT NULL, id TEXT NOT NULL, data BLOB, PRIMARY KEY (kind, id))')
+            cursor.execute('CREATE TABLE IF NOT EXISTS scim_metadata (name TEXT PRIMARY KEY, value TEXT)')
+        connection.commit()
+
+    def clear(self):
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('DELETE FROM scim_entity')
+            cursor.execute('DELETE FROM scim_metadata')
+        connection.commit()
+
+    def get_metadata(self):   # type: () -> Dict[str, Any]
+        with closing(self.get_connection().cursor()) as cursor:
+            return {x[0]: json.loads(x[1]) for x in cursor.execute('SELECT name, value FROM scim_metadata')}
+
+    def is_valid(self, snapshot_key):   # type: (str) -> bool
+        return self.get_metadata().get('key') == snapshot_key
+
+    def is_keeper_current(self):   # type: () -> bool
+        loaded = self.get_metadata().get('keeper_loaded')
+        return isinstance(loaded, int) and loaded + KEEPER_SNAPSHOT_TTL > int(time.time())
+
+    def get_entities(self, kind):   # type: (str) -> Dict[str, dict]
+        with closing(self.get_connection().cursor()) as cursor:
+            return {x[0]: json.loads(crypto.decrypt_aes_v2(x[1], self.encryption_key))
+                    for x in cursor.execute('SELECT id, data FROM scim_entity WHERE kind = ?', (kind,))}
+
+    def save(self, snapshot_key, entities, keeper_loaded, source_state=None):
+        # type: (str, Dict[str, Iterable[Tuple[str, dict]]], int, Optional[dict]) -> None
+        """Replaces the snapshot"""
+        rows = [(kind, entity_id, crypto.encrypt_aes_v2(json.dumps(data).encode('utf-8'), self.encryption_key))
+                for kind, values in entities.items() for entity_id, data in values]
+        metadata = {
+            'key': snapshot_key,
+            'pushed': int(time.time()),
+            'keeper_loaded': keeper_loaded,
+            'source_state': source_state,
+        }
+        connection = self.get_connection()
+        with closing(connection.cursor()) as cursor:
+            cursor.execute('DELETE FROM scim_entity')
+            cursor.execute('DELETE FROM scim_metadata')
+            cursor.executemany('INSERT INTO scim_entity (kind, id, data) VALUES (?, ?, ?)', rows)
+            cursor.executemany('INSERT INTO scim_metadata (name, value) VALUES (?, ?)',
+                               ((k, json.dumps(v)) for k, v in metadata.items()))
+        connection.commit()
+
+
+def get_scim_store_name(config_filename, scim_id):   # type: (Optional[str], int) -> str
+    path = os.path.dirname(os.path.abspath(config_filename or '1'))
+    return os.path.join(path, f'scim_{scim_id}.db')
@@ -15,12 +15,13 @@ import datetime
 import json
 import logging
 import os
-from functools import reduce
-from typing import Set, Dict, List, Iterable, Any, Tuple, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Set, Dict, List, Iterable, Any, Tuple, Union, Optional, Callable
 from urllib.parse import urlparse, urlunparse
 
 from .base import dump_report_data, user_choice, field_to_title, report_output_parser
 from .enterprise import EnterpriseCommand
+from .helpers import billing_store
 from .. import api, crypto, utils, loginv3, constants
 from ..display import bcolors
 from ..error import CommandError
@@ -103,6 +104,8 @@ group.add_argument('--to', dest='to_date',
 msp_billing_report_parser = argparse.ArgumentParser(prog='msp-billing-report', parents=[report_output_parser],
                                                     description='Generate MSP Billing Reports.')
 msp_billing_report_parser.add_argument('--month', dest='month', action='store', metavar='YYYY-MM', help='Month for billing report: 2022-02')
+msp_billing_report_parser.add_argument('--to-month', dest='to_month', action='store', metavar='YYYY-MM',
+                                       help='Last month for multi-month billing report')
 msp_billing_report_parser.add_argument('-d', '--show-date', dest='show_date', action='store_true', help='Breakdown report by date')
 msp_billing_report_parser.add_argument('-c', '--show-company', dest='show_company', action='store_true', help='Breakdown report by managed company')
 
@@ -151,9 +154,50 @@ switch_to_msp_parser = argparse.ArgumentParser(prog='switch-to-msp',
 
 
 msp_params = None
-mc_params_dict = {}
+mc_params_dict = {}    # type: Dict[int, KeeperParams]
 current_mc_id = None
 
+MC_MAX_WORKERS = 8
+
+
+def get_mc_params(params, mc_id):    # type: (KeeperParams, int) -> KeeperParams
+    """Managed company session. Sessions are kept in mc_params_dict until the MSP user logs out."""
+    mc_params = mc_params_dict.get(mc_id)
+    if mc_params is not None:
+        try:
+            api.query_enterprise(mc_params)
+            return mc_params
+        except Exception as e:
+            logging.debug('MC %d: cached session cannot be used: %s', mc_id, e)
+            mc_params_dict.pop(mc_id, None)
+    mc_params = api.login_and_get_mc_params_login_v3(params, mc_id)
+    mc_params_dict[mc_id] = mc_params
+    return mc_params
+
+
+def for_each_managed_company(params, mc_ids, action, max_workers=MC_MAX_WORKERS):
+    # type: (KeeperParams, Iterable[int], Callable[[KeeperParams, int], Any], int) -> Dict[int, Tuple[Any, Optional[Exception]]]
+    """Logs into managed companies and runs action(mc_params, mc_id) concurrently.
+    Returns the action result or the error for every managed company."""
+    mc_ids = list(mc_ids)
+    results = {}    # type: Dict[int, Tuple[Any, Optional[Exception]]]
+    if len(mc_ids) == 0:
+        return results
+
+    def run_action(mc_id):
+        try:
+            return action(get_mc_params(params, mc_id), mc_id), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(mc_ids)))) as executor:
+        for mc_id, result in zip(mc_ids, executor.map(run_action, mc_ids)):
+            results[mc_id] = result
+    return results
+
+
+BILLING_MAX_WORKERS = 4
+
 
 def bi_url(params, endpoint):
     p = urlparse(params.rest_context.server_base)
@@ -292,12 +336,7 @@ class SwitchToMcCommand(EnterpriseCommand, MSPMixin):
 
         current_mc_id = current_mc['mc_enterprise_id']
 
-        if current_mc_id not in mc_params_dict:
-            mc_params = api.login_and_get_mc_params_login_v3(params, current_mc_id)
-            mc_params_dict[current_mc_id] = mc_params
-        else:
-            mc_params = mc_params_dict[current_mc_id]
-            api.query_enterprise(mc_params)
+        get_mc_params(params, current_mc_id)
 
         msp_params = params
         logging.info("Switched to MC '%s'", current_mc['mc_enterprise_name'])
@@ -561,6 +600,50 @@ class DailySnapshot(object):
         return ret
 
 
+class BillingSummary:
+    """Per company and per product aggregates of the daily snapshots, computed in one pass"""
+    def __init__(self, period_snapshots):    # type: (Dict[DailySnapshot, Dict[int, int]]) -> None
+        self.company_start = {}    # type: Dict[int, Tuple[int, Dict[int, int]]]
+        self.company_end = {}      # type: Dict[int, Tuple[int, Dict[int, int]]]
+        self.company_max = {}      # type: Dict[Tuple[int, int], int]
+        self.total_max = {}        # type: Dict[int, int]
+        daily_totals = {}          # type: Dict[int, Dict[int, int]]
+        for ds, units in period_snapshots.items():
+            mc_id = ds.mc_enterprise_id
+            start = self.company_start.get(mc_id)
+            if start is None or ds.date_no < start[0]:
+                self.company_start[mc_id] = (ds.date_no, units)
+            end = self.company_end.get(mc_id)
+            if end is None or ds.date_no > end[0]:
+                self.company_end[mc_id] = (ds.date_no, units)
+            totals = daily_totals.setdefault(ds.date_no, {})
+            for product, count in units.items():
+                totals[product] = totals.get(product, 0) + count
+                key = (mc_id, product)
+                if count > self.company_max.get(key, 0):
+                    self.company_max[key] = count
+        for totals in daily_totals.values():
+            for product, count in totals.items():
+                if count > self.total_max.get(product, 0):
+                    self.total_max[product] = count
+        self.total_start = DailySnapshot.merge_units(x[1] for x in self.company_start.values())
+        self.total_end = DailySnapshot.merge_units(x[1] for x in self.company_end.values())
+        self.reported_days = max(daily_totals) - min(daily_totals) + 1 if daily_totals else 30
+
+    def get_bounding_snapshots(self, mc_id=None):
+        # type: (Optional[int]) -> Tuple[Optional[Union[Dict[int, int], Dict[int, Tuple[int, int]]]], ...]
+        if mc_id is None:
+            return self.total_start, self.total_end
+        start = self.company_start.get(mc_id)
+        end = self.company_end.get(mc_id)
+        return start[1] if start else None, end[1] if end else None
+
+    def get_max_product_count(self, product, mc_id=None):    # type: (int, Optional[int]) -> int
+        if mc_id is None:
+            return self.total_max.get(product, 0)
+        return self.company_max.get((mc_id, product), 0)
+
+
 class MSPBillingReportCommand(EnterpriseCommand):
     LAST_USER = ''
     SNAPSHOT_CACHE = {}  # type: Dict[str, Dict[DailySnapshot, Dict[int, int]]]
@@ -592,95 +675,94 @@ class MSPBillingReportCommand(EnterpriseCommand):
         return 0
 
     @staticmethod
-    def get_daily_snapshots(params, year, month):
+    def fetch_daily_snapshots(params, year, month):    # type: (KeeperParams, int, int) -> dict
+        rq = BI_pb2.ReportingDailySnapshotRequest()
+        rq.year = year
+        rq.month = month
+        url = bi_url(params, 'reporting/daily_snapshot')
+        rs = api.communicate_rest(params, rq, url, rs_type=BI_pb2.ReportingDailySnapshotResponse)
+        companies = [[x.id, x.name] for x in rs.mcEnterprises]
+        snapshots = []
+        for record in rs.records:
+            units = []
+            if record.maxLicenseCount > 0:
+                if record.maxBasePlanId > 0:
+                    units.append([record.maxBasePlanId, record.maxLicenseCount])
+                if record.maxFilePlanTypeId > 0:
+                    units.append([record.maxFilePlanTypeId * 100, record.maxLicenseCount])
+                for addon in record.addons:
+                    if addon.maxAddonId > 0:
+                        units.append([addon.maxAddonId * 10000, addon.units])
+            ds = datetime.datetime.fromtimestamp(record.date // 1000, tz=datetime.timezone.utc)
+            snapshots.append([record.mcEnterpriseId, ds.date().toordinal(), units])
+        return {'companies': companies, 'snapshots': snapshots}
+
+    @staticmethod
+    def get_billing_store(params):    # type: (KeeperParams) -> Optional[billing_store.BillingSnapshotStore]
+        if not params.enterprise or 'unencrypted_tree_key' not in params.enterprise:
+            return None
+        enterprise_id = next(((x['node_id'] >> 32) for x in params.enterprise.get('nodes') or []), 0)
+        database_name = billing_store.get_billing_store_name(params.config_filename, enterprise_id)
+        return billing_store.BillingSnapshotStore(database_name, params.enterprise['unencrypted_tree_key'])
+
+    @staticmethod
+    def get_period_snapshots(params, months, store=None):
+        # type: (KeeperParams, List[Tuple[int, int]], Optional[billing_store.BillingSnapshotStore]) -> Dict[DailySnapshot, Dict[int, int]]
+        """Daily snapshots of the months. Closed months are read from the local store, the others are
+        requested concurrently."""
         if MSPBillingReportCommand.LAST_USER:
             if MSPBillingReportCommand.LAST_USER != params.user:
                 MSPBillingReportCommand.SNAPSHOT_CACHE.clear()
                 MSPBillingReportCommand.COMPANY_CACHE.clear()
         MSPBillingReportCommand.LAST_USER = params.user
 
-        key = f'{year}-{month}'
-        if key not in MSPBillingReportCommand.SNAPSHOT_CACHE:
-            rq = BI_pb2.ReportingDailySnapshotRequest()
-            rq.year = year
-            rq.month = month
-            url = bi_url(params, 'reporting/daily_snapshot')
-            rs = api.communicate_rest(params, rq, url, rs_type=BI_pb2.ReportingDailySnapshotResponse)
-            for company in rs.mcEnterprises:
-                MSPBillingReportCommand.COMPANY_CACHE[company.id] = company.name
-
-            snapshot = {}
-            for record in rs.records:
-                units = {}
-                if record.maxLicenseCount > 0:
-                    if record.maxBasePlanId > 0:
-                        units[record.maxBasePlanId] = record.maxLicenseCount
-                    if record.maxFilePlanTypeId > 0:
-                        units[record.maxFilePlanTypeId * 100] = record.maxLicenseCount
-                    for addon in record.addons:
-                        if addon.maxAddonId > 0:
-                            units[addon.maxAddonId * 10000] = addon.units
-                mc_id = record.mcEnterpriseId
-                ds = datetime.datetime.fromtimestamp(record.date // 1000, tz=datetime.timezone.utc)
-                dt = ds.date()
-                daily = DailySnapshot(mc_id, dt.toordinal())
-                snapshot[daily] = units
-            MSPBillingReportCommand.SNAPSHOT_CACHE[key] = snapshot
-        return MSPBillingReportCommand.SNAPSHOT_CACHE[key]
-
-    @staticmethod
-    def get_max_product_count(period_snapshots, product, mc_id=None):
-        # type: (Dict[DailySnapshot, Dict[int, int]], int, Optional[str]) -> int
-        daily_counts = dict()
-        for ds, counts in period_snapshots.items():
-            if mc_id is not None and mc_id != ds.mc_enterprise_id:
+        month_data = {}   # type: Dict[Tuple[int, int], dict]
+        to_fetch = []     # type: List[Tuple[int, int]]
+        for year, month in months:
+            if f'{year}-{month}' in MSPBillingReportCommand.SNAPSHOT_CACHE:
                 continue
-            date = ds.date_no
-            counts_group = daily_counts.get(date, [])
-            counts_group.append(counts.get(product) or 0)
-            daily_counts[date] = counts_group
-        daily_totals = [sum(counts) for counts in daily_counts.values()]
-        return max(daily_totals)
+            data = store.get_month(year, month) if store else None
+            if data:
+                month_data[(year, month)] = data
+            else:
+                to_fetch.append((year, month))
+
+        if len(to_fetch) > 0:
+            with ThreadPoolExecutor(max_workers=min(BILLING_MAX_WORKERS, len(to_fetch))) as executor:
+                fetched = executor.map(lambda x: MSPBillingReportCommand.fetch_daily_snapshots(params, *x), to_fetch)
+                for (year, month), data in zip(to_fetch, fetched):
+                    month_data[(year, month)] = data
+                    if store:
+                        store.put_month(year, month, data)
+
+        for (year, month), data in month_data.items():
+            for company_id, company_name in data.get('companies') or []:
+                MSPBillingReportCommand.COMPANY_CACHE[company_id] = company_name
+            snapshot = {}    # type: Dict[DailySnapshot, Dict[int, int]]
+            for mc_id, date_no, units in data.get('snapshots') or []:
+                snapshot[DailySnapshot(mc_id, date_no)] = {x[0]: x[1] for x in units}
+            MSPBillingReportCommand.SNAPSHOT_CACHE[f'{year}-{month}'] = snapshot
+
+        period_snapshots = {}   # type: Dict[DailySnapshot, Dict[int, int]]
+        for year, month in months:
+            period_snapshots.update(MSPBillingReportCommand.SNAPSHOT_CACHE[f'{year}-{month}'])
+        return period_snapshots
 
     @staticmethod
-    def get_bounding_snapshots(period_snapshots, mc_id=None):
-        # type: (Dict[DailySnapshot, Dict[int, int]], Optional[str]) -> Tuple[Union[Dict[int, int], Dict[int, Tuple[int, int]]], ...]
-        snap_keys = period_snapshots.keys()
-
-        def get_mc_bounding_snapshots(mc):
-            # type: (str) -> Tuple[Optional[Dict[int, int]], ...]
-            mc_snapshots = {ds for ds in snap_keys if ds.mc_enterprise_id == mc}
-            if not len(mc_snapshots):
-                return None, None, None
-
-            dates = {ds.date_no for ds in mc_snapshots}
-            start_date, end_date = min(dates), max(dates)
-            start_ds = next((ds for ds in mc_snapshots if ds.date_no == start_date), None)
-            end_ds = next((ds for ds in mc_snapshots if ds.date_no == end_date), None)
-            return period_snapshots.get(start_ds), period_snapshots.get(end_ds)
-
-        if mc_id is None:
-            start_snapshots = []   # type: List[Dict[int, int]]
-            end_snapshots = []     # type: List[Dict[int, int]]
-            mc_ids = {ds.mc_enterprise_id for ds in snap_keys}
-            # Get the first and last snapshot for each MC
-            for mc in mc_ids:
-                start, end = get_mc_bounding_snapshots(mc)
-                start and start_snapshots.append(start)
-                end and end_snapshots.append(end)
-
-            # Merge all first snapshots together, then all last snapshots
-            merge_counts = lambda x, y: DailySnapshot.merge_units((x, y))
-            start_snapshot = reduce(merge_counts, start_snapshots)
-            end_snapshot = reduce(merge_counts, end_snapshots)
-            return start_snapshot, end_snapshot
-        else:
-            return get_mc_bounding_snapshots(mc_id)
+    def get_daily_snapshots(params, year, month):
+        return MSPBillingReportCommand.get_period_snapshots(params, [(year, month)])
 
     @staticmethod
-    def get_num_reported_days(period_snapshots): # type: (Dict[DailySnapshot, Dict[int, int]]) -> int
-        dates = [ds.date_no for ds in period_snapshots]
-        return max(dates) - min(dates) + 1 if dates else 30
+    def parse_month(month_str):    # type: (str) -> Optional[Tuple[int, int]]
+        year_part, sep, month_part = month_str.partition('-')
+        try:
+            year = int(year_part)
+            month = int(month_part)
+            if 1 <= month <= 12:
+                return year, month
+        except:
+            pass
+        logging.warning('Given month \"%s\" is not valid. YYYY-MM', month_str)
 
     def execute(self, params, **kwargs):
         month_str = kwargs.get('month')
@@ -693,15 +775,33 @@ class MSPBillingReportCommand(EnterpriseCommand):
                 month += 12
                 year -= 1
         else:
-            year_part, sep, month_part = month_str.partition('-')
-            try:
-                year = int(year_part)
-                month = int(month_part)
-            except:
-                logging.warning('Given month \"%s\" is not valid. YYYY-MM', month_str)
+            start = MSPBillingReportCommand.parse_month(month_str)
+            if not start:
                 return
-        daily_counts = MSPBillingReportCommand.get_daily_snapshots(params, year, month)
+            year, month = start
+        months = [(year, month)]
+        to_month_str = kwargs.get('to_month')
+        if to_month_str:
+            end = MSPBillingReportCommand.parse_month(to_month_str)
+            if not end:
+                return
+            if end < months[0]:
+                logging.warning('"--to-month" %s is before the report month', to_month_str)
+                return
+            while months[-1] < end:
+                y, m = months[-1]
+                months.append((y + 1, 1) if m == 12 else (y, m + 1))
+
+        store = MSPBillingReportCommand.get_billing_store(params)
+        try:
+            daily_counts = MSPBillingReportCommand.get_period_snapshots(params, months, store)
+        finally:
+            if store:
+                store.close()
+        summary = BillingSummary(daily_counts)
         title = f'Consumption Billing Statement: {calendar.month_name[month]} {year}'
+        if len(months) > 1:
+            title += f' - {calendar.month_name[months[-1][1]]} {months[-1][0]}'
         headers = []
         table = []
 
@@ -732,7 +832,7 @@ class MSPBillingReportCommand(EnterpriseCommand):
             company = MSPBillingReportCommand.COMPANY_CACHE.get(point.mc_enterprise_id, '') if show_company else ''
             start_snapshots, end_snapshots = (None, None) \
                 if show_date \
-                else MSPBillingReportCommand.get_bounding_snapshots(daily_counts, None if not show_company else point.mc_enterprise_id)
+                else summary.get_bounding_snapshots(None if not show_company else point.mc_enterprise_id)
             counts = merged_counts[point]
             products = list(counts.keys())
             products.sort()
@@ -745,7 +845,7 @@ class MSPBillingReportCommand(EnterpriseCommand):
                 count_id = MSPBillingReportCommand.get_count_id(product)
                 count, days = counts[product] \
                     if show_company \
-                    else (counts[product][0], MSPBillingReportCommand.get_num_reported_days(daily_counts))
+                    else (counts[product][0], summary.reported_days)
 
                 product_name = ''
                 rate_text = ''
@@ -780,7 +880,7 @@ class MSPBillingReportCommand(EnterpriseCommand):
                     end_counts_data = 0 if end_snapshots is None else end_snapshots.get(product) or 0
                     start_count = next(iter(start_counts_data)) if isinstance(start_counts_data, tuple) else start_counts_data
                     end_count = next(iter(end_counts_data)) if isinstance(end_counts_data, tuple) else end_counts_data
-                    max_count = MSPBillingReportCommand.get_max_product_count(daily_counts, product, None if not show_company else point.mc_enterprise_id)
+                    max_count = summary.get_max_product_count(product, None if not show_company else point.mc_enterprise_id)
                     row.extend([start_count, end_count, max_count])
 
                 table.append(row)
@@ -1365,9 +1465,7 @@ class MSPCopyRoleCommand(EnterpriseCommand):
                 raise CommandError('msp-copy-role', f'Managed Company \"{mc_name}\" not found')
             mcs[mc['mc_enterprise_id']] = mc
 
-        for mc in mcs.values():
-            mc_id = mc['mc_enterprise_id']
-            mc_params = api.login_and_get_mc_params_login_v3(params, mc_id)
+        def copy_roles(mc_params, mc_id):    # type: (KeeperParams, int) -> int
             node_id = next((x['node_id'] for x in mc_params.enterprise.get('nodes', []) if not x.get('parent_id')), None)
             mc_rqs = []
             for role in src_roles.values():
@@ -1431,7 +1529,19 @@ class MSPCopyRoleCommand(EnterpriseCommand):
                     mc_rqs.append(rq)
             if mc_rqs:
                 api.execute_batch(mc_params, mc_rqs)
-            logging.info('MC %s: Roles are in sync', mc_id)
+            return len(mc_rqs)
+
+        failed = 0
+        results = for_each_managed_company(params, mcs.keys(), copy_roles)
+        for mc_id, (changes, error) in results.items():
+            mc_name = mcs[mc_id].get('mc_enterprise_name') or ''
+            if error:
+                failed += 1
+                logging.warning('MC %s "%s": %s', mc_id, mc_name, error)
+            else:
+                logging.info('MC %s "%s": Roles are in sync (%d change(s))', mc_id, mc_name, changes)
+        if len(results) > 1:
+            logging.info('%d managed company(ies) processed: %d failed', len(results), failed)
 
     @staticmethod
     def get_enforcement_value(name, value):    # type: (str, str) -> Any
@@ -23,7 +23,7 @@ from colorama import Fore, Back, Style
 
 from . import record_edit, base, record_totp, record_file_report
 from .base import Command, GroupCommand, RecordMixin, FolderMixin
-from .. import api, display, crypto, utils, vault, vault_extensions, subfolder, recordv3, record_types
+from .. import api, display, crypto, utils, vault, vault_extensions, subfolder, recordv3, record_types, share_index
 from ..breachwatch import BreachWatch
 from ..error import CommandError
 from ..params import KeeperParams
@@ -1617,107 +1617,60 @@ class SharedRecordsReport(Command):
                         continue
                 records[record.record_uid] = record
 
-        expand_teams = kwargs.get('show_team_users') is True
-        team_membership = None   # type: Optional[Dict[str, List[str]]]
-        if expand_teams:
-            team_membership = {}
-            if params.enterprise is not None:
-                user_lookup = {x['enterprise_user_id']: x['username'] for x in params.enterprise['users'] if x.get('status') == 'active'}
-                if 'team_users' in params.enterprise:
-                    for tu in params.enterprise['team_users']:
-                        team_uid = tu['team_uid']
-                        enterprise_user_id = tu['enterprise_user_id']
-                        if enterprise_user_id in user_lookup:
-                            members = team_membership.get(team_uid)
-                            if members is None:
-                                members = []
-                                team_membership[team_uid] = members
-                            members.append(user_lookup[enterprise_user_id])
-
-        rows = []
+        team_membership = share_index.get_team_members(params) if kwargs.get('show_team_users') is True else None
         fields = ['record_uid', 'title', 'share_type', 'shared_to', 'permissions', 'folder_path']
         if all_records:
             fields.insert(0, 'owner')
-        api.get_record_shares(params, records.keys())
+        index = share_index.get_share_index(params, records.keys())
 
         shared_from_mapping = {
-            1: "Direct Share",
-            2: "Share Folder",
-            3: "Share Team Folder"
+            share_index.ShareSource.Direct: "Direct Share",
+            share_index.ShareSource.SharedFolder: "Share Folder",
+            share_index.ShareSource.Team: "Share Team Folder"
         }
 
-        for record_uid, record in records.items():
-            r = params.record_cache.get(record_uid)
-            if not r:
-                continue
-            if 'shares' not in r:
-                continue
-            record_title = record.title
-            if export_format == 'table' and len(record_title) > 40:
-                record_title = record_title[:38] + '...'
-            shares = r['shares']
-            owner = next((x.get('username') for x in shares.get('user_permissions', []) if x.get('owner') is True), None)
-            record_folders = set(find_folders(params, record_uid))
-            if filter_folders is not None:
-                record_folders.intersection_update(filter_folders)
-            folder_path = '\n'.join((get_folder_path(params, x) for x in record_folders))
-            for up in shares.get('user_permissions', []):
-                username = up.get('username')
-                if not username:
+        def get_rows():
+            for record_uid, record in records.items():
+                permissions = index.get_permissions(record_uid)
+                if permissions is None:
                     continue
-                if not all_records and username == params.user:
-                    continue
-                permission = self.permissions_text(can_share=up.get('shareable'), can_edit=up.get('editable'))
-                row = [record_uid, record_title, shared_from_mapping[1], username, permission, folder_path]
-                if all_records:
-                    row.insert(0, owner)
-                rows.append(row)
-            for sfp in shares.get('shared_folder_permissions', []):
-                shared_folder_uid = sfp.get('shared_folder_uid')
-                can_share = sfp.get('reshareable')
-                can_edit = sfp.get('editable')
-                permission = self.permissions_text(can_share=can_share, can_edit=can_edit)
-                if shared_folder_uid in params.shared_folder_cache:
-                    shared_folder = api.get_shared_folder(params, shared_folder_uid)
-                    folder_path = get_folder_path(params, shared_folder_uid)
-                    for sfu in shared_folder.users or []:
-                        username = sfu.get('username')
-                        if not all_records and username == params.user:
-                            continue
-                        row = [record_uid, record_title, shared_from_mapping[2], username, permission, folder_path]
+                record_title = record.title
+                if export_format == 'table' and len(record_title) > 40:
+                    record_title = record_title[:38] + '...'
+                owner = index.get_owner(record_uid)
+                record_folders = set(index.get_record_folders(params, record_uid))
+                if filter_folders is not None:
+                    record_folders.intersection_update(filter_folders)
+                record_path = '\n'.join((index.get_folder_path(params, x) for x in record_folders))
+                for p in permissions:
+                    share_type = shared_from_mapping[p.source]
+                    permission = self.permissions_text(can_share=p.can_share, can_edit=p.can_edit, can_view=p.can_view)
+                    if p.shared_to is None:
+                        shared_to = ['***']
+                        folder_path = p.shared_folder_uid
+                    else:
+                        if p.source == share_index.ShareSource.Team:
+                            if team_membership and p.team_uid in team_membership:
+                                shared_to = [f'({p.shared_to}) {u}' for u in team_membership[p.team_uid]]
+                            else:
+                                shared_to = [p.shared_to]
+                        else:
+                            if not all_records and p.shared_to == params.user:
+                                continue
+                            shared_to = [p.shared_to]
+                        folder_path = record_path if p.source == share_index.ShareSource.Direct \
+                            else index.get_folder_path(params, p.shared_folder_uid)
+                    for target in shared_to:
+                        row = [record_uid, record_title, share_type, target, permission, folder_path]
                         if all_records:
                             row.insert(0, owner)
-                        rows.append(row)
-                    for sft in shared_folder.teams or []:
-                        team_uid = sft['team_uid']
-                        team_name = sft['name']
-                        team_permission = permission
-                        if team_uid in params.team_cache:
-                            team = api.get_team(params, team_uid)
-                            team_permission = self.permissions_text(can_share=can_share and not team.restrict_share,
-                                                                    can_edit=can_edit and not team.restrict_edit,
-                                                                    can_view=not team.restrict_view)
-                        if team_membership and team_uid in team_membership:
-                            for u in team_membership[team_uid]:
-                                row = [record_uid, record_title, shared_from_mapping[3], f'({team_name}) {u}', team_permission, folder_path]
-                                if all_records:
-                                    row.insert(0, owner)
-                                rows.append(row)
-                        else:
-                            row = [record_uid, record_title, shared_from_mapping[3], team_name, team_permission, folder_path]
-                            if all_records:
-                                row.insert(0, owner)
-                            rows.append(row)
-                else:
-                    row = [record_uid, record_title, shared_from_mapping[2], '***', permission, shared_folder_uid]
-                    if all_records:
-                        row.insert(0, owner)
-                    rows.append(row)
+                        yield row
 
         sort_by = (1,3) if all_records else (0,2)
         if export_format == 'table':
             fields = [base.field_to_title(x) for x in fields]
-        return base.dump_report_data(rows, fields, fmt=export_format, filename=export_name, row_number=True, sort_by=sort_by)
+        return base.stream_report_data(get_rows(), fields, fmt=export_format, filename=export_name, row_number=True,
+                                       sort_by=sort_by)
 
 
 class ClipboardCommand(Command, RecordMixin):
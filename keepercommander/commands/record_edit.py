@@ -802,6 +802,9 @@ class RecordUpdateCommand(Command, RecordEditMixin, RecordMixin):
     def get_parser(self):
         return record_update_parser
 
+    def needs_fresh_vault(self):
+        return True
+
     def execute(self, params, **kwargs):
         if kwargs.get('syntax_help') is True:
             print(record_fields_description)
@@ -894,6 +897,9 @@ class RecordAppendNotesCommand(Command):
     def get_parser(self):
         return append_parser
 
+    def needs_fresh_vault(self):
+        return True
+
     def execute(self, params, **kwargs):
         notes = kwargs['notes'] if 'notes' in kwargs else None
         while not notes:
@@ -908,6 +914,9 @@ class RecordDeleteAttachmentCommand(Command):
     def get_parser(self):
         return delete_attachment_parser
 
+    def needs_fresh_vault(self):
+        return True
+
     def execute(self, params, **kwargs):
         record_name = kwargs['record'] if 'record' in kwargs else None
 
@@ -1085,6 +1094,9 @@ class RecordUploadAttachmentCommand(Command):
     def get_parser(self):
         return upload_parser
 
+    def needs_fresh_vault(self):
+        return True
+
     def execute(self, params, **kwargs):
         record_name = kwargs['record'] if 'record' in kwargs else None
         if not record_name:
@@ -11,10 +11,22 @@
 
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
 import requests
+from requests.adapters import HTTPAdapter
 
-from .base import report_output_parser, dump_report_data, field_to_title, Command
+from .base import report_output_parser, stream_report_data, field_to_title, Command
 from .. import vault, attachment, record_facades
+from ..params import KeeperParams
+
+# Attachments are probed in parallel through a pooled HTTP session
+FILE_PROBE_MAX_WORKERS = 8
+# (connect, read) timeouts in seconds
+FILE_PROBE_TIMEOUT = (10, 30)
+# Report rows are written after the attachments of each chunk of records are checked
+FILE_REPORT_CHUNK_SIZE = 100
 
 file_report_parser = argparse.ArgumentParser(prog='file-report', parents=[report_output_parser],
                                              description='List records with file attachments.')
@@ -37,7 +49,7 @@ class RecordFileReportCommand(Command):
             headers = [field_to_title(x) for x in headers]
 
         facade = record_facades.FileRefRecordFacade()
-        table = []
+        records = []
         for record_uid in params.record_cache:
             rec = vault.KeeperRecord.load(params, record_uid)
             if isinstance(rec, vault.PasswordRecord):
@@ -49,33 +61,63 @@ class RecordFileReportCommand(Command):
                     continue
             else:
                 continue
+            records.append(rec)
 
-            statuses = {}
-            if try_download:
-                logging.info('Downloading attachment(s) for record: %s', rec.title)
-                downloads = list(attachment.prepare_attachment_download(params, record_uid))
-                for download in downloads:
-                    try:
-                        if download.url:
-                            opt_rs = requests.get(download.url, proxies=params.rest_context.proxies,
-                                                  headers={"Range": "bytes=0-1"})
-                            statuses[download.file_id] = 'OK' if opt_rs.status_code in {200, 206} else str(opt_rs.status_code)
-                    except Exception as e:
-                        logging.debug(e)
+        def get_rows(session):
+            for i in range(0, len(records), FILE_REPORT_CHUNK_SIZE):
+                chunk = records[i:i + FILE_REPORT_CHUNK_SIZE]
+                statuses = {}    # type: Dict[str, str]
+                if try_download:
+                    statuses = self.probe_attachments(params, session, [x.record_uid for x in chunk])
+                    logging.info('Checked attachments of %d of %d record(s)', i + len(chunk), len(records))
+                for rec in chunk:
+                    if isinstance(rec, vault.PasswordRecord):
+                        for atta in rec.attachments:
+                            row = [rec.title, rec.record_uid, '', atta.id, atta.title or atta.name, atta.size]
+                            if try_download:
+                                row.append(statuses.get(atta.id, 'Error'))
+                            yield row
+                    elif isinstance(rec, vault.TypedRecord):
+                        facade.record = rec
+                        for file_uid in facade.file_ref:
+                            file_rec = vault.KeeperRecord.load(params, file_uid)
+                            if isinstance(file_rec, vault.FileRecord):
+                                row = [rec.title, rec.record_uid, rec.record_type, file_rec.record_uid,
+                                       file_rec.title or file_rec.name, file_rec.size]
+                                if try_download:
+                                    row.append(statuses.get(file_rec.record_uid, 'Error'))
+                                yield row
 
-            if isinstance(rec, vault.PasswordRecord):
-                for atta in rec.attachments:
-                    row = [rec.title, rec.record_uid, '', atta.id, atta.title or atta.name, atta.size]
-                    if try_download:
-                        row.append(statuses.get(atta.id))
-                    table.append(row)
-            elif isinstance(rec, vault.TypedRecord):
-                facade.record = rec
-                for file_uid in facade.file_ref:
-                    file_rec = vault.KeeperRecord.load(params, file_uid)
-                    if isinstance(file_rec, vault.FileRecord):
-                        row = [rec.title, rec.record_uid, rec.record_type, file_rec.record_uid, file_rec.title or file_rec.name, file_rec.size]
-                        if try_download:
-                            row.append(statuses.get(file_rec.record_uid))
-                        table.append(row)
-        return dump_report_data(table, headers, fmt=fmt, filename=kwargs.get('output'))
+        with requests.Session() as session:
+            session.proxies = params.rest_context.proxies
+            adapter = HTTPAdapter(pool_connections=FILE_PROBE_MAX_WORKERS, pool_maxsize=FILE_PROBE_MAX_WORKERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            return stream_report_data(get_rows(session), headers, fmt=fmt, filename=kwargs.get('output'))
+
+    @staticmethod
+    def probe_attachments(params, session, record_uids):
+        # type: (KeeperParams, requests.Session, List[str]) -> Dict[str, str]
+        """Requests the first bytes of every attachment. Returns file ID to download status"""
+        downloads = [x for x in attachment.prepare_attachment_downloads(params, record_uids) if x.url]
+
+        statuses = {}    # type: Dict[str, str]
+        if not downloads:
+            return statuses
+
+        def probe(download):    # type: (attachment.AttachmentDownloadRequest) -> str
+            with session.get(download.url, headers={'Range': 'bytes=0-1'}, timeout=FILE_PROBE_TIMEOUT,
+                             stream=True) as rs:
+                return 'OK' if rs.status_code in {200, 206} else str(rs.status_code)
+
+        with ThreadPoolExecutor(max_workers=FILE_PROBE_MAX_WORKERS) as executor:
+            futures = {executor.submit(probe, x): x for x in downloads}
+            for future in as_completed(futures):
+                download = futures[future]
+                try:
+                    statuses[download.file_id] = future.result()
+                except requests.Timeout:
+                    statuses[download.file_id] = 'Timeout'
+                except Exception as e:
+                    logging.debug('%s: %s', download.file_id, e)
+        return statuses
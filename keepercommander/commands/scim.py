@@ -11,18 +11,24 @@
 import abc
 import argparse
 import base64
+import copy
 import datetime
 import io
 import json
 import logging
 import os
-from typing import Iterable, Union, Optional, Dict, List, Set, Any, Callable
-from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Union, Optional, Dict, List, Set, Any, Callable, Tuple
+from urllib.parse import urlparse, urlunparse, parse_qsl
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from .base import user_choice, dump_report_data, report_output_parser, field_to_title, GroupCommand
 from .enterprise import TeamApproveCommand, EnterpriseCommand
+from .helpers import scim_store
 from .. import api, utils, vault, attachment, vault_extensions
 from ..display import bcolors
 from ..error import CommandError
@@ -65,6 +71,10 @@ scim_push_parser.add_argument('--source', dest='source', action='store', choices
                               default='google', help='Source of SCIM data')
 scim_push_parser.add_argument('--record', '-r', dest='record', action='store',
                               help='Record UID with SCIM configuration')
+scim_push_parser.add_argument('--bulk', dest='bulk', action='store_true',
+                              help='use SCIM bulk operations if the endpoint supports them')
+scim_push_parser.add_argument('--incremental', dest='incremental', action='store_true',
+                              help='compare with the snapshot of the previous push and load changes only')
 scim_push_parser.add_argument('--auto-approve', dest='auto_approve', action='store', choices=['on', 'off'],
                               default='on', help='Auto approve SCIM teams')
 scim_push_parser.add_argument('target', help='SCIM ID')
@@ -317,10 +327,226 @@ class ScimGroup:
         return 'SCIM GROUP: ' + json.dumps(scim_group)
 
 
+SCIM_MAX_WORKERS = 8
+SCIM_PAGE_SIZE = 500
+SCIM_MAX_RETRIES = 5
+SCIM_MAX_RETRY_DELAY = 60
+SCIM_BULK_MAX_OPERATIONS = 1000
+
+
+class ScimOperation:
+    def __init__(self, method, path, payload=None, name='', on_success=None):
+        # type: (str, str, Optional[dict], str, Optional[Callable[[Optional[dict]], None]]) -> None
+        self.method = method
+        self.path = path
+        self.payload = payload
+        self.name = name
+        self.on_success = on_success
+
+
+class ScimClient:
+    """SCIM endpoint client
+
+    Requests share a keep-alive session. Pages and operations are sent by a bounded pool of workers,
+    responses are processed by the calling thread in the order the operations were queued.
+    HTTP 429 responses are retried after the delay suggested by the server.
+    """
+    def __init__(self, scim_url, token, dry_run=False, bulk=False, max_workers=SCIM_MAX_WORKERS):
+        # type: (str, str, bool, bool, int) -> None
+        self.scim_url = scim_url
+        self.dry_run = dry_run
+        self.bulk = bulk
+        self.max_workers = max(max_workers, 1)
+        self.max_retries = SCIM_MAX_RETRIES
+        self.bulk_max_operations = None    # type: Optional[int]
+        self.errors = 0
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {token}'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    @staticmethod
+    def get_retry_delay(rs, attempt):    # type: (requests.Response, int) -> float
+        retry_after = rs.headers.get('Retry-After')
+        delay = None
+        if retry_after:
+            if retry_after.isdigit():
+                delay = int(retry_after)
+            else:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    delay = retry_at.timestamp() - datetime.datetime.now(tz=datetime.timezone.utc).timestamp()
+                except (TypeError, ValueError):
+                    pass
+        if delay is None:
+            delay = 2 ** attempt
+        return min(max(delay, 0), SCIM_MAX_RETRY_DELAY)
+
+    def request(self, method, path, payload=None, params=None):
+        # type: (str, str, Optional[dict], Optional[list]) -> Optional[dict]
+        url = self.scim_url + path
+        attempt = 0
+        while True:
+            rs = self.session.request(method, url, json=payload, params=params)
+            if rs.status_code == 429 and attempt < self.max_retries:
+                attempt += 1
+                delay = ScimClient.get_retry_delay(rs, attempt)
+                logging.debug('SCIM %s %s throttled. Retry in %.1f seconds', method, path, delay)
+                time.sleep(delay)
+                continue
+            if rs.status_code >= 300:
+                raise CommandError('', f'{method} error: {rs.status_code}')
+            if rs.status_code in (200, 201) and rs.content:
+                return rs.json()
+            return None
+
+    def get_page(self, path, start_index, count):    # type: (str, int, int) -> dict
+        comps = urlparse(path)
+        q = parse_qsl(comps.query, keep_blank_values=True)
+        q.append(('startIndex', str(start_index)))
+        q.append(('count', str(count)))
+        path = urlunparse((comps.scheme, comps.netloc, comps.path, None, None, None))
+        return self.request('GET', path, params=q) or {}
+
+    def get_resources(self, path, page_size=SCIM_PAGE_SIZE):    # type: (str, int) -> List[dict]
+        response = self.get_page(path, 1, page_size)
+        resources = list(response.get('Resources') or [])
+        total_results = response.get('totalResults') or 0
+        items_per_page = response.get('itemsPerPage') or len(resources)
+        if items_per_page <= 0 or len(resources) >= total_results:
+            return resources
+
+        start = (response.get('startIndex') or 1) + items_per_page
+        start_indexes = list(range(start, total_results + 1, items_per_page))
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(start_indexes))) as executor:
+            pages = executor.map(lambda x: self.get_page(path, x, items_per_page), start_indexes)
+            for page in pages:
+                resources.extend(page.get('Resources') or [])
+        return resources
+
+    def send(self, operation):   # type: (ScimOperation) -> Optional[dict]
+        if self.dry_run:
+            logging.info(f'{operation.method} {self.scim_url}{operation.path}')
+            if operation.payload is not None:
+                logging.info(json.dumps(operation.payload, indent=2))
+            if operation.method == 'POST':
+                response = operation.payload.copy()
+                response['id'] = utils.generate_uid()
+                return response
+            return None
+        return self.request(operation.method, operation.path, operation.payload)
+
+    def execute(self, operations):    # type: (List[ScimOperation]) -> None
+        if len(operations) == 0:
+            return
+        if self.bulk and not self.dry_run and self.get_bulk_max_operations() > 0:
+            self.execute_bulk(operations)
+            return
+
+        if self.dry_run or self.max_workers == 1 or len(operations) == 1:
+            results = (self.try_send(x) for x in operations)
+            for operation, (rs, error) in zip(operations, results):
+                self.complete(operation, rs, error)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(operations))) as executor:
+                futures = [executor.submit(self.try_send, x) for x in operations]
+                for operation, future in zip(operations, futures):
+                    rs, error = future.result()
+                    self.complete(operation, rs, error)
+
+    def try_send(self, operation):    # type: (ScimOperation) -> Tuple[Optional[dict], Optional[Exception]]
+        try:
+            return self.send(operation), None
+        except Exception as e:
+            return None, e
+
+    def complete(self, operation, rs, error):    # type: (ScimOperation, Optional[dict], Optional[Exception]) -> None
+        if error:
+            self.errors += 1
+            logging.warning('%s %s error: %s', operation.method, operation.name, error)
+        elif operation.on_success:
+            operation.on_success(rs)
+
+    def get_bulk_max_operations(self):    # type: () -> int
+        if self.bulk_max_operations is None:
+            self.bulk_max_operations = 0
+            try:
+                config = self.request('GET', '/ServiceProviderConfig') or {}
+                bulk = config.get('bulk') or {}
+                if bulk.get('supported') is True:
+                    self.bulk_max_operations = min(bulk.get('maxOperations') or SCIM_BULK_MAX_OPERATIONS,
+                                                   SCIM_BULK_MAX_OPERATIONS)
+            except Exception as e:
+                logging.debug('SCIM ServiceProviderConfig error: %s', e)
+            if self.bulk_max_operations <= 0:
+                logging.info('SCIM endpoint does not support bulk operations')
+        return self.bulk_max_operations
+
+    def execute_bulk(self, operations):    # type: (List[ScimOperation]) -> None
+        chunk_size = self.get_bulk_max_operations()
+        for pos in range(0, len(operations), chunk_size):
+            chunk = operations[pos:pos + chunk_size]
+            payload = {
+                'schemas': ['urn:ietf:params:scim:api:messages:2.0:BulkRequest'],
+                'Operations': []
+            }
+            for i, operation in enumerate(chunk):
+                op = {
+                    'method': operation.method,
+                    'bulkId': str(i),
+                    'path': operation.path,
+                }
+                if operation.payload is not None:
+                    op['data'] = operation.payload
+                payload['Operations'].append(op)
+            try:
+                rs = self.request('POST', '/Bulk', payload) or {}
+            except Exception as e:
+                for operation in chunk:
+                    self.complete(operation, None, e)
+                continue
+
+            results = {x.get('bulkId'): x for x in rs.get('Operations') or [] if isinstance(x, dict)}
+            for i, operation in enumerate(chunk):
+                result = results.get(str(i))
+                if result is None:
+                    self.complete(operation, None, CommandError('', 'no bulk response'))
+                    continue
+                status = result.get('status')
+                if isinstance(status, dict):
+                    status = status.get('code')
+                status = int(status) if str(status).isdigit() else 0
+                response = result.get('response')
+                if status >= 300 or status == 0:
+                    detail = response.get('detail') if isinstance(response, dict) else None
+                    self.complete(operation, None, CommandError('', detail or f'{operation.method} error: {status}'))
+                    continue
+                if not isinstance(response, dict):
+                    response = None
+                    location = result.get('location')
+                    if location and operation.method == 'POST':
+                        response = {'id': location.rstrip('/').rsplit('/', 1)[-1]}
+                self.complete(operation, response, None)
+
+
+def load_scim_entity(entity, data):   # type: (Union[ScimUser, ScimGroup], dict) -> Union[ScimUser, ScimGroup]
+    for key, value in data.items():
+        if hasattr(entity, key):
+            setattr(entity, key, value)
+    return entity
+
+
 class ICrmDataSource(abc.ABC):
     def __init__(self):
         self._load_errors = False     # type: bool
         self._debug_logger = ICrmDataSource.null_logger     # type: Callable[[str], None]
+        self.previous_users = None    # type: Optional[Dict[str, ScimUser]]
+        self.previous_state = None    # type: Optional[dict]
+        self.state = None             # type: Optional[dict]
 
     @staticmethod
     def null_logger(message):
@@ -402,21 +628,40 @@ class ScimPushCommand(EnterpriseCommand):
             if verbose:
                 logging.info(message)
 
-        keeper_users = {}  # type: Dict[str, ScimUser]
-        keeper_groups = {}  # type: Dict[str, ScimGroup]
-        logging.debug('SCIM Query Keeper')
-        for element in ScimPushCommand.scim_keeper(scim_url, token):
-            if isinstance(element, ScimUser):
-                keeper_users[element.id] = element
-                logging.debug(str(element))
-            elif isinstance(element, ScimGroup):
-                keeper_groups[element.id] = element
-                logging.debug(str(element))
-
         source = kwargs.get('source')
         if not source:
             raise CommandError('', f'SCIM source {source} cannot be empty')
 
+        store = scim_store.ScimSnapshotStore(scim_store.get_scim_store_name(params.config_filename, scim['scim_id']),
+                                             params.enterprise['unencrypted_tree_key'])
+        snapshot_key = f'{source}:{record.record_uid}:{scim_url}'
+        use_snapshot = kwargs.get('incremental') is True and store.is_valid(snapshot_key)
+        if kwargs.get('incremental') is True and not use_snapshot:
+            verbose_logging('SCIM snapshot is not found: full push')
+
+        keeper_users = {}  # type: Dict[str, ScimUser]
+        keeper_groups = {}  # type: Dict[str, ScimGroup]
+        keeper_loaded = int(time.time())
+        client = ScimClient(scim_url, token, dry_run=dry_run, bulk=kwargs.get('bulk') is True)
+        if use_snapshot and store.is_keeper_current():
+            verbose_logging('SCIM Keeper directory is loaded from the snapshot')
+            keeper_loaded = store.get_metadata()['keeper_loaded']
+            for data in store.get_entities(scim_store.KEEPER_USER).values():
+                user = load_scim_entity(ScimUser(), data)
+                keeper_users[user.id] = user
+            for data in store.get_entities(scim_store.KEEPER_GROUP).values():
+                group = load_scim_entity(ScimGroup(), data)
+                keeper_groups[group.id] = group
+        else:
+            logging.debug('SCIM Query Keeper')
+            for element in ScimPushCommand.scim_keeper(client):
+                if isinstance(element, ScimUser):
+                    keeper_users[element.id] = element
+                    logging.debug(str(element))
+                elif isinstance(element, ScimGroup):
+                    keeper_groups[element.id] = element
+                    logging.debug(str(element))
+
         # SCIM group
         scim_groups = []    # type: List[str]
         for cf in record.custom:
@@ -505,6 +750,10 @@ class ScimPushCommand(EnterpriseCommand):
         other_groups = {}  # type: Dict[str, ScimGroup]
 
         data_source.debug_logger = verbose_logging
+        if use_snapshot:
+            data_source.previous_state = store.get_metadata().get('source_state')
+            data_source.previous_users = {x['id']: load_scim_entity(ScimUser(), x)
+                                          for x in store.get_entities(scim_store.SOURCE_USER).values()}
         verbose_logging('SCIM Query External Source')
         for element in data_source.populate():
             if isinstance(element, ScimUser):
@@ -517,9 +766,25 @@ class ScimPushCommand(EnterpriseCommand):
             verbose_logging('Switching to the "Safe Mode" due to errors')
             destructive = -1
 
-        self.sync_groups(scim_url, token, keeper_groups, other_groups, dry_run, destructive=destructive)
-        self.sync_users(scim_url, token, keeper_users, other_users, dry_run)
-        self.sync_membership(scim_url, token, keeper_groups, keeper_users, other_users, dry_run, destructive=destructive)
+        keeper_group_ids = set(keeper_groups)
+        self.sync_groups(client, keeper_groups, other_groups, destructive=destructive)
+        self.sync_users(client, keeper_users, other_users)
+        self.sync_membership(client, keeper_groups, keeper_users, other_users, destructive=destructive)
+        client.close()
+
+        if not dry_run:
+            if client.errors == 0 and not data_source.load_errors:
+                if any(x not in keeper_group_ids for x in keeper_groups):
+                    keeper_loaded = 0    # approved teams may get new SCIM IDs: re-read Keeper on the next push
+                store.save(snapshot_key, {
+                    scim_store.SOURCE_USER: ((x.id, vars(x)) for x in other_users.values()),
+                    scim_store.SOURCE_GROUP: ((x.id, vars(x)) for x in other_groups.values()),
+                    scim_store.KEEPER_USER: ((x.id, vars(x)) for x in keeper_users.values()),
+                    scim_store.KEEPER_GROUP: ((x.id, vars(x)) for x in keeper_groups.values()),
+                }, keeper_loaded, data_source.state)
+            else:
+                store.clear()
+        store.close()
         api.query_enterprise(params)
         auto_approve = kwargs.get('auto_approve') or ''
         if auto_approve != 'off':
@@ -528,11 +793,11 @@ class ScimPushCommand(EnterpriseCommand):
             api.query_enterprise(params)
 
     @staticmethod
-    def sync_groups(scim_url, token,
+    def sync_groups(client,
                     keeper_groups,
                     external_groups,
-                    dry_run=False,
-                    **kwargs):  # type: (str, str, Dict[str, ScimGroup], Dict[str, ScimGroup], bool, Any) -> None
+                    **kwargs):  # type: (ScimClient, Dict[str, ScimGroup], Dict[str, ScimGroup], Any) -> None
+        operations = []    # type: List[ScimOperation]
         keeper_group_copy = keeper_groups.copy()
         external_group_copy = external_groups.copy()
         for match_round in range(3):  # 0 - external ID, 1 - name, 2 - reuse groups
@@ -571,14 +836,14 @@ class ScimPushCommand(EnterpriseCommand):
                             'schemas': ['urn:ietf:params:scim:api:messages:2.0:PatchOp'],
                             'Operations': [op]
                         }
-                        try:
-                            ScimPushCommand.patch_scim_resource(
-                                f'{scim_url}/Groups', keeper_group.id, token, payload, dry_run)
+
+                        def on_group_updated(_, keeper_group=keeper_group, group=group):
                             keeper_group.external_id = group.id
                             keeper_group.name = group.name
                             logging.info('SCIM updated group "%s"', group.name)
-                        except Exception as e:
-                            logging.warning('PATCH group "%s" error: %s', group.name, e)
+
+                        operations.append(ScimOperation('PATCH', f'/Groups/{keeper_group.id}', payload,
+                                                        f'group "{group.name}"', on_group_updated))
 
                     del keeper_group_copy[keeper_group.id]
                     del external_group_copy[group.id]
@@ -590,18 +855,18 @@ class ScimPushCommand(EnterpriseCommand):
                     'displayName': group.name,
                     'externalId': group.id
                 }
-                try:
-                    rs = ScimPushCommand.post_scim_resource(f'{scim_url}/Groups', token, payload, dry_run)
-                    group_id = rs.get('id')
+
+                def on_group_added(rs, group=group):
+                    group_id = rs.get('id') if rs else None
                     if group_id:
                         keeper_group = ScimGroup()
                         keeper_group.id = group_id
-                        keeper_group.external_id = rs.get('externalId')
-                        keeper_group.name = rs.get('displayName')
+                        keeper_group.external_id = rs.get('externalId') or group.id
+                        keeper_group.name = rs.get('displayName') or group.name
                         keeper_groups[group_id] = keeper_group
                         logging.info('SCIM added group "%s"', group.name)
-                except Exception as e:
-                    logging.warning('POST group "%s" error: %s', group.name, e)
+
+                operations.append(ScimOperation('POST', '/Groups', payload, f'group "{group.name}"', on_group_added))
         external_group_copy.clear()
 
         if len(keeper_group_copy) > 0:  # delete groups
@@ -610,25 +875,27 @@ class ScimPushCommand(EnterpriseCommand):
                 destructive = 0
             for keeper_group_id in keeper_group_copy:
                 keeper_group = keeper_group_copy[keeper_group_id]
-                try:
-                    if destructive > 0 or keeper_group.external_id:
-                        ScimPushCommand.delete_scim_resource(f'{scim_url}/Groups', keeper_group_id, token, dry_run)
-                        del keeper_groups[keeper_group_id]
+                if destructive > 0 or keeper_group.external_id:
+                    def on_group_deleted(_, keeper_group=keeper_group):
+                        keeper_groups.pop(keeper_group.id, None)
                         logging.info('SCIM deleted group "%s"', keeper_group.name)
+
+                    operations.append(ScimOperation('DELETE', f'/Groups/{keeper_group_id}', None,
+                                                    f'group "{keeper_group.name}"', on_group_deleted))
+                else:
+                    if keeper_group.external_id:
+                        logging.info('DELETE group "%s" skipped: "Safe Mode" is enforced', keeper_group.name)
                     else:
-                        if keeper_group.external_id:
-                            logging.info('DELETE group "%s" skipped: "Safe Mode" is enforced', keeper_group.name)
-                        else:
-                            logging.info('DELETE group "%s" skipped: the group is not controlled by SCIM', keeper_group.name)
-                except Exception as e:
-                    logging.warning('DELETE group "%s" error: %s', keeper_group.name, e)
+                        logging.info('DELETE group "%s" skipped: the group is not controlled by SCIM', keeper_group.name)
         keeper_group_copy.clear()
 
+        client.execute(operations)
+
     @staticmethod
-    def sync_users(scim_url, token,
+    def sync_users(client,
                    keeper_users,
-                   external_users,
-                   dry_run=False):  # type: (str, str, Dict[str, ScimUser], Dict[str, ScimUser], bool) -> None
+                   external_users):  # type: (ScimClient, Dict[str, ScimUser], Dict[str, ScimUser]) -> None
+        operations = []    # type: List[ScimOperation]
         keeper_user_copy = keeper_users.copy()
         external_user_copy = external_users.copy()
         for match_round in range(1):  # 0 - email
@@ -667,17 +934,17 @@ class ScimPushCommand(EnterpriseCommand):
                             'schemas': ['urn:ietf:params:scim:api:messages:2.0:PatchOp'],
                             'Operations': [op]
                         }
-                        try:
-                            ScimPushCommand.patch_scim_resource(
-                                f'{scim_url}/Users', keeper_user.id, token, payload, dry_run)
+
+                        def on_user_updated(_, keeper_user=keeper_user, user=user):
                             keeper_user.external_id = user.id
                             keeper_user.full_name = user.full_name
                             keeper_user.first_name = user.first_name
                             keeper_user.last_name = user.last_name
                             keeper_user.active = user.active
                             logging.info('SCIM updated user "%s"', user.email)
-                        except Exception as e:
-                            logging.warning('PATCH user "%s" error: %s', user.email, e)
+
+                        operations.append(ScimOperation('PATCH', f'/Users/{keeper_user.id}', payload,
+                                                        f'user "{user.email}"', on_user_updated))
 
                     del keeper_user_copy[keeper_user.id]
                     del external_user_copy[user.id]
@@ -699,21 +966,22 @@ class ScimPushCommand(EnterpriseCommand):
                     },
                     'active': user.active
                 }
-                try:
-                    rs = ScimPushCommand.post_scim_resource(f'{scim_url}/Users', token, payload, dry_run)
-                    user_id = rs.get('id')
+
+                def on_user_added(rs, user=user):
+                    user_id = rs.get('id') if rs else None
                     if user_id:
                         keeper_user = ScimUser()
                         keeper_user.id = user_id
                         keeper_user.email = user.email
                         keeper_user.active = user.active
                         keeper_user.external_id = user.id
+                        keeper_user.full_name = user.full_name
                         keeper_user.first_name = user.first_name
                         keeper_user.last_name = user.last_name
                         keeper_users[user_id] = keeper_user
                         logging.info('SCIM added user "%s"', user.email)
-                except Exception as e:
-                    logging.warning('POST email "%s" error: %s', user.email, e)
+
+                operations.append(ScimOperation('POST', '/Users', payload, f'email "{user.email}"', on_user_added))
         external_user_copy.clear()
 
         if len(keeper_user_copy) > 0:  # delete users
@@ -721,27 +989,29 @@ class ScimPushCommand(EnterpriseCommand):
                 keeper_user = keeper_user_copy[keeper_user_id]
                 if not keeper_user.active:
                     continue
-                try:
-                    ScimPushCommand.delete_scim_resource(f'{scim_url}/Users', keeper_user_id, token, dry_run)
-                    del keeper_users[keeper_user_id]
+
+                def on_user_deleted(_, keeper_user=keeper_user):
+                    keeper_users.pop(keeper_user.id, None)
                     logging.info('SCIM deleted user "%s"', keeper_user.email)
-                except Exception as e:
-                    logging.warning('DELETE user "%s" error: %s', keeper_user.email, e)
+
+                operations.append(ScimOperation('DELETE', f'/Users/{keeper_user_id}', None,
+                                                f'user "{keeper_user.email}"', on_user_deleted))
         keeper_user_copy.clear()
 
+        client.execute(operations)
+
     @staticmethod
-    def sync_membership(scim_url,  # type: str
-                        token,  # type: str
+    def sync_membership(client,  # type: ScimClient
                         keeper_groups,   # type: Dict[str, ScimGroup]
                         keeper_users,    # type: Dict[str, ScimUser]
                         external_users,  # type: Dict[str, ScimUser]
-                        dry_run=False,   # type: bool
                         **kwargs         # type: Any
                         ):  # type: (...) -> None
         destructive = kwargs.get('destructive')
         if not isinstance(destructive, int):
             destructive = 0
 
+        operations = []    # type: List[ScimOperation]
         keeper_user_lookup = {x.email: x for x in keeper_users.values()}   # type: Dict[str, ScimUser]
         keeper_group_map = {x.external_id: x.id for x in keeper_groups.values() if x.external_id}
         for user in external_users.values():
@@ -790,95 +1060,53 @@ class ScimPushCommand(EnterpriseCommand):
                         'path': 'groups',
                         'value': [{'value': x} for x in remove_groups]
                     })
-                try:
-                    ScimPushCommand.patch_scim_resource(
-                        f'{scim_url}/Users', keeper_user.id, token, payload, dry_run)
+
+                def on_membership_changed(_, keeper_user=keeper_user, added=add_groups, removed=remove_groups):
+                    keeper_user.groups = [x for x in keeper_user.groups if x not in removed] + added
                     logging.info('SCIM changed user "%s" membership: %d added; %d removed',
-                                 keeper_user.email, len(add_groups), len(remove_groups))
-                except Exception as e:
-                    logging.warning('PATCH user "%s" membership error: %s', keeper_user.email, e)
+                                 keeper_user.email, len(added), len(removed))
+
+                operations.append(ScimOperation('PATCH', f'/Users/{keeper_user.id}', payload,
+                                                f'user "{keeper_user.email}" membership', on_membership_changed))
+
+        client.execute(operations)
 
     @staticmethod
     def post_scim_resource(url, token, payload, dry_run=False):
-        if dry_run:
-            logging.info(f'POST {url}')
-            logging.info(json.dumps(payload, indent=2))
-            response = payload.copy()
-            response['id'] = utils.generate_uid()
-            return response
-        else:
-            headers = {
-                'Authorization': f'Bearer {token}',
-            }
-            rs = requests.post(url, headers=headers, json=payload)
-            if rs.status_code >= 300:
-                raise CommandError('', f'POST error: {rs.status_code}')
-            if rs.status_code in (200, 201):
-                return rs.json()
+        client = ScimClient('', token, dry_run=dry_run)
+        try:
+            return client.send(ScimOperation('POST', url, payload))
+        finally:
+            client.close()
 
     @staticmethod
     def patch_scim_resource(url, resource_id, token, payload, dry_run=False):
-        patch_url = f'{url}/{resource_id}'
-        if dry_run:
-            logging.info(f'PATCH {patch_url}')
-            logging.info(json.dumps(payload, indent=2))
-        else:
-            headers = {
-                'Authorization': f'Bearer {token}',
-            }
-            rs = requests.patch(patch_url, headers=headers, json=payload)
-            if rs.status_code >= 300:
-                raise CommandError('', f'PATCH error: {rs.status_code}')
-            if rs.status_code == 200:
-                return rs.json()
+        client = ScimClient('', token, dry_run=dry_run)
+        try:
+            return client.send(ScimOperation('PATCH', f'{url}/{resource_id}', payload))
+        finally:
+            client.close()
 
     @staticmethod
     def delete_scim_resource(url, resource_id, token, dry_run=False):
-        patch_url = f'{url}/{resource_id}'
-        if dry_run:
-            logging.info(f'DELETE {patch_url}')
-        else:
-            headers = {
-                'Authorization': f'Bearer {token}',
-            }
-            rs = requests.delete(patch_url, headers=headers)
-            if rs.status_code >= 300:
-                raise CommandError('', f'DELETE error: {rs.status_code}')
+        client = ScimClient('', token, dry_run=dry_run)
+        try:
+            client.send(ScimOperation('DELETE', f'{url}/{resource_id}'))
+        finally:
+            client.close()
 
     @staticmethod
     def get_scim_resource(url, token):
-        resources = []
-        start_index = 1
-        count = 500
-        headers = {
-            'Authorization': f'Bearer {token}'
-        }
-        comps = urlparse(url)
-
-        while True:
-            q = parse_qsl(comps.query, keep_blank_values=True)
-            q.append(('startIndex', str(start_index)))
-            q.append(('count', str(count)))
-            query = urlencode(q, doseq=True)
-            url_comp = (comps.scheme, comps.netloc, comps.path, None, query, None)
-            rq_url = urlunparse(url_comp)
-            rs = requests.get(rq_url, headers=headers)
-            if rs.status_code != 200:
-                raise Exception(f'SCIM GET error code "{rs.status_code}"')
-            response = rs.json()
-            if 'Resources' in response:
-                resources.extend(response['Resources'])
-            total_results = response['totalResults']
-            items_per_page = response['itemsPerPage']
-            start_index = response['startIndex'] + items_per_page
-            if start_index >= total_results:
-                break
-        return resources
+        client = ScimClient('', token)
+        try:
+            return client.get_resources(url)
+        finally:
+            client.close()
 
     @staticmethod
-    def scim_keeper(scim_url, token):  # type: (str, str) -> Iterable[Union[ScimUser, ScimGroup]]
-        user_resource = ScimPushCommand.get_scim_resource(f'{scim_url}/Users', token)
-        group_resource = ScimPushCommand.get_scim_resource(f'{scim_url}/Groups', token)
+    def scim_keeper(client):  # type: (ScimClient) -> Iterable[Union[ScimUser, ScimGroup]]
+        user_resource = client.get_resources('/Users')
+        group_resource = client.get_resources('/Groups')
         for group in group_resource:
             group_id = group.get('id')
             group_name = group.get('displayName')
@@ -919,6 +1147,30 @@ class AdCrmDataSource(ICrmDataSource):
         self.ad_password = ad_password
         self.scim_groups = scim_groups
 
+    @staticmethod
+    def parse_ad_user(user_id, attrs, now):    # type: (str, dict, float) -> Optional[ScimUser]
+        email = ''
+        if 'mail' in attrs:
+            email = attrs['mail']
+        if not email and 'userPrincipalName' in attrs:
+            email = attrs['userPrincipalName']
+        if not email:
+            return None
+        su = ScimUser()
+        su.id = user_id
+        su.email = email
+        if 'cn' in attrs:
+            su.full_name = attrs['cn']
+        if 'givenName' in attrs:
+            su.first_name = attrs['givenName']
+        if 'sn' in attrs:
+            su.last_name = attrs['sn']
+        if 'accountExpires' in attrs:
+            ae = attrs['accountExpires']
+            if isinstance(ae, datetime.datetime):
+                su.active = ae.timestamp() > now
+        return su
+
     def populate(self):
         try:
             import ldap3
@@ -946,16 +1198,29 @@ class AdCrmDataSource(ICrmDataSource):
                 if isinstance(attrs, list) and len(attrs) > 0:
                     root_dn = attrs[0]
 
+            # Update sequence numbers are local to a domain controller
+            server_name = entry.dsServiceName.value if 'dsServiceName' in entry_attributes else ''
+            usn = None
+            if 'highestCommittedUSN' in entry_attributes:
+                usn = int(entry.highestCommittedUSN.value)
+            now = datetime.datetime.now().timestamp()
+            now_filetime = int((now + 11644473600) * 10000000)
+            previous = self.previous_state if isinstance(self.previous_state, dict) else {}
+            incremental = self.previous_users is not None and usn is not None and server_name and \
+                previous.get('server') == server_name and isinstance(previous.get('usn'), int)
+            previous_groups = (previous.get('groups') or {}) if incremental else {}
+            group_usns = {}          # type: Dict[str, int]
+
             scim_groups = {}           # type: Dict[str, ScimGroup]
             for scim_group in self.scim_groups:
                 if scim_group.lower().startswith('cn='):
                     rs = connection.extend.standard.paged_search(
                         scim_group, f'(objectClass=group)',
-                        search_scope=ldap3.BASE, attributes=['objectGUID', 'name'], generator=False)
+                        search_scope=ldap3.BASE, attributes=['objectGUID', 'name', 'uSNChanged'], generator=False)
                 else:
                     rs = connection.extend.standard.paged_search(
                         root_dn, f'(&(objectClass=group)(name={escape_filter_chars(scim_group)}))',
-                        search_scope=ldap3.SUBTREE, attributes=['objectGUID', 'name'], generator=False)
+                        search_scope=ldap3.SUBTREE, attributes=['objectGUID', 'name', 'uSNChanged'], generator=False)
 
                 group_entry = next((x for x in rs if x.get('type') == 'searchResEntry'), None)
                 if group_entry:
@@ -968,6 +1233,8 @@ class AdCrmDataSource(ICrmDataSource):
                     scim_group.id = attrs.get('objectGUID')
                     scim_group.name = attrs.get('name')
                     scim_groups[group_dn] = scim_group
+                    if isinstance(attrs.get('uSNChanged'), int):
+                        group_usns[group_dn] = attrs['uSNChanged']
                 else:
                     self.debug_logger(f'AD Group "{scim_group}" could not be resolved')
                     self._load_errors = True
@@ -976,14 +1243,31 @@ class AdCrmDataSource(ICrmDataSource):
                 raise Exception('No Active Directory groups could be resolved')
 
             scim_users = {}           # type: Dict[str, ScimUser]
+            loaded_users = set()      # type: Set[str]
 
             for group_dn, group in scim_groups.items():
+                user_filter = f'(objectClass=user)(memberOf={escape_filter_chars(group_dn)})'
+                group_usn = group_usns.get(group_dn)
+                if group_usn is not None and previous_groups.get(group_dn) == group_usn:
+                    # Group membership is unchanged: reuse the snapshot and load users changed since the previous push
+                    # or whose account expired since then.
+                    for previous_user in self.previous_users.values():
+                        if group_dn in previous_user.groups:
+                            su = scim_users.get(previous_user.id)
+                            if not su:
+                                su = copy.copy(previous_user)
+                                su.groups = []
+                                scim_users[su.id] = su
+                            su.groups.append(group_dn)
+                    user_filter += f'(|(uSNChanged>={previous["usn"] + 1})' \
+                                   f'(&(accountExpires>={previous.get("filetime") or 0})(accountExpires<={now_filetime})))'
+                    self.debug_logger(f'AD Group "{group.name}": loading changed users')
+
                 group_users = connection.extend.standard.paged_search(
-                    root_dn, f'(&(objectClass=user)(memberOf={escape_filter_chars(group_dn)}))',
+                    root_dn, f'(&{user_filter})',
                     search_scope=ldap3.SUBTREE, paged_size=1000, generator=True,
                     attributes=['objectGUID', 'mail', 'userPrincipalName', 'givenName', 'accountExpires',
                                 'sn', 'cn', 'memberOf'])
-                now = datetime.datetime.now().timestamp()
                 for u in group_users:
                     t = u.get('type')
                     if t != 'searchResEntry':
@@ -994,30 +1278,26 @@ class AdCrmDataSource(ICrmDataSource):
                         user_id = attrs['objectGUID']
                     else:
                         continue
-                    su = scim_users.get(user_id)
-                    if not su:
-                        email = ''
-                        if 'mail' in attrs:
-                            email = attrs['mail']
-                        if not email and 'userPrincipalName' in attrs:
-                            email = attrs['userPrincipalName']
-                        if not email:
+                    if user_id in loaded_users:
+                        su = scim_users[user_id]
+                    else:
+                        su = AdCrmDataSource.parse_ad_user(user_id, attrs, now)
+                        if not su:
                             continue
-                        su = ScimUser()
-                        su.id = user_id
-                        su.email = email
-                        if 'cn' in attrs:
-                            su.full_name = attrs['cn']
-                        if 'givenName' in attrs:
-                            su.first_name = attrs['givenName']
-                        if 'sn' in attrs:
-                            su.last_name = attrs['sn']
-                        if 'accountExpires' in attrs:
-                            ae = attrs['accountExpires']
-                            if isinstance(ae, datetime.datetime):
-                                su.active = ae.timestamp() > now
+                        if user_id in scim_users:
+                            su.groups = scim_users[user_id].groups
                         scim_users[user_id] = su
-                    su.groups.append(group_dn)
+                        loaded_users.add(user_id)
+                    if group_dn not in su.groups:
+                        su.groups.append(group_dn)
+
+            if usn is not None and server_name:
+                self.state = {
+                    'server': server_name,
+                    'usn': usn,
+                    'filetime': now_filetime,
+                    'groups': group_usns,
+                }
 
             yield from scim_groups.values()
             yield from scim_users.values()
@@ -9,13 +9,20 @@
 # Contact: ops@keepersecurity.com
 #
 import argparse
+import collections
+import csv
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from glob import glob
 from os.path import normpath
+from typing import List, Tuple, Optional, Dict, Any
 
-from .. import cli
-from .base import raise_parse_exception, suppress_exit, Command
+from .. import cli, background_sync
+from ..error import CommandError, Error
+from ..params import KeeperParams
+from .base import raise_parse_exception, suppress_exit, Command, aliases
 
 
 def register_commands(commands):
@@ -40,6 +47,14 @@ run_batch_parser.add_argument(
 run_batch_parser.add_argument(
     '-n', '--dry-run', dest='dry_run', action='store_true', help='Preview the commands that will be run'
 )
+run_batch_parser.add_argument(
+    '-p', '--parallel', dest='parallel', type=int, action='store',
+    help='Run independent commands concurrently on this many workers. '
+         'A "barrier" line waits for the commands above it to complete.'
+)
+run_batch_parser.add_argument(
+    '--log', dest='log', action='store', help='Write the result and timing of every command to a CSV file'
+)
 run_batch_parser.add_argument(
     'batch-file-patterns', nargs='*', type=str, action='store', help='One or more batch files of Commander commands'
 )
@@ -47,6 +62,159 @@ run_batch_parser.error = raise_parse_exception
 run_batch_parser.exit = suppress_exit
 
 
+# A line that waits for all commands above it to complete
+BATCH_BARRIER = 'barrier'
+# Commands that change the session or the current folder, or that later lines usually depend on.
+# They run alone, after the commands above them complete.
+BARRIER_COMMANDS = {'cd', 'mkdir', 'sync-down', 'sleep', 'login', 'logout', 'server', 'set', 'run-batch', 'this-device',
+                    'switch-to-mc', 'switch-to-msp', 'enterprise-down'}
+
+
+def get_batch_phases(commands):    # type: (List[Tuple[int, str]]) -> List[List[Tuple[int, str]]]
+    """Splits batch lines into phases. Commands of a phase are independent and can run concurrently."""
+    phases = []    # type: List[List[Tuple[int, str]]]
+    phase = []     # type: List[Tuple[int, str]]
+    for line_no, command in commands:
+        if not command:
+            continue
+        if command.lower() == BATCH_BARRIER:
+            if phase:
+                phases.append(phase)
+                phase = []
+            continue
+        cmd, _ = cli.command_and_args_from_cmd(command.lstrip('@'))
+        ali = aliases.get(cmd)
+        if ali:
+            cmd = ali[0] if isinstance(ali, (tuple, list)) else ali
+        if cmd in BARRIER_COMMANDS:
+            if phase:
+                phases.append(phase)
+                phase = []
+            phases.append([(line_no, command)])
+        else:
+            phase.append((line_no, command))
+    if phase:
+        phases.append(phase)
+    return phases
+
+
+class BatchRunner:
+    """Runs batch phases on a worker pool
+
+    Commands of a phase share the vault state loaded before the phase. A command that syncs the vault waits until
+    the other commands of the phase leave the caches alone (see background_sync.CacheGate). Client events are posted
+    and the vault is synced once the phase completes, so the next phase sees the changes.
+    Concurrency is halved when the server throttles requests and grows back by one worker after every
+    successful round.
+    """
+    def __init__(self, params, workers, delay=0, log_file=None, quiet=False):
+        # type: (KeeperParams, int, int, Optional[str], bool) -> None
+        self.params = params
+        self.workers = max(workers, 1)
+        self.delay = delay
+        self.quiet = quiet
+        self.results = []    # type: List[Dict[str, Any]]
+        self._log_file = log_file
+        self._lock = threading.Lock()
+        self._last_start = 0.0
+
+    def run(self, commands):    # type: (List[Tuple[int, str]]) -> List[Dict[str, Any]]
+        started = time.time()
+        for phase in get_batch_phases(commands):
+            if len(phase) == 1 or self.workers == 1:
+                for line_no, command in phase:
+                    self.run_line(line_no, command)
+            else:
+                with background_sync.command_lock(self.params):
+                    self.run_phase(phase)
+                cli.post_command(self.params)
+                background_sync.wait_for_sync(self.params)
+        failed = len([x for x in self.results if x['status'] != 'success'])
+        logging.info('run-batch: %d command(s), %d failed, %.1f seconds',
+                     len(self.results), failed, time.time() - started)
+        if self._log_file:
+            self.write_log()
+        return self.results
+
+    def run_phase(self, phase):    # type: (List[Tuple[int, str]]) -> None
+        limit = self.workers
+        throttle_count = self.params.rest_context.throttle_count
+        queue = collections.deque(phase)
+        self.params.cache_gate = background_sync.CacheGate()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = set()
+                while queue or pending:
+                    while queue and len(pending) < limit:
+                        line_no, command = queue.popleft()
+                        pending.add(executor.submit(self.run_line, line_no, command, True))
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    count = self.params.rest_context.throttle_count
+                    if count > throttle_count:
+                        throttle_count = count
+                        if limit > 1:
+                            limit = max(limit // 2, 1)
+                            logging.info('run-batch: requests are throttled, running %d command(s) at a time', limit)
+                    elif limit < self.workers:
+                        limit += 1
+        finally:
+            self.params.cache_gate = None
+
+    def run_line(self, line_no, command, concurrent=False):    # type: (int, str, bool) -> Dict[str, Any]
+        if self.delay > 0:
+            with self._lock:
+                pause = self._last_start + self.delay - time.time()
+                self._last_start = time.time() + max(pause, 0)
+            if pause > 0:
+                time.sleep(pause)
+        if not self.quiet:
+            logging.info('Executing [%s]...', command)
+        started = time.time()
+        status = 'success'
+        message = ''
+        try:
+            gate = self.params.cache_gate if concurrent else None
+            if gate:
+                with gate.shared():
+                    result = cli.do_command(self.params, command.lstrip('@'), concurrent=concurrent)
+            else:
+                result = cli.do_command(self.params, command.lstrip('@'), concurrent=concurrent)
+            if result is not None:
+                print(result)
+        except CommandError as e:
+            status = 'error'
+            message = f'{e.command}: {e.message}' if e.command else f'{e.message}'
+            logging.error(message)
+        except Error as e:
+            status = 'error'
+            message = e.message
+            logging.error('Communication Error: %s', e.message)
+        except Exception as e:
+            status = 'error'
+            message = str(e)
+            logging.debug(e, exc_info=True)
+            logging.error('An unexpected error occurred: %s', e)
+        line_result = {
+            'line': line_no,
+            'command': command,
+            'status': status,
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)),
+            'seconds': round(time.time() - started, 3),
+            'message': message,
+        }
+        with self._lock:
+            self.results.append(line_result)
+        return line_result
+
+    def write_log(self):
+        fields = ['line', 'command', 'status', 'started', 'seconds', 'message']
+        with open(self._log_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(sorted(self.results, key=lambda x: x['line']))
+        logging.info('run-batch: command log is written to %s', self._log_file)
+
+
 sleep_parser = argparse.ArgumentParser(
     prog='sleep', description='Sleep (in seconds) for adding delay between batch commands'
 )
@@ -65,6 +233,8 @@ class RunBatchCommand(Command):
         dry_run = kwargs.get('dry_run', False)
         command_delay = kwargs.get('delay') or 0
         quiet = kwargs.get('quiet', False)
+        parallel = kwargs.get('parallel') or 0
+        log_file = kwargs.get('log')
         pattern_list = kwargs.get('batch-file-patterns', [])
         if len(pattern_list) == 0:
             logging.warning(f'Please specify one or more batch files to run')
@@ -83,9 +253,21 @@ class RunBatchCommand(Command):
                 with open(filepath, encoding='utf-8') as f:
                     lines = f.readlines()
                     commands = [c.strip() for c in lines if not c.startswith('#')]
+                    if not parallel or parallel <= 1:
+                        commands = [c for c in commands if c.lower() != BATCH_BARRIER]
                     if len(commands) > 0:
                         if dry_run:
-                            print('    ' + '\n    '.join(commands))
+                            if parallel > 1:
+                                for phase in get_batch_phases([(0, x) for x in commands]):
+                                    print('    ' + '\n    '.join((x[1] for x in phase)))
+                                    print('    ' + BATCH_BARRIER)
+                            else:
+                                print('    ' + '\n    '.join(commands))
+                        elif parallel > 1 or log_file:
+                            numbered = [(i + 1, c.strip()) for i, c in enumerate(lines) if not c.startswith('#')]
+                            runner = BatchRunner(params, parallel, delay=command_delay, log_file=log_file,
+                                                 quiet=quiet)
+                            runner.run(numbered)
                         else:
                             cli.runcommands(params, commands=commands, command_delay=command_delay, quiet=quiet)
                     else:
@@ -1,4 +1,5 @@
 import asyncio
+import collections
 import enum
 import json
 import logging
@@ -9,7 +10,7 @@ import string
 import struct
 import time
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple, Callable, Awaitable, Deque
 
 from aiortc import RTCPeerConnection, RTCSessionDescription, RTCConfiguration, RTCIceServer
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
@@ -45,6 +46,10 @@ TIME_STAMP_LENGTH = 8
 CONNECTION_NO_LENGTH = DATA_LENGTH = PORT_LENGTH = 4
 TERMINATOR = b';'
 PROTOCOL_LENGTH = CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + CONTROL_MESSAGE_NO_LENGTH + len(TERMINATOR)
+# Frame header: connection number, timestamp in milliseconds, data length
+FRAME_HEADER = struct.Struct('>IQI')
+FRAME_HEADER_LENGTH = CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH
+CONTROL_MESSAGE_NO = struct.Struct('>H')
 KRELAY_URL = 'KRELAY_SERVER'
 GATEWAY_TIMEOUT = int(os.getenv('GATEWAY_TIMEOUT')) if os.getenv('GATEWAY_TIMEOUT') else 30000
 
@@ -52,9 +57,17 @@ GATEWAY_TIMEOUT = int(os.getenv('GATEWAY_TIMEOUT')) if os.getenv('GATEWAY_TIMEOU
 # 16 MiB max https://viblast.com/blog/2015/2/25/webrtc-bufferedamount/, so we will use 14.4 MiB or 90% of the max,
 # because in some cases if the max is reached the channel will close
 BUFFER_THRESHOLD = 134217728 * .90
+# Sending resumes when the data channel reports that the buffered amount dropped below this value
+BUFFER_LOW_THRESHOLD = int(BUFFER_THRESHOLD / 2)
+# How long a sender waits for a buffered amount low event or a Pong before checking the tunnel state again
+FLOW_CONTROL_TIMEOUT = 1
 # 16 Kbytes max https://viblast.com/blog/2015/2/5/webrtc-data-channel-message-size/,
 # so we will use the max minus bytes for the protocol
 BUFFER_TRUNCATION_THRESHOLD = 16000 - PROTOCOL_LENGTH
+# Bytes a connection with priority 1 may send in one scheduler round: one full data frame
+SCHEDULER_QUANTUM = BUFFER_TRUNCATION_THRESHOLD + PROTOCOL_LENGTH
+# A connection waits for the scheduler once it has this many bytes queued
+SCHEDULER_MAX_QUEUE_SIZE = 4 * SCHEDULER_QUANTUM
 
 
 class CloseConnectionReasons(enum.IntEnum):
@@ -97,17 +110,75 @@ class ControlMessage(enum.IntEnum):
     SendEOF = 104
 
 
+def make_frame(connection_no, data, timestamp_ms=None):  # type: (int, bytes, Optional[int]) -> bytes
+    """
+    Packet structure
+     Data Packets [CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + DATA + TERMINATOR]
+    The parts are joined once, instead of appending to the packet.
+    """
+    if timestamp_ms is None:
+        timestamp_ms = int(datetime.now().timestamp() * 1000)
+    return b''.join((FRAME_HEADER.pack(connection_no, timestamp_ms, len(data)), data, TERMINATOR))
+
+
 def make_control_message(message_no, data=None):
     data = data if data is not None else b''
-    buffer = int.to_bytes(0, CONNECTION_NO_LENGTH, byteorder='big')
     # Add timestamp
     timestamp_ms = int(datetime.now().timestamp() * 1000)
-    buffer += int.to_bytes(timestamp_ms, TIME_STAMP_LENGTH, byteorder='big')
     length = CONTROL_MESSAGE_NO_LENGTH + len(data)
-    buffer += int.to_bytes(length, DATA_LENGTH, byteorder='big')
-    buffer += int.to_bytes(message_no, CONTROL_MESSAGE_NO_LENGTH, byteorder='big')
-    buffer += data + TERMINATOR
-    return buffer
+    return b''.join((FRAME_HEADER.pack(0, timestamp_ms, length), CONTROL_MESSAGE_NO.pack(message_no), data,
+                     TERMINATOR))
+
+
+class FrameBuffer:
+    """
+    Buffer for data received from the WebRTC connection, split into frames.
+
+    Parsed frames are not removed from the front of the buffer one at a time; the read offset is moved instead.
+    The consumed bytes are dropped when they make up most of the buffer, so the cost of parsing stays linear
+    when many small frames arrive.
+    """
+    COMPACT_SIZE = 65536
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def __len__(self):
+        return len(self._buffer) - self._offset
+
+    def feed(self, data):  # type: (bytes) -> None
+        if self._offset > 0:
+            if self._offset == len(self._buffer):
+                self._buffer.clear()
+                self._offset = 0
+            elif self._offset >= FrameBuffer.COMPACT_SIZE and self._offset * 2 >= len(self._buffer):
+                del self._buffer[:self._offset]
+                self._offset = 0
+        self._buffer += data
+
+    def next_frame(self):  # type: () -> Optional[Tuple[int, int, bytes]]
+        """
+        Get the next complete frame.
+
+        :return: connection number, timestamp and data of the frame, or None if the frame is not complete
+        :raises ValueError: the frame does not end with the terminator
+        """
+        buffer = self._buffer
+        offset = self._offset
+        if len(buffer) - offset < FRAME_HEADER_LENGTH:
+            return None
+        connection_no, timestamp, length = FRAME_HEADER.unpack_from(buffer, offset)
+        start = offset + FRAME_HEADER_LENGTH
+        end = start + length
+        if len(buffer) < end + len(TERMINATOR):
+            return None
+        if not buffer.startswith(TERMINATOR, end):
+            raise ValueError('Invalid terminator')
+        with memoryview(buffer)[start:end] as view:
+            data = bytes(view)
+        self._offset = end + len(TERMINATOR)
+        return connection_no, timestamp, data
 
 
 def generate_random_bytes(pass_length=RANDOM_LENGTH):  # type: (int) -> bytes
@@ -223,7 +294,8 @@ def get_keeper_tokens(params):
 
 
 class TunnelDAG:
-    def __init__(self, params, encrypted_session_token, encrypted_transmission_key, record_uid: str, is_config=False):
+    def __init__(self, params, encrypted_session_token, encrypted_transmission_key, record_uid: str, is_config=False,
+                 snapshot_dir=None):
         config_uid = None
         if not is_config:
             config_uid = get_config_uid(params, encrypted_session_token, encrypted_transmission_key, record_uid)
@@ -237,7 +309,7 @@ class TunnelDAG:
         self.conn = Connection(params=params, encrypted_transmission_key=self.encrypted_transmission_key,
                                encrypted_session_token=self.encrypted_session_token
                                )
-        self.linking_dag = DAG(conn=self.conn, record=self.record, graph_id=0)
+        self.linking_dag = DAG(conn=self.conn, record=self.record, graph_id=0, snapshot_dir=snapshot_dir)
         try:
             self.linking_dag.load()
         except Exception as e:
@@ -712,6 +784,8 @@ class WebRTCConnection:
         # Using Keeper's STUN and TURN servers
         self.relay_url = 'krelay.' + server
         self.time_diff = datetime.now() - datetime.now()
+        self.buffer_low_event = asyncio.Event()
+        self.buffer_low_event.set()
         krelay_url = os.getenv(KRELAY_URL)
         if krelay_url:
             self.relay_url = krelay_url
@@ -870,10 +944,12 @@ class WebRTCConnection:
 
     def setup_data_channel(self):
         self.data_channel = self._pc.createDataChannel("control", ordered=True)
+        self.data_channel.bufferedAmountLowThreshold = BUFFER_LOW_THRESHOLD
 
     def setup_event_handlers(self):
         self.data_channel.on("open", self.on_data_channel_open)
         self.data_channel.on("message", self.on_data_channel_message)
+        self.data_channel.on("bufferedamountlow", self.on_buffered_amount_low)
         self._pc.on("datachannel", self.on_data_channel)
         self._pc.on("connectionstatechange", self.on_connection_state_change)
 
@@ -886,6 +962,9 @@ class WebRTCConnection:
     def on_data_channel_message(self, message):
         self.web_rtc_queue.put_nowait(message)
 
+    def on_buffered_amount_low(self):
+        self.buffer_low_event.set()
+
     def on_data_channel(self, channel):
         channel.on("open", self.on_data_channel_open)
         channel.on("error", self.on_data_channel_error)
@@ -1020,6 +1099,149 @@ class ConnectionInfo:
         self.receive_latency_count = 0
         self.transfer_size = 0
         self.receive_size = 0
+        # Bytes sent since the last Pong. The sender waits on window_event when the credit window is used up
+        self.unacked_size = 0
+        self.window_event = asyncio.Event()
+        self.window_event.set()
+        self.round_trip_latency = None  # type: Optional[float]
+
+    def get_stats(self):  # type: () -> dict
+        elapsed = max((datetime.now() - self.start_time).total_seconds(), 1e-3)
+        return {
+            'transfer_size': self.transfer_size,
+            'receive_size': self.receive_size,
+            'transfer_rate': self.transfer_size / elapsed,
+            'receive_rate': self.receive_size / elapsed,
+            'round_trip_latency': self.round_trip_latency,
+            'queue_messages': self.message_counter,
+            'queue_size': self.unacked_size,
+        }
+
+
+class ScheduledQueue:
+    def __init__(self, priority=1):  # type: (int) -> None
+        self.frames = collections.deque()  # type: Deque[bytes]
+        self.size = 0
+        self.deficit = 0
+        self.priority = priority
+        self.active = False
+        self.removed = False
+        self.space_event = asyncio.Event()
+        self.space_event.set()
+        self.empty_event = asyncio.Event()
+        self.empty_event.set()
+
+
+class SendScheduler:
+    """
+    Fair queuing of data frames from the local connections onto the shared data channel.
+
+    Each connection has its own queue, served by a single sender task using deficit round robin:
+    on every round a connection may send up to quantum * priority bytes, so a bulk transfer cannot starve
+    interactive sessions on the same tunnel. A connection with max_queue_size bytes queued waits until
+    the sender catches up, which bounds the bytes each connection has in flight inside the tunnel entrance.
+    """
+    def __init__(self, send, quantum=SCHEDULER_QUANTUM, max_queue_size=SCHEDULER_MAX_QUEUE_SIZE, logger=None):
+        # type: (Callable[[bytes], Awaitable[None]], int, int, Optional[logging.Logger]) -> None
+        self._send = send
+        self.quantum = quantum
+        self.max_queue_size = max_queue_size
+        self.logger = logger or logging.getLogger()
+        self._queues = {}  # type: Dict[int, ScheduledQueue]
+        self._active = collections.deque()  # type: Deque[int]
+        self._ready = asyncio.Event()
+        self._task = None  # type: Optional[asyncio.Task]
+
+    def set_priority(self, connection_no, priority):  # type: (int, int) -> None
+        if priority < 1:
+            raise ValueError('Priority must be a positive integer')
+        queue = self._get_queue(connection_no)
+        queue.priority = priority
+
+    def queued_size(self, connection_no):  # type: (int) -> int
+        queue = self._queues.get(connection_no)
+        return queue.size if queue else 0
+
+    async def put(self, connection_no, frame):  # type: (int, bytes) -> None
+        """
+        Queue a frame for the connection. Waits while the connection has max_queue_size bytes queued.
+        """
+        queue = self._get_queue(connection_no)
+        while queue.size >= self.max_queue_size and not queue.removed:
+            queue.space_event.clear()
+            await queue.space_event.wait()
+        if queue.removed:
+            return
+        queue.frames.append(frame)
+        queue.size += len(frame)
+        queue.empty_event.clear()
+        if not queue.active:
+            queue.active = True
+            self._active.append(connection_no)
+        self._ready.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def drain(self, connection_no):  # type: (int) -> None
+        """
+        Wait until all frames queued for the connection are sent
+        """
+        queue = self._queues.get(connection_no)
+        if queue is not None:
+            await queue.empty_event.wait()
+
+    def remove(self, connection_no):  # type: (int) -> None
+        """
+        Drop the queue of a closed connection, releasing anyone waiting on it
+        """
+        queue = self._queues.pop(connection_no, None)
+        if queue is not None:
+            queue.removed = True
+            queue.frames.clear()
+            queue.size = 0
+            queue.space_event.set()
+            queue.empty_event.set()
+
+    def stop(self):
+        for connection_no in list(self._queues.keys()):
+            self.remove(connection_no)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _get_queue(self, connection_no):  # type: (int) -> ScheduledQueue
+        queue = self._queues.get(connection_no)
+        if queue is None:
+            queue = ScheduledQueue()
+            self._queues[connection_no] = queue
+        return queue
+
+    async def _run(self):
+        while True:
+            while not self._active:
+                self._ready.clear()
+                await self._ready.wait()
+            connection_no = self._active.popleft()
+            queue = self._queues.get(connection_no)
+            if queue is None:
+                continue
+            queue.deficit += self.quantum * queue.priority
+            while queue.frames and len(queue.frames[0]) <= queue.deficit:
+                frame = queue.frames.popleft()
+                queue.deficit -= len(frame)
+                queue.size -= len(frame)
+                if queue.size < self.max_queue_size:
+                    queue.space_event.set()
+                try:
+                    await self._send(frame)
+                except Exception as e:
+                    self.logger.error(f'Error sending frame for connection {connection_no}: {e}')
+            if queue.frames and not queue.removed:
+                self._active.append(connection_no)
+            else:
+                queue.active = False
+                queue.deficit = 0
+                queue.empty_event.set()
 
 
 class TunnelEntrance:
@@ -1040,7 +1262,9 @@ class TunnelEntrance:
                  connect_task=None,  # type: asyncio.Task
                  kill_server_event=None,  # type: asyncio.Event
                  target_host=None,  # type: Optional[str]
-                 target_port=None  # type: Optional[int]
+                 target_port=None,  # type: Optional[int]
+                 priorities=None,  # type: Optional[Dict[int, int]]
+                 max_queue_size=SCHEDULER_MAX_QUEUE_SIZE  # type: int
                  ):  # type: (...) -> None
         self.closing = False
         self.to_local_task = None
@@ -1060,22 +1284,35 @@ class TunnelEntrance:
         self.print_ready_event = print_ready_event
         self.connect_task = connect_task
         self.eof_sent = False
+        # Scheduler priority of the connections by destination port
+        self.priorities = priorities or {}  # type: Dict[int, int]
+        self.scheduler = SendScheduler(self.send_to_web_rtc, max_queue_size=max_queue_size, logger=logger)
 
     @property
     def port(self):
         return self._port
 
+    async def wait_for_buffer_low(self):
+        """
+        Wait until the data channel drains below BUFFER_LOW_THRESHOLD.
+        The data channel's bufferedamountlow event wakes the sender, so there is no polling while the buffer drains.
+        """
+        while (self.pc.data_channel is not None and
+               self.pc.data_channel.bufferedAmount >= BUFFER_THRESHOLD and
+               not self.kill_server_event.is_set() and
+               self.pc.is_data_channel_open()):
+            self.logger.debug(f"{bcolors.WARNING}Buffered amount is too high "
+                              f"{self.pc.data_channel.bufferedAmount}{bcolors.ENDC}")
+            self.pc.buffer_low_event.clear()
+            try:
+                await asyncio.wait_for(self.pc.buffer_low_event.wait(), FLOW_CONTROL_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+
     async def send_to_web_rtc(self, data):
         if self.pc.is_data_channel_open():
-            sleep_count = 0
-            while (self.pc.data_channel is not None and
-                   self.pc.data_channel.bufferedAmount >= BUFFER_THRESHOLD and
-                   not self.kill_server_event.is_set() and
-                   self.pc.is_data_channel_open()):
-                self.logger.debug(f"{bcolors.WARNING}Buffered amount is too high ({sleep_count * 100}) "
-                                  f"{self.pc.data_channel.bufferedAmount}{bcolors.ENDC}")
-                await asyncio.sleep(sleep_count)
-                sleep_count += .01
+            if self.pc.data_channel is not None and self.pc.data_channel.bufferedAmount >= BUFFER_THRESHOLD:
+                await self.wait_for_buffer_low()
 
             try:
                 self.pc.send_message(data)
@@ -1091,18 +1328,25 @@ class TunnelEntrance:
             if self.connection_no > 1:
                 self.kill_server_event.set()
 
-    async def send_control_message(self, message_no, data=None):  # type: (ControlMessage, Optional[bytes]) -> None
+    async def send_control_message(self, message_no, data=None, connection_no=None):
+        # type: (ControlMessage, Optional[bytes], Optional[int]) -> None
         """
         Packet structure
          Control Message Packets
                [CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + CONTROL_MESSAGE_NO_LENGTH + DATA]
+
+        If connection_no is set, the message is queued on that connection's scheduler queue,
+        so it is sent after the frames already queued for the connection.
         """
         buffer = make_control_message(message_no, data)
         try:
             self.logger.debug(f'Endpoint {self.pc.endpoint_name}: Sending Control command {message_no} '
                               f'len: {len(buffer)} to tunnel.')
             self.connections[0].transfer_size += len(buffer)
-            await self.send_to_web_rtc(buffer)
+            if connection_no is None:
+                await self.send_to_web_rtc(buffer)
+            else:
+                await self.scheduler.put(connection_no, buffer)
         except Exception as e:
             self.logger.error(f"Endpoint {self.pc.endpoint_name}: Error while sending control message: {e}")
 
@@ -1124,6 +1368,29 @@ class TunnelEntrance:
             c.receive_latency_sum += td_milliseconds
             c.receive_latency_count += 1
 
+    def get_stats(self):  # type: () -> Dict[int, dict]
+        """
+        Get throughput, round trip latency and queue depth of the open connections
+        :return: stats by connection number
+        """
+        stats = {}
+        for con_no, con in list(self.connections.items()):
+            if con_no != 0:
+                stats[con_no] = con.get_stats()
+                stats[con_no]['scheduled_size'] = self.scheduler.queued_size(con_no)
+        return stats
+
+    def set_connection_priority(self, connection_no, priority):  # type: (int, int) -> None
+        """
+        Set the share of the data channel the connection gets when several connections are sending.
+        A connection with priority 2 may send twice as many bytes per scheduler round as one with priority 1.
+        """
+        self.scheduler.set_priority(connection_no, priority)
+
+    def get_buffered_amount(self):  # type: () -> int
+        data_channel = self.pc.data_channel if self.pc else None
+        return data_channel.bufferedAmount if data_channel is not None else 0
+
     def report_stats(self, connection_no: int):
         """
         Report the stats for the connection
@@ -1142,6 +1409,7 @@ class TunnelEntrance:
                              f"\n\tTransferred {con.transfer_size} bytes"
                              f"\n\tTransfer Latency Average: {average_transfer_latency} ms"
                              f"\n\tReceive Latency Average: {average_receive_latency} ms"
+                             f"\n\tRound Trip Latency: {con.round_trip_latency} ms"
                              f"\n\tReceived {con.receive_size} bytes")
 
     async def process_control_message(self, message_no, data):  # type: (ControlMessage, Optional[bytes]) -> None
@@ -1170,19 +1438,23 @@ class TunnelEntrance:
             if len(data) >= CONNECTION_NO_LENGTH:
                 con_no = int.from_bytes(data[:CONNECTION_NO_LENGTH], byteorder='big')
                 if con_no in self.connections:
+                    # Pong grants a new credit window to the connection
                     self.connections[con_no].message_counter = 0
+                    self.connections[con_no].unacked_size = 0
+                    self.connections[con_no].window_event.set()
                     self.logger.debug(f'Endpoint {self.pc.endpoint_name}: Received pong request')
                     if con_no != 0:
                         self.logger.debug(f'Endpoint {self.pc.endpoint_name}: Received ACK for {con_no}')
                     if self.connections[con_no].ping_time is not None:
                         time_now = time.perf_counter()
                         # from the time the ping was sent to the time the pong was received
-                        latency = time_now - self.connections[con_no].ping_time
+                        latency = (time_now - self.connections[con_no].ping_time) * 1000
+                        self.connections[con_no].round_trip_latency = latency
 
                         if self.connections[con_no].receive_latency_count > 0:
                             receive_latency_average = (self.connections[con_no].receive_latency_sum /
                                                        self.connections[con_no].receive_latency_count)
-                            t_latency = self._round_trip_latency[-1] - receive_latency_average
+                            t_latency = latency - receive_latency_average
                             self.connections[con_no].transfer_latency_sum += t_latency
                             self.connections[con_no].transfer_latency_count += 1
                         self.logger.debug(f'Endpoint {self.pc.endpoint_name}: Round trip latency: {latency} ms')
@@ -1192,7 +1464,8 @@ class TunnelEntrance:
                 if self.connections[0].ping_time is not None:
                     time_now = time.perf_counter()
                     # from the time the ping was sent to the time the pong was received
-                    latency = time_now - self.connections[0].ping_time
+                    latency = (time_now - self.connections[0].ping_time) * 1000
+                    self.connections[0].round_trip_latency = latency
                     self.logger.debug(f'Endpoint {self.pc.endpoint_name}: Round trip latency: {latency} ms')
                     self.connections[0].ping_time = None
 
@@ -1263,67 +1536,55 @@ class TunnelEntrance:
          Data Packets [CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + DATA]
         """
         self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Forwarding data to local...")
-        buff = b''
+        buff = FrameBuffer()
         while not self.kill_server_event.is_set():
             if self.pc.closed:
                 self.kill_server_event.set()
                 break
-            while len(buff) >= CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH:
-                connection_no = int.from_bytes(buff[:CONNECTION_NO_LENGTH], byteorder='big')
-                time_stamp = int.from_bytes(
-                    buff[CONNECTION_NO_LENGTH:CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH], byteorder='big')
-                length = int.from_bytes(
-                    buff[CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH:
-                         CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH], byteorder='big')
-                if len(buff) >= CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + length + len(TERMINATOR):
-                    if (buff[(CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + length):
-                        (CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + length + len(TERMINATOR))] !=
-                            TERMINATOR):
-                        self.logger.warning(f'Endpoint {self.pc.endpoint_name}: Invalid terminator')
-                        # if we don't have a valid terminator then we don't know where the message ends or begins
-                        self.kill_server_event.set()
-                        break
-                    self.logger.debug(f'Endpoint {self.pc.endpoint_name}: Buffer data received data')
-                    send_data = (buff[CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH:
-                                 CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + length])
-                    self.update_stats(connection_no, len(send_data) + CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH +
-                                      DATA_LENGTH, time_stamp)
-                    buff = buff[CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + length + len(TERMINATOR):]
-
-                    if connection_no == 0:
-                        # This is a control message
-                        control_m = ControlMessage(int.from_bytes(send_data[:CONTROL_MESSAGE_NO_LENGTH],
-                                                                  byteorder='big'))
-
-                        send_data = send_data[CONTROL_MESSAGE_NO_LENGTH:]
-
-                        await self.process_control_message(control_m, send_data)
-                    else:
-                        if connection_no not in self.connections:
-                            self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Connection not found: "
-                                              f"{connection_no}")
-                            continue
-
-                        try:
-                            self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Forwarding data to "
-                                              f"local for connection {connection_no} ({len(send_data)})")
-                            self.connections[connection_no].writer.write(send_data)
-                            await self.connections[connection_no].writer.drain()
-                            # Yield control back to the event loop for other tasks to execute
-                            await asyncio.sleep(0)
-                        except Exception as ex:
-                            self.logger.error(f"Endpoint {self.pc.endpoint_name}: Error while forwarding "
-                                              f"data to local: {ex}")
-
-                            # Yield control back to the event loop for other tasks to execute
-                            await asyncio.sleep(0)
-                else:
-                    self.logger.debug(
-                        f"Endpoint {self.pc.endpoint_name}: Buffer is too short {len(buff)} need "
-                        f"{CONNECTION_NO_LENGTH + TIME_STAMP_LENGTH + DATA_LENGTH + length + len(TERMINATOR)}")
+            while len(buff) >= FRAME_HEADER_LENGTH:
+                try:
+                    frame = buff.next_frame()
+                except ValueError:
+                    self.logger.warning(f'Endpoint {self.pc.endpoint_name}: Invalid terminator')
+                    # if we don't have a valid terminator then we don't know where the message ends or begins
+                    self.kill_server_event.set()
+                    break
+                if frame is None:
+                    self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Buffer is too short {len(buff)}")
                     # Yield control back to the event loop for other tasks to execute
                     await asyncio.sleep(0)
                     break
+
+                connection_no, time_stamp, send_data = frame
+                self.logger.debug(f'Endpoint {self.pc.endpoint_name}: Buffer data received data')
+                self.update_stats(connection_no, len(send_data) + FRAME_HEADER_LENGTH, time_stamp)
+
+                if connection_no == 0:
+                    # This is a control message
+                    control_m = ControlMessage(CONTROL_MESSAGE_NO.unpack_from(send_data)[0])
+
+                    send_data = send_data[CONTROL_MESSAGE_NO_LENGTH:]
+
+                    await self.process_control_message(control_m, send_data)
+                else:
+                    if connection_no not in self.connections:
+                        self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Connection not found: "
+                                          f"{connection_no}")
+                        continue
+
+                    try:
+                        self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Forwarding data to "
+                                          f"local for connection {connection_no} ({len(send_data)})")
+                        self.connections[connection_no].writer.write(send_data)
+                        await self.connections[connection_no].writer.drain()
+                        # Yield control back to the event loop for other tasks to execute
+                        await asyncio.sleep(0)
+                    except Exception as ex:
+                        self.logger.error(f"Endpoint {self.pc.endpoint_name}: Error while forwarding "
+                                          f"data to local: {ex}")
+
+                        # Yield control back to the event loop for other tasks to execute
+                        await asyncio.sleep(0)
             if self.kill_server_event.is_set():
                 break
             try:
@@ -1342,7 +1603,7 @@ class TunnelEntrance:
                         receive_latency_average = int(self.connections[0].receive_latency_sum /
                                                       self.connections[0].receive_latency_count)
                         buffer += int.to_bytes(receive_latency_average, TIME_STAMP_LENGTH, byteorder='big')
-                    await self.send_control_message(ControlMessage.Ping, buffer)
+                    await self.send_control_message(ControlMessage.Ping, buffer, connection_no=0)
 
                     if self.logger.level == logging.DEBUG:
                         # print the stats
@@ -1361,7 +1622,7 @@ class TunnelEntrance:
             elif isinstance(data, bytes):
                 self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Got data from WebRTC connection "
                                   f"{len(data)} bytes")
-                buff += data
+                buff.feed(data)
             else:
                 # Yield control back to the event loop for other tasks to execute
                 await asyncio.sleep(0)
@@ -1394,6 +1655,21 @@ class TunnelEntrance:
                 self.is_connected = False
             return
 
+    async def wait_for_window(self, con_no):
+        """
+        Wait until the tunnel exit acknowledges the data sent on the connection.
+        Each connection may have up to MESSAGE_MAX messages in flight while the data channel is backed up;
+        the Pong for the connection's Ping grants the next window.
+        """
+        while not self.kill_server_event.is_set():
+            c = self.connections.get(con_no)
+            if c is None or c.window_event.is_set():
+                break
+            try:
+                await asyncio.wait_for(c.window_event.wait(), FLOW_CONTROL_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+
     async def forward_data_to_tunnel(self, con_no):
         """
         Forward data from the given connection to the WebRTC connection
@@ -1415,6 +1691,7 @@ class TunnelEntrance:
             if isinstance(data, bytes):
                 if c.reader.at_eof() and len(data) == 0:
                     if not self.eof_sent:
+                        await self.scheduler.drain(con_no)
                         await self.send_control_message(ControlMessage.SendEOF,
                                                         int.to_bytes(con_no, CONNECTION_NO_LENGTH,
                                                                      byteorder='big'))
@@ -1424,22 +1701,20 @@ class TunnelEntrance:
                     continue
                 else:
                     self.eof_sent = False
-                    buffer = int.to_bytes(con_no, CONNECTION_NO_LENGTH, byteorder='big')
-                    # Add timestamp
-                    timestamp_ms = int(datetime.now().timestamp() * 1000)
-                    buffer += int.to_bytes(timestamp_ms, TIME_STAMP_LENGTH, byteorder='big')
-                    buffer += int.to_bytes(len(data), DATA_LENGTH, byteorder='big') + data + TERMINATOR
+                    buffer = make_frame(con_no, data)
                     self.connections[con_no].transfer_size += len(buffer)
-                    await self.send_to_web_rtc(buffer)
+                    await self.scheduler.put(con_no, buffer)
 
                     self.logger.debug(
                         f'Endpoint {self.pc.endpoint_name}: buffer size: {self.pc.data_channel.bufferedAmount}'
                         f', time since start: {datetime.now() - c.start_time}')
 
                     c.message_counter += 1
+                    c.unacked_size += len(buffer)
                     if (c.message_counter >= MESSAGE_MAX and
                             self.pc.data_channel.bufferedAmount > BUFFER_TRUNCATION_THRESHOLD):
                         c.ping_time = time.perf_counter()
+                        c.window_event.clear()
 
                         ping_buffer = int.to_bytes(con_no, CONNECTION_NO_LENGTH, byteorder='big')
                         if self.connections[0].receive_latency_count > 0:
@@ -1447,15 +1722,13 @@ class TunnelEntrance:
                                                           self.connections[0].receive_latency_count)
                             ping_buffer += int.to_bytes(receive_latency_average, TIME_STAMP_LENGTH,
                                                         byteorder='big')
-                        await self.send_control_message(ControlMessage.Ping, ping_buffer)
+                        await self.send_control_message(ControlMessage.Ping, ping_buffer, connection_no=con_no)
                         self._ping_attempt += 1
-                        wait_count = 0
-                        while c.message_counter >= MESSAGE_MAX:
-                            await asyncio.sleep(wait_count)
-                            wait_count += .1
+                        await self.wait_for_window(con_no)
                     elif (c.message_counter >= MESSAGE_MAX and
                           self.pc.data_channel.bufferedAmount <= BUFFER_TRUNCATION_THRESHOLD):
                         c.message_counter = 0
+                        c.unacked_size = 0
 
             else:
                 # Yield control back to the event loop for other tasks to execute
@@ -1464,6 +1737,8 @@ class TunnelEntrance:
         if con_no not in self.connections:
             raise ConnectionNotFoundException(f"Connection {con_no} not found")
 
+        # Data queued for the connection has to reach the tunnel exit before the connection is closed
+        await self.scheduler.drain(con_no)
         # Send close connection message with con_no
         buff = int.to_bytes(con_no, CONNECTION_NO_LENGTH, byteorder='big')
         buff += int.to_bytes(CloseConnectionReasons.Normal.value, CLOSE_CONNECTION_REASON_LENGTH, byteorder='big')
@@ -1478,6 +1753,8 @@ class TunnelEntrance:
         self.connection_no += 1
         self.connections[connection_no] = ConnectionInfo(reader, writer, 0, None, None, datetime.now())
         self.logger.debug(f"Endpoint {self.pc.endpoint_name}: Created local connection {connection_no}")
+        if self.target_port in self.priorities:
+            self.set_connection_priority(connection_no, self.priorities[self.target_port])
 
         # Send open connection message with con_no. this is required to be sent to start the connection
         await self.send_control_message(ControlMessage.OpenConnection,
@@ -1521,6 +1798,7 @@ class TunnelEntrance:
             return
 
         self.closing = True
+        self.scheduler.stop()
         if len(self.connections) > 1:
             for i in range(1, len(self.connections)):
                 await self.close_connection(i, reason)
@@ -1588,6 +1866,7 @@ class TunnelEntrance:
             except Exception as ex:
                 self.logger.warning(f'Endpoint {self.pc.endpoint_name}: hit exception closing reader {ex}')
 
+            self.scheduler.remove(connection_no)
             if connection_no in self.connections:
                 try:
                     if self.connections[connection_no].to_tunnel_task is not None:
@@ -1619,10 +1898,12 @@ class SOCKS5Server(TunnelEntrance):
                  connect_task=None,  # type: asyncio.Task
                  kill_server_event=None,  # type: asyncio.Event
                  target_host=None,  # type: Optional[str]
-                 target_port=None  # type: Optional[int]
+                 target_port=None,  # type: Optional[int]
+                 priorities=None,  # type: Optional[Dict[int, int]]
+                 max_queue_size=SCHEDULER_MAX_QUEUE_SIZE  # type: int
                  ):  # type: (...) -> None
         super().__init__(host, port, pc, print_ready_event, logger, connect_task, kill_server_event, target_host,
-                         target_port)
+                         target_port, priorities, max_queue_size)
         # Credentials for authentication
         # self.valid_username = os.getenv('SOCKS5_USERNAME', 'defaultuser')
         # self.valid_password = os.getenv('SOCKS5_PASSWORD', 'defaultpass')
@@ -1784,6 +2065,8 @@ class SOCKS5Server(TunnelEntrance):
             return
 
         tunnel_port = int.from_bytes(await reader.readexactly(2), 'big')
+        if tunnel_port in self.priorities:
+            self.set_connection_priority(connection_no, self.priorities[tunnel_port])
 
         # Send open connection message with con_no. this is required to be sent to start the connection
         data = int.to_bytes(connection_no, CONNECTION_NO_LENGTH, byteorder='big')
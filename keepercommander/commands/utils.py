@@ -720,7 +720,7 @@ class LoginCommand(Command):
     def execute(self, params, **kwargs):
         if msp.current_mc_id:
             msp.current_mc_id = None
-            msp.mc_params_dict.clear()
+        msp.mc_params_dict.clear()
 
         new_login = kwargs.get('new_login', True)
         if new_login:
@@ -838,7 +838,7 @@ class LogoutCommand(Command):
     def execute(self, params, **kwargs):
         if msp.current_mc_id:
             msp.current_mc_id = None
-            msp.mc_params_dict.clear()
+        msp.mc_params_dict.clear()
 
         if params.session_token:
             try:
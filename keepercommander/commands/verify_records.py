@@ -11,22 +11,214 @@
 #
 
 import argparse
+import functools
 import itertools
 import json
 import logging
-from typing import Tuple, List, Optional, Set, Dict
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Tuple, List, Optional, Set, Dict, Callable
 
 from .base import user_choice, dump_report_data, Command
 from .. import api, crypto, utils, vault, error
+from ..params import KeeperParams
 from ..proto import record_pb2, folder_pb2
 from ..record import get_totp_code
 
+# Records are scanned in worker processes in chunks of this size
+VERIFY_SCAN_CHUNK_SIZE = 5000
+VERIFY_MAX_WORKERS = 4
+# get_shared_folders requests are sent in parallel
+SHARED_FOLDERS_CHUNK_SIZE = 100
+# vault/records_update and vault/records_convert3 accept up to 999 records
+RECORDS_BATCH_SIZE = 999
+# record_update accepts up to 99 records
+RECORDS_V2_BATCH_SIZE = 99
+SHARED_FOLDER_RECORDS_BATCH_SIZE = 990
+
 
 verify_shared_folders_parser = argparse.ArgumentParser(prog='verify-shared-folders')
 verify_shared_folders_parser.add_argument('--dry-run', dest='dry_run', action='store_true',
                                           help='Display the the found problems without fixing')
 verify_shared_folders_parser.add_argument('target', nargs='*', help='Shared folder UID or name.')
 
+verify_records_parser = argparse.ArgumentParser(prog='verify-records')
+verify_records_parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                                   help='Display the the found problems without fixing')
+
+
+def fix_field_value_list(data):    # type: (dict) -> bool
+    is_broken = False
+    for field in itertools.chain(data.get('fields', []), data.get('custom', [])):
+        value = field.get('value')
+        if not isinstance(value, list):
+            is_broken = True
+            field['value'] = [value] if value else []
+    return is_broken
+
+
+def fix_payment_card_expiration(data):    # type: (dict) -> bool
+    is_broken = False
+    for field in itertools.chain(data.get('fields', []), data.get('custom', [])):
+        if field.get('type', '') != 'paymentCard':
+            continue
+        for card in field['value']:
+            if isinstance(card, dict):
+                if 'cardExpirationDate' in card:
+                    exp = card['cardExpirationDate']
+                    if isinstance(exp, str):
+                        if exp:
+                            month, sep, year = exp.partition('/')
+                            if not month.isnumeric() or not year.isnumeric():
+                                is_broken = True
+                                card['cardExpirationDate'] = ""
+                    else:
+                        is_broken = True
+                        card['cardExpirationDate'] = ""
+            else:
+                field['value'] = []
+                break
+    return is_broken
+
+
+def fix_date_field(data):    # type: (dict) -> bool
+    is_broken = False
+    for field in itertools.chain(data.get('fields', []), data.get('custom', [])):
+        if field.get('type', '') != 'date':
+            continue
+        orig_dates = field['value']
+        tested_dates = [x for x in orig_dates if isinstance(x, int)]
+        if len(tested_dates) < len(orig_dates):
+            field['value'] = tested_dates
+            is_broken = True
+    return is_broken
+
+
+def fix_custom_totp_field(data):    # type: (dict) -> bool
+    is_broken = False
+    for field in data.get('custom', []):
+        if field.get('type', '') != 'oneTimeCode' and field.get('value'):
+            value = field.get('value')
+            if isinstance(value, list) and len(value) == 1:
+                value = value[0]
+                if isinstance(value, str) and value.startswith('otpauth'):
+                    try:
+                        code, _, _ = get_totp_code(value)
+                        if code:
+                            field['type'] = 'oneTimeCode'
+                            is_broken = True
+                    except:
+                        pass
+    return is_broken
+
+
+def remove_unknown_fields(data):    # type: (dict) -> bool
+    has_unknown_type = any((x for x in data.get('custom', []) if x.get('type') == 'unknownType'))
+    if has_unknown_type:
+        data['custom'] = [x for x in data['custom'] if x.get('type') != 'unknownType']
+    return has_unknown_type
+
+
+def move_login_totp_field(data):    # type: (dict) -> bool
+    if data.get('type') in {'login'} and 'fields' in data and 'custom' in data:
+        fields_otp = next((x for x in data.get('fields') if x.get('type') == 'oneTimeCode'), None)
+        if not fields_otp or not fields_otp.get('value'):
+            custom_otp = next((x for x in data.get('custom', []) if x.get('type') == 'oneTimeCode'), None)
+            if custom_otp and custom_otp.get('value'):
+                if fields_otp:
+                    fields_otp['value'] = custom_otp['value']
+                else:
+                    data['fields'].append(custom_otp)
+                try:
+                    data['custom'].remove(custom_otp)
+                except:
+                    custom_otp['value'] = []
+                return True
+    return False
+
+
+def fix_legacy_fields(data):    # type: (dict) -> bool
+    is_broken = False
+    for field in ('title', 'secret1', 'secret2', 'link', 'notes'):
+        if field in data:
+            value = data[field]
+            if not isinstance(value, str):
+                data[field] = '' if value is None else str(value)
+                is_broken = True
+        else:
+            data[field] = ''
+            is_broken = True
+    return is_broken
+
+
+# Record verification rules by record version: (problem description, rule).
+# A rule corrects the record data in place and returns True if the data has been changed.
+# Rules are applied in order and must be module-level functions: records are verified in worker processes.
+RECORD_RULES = {
+    2: [
+        ('Missing or invalid field', fix_legacy_fields),
+    ],
+    3: [
+        ('Field value is not a list', fix_field_value_list),
+        ('Invalid card expiration date', fix_payment_card_expiration),
+        ('Invalid date value', fix_date_field),
+        ('TOTP URL in a text field', fix_custom_totp_field),
+        ('Unknown field type', remove_unknown_fields),
+        ('TOTP in custom fields', move_login_totp_field),
+    ],
+}   # type: Dict[int, List[Tuple[str, Callable[[dict], bool]]]]
+
+
+def verify_record_data(version, data, rules=None):
+    # type: (int, dict, Optional[Dict[int, List[Tuple[str, Callable[[dict], bool]]]]]) -> List[str]
+    """Applies the verification rules to the record data. Returns the found problems"""
+    problems = []
+    for description, rule in (rules or RECORD_RULES).get(version) or []:
+        if rule(data):
+            problems.append(description)
+    return problems
+
+
+def verify_record_chunk(records, rules=None):
+    # type: (List[Tuple[str, int, bytes]], Optional[dict]) -> List[Tuple[str, int, Optional[dict], List[str]]]
+    """Verifies (record UID, version, record data) entries. Returns the records that have problems"""
+    result = []
+    for record_uid, version, record_data in records:
+        try:
+            data = json.loads(record_data)
+        except:
+            result.append((record_uid, version, None, ['Record data cannot be parsed']))
+            continue
+        problems = verify_record_data(version, data, rules)
+        if problems:
+            result.append((record_uid, version, data, problems))
+    return result
+
+
+def verify_records(params, rules=None):
+    # type: (KeeperParams, Optional[dict]) -> List[Tuple[str, int, Optional[dict], List[str]]]
+    """Verifies the vault records
+
+    Large vaults are verified in worker processes. The frozen application and rules that
+    cannot be sent to a worker process fall back to in-process verification.
+    """
+    rules = rules or RECORD_RULES
+    records = [(record_uid, record.get('version', 0), record['data_unencrypted'])
+               for record_uid, record in params.record_cache.items()
+               if 'data_unencrypted' in record and record.get('version', 0) in rules]
+    chunks = [records[i:i + VERIFY_SCAN_CHUNK_SIZE] for i in range(0, len(records), VERIFY_SCAN_CHUNK_SIZE)]
+    if len(chunks) > 1 and not getattr(sys, 'frozen', False):
+        try:
+            result = []
+            with ProcessPoolExecutor(max_workers=min(len(chunks), VERIFY_MAX_WORKERS)) as executor:
+                for chunk_result in executor.map(functools.partial(verify_record_chunk, rules=rules), chunks):
+                    result.extend(chunk_result)
+            return result
+        except Exception as e:
+            logging.debug('Record verification in worker processes failed: %s', e)
+    return verify_record_chunk(records, rules)
+
 
 class VerifySharedFoldersCommand(Command):
     def get_parser(self):
@@ -52,16 +244,27 @@ class VerifySharedFoldersCommand(Command):
         if len(shared_folders) == 0:
             raise error.CommandError('shared_folders', f'No shared folders found')
 
-        rq = {
-            'command': 'get_shared_folders',
-            'shared_folders': [{ 'shared_folder_uid': x } for x in shared_folders],
-            'include': ['sfheaders', 'sfusers', 'sfrecords']
-        }
-        rs = api.communicate(params, rq)
+        def get_shared_folders(shared_folder_uids):
+            rq = {
+                'command': 'get_shared_folders',
+                'shared_folders': [{'shared_folder_uid': x} for x in shared_folder_uids],
+                'include': ['sfheaders', 'sfusers', 'sfrecords']
+            }
+            return api.communicate(params, rq)
+
+        started = time.time()
+        sf_uids = list(shared_folders)
+        chunks = [sf_uids[i:i + SHARED_FOLDERS_CHUNK_SIZE] for i in range(0, len(sf_uids), SHARED_FOLDERS_CHUNK_SIZE)]
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), VERIFY_MAX_WORKERS)) as executor:
+                responses = list(executor.map(get_shared_folders, chunks))
+        else:
+            responses = [get_shared_folders(x) for x in chunks]
+
         sf_v3_keys = []     # type: List[Tuple[str, str]]  # (record_uid, shared_folder_uid)
         sf_v2_keys = []     # type: List[Tuple[str, str]]  # (record_uid, shared_folder_uid)
-        if 'shared_folders' in rs:
-            for sf in rs['shared_folders']:
+        for rs in responses:
+            for sf in rs.get('shared_folders') or []:
                 shared_folder_uid = sf['shared_folder_uid']
                 if 'records' in sf:
                     for rec in sf['records']:
@@ -75,12 +278,15 @@ class VerifySharedFoldersCommand(Command):
                         version = record.get('version', 0)
                         if version == 3:
                             if len(record_key) != 60:
-                                if shared_folders is None or shared_folder_uid in shared_folders:
+                                if shared_folder_uid in shared_folders:
                                     sf_v3_keys.append((record_uid, shared_folder_uid))
                         elif version == 2:
                             if len(record_key) == 60:
-                                if shared_folders is None or shared_folder_uid in shared_folders:
+                                if shared_folder_uid in shared_folders:
                                     sf_v2_keys.append((record_uid, shared_folder_uid))
+        elapsed = time.time() - started
+        logging.info('Verified %d shared folder(s) in %.2f seconds (%.0f shared folders/s)',
+                     len(shared_folders), elapsed, len(shared_folders) / elapsed if elapsed > 0 else 0)
 
         if not sf_v3_keys and not sf_v2_keys:
             if kwargs.get('dry_run'):
@@ -116,26 +322,25 @@ class VerifySharedFoldersCommand(Command):
 
         answer = user_choice('Do you want to proceed?', 'yn', 'n')
         if answer.lower() == 'y':
-            sf_v3_keys.sort(key=lambda x: x[0])
-            while sf_v3_keys:
-                chunk = sf_v3_keys[:999]
-                sf_v3_keys = sf_v3_keys[999:]
-
-                record_convert = None
-                last_record_uid = ''
-                rq = record_pb2.RecordsConvertToV3Request()
-                for record_uid, shared_folder_uid in chunk:
+            started = time.time()
+            success = 0
+            results = []
+            if sf_v3_keys:
+                record_folders = {}    # type: Dict[str, List[str]]
+                for record_uid, shared_folder_uid in sf_v3_keys:
                     if shared_folder_uid not in params.shared_folder_cache:
                         continue
                     if record_uid not in params.record_cache:
                         continue
-
-                    record = params.record_cache[record_uid]
-                    shared_folder = params.shared_folder_cache[shared_folder_uid]
-                    if last_record_uid != record_uid:
-                        if record_convert:
-                            rq.records.append(record_convert)
-                        last_record_uid = record_uid
+                    record_folders.setdefault(record_uid, []).append(shared_folder_uid)
+
+                record_uids = list(record_folders.keys())
+                while record_uids:
+                    chunk = record_uids[:RECORDS_BATCH_SIZE]
+                    record_uids = record_uids[RECORDS_BATCH_SIZE:]
+                    rq = record_pb2.RecordsConvertToV3Request()
+                    for record_uid in chunk:
+                        record = params.record_cache[record_uid]
                         record_convert = record_pb2.RecordConvertToV3()
                         record_convert.record_uid = utils.base64_url_decode(record_uid)
                         record_convert.client_modified_time = utils.current_milli_time()
@@ -155,213 +360,147 @@ class VerifySharedFoldersCommand(Command):
                                         audit_data['url'] = utils.url_strip(default_value)
                                 record_convert.audit.data = crypto.encrypt_ec(json.dumps(audit_data).encode('utf-8'), params.enterprise_ec_key)
 
-                    fk = record_pb2.RecordFolderForConversion()
-                    fk.folder_uid = utils.base64_url_decode(shared_folder_uid)
-                    fk.record_folder_key = crypto.encrypt_aes_v2(record['record_key_unencrypted'], shared_folder['shared_folder_key_unencrypted'])
-                    record_convert.folder_key.append(fk)
-
-                if record_convert:
-                    rq.records.append(record_convert)
+                        for shared_folder_uid in record_folders[record_uid]:
+                            shared_folder = params.shared_folder_cache[shared_folder_uid]
+                            fk = record_pb2.RecordFolderForConversion()
+                            fk.folder_uid = utils.base64_url_decode(shared_folder_uid)
+                            fk.record_folder_key = crypto.encrypt_aes_v2(record['record_key_unencrypted'], shared_folder['shared_folder_key_unencrypted'])
+                            record_convert.folder_key.append(fk)
+                        rq.records.append(record_convert)
 
-                rs = api.communicate_rest(params, rq, 'vault/records_convert3', rs_type=record_pb2.RecordsModifyResponse)
-                if rs:
-                    pass
+                    try:
+                        rs = api.communicate_rest(params, rq, 'vault/records_convert3', rs_type=record_pb2.RecordsModifyResponse)
+                        for status in rs.records:
+                            record_uid = utils.base64_url_encode(status.record_uid)
+                            if status.status == record_pb2.RS_SUCCESS:
+                                success += len(record_folders.get(record_uid) or [])
+                            else:
+                                for shared_folder_uid in record_folders.get(record_uid) or []:
+                                    results.append([shared_folder_uid, record_uid, '', status.message or record_pb2.RecordModifyResult.Name(status.status)])
+                    except Exception as e:
+                        logging.warning('Failed to correct %d V3 record key(s): %s', len(chunk), e)
 
             if sf_v2_keys:
                 sf_v2_keys.sort(key=lambda x: x[1])
-                rqs = {}    # type: Dict[str, List[folder_pb2.SharedFolderUpdateRecord]]
-                results = []
-                for record_uid, shared_folder_uid in sf_v2_keys:
-                    if shared_folder_uid not in rqs:
-                        rqs[shared_folder_uid] = []
-                    record = params.record_cache[record_uid]
-                    record_key = record['record_key_unencrypted']
-                    shared_folder = params.shared_folder_cache[shared_folder_uid]
-                    shared_folder_key = shared_folder['shared_folder_key_unencrypted']
-                    sfur = folder_pb2.SharedFolderUpdateRecord()
-                    sfur.recordUid = utils.base64_url_decode(record_uid)
-                    sfur.sharedFolderUid = utils.base64_url_decode(shared_folder_uid)
-                    sfur.encryptedRecordKey = crypto.encrypt_aes_v1(record_key, shared_folder_key)
-                    sfur.canEdit = folder_pb2.BOOLEAN_FALSE
-                    sfur.canShare = folder_pb2.BOOLEAN_TRUE
-
-                sfu_rqs = None     # type: Optional[folder_pb2.SharedFolderUpdateV3RequestV2]
+                sfu_rqs = []     # type: List[folder_pb2.SharedFolderUpdateV3RequestV2]
                 left = 0
-                while len(rqs) > 0 or sfu_rqs is not None:
-                    if sfu_rqs is None:
-                        sfu_rqs = folder_pb2.SharedFolderUpdateV3RequestV2()
-                        left = 990
-                    shared_folder_uid = next(iter(rqs.keys()))
-                    sfu_records = rqs.pop(shared_folder_uid)
-                    sfu_rq = folder_pb2.SharedFolderUpdateV3Request()
-                    sfu_rq.sharedFolderUid = utils.base64_url_decode(shared_folder_uid)
-                    sfu_rq.forceUpdate = True
-                    if len(sfu_records) < left:
-                        sfu_rq.sharedFolderAddRecord.extend(sfu_records)
-                        left -= len(sfu_records)
-                        if left > 10:
-                            continue
-                    else:
+                for shared_folder_uid, keys in itertools.groupby(sf_v2_keys, key=lambda x: x[1]):
+                    shared_folder = params.shared_folder_cache.get(shared_folder_uid)
+                    if not shared_folder:
+                        continue
+                    shared_folder_key = shared_folder['shared_folder_key_unencrypted']
+                    sfu_records = []    # type: List[folder_pb2.SharedFolderUpdateRecord]
+                    for record_uid, _ in keys:
+                        record = params.record_cache[record_uid]
+                        record_key = record['record_key_unencrypted']
+                        sfur = folder_pb2.SharedFolderUpdateRecord()
+                        sfur.recordUid = utils.base64_url_decode(record_uid)
+                        sfur.sharedFolderUid = utils.base64_url_decode(shared_folder_uid)
+                        sfur.encryptedRecordKey = crypto.encrypt_aes_v1(record_key, shared_folder_key)
+                        sfur.canEdit = folder_pb2.BOOLEAN_FALSE
+                        sfur.canShare = folder_pb2.BOOLEAN_TRUE
+                        sfu_records.append(sfur)
+
+                    while sfu_records:
+                        if left == 0:
+                            sfu_rqs.append(folder_pb2.SharedFolderUpdateV3RequestV2())
+                            left = SHARED_FOLDER_RECORDS_BATCH_SIZE
                         chunk = sfu_records[:left]
                         sfu_records = sfu_records[left:]
+                        left -= len(chunk)
+                        sfu_rq = folder_pb2.SharedFolderUpdateV3Request()
+                        sfu_rq.sharedFolderUid = utils.base64_url_decode(shared_folder_uid)
+                        sfu_rq.forceUpdate = True
                         sfu_rq.sharedFolderAddRecord.extend(chunk)
-                        rqs[shared_folder_uid] = sfu_records
+                        sfu_rqs[-1].sharedFoldersUpdateV3.append(sfu_rq)
 
+                failed_records = []    # type: List[Tuple[str, str, str]]
+                for rqs in sfu_rqs:
                     try:
-                        sfu_rss = api.communicate_rest(params, sfu_rqs, 'vault/shared_folder_update_v3',
+                        sfu_rss = api.communicate_rest(params, rqs, 'vault/shared_folder_update_v3',
                                                        rs_type=folder_pb2.SharedFolderUpdateV3ResponseV2, payload_version=1)
-                        for sfu_rs in sfu_rss.sharedFolderUpdateV3Response:
+                        for sfu_rs in sfu_rss.sharedFoldersUpdateV3Response:
                             shared_folder_uid = utils.base64_url_encode(sfu_rs.sharedFolderUid)
                             for sfu_status in sfu_rs.sharedFolderAddRecordStatus:
                                 if sfu_status.status.lower() == 'success':
+                                    success += 1
                                     continue
                                 record_uid = utils.base64_url_encode(sfu_status.recordUid)
-                                api.get_record_shares(params, [record_uid])
-                                owner = ''
-                                rec = params.record_cache.get(record_uid)
-                                if rec and 'shares' in rec:
-                                    shares = rec['shares']
-                                    if 'user_permissions' in shares:
-                                        owner = next((x.get('username') for x in shares['user_permissions'] if x.get('owner')))
-                                results.append([shared_folder_uid, record_uid, owner, sfu_status.status])
-                    except:
-                        pass
-                    finally:
-                        sfu_rqs = None
-
-                if results:
-                    headers = ['Shared Folder UID', 'Record UID', 'Record Owner', 'Error code']
-                    dump_report_data(results, headers=headers, title='V2 Record key errors')
+                                failed_records.append((shared_folder_uid, record_uid, sfu_status.status))
+                    except Exception as e:
+                        record_count = sum(len(x.sharedFolderAddRecord) for x in rqs.sharedFoldersUpdateV3)
+                        logging.warning('Failed to correct %d V2 record key(s): %s', record_count, e)
+
+                if failed_records:
+                    api.get_record_shares(params, list({x[1] for x in failed_records}))
+                    for shared_folder_uid, record_uid, status in failed_records:
+                        owner = ''
+                        rec = params.record_cache.get(record_uid)
+                        if rec and 'shares' in rec:
+                            shares = rec['shares']
+                            if 'user_permissions' in shares:
+                                owner = next((x.get('username') for x in shares['user_permissions'] if x.get('owner')), '')
+                        results.append([shared_folder_uid, record_uid, owner, status])
+
+            elapsed = time.time() - started
+            logging.info('Corrected %d record key(s) in %.2f seconds (%.0f keys/s)',
+                         success, elapsed, success / elapsed if elapsed > 0 else 0)
+            if results:
+                headers = ['Shared Folder UID', 'Record UID', 'Record Owner', 'Error code']
+                dump_report_data(results, headers=headers, title='Record key errors')
 
             params.sync_data = True
 
 
 class VerifyRecordsCommand(Command):
+    def get_parser(self):
+        return verify_records_parser
+
     def execute(self, params, **kwargs):
+        started = time.time()
+        verified = sum(1 for x in params.record_cache.values() if 'data_unencrypted' in x)
         records_v3_to_fix = {}
         records_v2_to_fix = {}
-        records_to_delete = set()
-        for record_uid in params.record_cache:
-            record = params.record_cache[record_uid]
-            if 'data_unencrypted' not in record:
-                continue
-
-            try:
-                data = json.loads(record['data_unencrypted'])
-            except:
-                records_to_delete.add(record_uid)
+        problems = {}    # type: Dict[str, List[str]]
+        for record_uid, version, data, record_problems in verify_records(params):
+            problems[record_uid] = record_problems
+            if data is None:
                 continue
-            version = record.get('version', 0)
-
             if version == 3:
-                is_broken = False
-                # both fields and custom
-                for field in itertools.chain(data.get('fields', []), data.get('custom', [])):
-                    value = field.get('value')
-                    # value is not list
-                    if not isinstance(value, list):
-                        is_broken = True
-                        if value:
-                            value = [value]
-                        else:
-                            value = []
-                        field['value'] = value
-                    # fix credit card expiration on paymentCard
-                    if field.get('type', '') == 'paymentCard':
-                        for card in field['value']:
-                            if isinstance(card, dict):
-                                if 'cardExpirationDate' in card:
-                                    exp = card['cardExpirationDate']
-                                    if isinstance(exp, str):
-                                        if exp:
-                                            month, sep, year = exp.partition('/')
-                                            if not month.isnumeric() or not year.isnumeric():
-                                                is_broken = True
-                                                card['cardExpirationDate'] = ""
-                                    else:
-                                        is_broken = True
-                                        card['cardExpirationDate'] = ""
-
-                            else:
-                                field['value'] = []
-                                break
-                    # date field type should contain int value
-                    if field.get('type', '') == 'date':
-                        orig_dates = field['value']
-                        tested_dates = [x for x in orig_dates if isinstance(x, int)]
-                        if len(tested_dates) < len(orig_dates):
-                            field['value'] = tested_dates
-                            is_broken = True
-
-                # custom only
-                for field in data.get('custom', []):
-                    # OTP URL scheme should have oneTimeCode
-                    if field.get('type', '') != 'oneTimeCode' and field.get('value'):
-                        value = field.get('value')
-                        if isinstance(value, list) and len(value) == 1:
-                            value = value[0]
-                            if isinstance(value, str) and value.startswith('otpauth'):
-                                try:
-                                    code, _, _ = get_totp_code(value)
-                                    if code:
-                                        field['type'] = 'oneTimeCode'
-                                        is_broken = True
-                                except:
-                                    pass
-
-                has_unknown_type = any((x for x in data.get('custom', []) if x.get('type') == 'unknownType'))
-                if has_unknown_type:
-                    data['custom'] = [x for x in data['custom'] if x.get('type') != 'unknownType']
-                    is_broken = True
-
-                # login record type should have oneTimeCode on fields rather than custom
-                if data.get('type') in {'login'} and 'fields' in data and 'custom' in data:
-                    fields_otp = next((x for x in data.get('fields') if x.get('type') == 'oneTimeCode'), None)
-                    if not fields_otp or not fields_otp.get('value'):
-                        custom_otp = next((x for x in data.get('custom', []) if x.get('type') == 'oneTimeCode'), None)
-                        if custom_otp and custom_otp.get('value'):
-                            if fields_otp:
-                                fields_otp['value'] = custom_otp['value']
-                            else:
-                                data['fields'].append(custom_otp)
-                            try:
-                                data['custom'].remove(custom_otp)
-                            except:
-                                custom_otp['value'] = []
-                            is_broken = True
-
-                if is_broken:
-                    records_v3_to_fix[record_uid] = data
+                records_v3_to_fix[record_uid] = data
             elif version == 2:
-                is_broken = False
-                for field in ('title', 'secret1', 'secret2', 'link', 'notes'):
-                    if field in data:
-                        value = data[field]
-                        if not isinstance(value, str):
-                            if value is None:
-                                data[field] = ''
-                            else:
-                                data[field] = str(value)
-                            is_broken = True
-                    else:
-                        data[field] = ''
-                        is_broken = True
-                if is_broken:
-                    records_v2_to_fix[record_uid] = data
+                records_v2_to_fix[record_uid] = data
+        elapsed = time.time() - started
+        logging.info('Verified %d record(s) in %.2f seconds (%.0f records/s)',
+                     verified, elapsed, verified / elapsed if elapsed > 0 else 0)
+
+        if kwargs.get('dry_run'):
+            if problems:
+                table = []
+                for record_uid, record_problems in problems.items():
+                    record = params.record_cache.get(record_uid) or {}
+                    data = records_v3_to_fix.get(record_uid) or records_v2_to_fix.get(record_uid) or {}
+                    table.append([record_uid, data.get('title', ''), record.get('version', 0), record_problems])
+                headers = ['Record UID', 'Title', 'Version', 'Problems']
+                dump_report_data(table, headers=headers, title='Records to be corrected')
+            else:
+                print('There are no records to be corrected')
+            return
 
         if len(records_v2_to_fix) > 0 or len(records_v3_to_fix) > 0:
             total_records = len(records_v2_to_fix) + len(records_v3_to_fix)
             print(f'There are {total_records} record(s) to be corrected')
             answer = user_choice('Do you want to proceed?', 'yn', 'n')
             if answer.lower() == 'y':
+                started = time.time()
                 success = 0
                 failed = []
 
                 if len(records_v2_to_fix) > 0:
                     record_uids = list(records_v2_to_fix.keys())
                     while len(record_uids) > 0:
-                        chunk = record_uids[:99]
-                        record_uids = record_uids[99:]
+                        chunk = record_uids[:RECORDS_V2_BATCH_SIZE]
+                        record_uids = record_uids[RECORDS_V2_BATCH_SIZE:]
                         rq = {
                             'command': 'record_update',
                             'client_time': utils.current_milli_time(),
@@ -381,19 +520,27 @@ class VerifyRecordsCommand(Command):
                                 'client_modified_time': utils.current_milli_time(),
                                 'revision': revision,
                             })
+                        try:
                             rs = api.communicate(params, rq)
-                            for rs_status in rs.get('update_records') or []:
-                                record_uid = rs_status['record_uid']
-                                status = rs_status.get('status')
-                                if status == 'success':
-                                    success += 1
-                                else:
-                                    failed.append(f'{record_uid}: {rs_status.get("message", status)}')
+                        except Exception as e:
+                            failed.extend(f'{x}: {e}' for x in chunk)
+                            continue
+                        for rs_status in rs.get('update_records') or []:
+                            record_uid = rs_status['record_uid']
+                            status = rs_status.get('status')
+                            if status == 'success':
+                                success += 1
+                            else:
+                                failed.append(f'{record_uid}: {rs_status.get("message", status)}')
 
                 if len(records_v3_to_fix) > 0:
+                    record_uids = list(records_v3_to_fix.keys())
+                    while len(record_uids) > 0:
+                        chunk = record_uids[:RECORDS_BATCH_SIZE]
+                        record_uids = record_uids[RECORDS_BATCH_SIZE:]
                         rq = record_pb2.RecordsUpdateRequest()
                         rq.client_time = utils.current_milli_time()
-                        for record_uid in records_v3_to_fix:
+                        for record_uid in chunk:
                             record = params.record_cache[record_uid]
                             record_key = record['record_key_unencrypted']
                             upd_rq = record_pb2.RecordUpdate()
@@ -403,9 +550,11 @@ class VerifyRecordsCommand(Command):
                             data = records_v3_to_fix[record_uid]
                             upd_rq.data = crypto.encrypt_aes_v2(api.get_record_data_json_bytes(data), record_key)
                             rq.records.append(upd_rq)
-                            if len(rq.records) >= 999:
-                                break
-                        rs = api.communicate_rest(params, rq, 'vault/records_update', rs_type=record_pb2.RecordsModifyResponse)
+                        try:
+                            rs = api.communicate_rest(params, rq, 'vault/records_update', rs_type=record_pb2.RecordsModifyResponse)
+                        except Exception as e:
+                            failed.extend(f'{x}: {e}' for x in chunk)
+                            continue
                         for status in rs.records:
                             if status.status == record_pb2.RS_SUCCESS:
                                 success += 1
@@ -413,11 +562,12 @@ class VerifyRecordsCommand(Command):
                                 record_uid = utils.base64_url_encode(status.record_uid)
                                 failed.append(f'{record_uid}: {status.message}')
 
+                elapsed = time.time() - started
                 if success > 0:
-                    logging.info('Successfully corrected %d record(s)', success)
+                    logging.info('Successfully corrected %d record(s) in %.2f seconds (%.0f records/s)',
+                                 success, elapsed, success / elapsed if elapsed > 0 else 0)
                 if len(failed) > 0:
                     logging.warning('Failed to correct %d record(s)', len(failed))
                     logging.info('\n'.join(failed))
 
-                    params.sync_data = True
-
+                params.sync_data = True
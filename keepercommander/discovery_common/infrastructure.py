@@ -33,7 +33,7 @@ class Infrastructure:
 
     def __init__(self, record: Any, logger: Optional[Any] = None, history_level: int = 0,
                  debug_level: int = 0, fail_on_corrupt: bool = True, log_prefix: str = "GS Infrastructure",
-                 save_batch_count: int = 0,
+                 save_batch_count: int = 0, snapshot_dir: Optional[str] = None,
                  **kwargs):
 
         # This will either be a KSM Record, or Commander KeeperRecord
@@ -47,6 +47,7 @@ class Infrastructure:
         self.debug_level = debug_level
         self.fail_on_corrupt = fail_on_corrupt
         self.save_batch_count = save_batch_count
+        self.snapshot_dir = snapshot_dir
 
         self.auto_save = False
         self.delta_graph = True
@@ -64,7 +65,8 @@ class Infrastructure:
             self._dag = DAG(conn=self.conn, record=self.record, graph_id=DIS_INFRA_GRAPH_ID, auto_save=self.auto_save,
                             logger=self.logger, history_level=self.history_level, debug_level=self.debug_level,
                             name="Discovery Infrastructure", fail_on_corrupt=self.fail_on_corrupt,
-                            log_prefix=self.log_prefix, save_batch_count=self.save_batch_count)
+                            log_prefix=self.log_prefix, save_batch_count=self.save_batch_count,
+                            snapshot_dir=self.snapshot_dir)
             # Do not load the DAG here.
             # We don't know if we are using a sync point yet.
 
@@ -18,7 +18,7 @@ class Jobs:
     KEY_PATH = "jobs"
 
     def __init__(self, record: Any, logger: Optional[Any] = None, debug_level: int = 0, fail_on_corrupt: bool = True,
-                 log_prefix: str = "GS Jobs", **kwargs):
+                 log_prefix: str = "GS Jobs", snapshot_dir: Optional[str] = None, **kwargs):
 
         self.conn = get_connection(**kwargs)
 
@@ -31,6 +31,7 @@ class Jobs:
         self.log_prefix = log_prefix
         self.debug_level = debug_level
         self.fail_on_corrupt = fail_on_corrupt
+        self.snapshot_dir = snapshot_dir
 
     @property
     def dag(self) -> DAG:
@@ -38,7 +39,8 @@ class Jobs:
 
             self._dag = DAG(conn=self.conn, record=self.record, graph_id=DIS_JOBS_GRAPH_ID, auto_save=False,
                             logger=self.logger, debug_level=self.debug_level, name="Discovery Jobs",
-                            fail_on_corrupt=self.fail_on_corrupt, log_prefix=self.log_prefix)
+                            fail_on_corrupt=self.fail_on_corrupt, log_prefix=self.log_prefix,
+                            snapshot_dir=self.snapshot_dir)
             self._dag.load()
 
             # Has the status been initialized?
@@ -78,7 +78,7 @@ class Rules:
     }
 
     def __init__(self, record: Any, logger: Optional[Any] = None,  debug_level: int = 0, fail_on_corrupt: bool = True,
-                 **kwargs):
+                 snapshot_dir: Optional[str] = None, **kwargs):
 
         self.conn = get_connection(**kwargs)
 
@@ -88,6 +88,7 @@ class Rules:
         self.logger = logger
         self.debug_level = debug_level
         self.fail_on_corrupt = fail_on_corrupt
+        self.snapshot_dir = snapshot_dir
 
     @property
     def dag(self) -> DAG:
@@ -96,7 +97,8 @@ class Rules:
             # Turn auto_save on after the DAG has been created.
             # No need to call it six times in a row to initialize it.
             self._dag = DAG(conn=self.conn, record=self.record, graph_id=DIS_RULES_GRAPH_ID, auto_save=False,
-                            logger=self.logger, debug_level=self.debug_level, fail_on_corrupt=self.fail_on_corrupt)
+                            logger=self.logger, debug_level=self.debug_level, fail_on_corrupt=self.fail_on_corrupt,
+                            snapshot_dir=self.snapshot_dir)
             self._dag.load()
 
             # Has the status been initialized?
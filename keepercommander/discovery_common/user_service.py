@@ -18,7 +18,7 @@ class UserService:
 
     def __init__(self, record: Any, logger: Optional[Any] = None, history_level: int = 0,
                  debug_level: int = 0, fail_on_corrupt: bool = True, log_prefix: str = "GS Services/Tasks",
-                 **kwargs):
+                 snapshot_dir: Optional[str] = None, **kwargs):
 
         self.conn = get_connection(**kwargs)
 
@@ -32,6 +32,7 @@ class UserService:
         self.history_level = history_level
         self.debug_level = debug_level
         self.fail_on_corrupt = fail_on_corrupt
+        self.snapshot_dir = snapshot_dir
 
         self.auto_save = False
         self.last_sync_point = -1
@@ -43,7 +44,8 @@ class UserService:
             self._dag = DAG(conn=self.conn, record=self.record, graph_id=USER_SERVICE_GRAPH_ID,
                             auto_save=False, logger=self.logger, history_level=self.history_level,
                             debug_level=self.debug_level, name="Discovery Service/Tasks",
-                            fail_on_corrupt=self.fail_on_corrupt, log_prefix=self.log_prefix)
+                            fail_on_corrupt=self.fail_on_corrupt, log_prefix=self.log_prefix,
+                            snapshot_dir=self.snapshot_dir)
 
             self._dag.load(sync_point=0)
 
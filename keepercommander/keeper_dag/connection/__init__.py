@@ -28,6 +28,17 @@ class ConnectionBase:
     def get_key_bytes(record: object) -> bytes:
         pass
 
+    @property
+    def snapshot_context(self) -> str:
+        # Identifies the server and the account, or device, of the connection.
+        # Local graph snapshots are kept separately for each context.
+        return ""
+
+    @property
+    def snapshot_dir(self) -> Optional[str]:
+        # Directory for local graph snapshots configured for the connection, if any.
+        return None
+
     def rest_call_to_router(self, http_method, endpoint, payload_json=None) -> str:
         return ""
 
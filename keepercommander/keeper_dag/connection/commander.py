@@ -47,6 +47,16 @@ class Connection(ConnectionBase):
     def get_key_bytes(record: KeeperRecord) -> bytes:
         return record.record_key
 
+    @property
+    def snapshot_context(self) -> str:
+        return f"{self.params.server}|{self.params.user}"
+
+    @property
+    def snapshot_dir(self) -> Optional[str]:
+        # Set with "dag_snapshot_dir" in the Commander configuration file.
+        snapshot_dir = self.params.config.get("dag_snapshot_dir")
+        return os.path.expanduser(snapshot_dir) if snapshot_dir else None
+
     @property
     def hostname(self) -> str:
         # The host is connect.keepersecurity.com, connect.dev.keepersecurity.com, etc. Append "connect" in front
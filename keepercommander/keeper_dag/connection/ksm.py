@@ -68,6 +68,10 @@ class Connection(ConnectionBase):
     def get_key_bytes(record: Record) -> bytes:
         return record.record_key_bytes
 
+    @property
+    def snapshot_context(self) -> str:
+        return f"{self.hostname}|{self.client_id}"
+
     def get_config_value(self, key: ConfigKeys) -> str:
         if isinstance(self.config, KeyValueStorage) is True:
             return self.config.get(key)
@@ -3,6 +3,7 @@ import logging
 from ..types import DataPayload, SyncData, EdgeType
 import json
 import os
+import threading
 from tabulate import tabulate
 
 try:
@@ -42,8 +43,24 @@ class Connection(ConnectionBase):
         self.db_file = os.path.join(db_dir, db_file)
         self.limit = limit
 
+        # One connection is kept open for the life of this instance.
+        # The DAG may save batches from multiple threads; the lock serializes access to the connection.
+        self._connection = None  # type: Optional[sqlite3.Connection]
+        self._lock = threading.RLock()
+
         self.create_database()
 
+    def get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
     def debug(self, msg):
         if Connection.DEBUG == 1:
             logging.debug(f"DAG: {msg}")
@@ -64,7 +81,12 @@ class Connection(ConnectionBase):
             return getattr(record, "record_key")
         raise Exception("Cannot find the record key bytes in object.")
 
+    @property
+    def snapshot_context(self) -> str:
+        return os.path.abspath(self.db_file)
+
     def clear_database(self):
+        self.close()
         try:
             os.unlink(self.db_file)
         except (Exception,):
@@ -74,7 +96,8 @@ class Connection(ConnectionBase):
 
         self.debug("create local dag database")
 
-        with closing(sqlite3.connect(self.db_file))as connection:
+        with self._lock:
+            connection = self.get_connection()
             with closing(connection.cursor()) as cursor:
 
                 # This is based on workflow, Database.kt.
@@ -132,6 +155,10 @@ CREATE TABLE IF NOT EXISTS dag_streams (
 )
                     """
                 )
+
+                cursor.execute("CREATE INDEX IF NOT EXISTS dag_edges_tail ON dag_edges (tail, graph_id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS dag_vertices_id ON dag_vertices (vertex_id)")
+                cursor.execute("CREATE INDEX IF NOT EXISTS dag_streams_vertex ON dag_streams (vertex_id, sync_point)")
                 connection.commit()
 
         os.chmod(self.db_file, 0o777)
@@ -172,8 +199,8 @@ CREATE TABLE IF NOT EXISTS dag_streams (
 
         # First check if we can route with existing edges in the database.
         stream_id = None
-        with closing(sqlite3.connect(self.db_file)) as connection:
-            with closing(connection.cursor()) as cursor:
+        with self._lock:
+            with closing(self.get_connection().cursor()) as cursor:
 
                 graph_id = data.get("graphId")
 
@@ -267,76 +294,71 @@ CREATE TABLE IF NOT EXISTS dag_streams (
 
     def add_data(self, payload: DataPayload):
 
-        stream_id = self._find_stream_id(payload)
-        self.debug(f"STREAM ID IS {stream_id}")
-
         data = Connection._payload_to_json(payload)
 
-        with closing(sqlite3.connect(self.db_file)) as connection:
-            with closing(connection.cursor()) as cursor:
-
-                origin_id = data.get("origin")["value"]
-                graph_id = data.get("graphId")
-
-                saved_vertex = {}
-                for item in data.get("dataList"):
+        with self._lock:
+            stream_id = self._find_stream_id(payload)
+            self.debug(f"STREAM ID IS {stream_id}")
 
-                    tail_uid = item.get("ref")["value"]
-                    tail_type = item.get("ref")["type"]
-                    tail_name = item.get("ref")["name"]
+            origin_id = data.get("origin")["value"]
+            graph_id = data.get("graphId")
 
-                    head_uid = None
-                    head_type = None
-                    head_name = None
-                    if item.get("parentRef") is not None:
-                        head_uid = item.get("parentRef")["value"]
-                        head_type = item.get("parentRef")["type"]
-                        head_name = item.get("parentRef")["name"]
+            edges = []
+            vertices = {}
+            for item in data.get("dataList"):
 
-                    edge_type = item.get("type")
-                    path = item.get("path")
+                tail_uid = item.get("ref")["value"]
+                tail_type = item.get("ref")["type"]
+                tail_name = item.get("ref")["name"]
+
+                head_uid = None
+                head_type = None
+                head_name = None
+                if item.get("parentRef") is not None:
+                    head_uid = item.get("parentRef")["value"]
+                    head_type = item.get("parentRef")["type"]
+                    head_name = item.get("parentRef")["name"]
+
+                edges.append((
+                    item.get("type"),
+                    head_uid,
+                    tail_uid,
+                    item.get("content"),
+                    origin_id,
+                    graph_id,
+                    item.get("path")
+                ))
+
+                # Type is RefType enum value
+                if tail_uid not in vertices:
+                    vertices[tail_uid] = (tail_uid, tail_type, tail_name)
+                if head_uid not in vertices:
+                    vertices[head_uid] = (head_uid, head_type, head_name)
+
+            # Insert all the edges in one transaction.
+            # The edge ids are AUTOINCREMENT, and the lock prevents other inserts, so the edges added by
+            #   executemany have consecutive ids after the current sequence.
+            connection = self.get_connection()
+            with closing(connection.cursor()) as cursor:
+                try:
+                    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'dag_edges'").fetchone()
+                    last_edge_id = row[0] if row is not None else 0
 
                     sql = "INSERT INTO dag_edges (type, head, tail, data, origin, graph_id, path) "
                     sql += "VALUES (?,?,?,?,?,?,?)"
-                    cursor.execute(sql, (
-                        edge_type,
-                        head_uid,
-                        tail_uid,
-                        item.get("content"),
-                        origin_id,
-                        graph_id,
-                        path
-                    ))
-                    edge_id = cursor.lastrowid
+                    cursor.executemany(sql, edges)
 
                     sql = "INSERT INTO dag_streams (graph_id, vertex_id, edge_id, count) VALUES (?, ?, ?, ?)"
-                    cursor.execute(sql, (
-                        graph_id,
-                        stream_id,
-                        edge_id,
-                        1
-                    ))
-
-                    if saved_vertex.get(tail_uid) is None:
-                        # Type is RefType enum value
-                        sql = "INSERT INTO dag_vertices (vertex_id, type, name) VALUES (?, ?, ?)"
-                        cursor.execute(sql, (
-                            tail_uid,
-                            tail_type,
-                            tail_name
-                        ))
-                        saved_vertex[tail_uid] = True
-                    if saved_vertex.get(head_uid) is None:
-                        # Type is RefType enum value
-                        sql = "INSERT INTO dag_vertices (vertex_id, type, name) VALUES (?, ?, ?)"
-                        cursor.execute(sql, (
-                            head_uid,
-                            head_type,
-                            head_name
-                        ))
-                        saved_vertex[head_uid] = True
+                    cursor.executemany(sql, ((graph_id, stream_id, last_edge_id + index + 1, 1)
+                                             for index in range(len(edges))))
 
-                connection.commit()
+                    sql = "INSERT INTO dag_vertices (vertex_id, type, name) VALUES (?, ?, ?)"
+                    cursor.executemany(sql, vertices.values())
+
+                    connection.commit()
+                except (Exception,):
+                    connection.rollback()
+                    raise
 
     def sync(self, stream_id: str, sync_point: Optional[int] = 0, graph_id: Optional[int] = 0) -> SyncData:
 
@@ -358,56 +380,46 @@ CREATE TABLE IF NOT EXISTS dag_streams (
             "hasMore": False
         }
 
-        with closing(sqlite3.connect(self.db_file)) as connection:
-            with closing(connection.cursor()) as cursor:
+        with self._lock:
+            with closing(self.get_connection().cursor()) as cursor:
                 self.debug(f"... loading DAG, {stream_id}, {sync_point}, {self.limit + 1}")
 
-                args = [stream_id, sync_point, graph_id]
-                sql = "SELECT sync_point, edge_id FROM dag_streams WHERE vertex_id = ? AND deletion = 0 "\
-                      "AND sync_point > ? AND graph_id=? ORDER BY sync_point ASC LIMIT ?"
-                args.append(self.limit + 1)
-                res = cursor.execute(sql, tuple(args))
-                rows = list(res.fetchall())
+                # Get the page of edges, with the types of the head and tail vertices, in one query.
+                args = [graph_id, stream_id, sync_point, graph_id, self.limit + 1]
+                sql = "SELECT s.sync_point, e.head, e.tail, e.data, e.path, e.type, "\
+                      "(SELECT type FROM dag_vertices WHERE vertex_id = e.head LIMIT 1), "\
+                      "(SELECT type FROM dag_vertices WHERE vertex_id = e.tail LIMIT 1) "\
+                      "FROM dag_streams s INNER JOIN dag_edges e ON e.edge_id = s.edge_id AND e.graph_id = ? "\
+                      "WHERE s.vertex_id = ? AND s.deletion = 0 AND s.sync_point > ? AND s.graph_id=? "\
+                      "ORDER BY s.sync_point ASC LIMIT ?"
+                rows = cursor.execute(sql, tuple(args)).fetchall()
                 if len(rows) > self.limit:
                     resp["hasMore"] = True
                     rows.pop()
                 for row in rows:
                     resp["syncPoint"] = row[0]
-
-                    args = [row[1], graph_id]
-                    sql = "SELECT head, tail, data, path, type FROM dag_edges WHERE edge_id = ? AND graph_id=?"
-                    res = cursor.execute(sql, tuple(args))
-                    edges = res.fetchone()
+                    head_uid, tail_uid = row[1], row[2]
 
                     # If the head and tail are the same (DATA edge), then parent_ref is None.
                     # Else include a parent_ref
                     parent_ref = None
-                    if edges[1] != edges[0]:
-
-                        sql = "SELECT type FROM dag_vertices WHERE vertex_id = ?"
-                        res = cursor.execute(sql, (edges[0],))
-                        head_vertex = res.fetchone()
-
+                    if tail_uid != head_uid:
                         parent_ref = {
-                            "type": head_vertex[0],
-                            "value": edges[0],
+                            "type": row[6],
+                            "value": head_uid,
                             "name": None
                         }
 
-                    sql = "SELECT type FROM dag_vertices WHERE vertex_id = ?"
-                    res = cursor.execute(sql, (edges[1],))
-                    tail_vertex = res.fetchone()
-
                     resp["data"].append({
-                        "type": edge_type_map.get(edges[4]),
+                        "type": edge_type_map.get(row[5]),
                         "ref": {
-                            "type": tail_vertex[0],
-                            "value": edges[1],
+                            "type": row[7],
+                            "value": tail_uid,
                             "name": None
                         },
                         "parentRef": parent_ref,
-                        "content": edges[2],
-                        "path": edges[3],
+                        "content": row[3],
+                        "path": row[4],
                         "deletion": False
                     })
 
@@ -418,8 +430,8 @@ CREATE TABLE IF NOT EXISTS dag_streams (
 
         ret = ""
 
-        with closing(sqlite3.connect(self.db_file)) as connection:
-            with closing(connection.cursor()) as cursor:
+        with self._lock:
+            with closing(self.get_connection().cursor()) as cursor:
 
                 cols = ["graph_id", "edge_id", "type", "head", "tail", "data", "origin", "path", "created",
                         "creator_id", "creator_type", "creator_name"]
@@ -468,7 +480,8 @@ CREATE TABLE IF NOT EXISTS dag_streams (
 
     def update_edge_content(self, graph_id: int, head_uid: str, tail_uid: str, content: str):
 
-        with closing(sqlite3.connect(self.db_file)) as connection:
+        with self._lock:
+            connection = self.get_connection()
             with closing(connection.cursor()) as cursor:
 
                 sql = "UPDATE dag_edges SET data=? WHERE graph_id=? AND head=? AND tail=?"
@@ -478,7 +491,8 @@ CREATE TABLE IF NOT EXISTS dag_streams (
 
     def clear(self):
 
-        with closing(sqlite3.connect(self.db_file)) as connection:
+        with self._lock:
+            connection = self.get_connection()
             with closing(connection.cursor()) as cursor:
 
                 for table in ["dag_streams", "dag_edges", "dag_vertices"]:
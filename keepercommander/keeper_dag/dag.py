@@ -1,9 +1,12 @@
 from __future__ import annotations
 import logging
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .vertex import DAGVertex
+from .snapshot import DAGSnapshot
 from .types import DAGData, EdgeType, RefType, Ref, DataPayload
 from .crypto import encrypt_aes, decrypt_aes, generate_uid_str, bytes_to_str, str_to_bytes, urlsafe_str_to_bytes
 from .exceptions import (DAGConfirmException, DAGPathException, DAGVertexAlreadyExistsException, DAGKeyException,
@@ -11,10 +14,11 @@ from .exceptions import (DAGConfirmException, DAGPathException, DAGVertexAlready
 from .utils import value_to_boolean
 import json
 import importlib
-from typing import Optional, Union, List, Any, TYPE_CHECKING
+from typing import Optional, Union, List, Tuple, Dict, Iterator, Any, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .connection import ConnectionBase
+    from .edge import DAGEdge
     Content = Union[str, bytes, dict]
     QueryValue = Union[list, dict, str, float, int, bool]
     Logger = Union[logging.RootLogger, logging.Logger]
@@ -28,6 +32,13 @@ class DAG:
     UID_KEY_BYTES_SIZE = 16
     UID_KEY_STR_SIZE = 22
 
+    # Decrypt the keychains in parallel if the graph has at least this many vertices with KEY edges.
+    KEYCHAIN_PARALLEL_MIN = 200
+    KEYCHAIN_DECRYPT_WORKERS = 4
+
+    # When saving in batches, the number of DATA edge batches sent at the same time.
+    SAVE_WORKERS = 4
+
     # For the dot output, enum to text.
     EDGE_LABEL = {
         EdgeType.DATA: "DATA",
@@ -42,7 +53,7 @@ class DAG:
                  history_level: int = 0, logger: Optional[Any] = None, debug_level: int = 0, is_dev: bool = False,
                  vertex_type: RefType = RefType.PAM_NETWORK, decrypt: bool = True, fail_on_corrupt: bool = True,
                  data_requires_encryption: bool = False, log_prefix: str = "GraphSync",
-                 save_batch_count: Optional[int] = None):
+                 save_batch_count: Optional[int] = None, snapshot_dir: Optional[str] = None):
 
         """
         Create a GraphSync instance.
@@ -63,6 +74,10 @@ class DAG:
         :param data_requires_encryption: Data edges are already encrypted. Default is False.
         :param log_prefix: Text prepended to the log messages. Handy if dealing with multiple graphs
         :param save_batch_count: The number of edges to save at one time.
+        :param snapshot_dir: Directory to keep a local copy of the graph stream.
+                             If set, loading will only request edges newer than the local copy.
+                             Defaults to the GS_SNAPSHOT_DIR (or DAG_SNAPSHOT_DIR) environment variable,
+                             then to the snapshot directory configured for the connection.
         :return: Instance of GraphSync
         """
 
@@ -111,6 +126,13 @@ class DAG:
         # Graph ID allow you to select which graph to load. The default is 0, which will load all graph for the UID
         self.graph_id = graph_id
 
+        # If a snapshot directory is set, the synced edges are stored locally with the last sync point.
+        if snapshot_dir is None:
+            snapshot_dir = os.environ.get("GS_SNAPSHOT_DIR", os.environ.get("DAG_SNAPSHOT_DIR"))
+        if snapshot_dir is None:
+            snapshot_dir = conn.snapshot_dir
+        self.snapshot_dir = snapshot_dir
+
         self.debug(f"{self.log_prefix} key {self.key}", level=1)
         self.debug(f"{self.log_prefix} UID {self.uid}", level=1)
         self.debug(f"{self.log_prefix} UID HEX {urlsafe_str_to_bytes(self.uid).hex()}", level=1)
@@ -155,6 +177,9 @@ class DAG:
         # If data was corrupt in the graph, the vertex UID will appear in this list.
         self.corrupt_uids = []
 
+        # DATA edges are decrypted when the content is first accessed, which might be from multiple threads.
+        self._decrypt_lock = threading.Lock()
+
         self.conn = conn
 
     def debug(self, msg: str, level: int = 0):
@@ -358,13 +383,20 @@ class DAG:
                     results.append(vertex)
         return results
 
-    def _sync(self, sync_point: int = 0) -> (List[DAGData], int):
+    def _sync_pages(self, sync_point: int = 0) -> Iterator[Tuple[List[DAGData], int]]:
+
+        """
+        Get the graph stream from the web service, a page at a time.
+
+        Each page is yielded as it arrives, with the sync point of the page, so the caller can apply
+        the edges without holding the entire stream in memory.
+
+        :param sync_point: Where to load
+        """
 
         # The web service will send 500 items, if there is more the 'has_more' flag is set to True.
         has_more = True
 
-        # Make the web service call to set all the data
-        all_data = []
         while has_more is True:
             # Load a page worth of items
             resp = self.conn.sync(
@@ -373,9 +405,9 @@ class DAG:
                 graph_id=self.graph_id
             )
             if resp.syncPoint == 0:
-                return all_data, 0
+                return
 
-            all_data += resp.data
+            yield resp.data, resp.syncPoint
 
             # The server will tell us if there is more data to get.
             has_more = resp.hasMore
@@ -383,7 +415,161 @@ class DAG:
             # The sync_point will indicate where we need to start the sync from. Think syncPoint > value
             sync_point = resp.syncPoint
 
-        return all_data, sync_point
+    def _sync(self, sync_point: int = 0) -> (List[DAGData], int):
+
+        # Make the web service call to set all the data
+        all_data = []
+        last_sync_point = 0
+        for data, last_sync_point in self._sync_pages(sync_point=sync_point):
+            all_data += data
+
+        return all_data, last_sync_point
+
+    def _sync_pages_with_snapshot(self, sync_point: int = 0) -> Iterator[Tuple[List[DAGData], int]]:
+
+        """
+        Get the graph stream, a page at a time, using the local snapshot.
+
+        The edges in the snapshot are yielded first, as one page.
+        Only the edges after the snapshot's sync point are requested from the web service.
+        The new edges are added to the snapshot.
+        The snapshot is not used if loading from a specific sync point.
+
+        :param sync_point: Where to load
+        """
+
+        if self.snapshot_dir is None or sync_point != 0:
+            yield from self._sync_pages(sync_point=sync_point)
+            return
+
+        snapshot = DAGSnapshot(self.snapshot_dir, stream_id=self.uid, graph_id=self.graph_id, logger=self.logger,
+                               context=self.conn.snapshot_context)
+        cached_data, sync_point = snapshot.load()
+        self.debug(f"snapshot has {len(cached_data)} edges, sync point {sync_point}", level=1)
+        if len(cached_data) > 0:
+            yield cached_data, sync_point
+
+        # A sync point of 0 means there is nothing after the requested sync point; no pages are returned.
+        new_data = []
+        for data, sync_point in self._sync_pages(sync_point=sync_point):
+            new_data += data
+            yield data, sync_point
+
+        if len(new_data) > 0:
+            self.debug(f"adding {len(new_data)} new edges to snapshot, sync point {sync_point}", level=1)
+            try:
+                snapshot.save(cached_data + new_data, sync_point)
+            except Exception as err:
+                self.logger.info(f"could not save the graph snapshot: {err}")
+
+    def _load_edge(self, data: DAGData, edge_type: EdgeType):
+
+        """
+        Add a non-DATA edge, from the graph stream, to the graph.
+
+        :param data: The edge from the web service.
+        :param edge_type: The edge type of the data.
+        """
+
+        # The ref the tail. It connects to stored in the vertex.
+        tail_uid = data.ref.get("value")
+
+        # The parentRef is the head. It's the arrowhead on the edge. For DATA edges, it will be None.
+        head_uid = None
+        if data.parentRef is not None:
+            head_uid = data.parentRef.get("value")
+
+        self.debug(f"  * edge {edge_type}, tail {tail_uid} to head {head_uid}", level=3)
+
+        # We want to store this edge in the Vertex with the same value/UID as the ref.
+        if tail_uid not in self._uid_lookup:
+            self.debug(f"    * tail vertex {tail_uid} does not exists. create.", level=3)
+            self.add_vertex(
+                uid=tail_uid,
+                name=data.ref.get("name"),
+
+                # This will be 0/GENERAL right now. We do the lookup just in case things will change in the
+                # future.
+                vertex_type=RefType.find_enum(data.ref.get("type"))
+            )
+
+        # Get the tail vertex.
+        tail = self.get_vertex(tail_uid)
+
+        # This most likely is a DELETION edge of a DATA edge.
+        # Set the head to be the same as the tail.
+        if head_uid is None:
+            head_uid = tail_uid
+
+        # If the head vertex doesn't exist, we need to create.
+        if head_uid not in self._uid_lookup:
+            self.debug(f"    * head vertex {head_uid} does not exists. create.", level=3)
+            self.add_vertex(
+                uid=head_uid,
+                name=data.parentRef.get("name"),
+                vertex_type=RefType.GENERAL
+            )
+        # Get the head vertex, which will exist now.
+        head = self.get_vertex(head_uid)
+        self.debug(f"    * tail {tail_uid} belongs to {head_uid}, "
+                   f"edge type {edge_type}", level=3)
+
+        if edge_type == EdgeType.DELETION:
+            tail.disconnect_from(head)
+        else:
+            if data.content is not None:
+                content = str_to_bytes(data.content)
+            else:
+                content = None
+
+            # ACL are decrypted, but it is base64 encode.
+            # We need to deserialize the base64 to get the bytes.
+            # We can't update an existing edges content after added.
+            # if edge_type == EdgeType.ACL:
+            #     content = str_to_bytes(content)
+
+            # Connect this vertex to the head vertex. It belongs to that head vertex.
+            tail.belongs_to(
+                vertex=head,
+                edge_type=edge_type,
+                # content is encrypted
+                content=content,
+                path=data.path,
+                modified=False,
+                from_load=True
+            )
+
+    def _load_data_edge(self, data: DAGData):
+
+        """
+        Add a DATA edge, from the graph stream, to the graph.
+
+        :param data: The edge from the web service.
+        """
+
+        # Get the tail vertex.
+        tail_uid = data.ref.get("value")
+        # We want to store this edge in the Vertex with the same value/UID as the ref.
+        if tail_uid not in self._uid_lookup:
+            self.debug(f"    * tail vertex {tail_uid} does not exists. create.", level=3)
+            self.add_vertex(
+                uid=tail_uid,
+                name=data.ref.get("name"),
+
+                # This will be 0/GENERAL right now. We do the lookup just in case things will change in the
+                # future.
+                vertex_type=RefType.find_enum(data.ref.get("type"))
+            )
+        tail = self.get_vertex(tail_uid)
+
+        self.debug(f"  * DATA edge belongs to {tail.uid}", level=3)
+        tail.add_data(
+            # content is encrypted
+            content=data.content,
+            path=data.path,
+            modified=False,
+            from_load=True,
+        )
 
     def _load(self, sync_point: int = 0):
 
@@ -391,11 +577,15 @@ class DAG:
         Load the DAG
 
         This will clear the existing graph.
-        It will make web services calls to get the fresh graph, which will return a list of edges.
-        With the list of edges, it will create vertices and connect them with the edges.
+        It will make web services calls to get the fresh graph, which will return pages of edges.
+        With the edges, it will create vertices and connect them with the edges.
         The content of the edges will remain encrypted. The 'encrypted' flag is set to True.
         We need the entire graph structure before decrypting.
 
+        The non-DATA edges are applied as each page arrives, so the graph stream is not held in memory.
+        The DATA edges are applied after the structure of the graph is complete, since adding DATA depends on
+        the vertex being active.
+
         We don't have to worry about keys at this point. We are just trying to get structure
         and content in the right place. Nothing is decrypted here.
 
@@ -407,127 +597,30 @@ class DAG:
         self._uid_lookup = {}  # type: dict[str, int]
 
         self.debug("# SYNC THE GRAPH ##################################################################", level=1)
-
-        # Make the web service call to set all the data
-        all_data, sync_point = self._sync(sync_point=sync_point)
-
         self.debug("  PROCESS the non-DATA edges", level=2)
 
-        # Process the non-DATA edges
-        for data in all_data:
-
-            # Skip all the DATA edge
-            edge_type = EdgeType.find_enum(data.type)
-            if edge_type == EdgeType.DATA:
-                continue
-
-            # The ref the tail. It connects to stored in the vertex.
-            tail_uid = data.ref.get("value")
-
-            # The parentRef is the head. It's the arrowhead on the edge. For DATA edges, it will be None.
-            head_uid = None
-            if data.parentRef is not None:
-                head_uid = data.parentRef.get("value")
-
-            self.debug(f"  * edge {edge_type}, tail {tail_uid} to head {head_uid}", level=3)
-
-            # We want to store this edge in the Vertex with the same value/UID as the ref.
-            if self.vertex_exists(tail_uid) is False:
-                self.debug(f"    * tail vertex {tail_uid} does not exists. create.", level=3)
-                self.add_vertex(
-                    uid=tail_uid,
-                    name=data.ref.get("name"),
-
-                    # This will be 0/GENERAL right now. We do the lookup just in case things will change in the
-                    # future.
-                    vertex_type=RefType.find_enum(data.ref.get("type"))
-                )
-
-            # Get the tail vertex.
-            tail = self.get_vertex(tail_uid)
-
-            # This most likely is a DELETION edge of a DATA edge.
-            # Set the head to be the same as the tail.
-            if head_uid is None:
-                head_uid = tail_uid
-
-            # If the head vertex doesn't exist, we need to create.
-            if self.vertex_exists(head_uid) is False:
-                self.debug(f"    * head vertex {head_uid} does not exists. create.", level=3)
-                self.add_vertex(
-                    uid=head_uid,
-                    name=data.parentRef.get("name"),
-                    vertex_type=RefType.GENERAL
-                )
-            # Get the head vertex, which will exist now.
-            head = self.get_vertex(head_uid)
-            self.debug(f"    * tail {tail_uid} belongs to {head_uid}, "
-                       f"edge type {edge_type}", level=3)
-
-            if edge_type == EdgeType.DELETION:
-                tail.disconnect_from(head)
-            else:
-                if data.content is not None:
-                    content = str_to_bytes(data.content)
-                else:
-                    content = None
-
-                # ACL are decrypted, but it is base64 encode.
-                # We need to deserialize the base64 to get the bytes.
-                # We can't update an existing edges content after added.
-                # if edge_type == EdgeType.ACL:
-                #     content = str_to_bytes(content)
-
-                # Connect this vertex to the head vertex. It belongs to that head vertex.
-                tail.belongs_to(
-                    vertex=head,
-                    edge_type=edge_type,
-                    # content is encrypted
-                    content=content,
-                    path=data.path,
-                    modified=False,
-                    from_load=True
-                )
+        # Make the web service calls to get the data, processing the non-DATA edges as the pages arrive.
+        data_edges = []  # type: List[DAGData]
+        last_sync_point = 0
+        for page, last_sync_point in self._sync_pages_with_snapshot(sync_point=sync_point):
+            for data in page:
+                edge_type = EdgeType.find_enum(data.type)
+                if edge_type == EdgeType.DATA:
+                    data_edges.append(data)
+                    continue
+                self._load_edge(data, edge_type)
 
         self.debug("", level=2)
         self.debug("  PROCESS the DATA edges", level=2)
 
         # Process the DATA edges
         # We don't have to worry about vertex creation since they will all exist.
-        for data in all_data:
-
-            # Only process the data edges.
-            edge_type = EdgeType.find_enum(data.type)
-            if edge_type != EdgeType.DATA:
-                continue
-
-            # Get the tail vertex.
-            tail_uid = data.ref.get("value")
-            # We want to store this edge in the Vertex with the same value/UID as the ref.
-            if self.vertex_exists(tail_uid) is False:
-                self.debug(f"    * tail vertex {tail_uid} does not exists. create.", level=3)
-                self.add_vertex(
-                    uid=tail_uid,
-                    name=data.ref.get("name"),
-
-                    # This will be 0/GENERAL right now. We do the lookup just in case things will change in the
-                    # future.
-                    vertex_type=RefType.find_enum(data.ref.get("type"))
-                )
-            tail = self.get_vertex(tail_uid)
-
-            self.debug(f"  * DATA edge belongs to {tail.uid}", level=3)
-            tail.add_data(
-                # content is encrypted
-                content=data.content,
-                path=data.path,
-                modified=False,
-                from_load=True,
-            )
+        for data in data_edges:
+            self._load_data_edge(data)
 
         self.debug("", level=1)
 
-        return sync_point
+        return last_sync_point
 
     def _mark_deletion(self):
 
@@ -565,87 +658,177 @@ class DAG:
 
         self.debug("", level=1)
 
+    def _decrypt_vertex_keychain(self, v: DAGVertex, head_keychains: dict) -> List[bytes]:
+
+        """
+        Decrypt the KEY edges of a vertex.
+
+        The keychains of the head vertices need to be decrypted first.
+        If a head vertex has no KEY edges, the record key bytes are used.
+
+        :param v: The vertex with KEY edges.
+        :param head_keychains: The decrypted keychains, by vertex UID.
+        :return: The decrypted keychain of the vertex.
+        """
+
+        self.debug(f"  * looking at {v.uid}", level=3)
+        for e in v.edges:
+            if e.edge_type != EdgeType.KEY:
+                continue
+
+            self.debug(f"    has edge that is a key, check head vertex {e.head_uid}", level=3)
+            keychain = head_keychains.get(e.head_uid, [self.key])
+
+            self.debug(f"  * decrypt {v.uid} with keys {keychain}", level=3)
+            was_able_to_decrypt = False
+
+            # Try the keys in the keychain. One should be able to decrypt the content.
+            for key in keychain:
+                try:
+                    # The edge will contain a single key.
+                    self.debug(f"    decrypt with key {key}", level=3)
+                    content = decrypt_aes(e.content, key)
+                    self.debug(f"    content {content}", level=3)
+                    v.add_to_keychain(content)
+                    self.debug(f"  * vertex {v.uid} keychain is {v.keychain}", level=3)
+                    was_able_to_decrypt = True
+                    break
+                except (Exception,):
+                    self.debug(f"      !! this is not the key", level=3)
+
+            if was_able_to_decrypt is False:
+
+                # Flag that the edge is corrupt, flag that the vertex keychain is corrupt,
+                #   and store vertex UID/tail UID.
+                # If we fail on corrupt keys, then raise exceptions.
+                e.corrupt = True
+                v.corrupt = True
+                self.corrupt_uids.append(v.uid)
+                if self.fail_on_corrupt is True:
+                    raise DAGKeyException(f"Could not decrypt vertex {v.uid} keychain for edge path {e.path}")
+                return []
+
+        return v.keychain
+
     def _decrypt_keychain(self):
 
         """
         Decrypt KEY/ACL edges
 
         Part one is to decrypt the KEY and ACL edges.
-        To decrypt the edge, we need to walk up the edges until we can no longer.
-        If we get the point where we can't walk up any farther, we need to use the record key bytes.
-        While walking up, if we get to a keychain that has been decrypted, we return that keychain.
-        As we walk back, we can decrypt any keychain that is still encrypted.
+        A vertex's key is encrypted with the key of the vertex its KEY edge points at.
+        If that vertex has no KEY edges, the record key bytes are used.
+
+        The vertices are decrypted level by level, starting with vertices that only belong to vertices without
+        KEY edges.
+        Vertices in the same level do not depend on each other, so they are decrypted in parallel.
         The decrypt keychain is set in the vertex.
         """
 
         self.debug("  DECRYPT the dag KEY edges", level=1)
 
-        def _get_keychain(v):
-            self.debug(f"  * looking at {v.uid}", level=3)
-
-            # If the vertex has a decrypted key, then return it.
-            if v.has_decrypted_keys is True:
-                self.debug("  found a decrypted keychain on vertex", level=3)
-                return v.keychain
-
-            # Else we need KEY/ACL edge and get the key from the vertex that this vertex belongs to
-            found_key_edge = False
-            for e in v.edges:
-                if e.edge_type == EdgeType.KEY:
-
-                    self.debug(f"    has edge that is a key, check head vertex {e.head_uid}", level=3)
-                    head = self.get_vertex(e.head_uid)
-                    keychain = _get_keychain(head)
-
-                    # No need to check if keychain exists.
-                    # At default, it should contain the record bytes if no KEY/ACL edges existed for a vertex.
-
-                    self.debug(f"  * decrypt {v.uid} with keys {keychain}", level=3)
-                    was_able_to_decrypt = False
-
-                    # Try the keys in the keychain. One should be able to decrypt the content.
-                    for key in keychain:
-                        try:
-                            # The edge will contain a single key.
-                            # Adding a key to
-                            self.debug(f"    decrypt with key {key}", level=3)
-                            content = decrypt_aes(e.content, key)
-                            self.debug(f"    content {content}", level=3)
-                            v.add_to_keychain(content)
-                            self.debug(f"  * vertex {v.uid} keychain is {v.keychain}", level=3)
-                            was_able_to_decrypt = True
-                            found_key_edge = True
-                            break
-                        except (Exception,):
-                            self.debug(f"      !! this is not the key", level=3)
-
-                    if was_able_to_decrypt is False:
-
-                        # Flag that the edge is corrupt, flag that the vertex keychain is corrupt,
-                        #   and store vertex UID/tail UID.
-                        # If we fail on corrupt keys, then raise exceptions.
-                        e.corrupt = True
-                        v.corrupt = True
-                        self.corrupt_uids.append(v.uid)
-                        if self.fail_on_corrupt is True:
-                            raise DAGKeyException(f"Could not decrypt vertex {v.uid} keychain for edge path {e.path}")
-                        return []
-
-            if found_key_edge is True:
-                return v.keychain
-            else:
-                self.debug("  * using record bytes", level=3)
-                return [self.key]
-
+        # For each vertex with KEY edges, the head vertices that have KEY edges and need to be decrypted first.
+        pending = {}  # type: dict[str, set]
         for vertex in self.all_vertices:
             if vertex.has_key is False:
                 continue
-            self.debug(f"vertex {vertex.uid}, {vertex.has_key}, {vertex.has_decrypted_keys}", level=3)
-            vertex.keychain = _get_keychain(vertex)
-            self.debug(f"  setting keychain to {vertex.keychain}", level=3)
+            pending[vertex.uid] = set()
+            for edge in vertex.edges:
+                if edge.edge_type == EdgeType.KEY and edge.head_uid != vertex.uid:
+                    head = self.get_vertex(edge.head_uid)
+                    if head is not None and head.has_key is True:
+                        pending[vertex.uid].add(edge.head_uid)
+
+        keychains = {}  # type: dict[str, List[bytes]]
+
+        def _decrypt(uids: List[str]):
+            return [self._decrypt_vertex_keychain(self.get_vertex(uid), keychains) for uid in uids]
+
+        executor = None
+        if len(pending) >= DAG.KEYCHAIN_PARALLEL_MIN:
+            executor = ThreadPoolExecutor(max_workers=DAG.KEYCHAIN_DECRYPT_WORKERS)
+        try:
+            while len(pending) > 0:
+                level = [uid for uid, heads in pending.items() if heads.issubset(keychains)]
+
+                # A KEY edge cycle; the keys cannot be decrypted in order.
+                if len(level) == 0:
+                    self.debug(f"  KEY edges of {len(pending)} vertices have a cycle", level=1)
+                    level = list(pending)
+
+                self.debug(f"  decrypt level with {len(level)} vertices", level=2)
+                if executor is not None and len(level) >= DAG.KEYCHAIN_PARALLEL_MIN:
+                    # One chunk of the level per worker.
+                    chunk_size = -(-len(level) // DAG.KEYCHAIN_DECRYPT_WORKERS)
+                    chunks = [level[i:i + chunk_size] for i in range(0, len(level), chunk_size)]
+                    results = [keychain for chunk in executor.map(_decrypt, chunks) for keychain in chunk]
+                else:
+                    results = _decrypt(level)
+
+                for uid, keychain in zip(level, results):
+                    vertex = self.get_vertex(uid)
+                    vertex.keychain = keychain
+                    self.debug(f"vertex {uid} setting keychain to {vertex.keychain}", level=3)
+                    keychains[uid] = keychain
+                    del pending[uid]
+        finally:
+            if executor is not None:
+                executor.shutdown()
 
         self.debug("", level=1)
 
+    def decrypt_edge_content(self, edge: DAGEdge):
+
+        """
+        Decrypt the content of a DATA edge.
+
+        After loading, the DATA edge content is decrypted when it is first accessed.
+        The keychain of the edge's vertex is used.
+
+        :param edge: The DATA edge.
+        """
+
+        with self._decrypt_lock:
+            if edge.decrypt_pending is False:
+                return
+            edge.decrypt_pending = False
+            self._decrypt_data_edge(edge.vertex, edge)
+
+    def _decrypt_data_edge(self, vertex: DAGVertex, edge: DAGEdge):
+
+        content = edge.content
+        if isinstance(content, bytes) is True:
+            raise ValueError("The content has already been decrypted.")
+
+        self.debug(f"  * enc safe content {content}", level=3)
+        if isinstance(content, str):
+            content = str_to_bytes(content)
+        self.debug(f"  * enc {content}, enc key {vertex.keychain}", level=3)
+        able_to_decrypt = False
+
+        keychain = vertex.keychain
+
+        # Try the keys in the keychain. One should be able to decrypt the content.
+        for key in keychain:
+            try:
+                edge.content = decrypt_aes(content, key)
+                able_to_decrypt = True
+                self.debug(f"  * content {edge.content}", level=3)
+                break
+            except (Exception,):
+                self.debug(f"      !! this is not the key", level=3)
+
+        if able_to_decrypt is False:
+
+            # If the DATA edge requires encryption, throw error if we cannot decrypt.
+            if self.data_requires_encryption is True:
+                self.corrupt_uids.append(vertex.uid)
+                raise DAGDataException(f"The data edge {vertex.uid} could not be decrypted.")
+
+            edge.content = content
+            edge.needs_encryption = False
+            self.debug(f"  * edge is not encrypted or key is incorrect.")
+
     def _decrypt_data(self):
 
         """
@@ -653,7 +836,9 @@ class DAG:
 
         At this point, all the vertex should have an encrypted key.
         This key is used to decrypt the DATA edge's content.
-        Walk each vertex and decrypt the DATA edge if there is a DATA edge.
+        Walk each vertex and flag the DATA edges to be decrypted when the content is first accessed.
+        If the DATA edges require encryption, they are decrypted now, so an edge that cannot be decrypted fails
+        the load.
         """
 
         self.debug("  DECRYPT the dag data", level=1)
@@ -672,38 +857,10 @@ class DAG:
                                       "cannot decrypt data.")
                     continue
 
-                content = edge.content
-                if isinstance(content, bytes) is True:
-                    raise ValueError("The content has already been decrypted.")
-
-                self.debug(f"  * enc safe content {content}", level=3)
-                if isinstance(content, str):
-                    content = str_to_bytes(content)
-                self.debug(f"  * enc {content}, enc key {vertex.keychain}", level=3)
-                able_to_decrypt = False
-
-                keychain = vertex.keychain
-
-                # Try the keys in the keychain. One should be able to decrypt the content.
-                for key in keychain:
-                    try:
-                        edge.content = decrypt_aes(content, key)
-                        able_to_decrypt = True
-                        self.debug(f"  * content {edge.content}", level=3)
-                        break
-                    except (Exception,):
-                        self.debug(f"      !! this is not the key", level=3)
-
-                if able_to_decrypt is False:
-
-                    # If the DATA edge requires encryption, throw error if we cannot decrypt.
-                    if self.data_requires_encryption is True:
-                        self.corrupt_uids.append(vertex.uid)
-                        raise DAGDataException(f"The data edge {vertex.uid} could not be decrypted.")
-
-                    edge.content = content
-                    edge.needs_encryption = False
-                    self.debug(f"  * edge is not encrypted or key is incorrect.")
+                if self.data_requires_encryption is True:
+                    self._decrypt_data_edge(vertex, edge)
+                else:
+                    edge.decrypt_pending = True
 
         self.debug("", level=1)
 
@@ -726,7 +883,7 @@ class DAG:
 
         The first step is to recreate the structure of the graph.
         The second step is mark vertex as deleted.
-        The third step is to decrypt the KEY/ACL/DATA edges.
+        The third step is to decrypt the KEY/ACL edges. DATA edges are decrypted when their content is accessed.
         Forth is to flag all edges as not modified.
 
         :return: The sync point of the graph stream
@@ -972,43 +1129,98 @@ class DAG:
             self.debug(f"total list has {len(data_list)} items", level=0)
             self.debug(f"batch {self.save_batch_count} edges", level=0)
 
+            # The structure (non-DATA edges) is saved first, in order, since the web service uses the existing
+            #   edges to find the stream id of the edges that follow.
+            # Once the structure exists, DATA edges of different vertices do not depend on each other and their
+            #   batches are sent concurrently.
+            # A vertex may have more than one new DATA edge; the last one is its current data.
+            #   The DATA edges are sent in rounds: the first new DATA edge of each vertex, then the second, ...
+            #   Rounds are sent one after the other, so the edges of a vertex are stored in order.
+            # A vertex with a DELETION edge keeps all of its edges in the structure, in order; a DATA edge sent
+            #   after the DELETION edge would make the vertex active again.
+            deleted_uids = {data.ref.value for data in data_list if data.type == EdgeType.DELETION}
+            structure_list = [data for data in data_list
+                              if data.type != EdgeType.DATA or data.ref.value in deleted_uids]
+            data_edge_rounds = self._make_data_rounds([data for data in data_list
+                                                       if data.type == EdgeType.DATA
+                                                       and data.ref.value not in deleted_uids])
+
+            # If not saving in batches, send the structure and DATA edges together.
+            if self.save_batch_count <= 0:
+                structure_batches = [structure_list + [data for data_round in data_edge_rounds
+                                                       for data in data_round]]
+                data_edge_rounds = []
+            else:
+                structure_batches = self._make_batches(structure_list)
+
             batch_num = 0
-            while len(data_list) > 0:
+            for batch_list in structure_batches:
+                self._add_batch(batch_list, batch_num)
+                batch_num += 1
 
-                # If using batch add, then take the first batch_count items.
-                # Remove them from the data list
-                if self.save_batch_count > 0:
-                    batch_list = data_list[:self.save_batch_count]
-                    data_list = data_list[self.save_batch_count:]
+            for data_round in data_edge_rounds:
+                data_edge_batches = self._make_batches(data_round)
+                if len(data_edge_batches) > 1:
+                    workers = min(DAG.SAVE_WORKERS, len(data_edge_batches))
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        futures = [executor.submit(self._add_batch, batch_list, batch_num + index)
+                                   for index, batch_list in enumerate(data_edge_batches)]
+                        errors = [future.exception() for future in futures]
+                    errors = [err for err in errors if err is not None]
+                    if len(errors) > 0:
+                        raise errors[0]
+                elif len(data_edge_batches) == 1:
+                    self._add_batch(data_edge_batches[0], batch_num)
+                batch_num += len(data_edge_batches)
 
-                # Else take everything and clear the data list (else infinite loop)
-                else:
-                    batch_list = data_list
-                    data_list = []
+        else:
+            self.debug("data list was empty, not saving.", level=2)
 
-                # Little sanity check
-                if len(batch_list) == 0:
-                    break
+        self.debug("====================================================================================", level=2)
 
-                self.debug(f"adding {len(batch_list)} edges, batch {batch_num}", level=0)
-                payload = DataPayload(
-                    origin=self.origin_ref,
-                    dataList=batch_list,
-                    graphId=self.graph_id
-                )
+    def _make_batches(self, data_list: List[DAGData]) -> List[List[DAGData]]:
+
+        """
+        Split the edges into batches of save_batch_count edges.
+        """
 
-                self.debug("PAYLOAD; batch {batch_num} =======================", level=5)
-                self.debug(payload.model_dump_json(), level=5)
-                self.debug("==================================================", level=5)
+        return [data_list[index:index + self.save_batch_count]
+                for index in range(0, len(data_list), self.save_batch_count)]
 
-                self.conn.add_data(payload)
-                batch_num += 1
+    @staticmethod
+    def _make_data_rounds(data_list: List[DAGData]) -> List[List[DAGData]]:
 
-                # It's a POST that returns no data
-        else:
-            self.debug("data list was empty, not saving.", level=2)
+        """
+        Split the DATA edges into rounds, where each round has at most one DATA edge per vertex.
 
-        self.debug("====================================================================================", level=2)
+        The n-th DATA edge of a vertex is in the n-th round.
+        """
+
+        rounds = []  # type: List[List[DAGData]]
+        edge_count = {}  # type: Dict[str, int]
+        for data in data_list:
+            index = edge_count.get(data.ref.value, 0)
+            edge_count[data.ref.value] = index + 1
+            if index == len(rounds):
+                rounds.append([])
+            rounds[index].append(data)
+        return rounds
+
+    def _add_batch(self, batch_list: List[DAGData], batch_num: int):
+
+        self.debug(f"adding {len(batch_list)} edges, batch {batch_num}", level=0)
+        payload = DataPayload(
+            origin=self.origin_ref,
+            dataList=batch_list,
+            graphId=self.graph_id
+        )
+
+        self.debug(f"PAYLOAD; batch {batch_num} =======================", level=5)
+        self.debug(payload.model_dump_json(), level=5)
+        self.debug("==================================================", level=5)
+
+        # It's a POST that returns no data
+        self.conn.add_data(payload)
 
     def do_auto_save(self):
         # If allow_auto_save is False, we will not allow auto saving.
@@ -1045,7 +1257,7 @@ class DAG:
             keychain=keychain,
             vertex_type=vertex_type
         )
-        if self.vertex_exists(vertex.uid) is True:
+        if vertex.uid in self._uid_lookup:
             raise DAGVertexAlreadyExistsException(f"Vertex {vertex.uid} already exists.")
 
         # Set the UID to array index lookup.
@@ -1120,34 +1332,31 @@ class DAG:
         return True
 
     def search_content(self, query, ignore_case: bool = False):
+        if isinstance(query, (bytes, str, dict)) is False:
+            raise ValueError("Query is not an accepted type.")
+
+        # The decoded content is cached on the DATA edge, so the content is only decoded once, not per query.
         results = []
         for vertex in self.vertices:
-            if vertex.has_data is False or vertex.active is False:
+            data_edge = vertex.get_data()
+            if data_edge is None:
                 continue
-            content = vertex.content
             if isinstance(query, bytes) is True:
-                if query == content:
+                if query == data_edge.content:
                     results.append(vertex)
             elif isinstance(query, str) is True:
-                try:
-                    content = content.decode()
-                    if query in content:
-                        results.append(vertex)
+                content = data_edge.decoded_content
+                if content is not None and query in content:
+                    results.append(vertex)
+            else:
+                content = data_edge.decoded_content_dict
+                if content is None:
                     continue
-
-                except (Exception,):
-                    pass
-            elif isinstance(query, dict) is True:
                 try:
-                    content = content.decode()
-                    content = json.loads(content)
-                    search_result = self._search(content, value=query, ignore_case=ignore_case)
-                    if search_result is True:
+                    if self._search(content, value=query, ignore_case=ignore_case) is True:
                         results.append(vertex)
                 except (Exception,):
                     pass
-            else:
-                raise ValueError("Query is not an accepted type.")
         return results
 
     def walk_down_path(self, path: Union[str, List[str]]) -> Optional[DAGVertex]:
@@ -12,6 +12,9 @@ if TYPE_CHECKING:
     import pydantic
     from pydantic import BaseModel
 
+# Marks decoded content that has not been cached yet.
+_NOT_DECODED = object()
+
 
 class DAGEdge:
     def __init__(self, vertex: DAGVertex, edge_type: EdgeType, head_uid: str, version: int = 0,
@@ -63,7 +66,15 @@ class DAGEdge:
         # If the content could not be decrypted, set
         self.corrupt = False
 
+        # If True, the content is encrypted and will be decrypted by the DAG when first accessed.
+        self.decrypt_pending = False
+
         self._content = None  # type: Optional[Any]
+
+        # Memoized decoded content, used when searching the graph. Reset when the content is set.
+        self._decoded_content = _NOT_DECODED  # type: Any
+        self._decoded_content_dict = _NOT_DECODED  # type: Any
+
         self.content = content
         self.path = path
 
@@ -101,6 +112,8 @@ class DAGEdge:
 
         If the content is a str, then the content is encrypted.
         """
+        if self.decrypt_pending is True:
+            self.vertex.dag.decrypt_edge_content(self)
         return self._content
 
     @property
@@ -109,7 +122,7 @@ class DAGEdge:
         Get the content from the DATA edge as a dictionary.
         :return: Content as a dictionary.
         """
-        content = self._content
+        content = self.content
         if content is not None:
             try:
                 content = json.loads(content)
@@ -123,7 +136,7 @@ class DAGEdge:
         Get the content from the DATA edge as string
         :return:
         """
-        content = self._content
+        content = self.content
         try:
             content = content.decode()
         except Exception as err:
@@ -143,6 +156,43 @@ class DAGEdge:
             content = meta_class.model_validate_json(self.content_as_str)
         return content
 
+    @property
+    def decoded_content(self) -> Optional[str]:
+        """
+        Get the content decoded as a str.
+
+        The decoded value is cached, so repeated searches do not decode the content again.
+        If the content cannot be decoded, None is returned.
+        """
+        if self._decoded_content is _NOT_DECODED:
+            self._decoded_content = None
+            content = self.content
+            if isinstance(content, bytes) is True:
+                try:
+                    self._decoded_content = content.decode()
+                except (Exception,):
+                    pass
+        return self._decoded_content
+
+    @property
+    def decoded_content_dict(self) -> Optional[Any]:
+        """
+        Get the content decoded as JSON.
+
+        The decoded value is cached and shared between calls; do not modify it.
+        Use content_as_dict to get a copy that can be modified.
+        If the content is not JSON, None is returned.
+        """
+        if self._decoded_content_dict is _NOT_DECODED:
+            self._decoded_content_dict = None
+            content = self.decoded_content
+            if content is not None:
+                try:
+                    self._decoded_content_dict = json.loads(content)
+                except (Exception,):
+                    pass
+        return self._decoded_content_dict
+
     @content.setter
     def content(self, value: Any):
 
@@ -157,6 +207,9 @@ class DAGEdge:
         self.debug(f"vertex {self.vertex.uid}, type {self.vertex.dag.__class__.EDGE_LABEL.get(self.edge_type)}, "
                    f"head {self.head_uid} setting content", level=2)
 
+        self._decoded_content = _NOT_DECODED
+        self._decoded_content_dict = _NOT_DECODED
+
         # If the data is encrypted, set it.
         # Don't try to make it bytes.
         # Also don't set the modified flag to True.
@@ -198,7 +251,7 @@ class DAGEdge:
         for edge in self.vertex.edges:
             edge.active = False
 
-        self.vertex.edges.append(
+        self.vertex.add_edge(
             DAGEdge(
                 vertex=self.vertex,
                 edge_type=EdgeType.DELETION,
@@ -0,0 +1,96 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+from .types import SyncDataItem
+from typing import Optional, List, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    Logger = Union[logging.RootLogger, logging.Logger]
+
+
+class DAGSnapshot:
+
+    """
+    Local copy of a graph stream.
+
+    The snapshot stores the edges exactly as the web service returned them, along with the last sync point.
+    KEY and DATA edge content stays encrypted; keys are decrypted again when the graph is loaded.
+    When the graph is loaded, only edges newer than the stored sync point need to be requested.
+    Snapshots are kept per context, the server and account of the connection, so switching accounts or
+    regions never loads a graph stream of another context.
+    """
+
+    VERSION = 1
+
+    def __init__(self, snapshot_dir: str, stream_id: str, graph_id: int = 0, logger: Optional[Logger] = None,
+                 context: str = ""):
+        if logger is None:
+            logger = logging.getLogger()
+        self.logger = logger
+        self.snapshot_dir = snapshot_dir
+        self.stream_id = stream_id
+        self.graph_id = graph_id
+        self.context = context
+
+    @property
+    def file_name(self) -> str:
+        context_id = hashlib.sha256(self.context.encode()).hexdigest()[:16]
+        return os.path.join(self.snapshot_dir, f"dag_{context_id}_{self.stream_id}_{self.graph_id}.json")
+
+    def load(self) -> Tuple[List[SyncDataItem], int]:
+
+        """
+        Load the stored edges.
+
+        If the snapshot does not exist, or cannot be read, an empty edge list and a sync point of 0 are returned.
+        This will cause a full sync of the graph.
+
+        :return: List of edges and the sync point of the last edge.
+        """
+
+        if os.path.isfile(self.file_name) is False:
+            return [], 0
+        try:
+            with open(self.file_name, "r") as fh:
+                snapshot = json.load(fh)
+            if snapshot.get("version") != DAGSnapshot.VERSION:
+                return [], 0
+            data = [SyncDataItem.model_validate(item) for item in snapshot.get("data", [])]
+            return data, snapshot.get("syncPoint", 0)
+        except Exception as err:
+            self.logger.debug(f"could not load the DAG snapshot {self.file_name}: {err}")
+            return [], 0
+
+    def save(self, data: List[SyncDataItem], sync_point: int):
+
+        """
+        Store the edges and sync point.
+
+        The file is written to a temporary file and then renamed, so an interrupted save will not corrupt the
+        existing snapshot.
+
+        :param data: All edges of the graph stream, in sync point order.
+        :param sync_point: The sync point of the last edge.
+        """
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        snapshot = {
+            "version": DAGSnapshot.VERSION,
+            "streamId": self.stream_id,
+            "graphId": self.graph_id,
+            "syncPoint": sync_point,
+            "data": [item.model_dump() for item in data]
+        }
+        temp_file_name = self.file_name + ".tmp"
+        with open(temp_file_name, "w") as fh:
+            json.dump(snapshot, fh)
+        os.chmod(temp_file_name, 0o600)
+        os.replace(temp_file_name, self.file_name)
+
+    def clear(self):
+        try:
+            os.unlink(self.file_name)
+        except (Exception,):
+            pass
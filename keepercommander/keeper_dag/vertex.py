@@ -3,7 +3,7 @@ from .edge import DAGEdge
 from .types import EdgeType, RefType
 from .crypto import generate_random_bytes, generate_uid_str, urlsafe_str_to_bytes
 from .exceptions import DAGDeletionException, DAGIllegalEdgeException, DAGVertexException, DAGKeyException
-from typing import Optional, Union, List, Any, TYPE_CHECKING
+from typing import Optional, Union, List, Dict, Tuple, Any, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from .dag import DAG
@@ -64,6 +64,14 @@ class DAGVertex:
         self.edges = []
         self.has_uid = []
 
+        # Lookups for the edges, by the head UID and by the head UID and edge type.
+        # Edges are only added using add_edge() and removed using remove_edge(), which keep these in sync.
+        self._head_edges = {}  # type: Dict[str, List[DAGEdge]]
+        self._type_edges = {}  # type: Dict[Tuple[str, EdgeType], List[DAGEdge]]
+
+        # Lookup for the has_uid list; the vertices that have an edge pointing at this vertex.
+        self._has_uid_lookup = set()
+
         # Flag indicating that this vertex is active.
         # This means this vertex has an active edge connected to another vertex.
         self.active = True
@@ -218,16 +226,44 @@ class DAGVertex:
         """
         return self._uid
 
+    def add_edge(self, edge: DAGEdge):
+        """
+        Append an edge to this vertex and add it to the edge lookups.
+
+        :param edge: The DAGEdge instance, which tail is this vertex.
+        """
+        self.edges.append(edge)
+        self._head_edges.setdefault(edge.head_uid, []).append(edge)
+        self._type_edges.setdefault((edge.head_uid, edge.edge_type), []).append(edge)
+
+    def remove_edge(self, edge: DAGEdge):
+        """
+        Remove an edge from this vertex and from the edge lookups.
+
+        :param edge: The DAGEdge instance, which tail is this vertex.
+        """
+        self.edges.remove(edge)
+        self._head_edges[edge.head_uid].remove(edge)
+        self._type_edges[(edge.head_uid, edge.edge_type)].remove(edge)
+
+    def add_has_uid(self, uid: str):
+        """
+        Record that the vertex with the UID has an edge that points at this vertex.
+
+        :param uid: The tail UID of the edge.
+        """
+        if uid not in self._has_uid_lookup:
+            self._has_uid_lookup.add(uid)
+            self.has_uid.append(uid)
+
     def get_edge(self, vertex: DAGVertex, edge_type: EdgeType) -> DAGEdge:
         high_edge = None
         high_version = -1
-        for edge in self.edges:
-            # Get all the edge point at the same vertex.
-            # Don't include DATA edges.
-            if edge.head_uid == vertex.uid and edge.edge_type == edge_type:
-                if edge.version > high_version:
-                    high_version = edge.version
-                    high_edge = edge
+        # Get all the edge point at the same vertex.
+        for edge in self._type_edges.get((vertex.uid, edge_type), []):
+            if edge.version > high_version:
+                high_version = edge.version
+                high_edge = edge
         return high_edge
 
     def get_highest_edge_version(self, head_uid: str) -> (int, Optional[DAGEdge]):
@@ -240,13 +276,11 @@ class DAGVertex:
 
         high_edge = None
         high_version = -1
-        for edge in self.edges:
-            # Get all the edge point at the same vertex.
-            # Don't include DATA edges.
-            if edge.head_uid == head_uid:
-                if edge.version > high_version:
-                    high_edge = edge
-                    high_version = edge.version
+        # Get all the edge point at the same vertex.
+        for edge in self._head_edges.get(head_uid, []):
+            if edge.version > high_version:
+                high_edge = edge
+                high_version = edge.version
         return high_version, high_edge
 
     def edge_count(self, vertex: DAGVertex, edge_type: EdgeType) -> int:
@@ -257,18 +291,10 @@ class DAGVertex:
         :param edge_type:
         :return:
         """
-        count = 0
-        for edge in self.edges:
-            if edge.head_uid == vertex.uid and edge.edge_type == edge_type:
-                count += 1
-        return count
+        return len(self._type_edges.get((vertex.uid, edge_type), []))
 
     def edge_by_type(self, vertex: DAGVertex, edge_type: EdgeType) -> List[DAGEdge]:
-        edge_list = []
-        for edge in self.edges:
-            if edge.edge_type == edge_type and edge.head_uid == vertex.uid:
-                edge_list.append(edge)
-        return edge_list
+        return list(self._type_edges.get((vertex.uid, edge_type), []))
 
     @property
     def has_data(self) -> bool:
@@ -279,10 +305,8 @@ class DAGVertex:
         :return: True if vertex has a DATA edge.
         """
 
-        for item in self.edges:
-            if item.edge_type == EdgeType.DATA:
-                return True
-        return False
+        # DATA edges always point back at this vertex.
+        return len(self._type_edges.get((self.uid, EdgeType.DATA), [])) > 0
 
     def get_data(self, index: Optional[int] = None) -> Optional[DAGEdge]:
         """
@@ -378,7 +402,7 @@ class DAGVertex:
             prior_data.active = False
 
         # The tail UID is the UID of the vertex. Since data loops back to the vertex, the head UID is the same.
-        self.edges.append(
+        self.add_edge(
             DAGEdge(
                 vertex=self,
                 edge_type=EdgeType.DATA,
@@ -400,7 +424,7 @@ class DAGVertex:
             while data_count > self.dag.history_level:
                 for index in range(0, len(self.edges) - 1):
                     if self.edges[index].edge_type == EdgeType.DATA:
-                        del self.edges[index]
+                        self.remove_edge(self.edges[index])
                         data_count -= 1
                         break
 
@@ -581,9 +605,8 @@ class DAGVertex:
         )
         edge.block_content_auto_save = False
 
-        self.edges.append(edge)
-        if self.uid not in vertex.has_uid:
-            vertex.has_uid.append(self.uid)
+        self.add_edge(edge)
+        vertex.add_has_uid(self.uid)
 
         self.dag.do_auto_save()
 
@@ -651,8 +674,14 @@ class DAGVertex:
                  False if it does not.
         """
 
-        vertices = self.has_vertices(edge_type=edge_type)
-        return vertex in vertices
+        # Check the single vertex, instead of building the list of all the vertices that belong to this vertex.
+        if vertex is None or vertex.uid not in self._has_uid_lookup:
+            return False
+        if vertex.uid == self.uid or self.dag.get_vertex(vertex.uid) is not vertex:
+            return False
+        if edge_type is not None:
+            return vertex.get_edge(self, edge_type=edge_type) is not None
+        return vertex.active is True
 
     def belongs_to_vertices(self) -> List[DAGVertex]:
         """
@@ -661,15 +690,17 @@ class DAGVertex:
         """
 
         vertices = []
-        for edge in self.edges:
+        for head_uid, edges in self._head_edges.items():
             # If the edge is not a DATA or DELETION type, and the edge is the highest version/active
-            if edge.edge_type != EdgeType.DATA and edge.edge_type != EdgeType.DELETION and edge.active is True:
-
-                # The head will point at the remote vertex.
-                # If it is active, and not already in the list, add it to the list of vertices this vertex belongs to.
-                vertex = self.dag.get_vertex(edge.head_uid)
-                if vertex.active is True and vertex not in vertices:
-                    vertices.append(vertex)
+            for edge in edges:
+                if edge.edge_type != EdgeType.DATA and edge.edge_type != EdgeType.DELETION and edge.active is True:
+
+                    # The head will point at the remote vertex.
+                    # If it is active, add it to the list of vertices this vertex belongs to.
+                    vertex = self.dag.get_vertex(head_uid)
+                    if vertex.active is True:
+                        vertices.append(vertex)
+                    break
         return vertices
 
     @property
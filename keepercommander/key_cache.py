@@ -0,0 +1,152 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2024 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Optional, Dict, Iterable
+
+from . import crypto, utils
+from .params import KeeperParams, PublicKeys
+
+# Cached user public keys and team keys are requested again when they are older than this.
+# Keys are dropped earlier only when they fail to load or the user leaves the team:
+# a user public key that is rotated on the server may be used until its cached copy expires.
+KEY_CACHE_TTL = 24 * 60 * 60
+
+# SQLite limits the number of host parameters in a statement
+KEY_CACHE_QUERY_CHUNK_SIZE = 500
+
+
+class KeyCacheStore:
+    """Local encrypted cache of user public keys and team keys
+
+    The store belongs to a Keeper account. Keys are encrypted with the account data key
+    and expire after KEY_CACHE_TTL.
+    The store is used from the background sync and run-batch worker threads: one connection is shared
+    and the lock serializes access to it.
+    """
+    def __init__(self, database_name, encryption_key, ttl=KEY_CACHE_TTL):   # type: (str, bytes, int) -> None
+        self.database_name = database_name
+        self.encryption_key = encryption_key
+        self.ttl = ttl
+        self._connection = None    # type: Optional[sqlite3.Connection]
+        self._lock = threading.RLock()
+        self.create_database()
+
+    def get_connection(self):   # type: () -> sqlite3.Connection
+        with self._lock:
+            if self._connection is None:
+                self._connection = sqlite3.connect(self.database_name, check_same_thread=False)
+            return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def create_database(self):
+        with self._lock:
+            connection = self.get_connection()
+            with closing(connection.cursor()) as cursor:
+                cursor.execute('CREATE TABLE IF NOT EXISTS public_key (key_id TEXT PRIMARY KEY, data BLOB, '
+                               'loaded INTEGER NOT NULL)')
+            connection.commit()
+
+    def clear(self):
+        with self._lock:
+            connection = self.get_connection()
+            with closing(connection.cursor()) as cursor:
+                cursor.execute('DELETE FROM public_key')
+            connection.commit()
+
+    def get_keys(self, key_ids):   # type: (Iterable[str]) -> Dict[str, PublicKeys]
+        """Returns the keys that are cached and not expired"""
+        key_ids = list(key_ids)
+        expired = int(time.time()) - self.ttl
+        result = {}    # type: Dict[str, PublicKeys]
+        invalid = []
+        rows = []
+        with self._lock, closing(self.get_connection().cursor()) as cursor:
+            for i in range(0, len(key_ids), KEY_CACHE_QUERY_CHUNK_SIZE):
+                chunk = key_ids[i:i + KEY_CACHE_QUERY_CHUNK_SIZE]
+                sql = f'SELECT key_id, data FROM public_key WHERE loaded > ? AND key_id IN ({",".join("?" * len(chunk))})'
+                rows.extend(cursor.execute(sql, [expired] + chunk))
+        for key_id, data in rows:
+            try:
+                keys = json.loads(crypto.decrypt_aes_v2(data, self.encryption_key))
+                result[key_id] = PublicKeys(**{k: utils.base64_url_decode(v) for k, v in keys.items()})
+            except Exception as e:
+                logging.debug('Key cache "%s": %s', key_id, e)
+                invalid.append(key_id)
+        if invalid:
+            self.delete_keys(invalid)
+        return result
+
+    def put_keys(self, keys):   # type: (Dict[str, PublicKeys]) -> None
+        loaded = int(time.time())
+        rows = []
+        for key_id, public_keys in keys.items():
+            data = json.dumps({k: utils.base64_url_encode(v) for k, v in public_keys._asdict().items() if v})
+            rows.append((key_id, crypto.encrypt_aes_v2(data.encode('utf-8'), self.encryption_key), loaded))
+        if not rows:
+            return
+        with self._lock:
+            connection = self.get_connection()
+            with closing(connection.cursor()) as cursor:
+                cursor.executemany('INSERT OR REPLACE INTO public_key (key_id, data, loaded) VALUES (?, ?, ?)', rows)
+            connection.commit()
+
+    def delete_keys(self, key_ids):   # type: (Iterable[str]) -> None
+        rows = [(x,) for x in key_ids]
+        if not rows:
+            return
+        with self._lock:
+            connection = self.get_connection()
+            with closing(connection.cursor()) as cursor:
+                cursor.executemany('DELETE FROM public_key WHERE key_id = ?', rows)
+            connection.commit()
+
+
+def get_key_store_name(config_filename, account_uid):   # type: (str, str) -> str
+    path = os.path.dirname(os.path.abspath(config_filename))
+    return os.path.join(path, f'key_cache_{account_uid}.db')
+
+
+def get_key_store(params):   # type: (KeeperParams) -> Optional[KeyCacheStore]
+    """Returns the key cache of the logged in account
+
+    The cache is kept next to the configuration file. There is no cache without one.
+    """
+    if params.key_store is None:
+        if not params.config_filename or not params.account_uid_bytes or not params.data_key:
+            return None
+        account_uid = utils.base64_url_encode(params.account_uid_bytes)
+        try:
+            params.key_store = KeyCacheStore(get_key_store_name(params.config_filename, account_uid), params.data_key)
+        except Exception as e:
+            logging.debug('Key cache is not available: %s', e)
+            return None
+    return params.key_store
+
+
+def invalidate_keys(params, key_ids):   # type: (KeeperParams, Iterable[str]) -> None
+    """Drops user or team keys that are no longer valid from memory and from the key cache"""
+    key_ids = list(key_ids)
+    for key_id in key_ids:
+        params.key_cache.pop(key_id, None)
+    store = get_key_store(params)
+    if store:
+        store.delete_keys(key_ids)
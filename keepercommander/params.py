@@ -7,9 +7,10 @@
 # Keeper Commander 
 # Contact: ops@keepersecurity.com
 #
+import threading
 import warnings
 from datetime import datetime
-from typing import Dict, NamedTuple, Optional, Set
+from typing import Dict, NamedTuple, Optional, Set, Union
 from urllib.parse import urlparse, urlunparse
 
 from urllib3.exceptions import InsecureRequestWarning
@@ -41,6 +42,7 @@ class RestApiContext:
         self.proxies = None
         self._certificate_check = True
         self.fail_on_throttle = False
+        self.throttle_count = 0
 
     def __get_server_base(self):
         return self.__server_base
@@ -119,6 +121,8 @@ class KeeperParams:
         self.record_rotation_cache = {}
         self.record_owner_cache = {}   # type: Dict[str, RecordOwner]
         self.key_cache = {}            # type: Dict[str, PublicKeys]
+        self.key_store = None
+        self.enterprise_team_index = None
         self.available_team_cache = None
         self.user_cache = {}
         self.subfolder_cache = {}
@@ -162,6 +166,11 @@ class KeeperParams:
         self.tunnel_threads = {}
         self.tunnel_threads_queue = {} # add ability to tail tunnel process
         self.forbid_rsa = False
+        self.background_sync = False    # type: Union[bool, int]
+        self.sync_worker = None
+        self.cache_gate = None
+        self.sync_lock = threading.RLock()    # sync_down may be called from several run-batch worker threads
+        self.share_index = None
         # TODO check if it can be deleted
         self.salt = None
         self.iterations = 0
@@ -194,6 +203,10 @@ class KeeperParams:
         self.record_owner_cache.clear()
         self.available_team_cache = None
         self.key_cache.clear()
+        if self.key_store:
+            self.key_store.close()
+            self.key_store = None
+        self.enterprise_team_index = None
         self.subfolder_cache .clear()
         self.subfolder_record_cache.clear()
         if self.folder_cache:
@@ -226,6 +239,10 @@ class KeeperParams:
         if self.ssh_agent:
             self.ssh_agent.close()
             self.ssh_agent = None
+        if self.sync_worker:
+            self.sync_worker.stop()
+            self.sync_worker = None
+        self.share_index = None
         self.tunnel_threads.clear()
         self.tunnel_threads_queue = {}
         self.forbid_rsa = False
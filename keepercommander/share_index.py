@@ -0,0 +1,190 @@
+#  _  __
+# | |/ /___ ___ _ __  ___ _ _ ®
+# | ' </ -_) -_) '_ \/ -_) '_|
+# |_|\_\___\___| .__/\___|_|
+#              |_|
+#
+# Keeper Commander
+# Copyright 2024 Keeper Security Inc.
+# Contact: ops@keepersecurity.com
+#
+
+import enum
+from typing import Dict, List, Set, Optional, Iterable
+
+from . import api
+from .params import KeeperParams
+from .subfolder import get_folder_path
+
+
+class ShareSource(enum.IntEnum):
+    Direct = 1
+    SharedFolder = 2
+    Team = 3
+
+
+class RecordShare:
+    """Effective access of a user or a team to a record"""
+    __slots__ = ('source', 'shared_to', 'team_uid', 'shared_folder_uid', 'can_edit', 'can_share', 'can_view',
+                 'expiration')
+
+    def __init__(self, source, shared_to, team_uid=None, shared_folder_uid=None, can_edit=False, can_share=False,
+                 can_view=True, expiration=0):
+        self.source = source                        # type: ShareSource
+        self.shared_to = shared_to                  # type: Optional[str]
+        self.team_uid = team_uid                    # type: Optional[str]
+        self.shared_folder_uid = shared_folder_uid  # type: Optional[str]
+        self.can_edit = can_edit                    # type: bool
+        self.can_share = can_share                  # type: bool
+        self.can_view = can_view                    # type: bool
+        self.expiration = expiration                # type: int
+
+
+class SharePermissionIndex:
+    """Record to share permission lookup
+
+    The index is built from the record share information (api.get_record_shares) and the shared folder
+    and team caches. sync_down invalidates the records, shared folders and teams that changed,
+    so the share information of the other records is not requested again after a sync.
+    """
+    def __init__(self):
+        self.shares = {}              # type: Dict[str, dict]
+        self.permissions = {}         # type: Dict[str, List[RecordShare]]
+        self.owners = {}              # type: Dict[str, str]
+        self.shared_folder_records = {}    # type: Dict[str, Set[str]]
+        self.team_records = {}        # type: Dict[str, Set[str]]
+        self._record_folders = None   # type: Optional[Dict[str, List[str]]]
+        self._folder_paths = {}       # type: Dict[str, str]
+
+    def clear(self):
+        self.shares.clear()
+        self.permissions.clear()
+        self.owners.clear()
+        self.shared_folder_records.clear()
+        self.team_records.clear()
+        self.clear_folders()
+
+    def clear_folders(self):
+        self._record_folders = None
+        self._folder_paths.clear()
+
+    def invalidate(self, record_uids=None, shared_folder_uids=None, team_uids=None):
+        # type: (Optional[Iterable[str]], Optional[Iterable[str]], Optional[Iterable[str]]) -> None
+        uids = set(record_uids or ())
+        for shared_folder_uid in shared_folder_uids or ():
+            uids.update(self.shared_folder_records.get(shared_folder_uid) or ())
+        for team_uid in team_uids or ():
+            uids.update(self.team_records.get(team_uid) or ())
+        for record_uid in uids:
+            self.shares.pop(record_uid, None)
+            self.permissions.pop(record_uid, None)
+            self.owners.pop(record_uid, None)
+
+    def load(self, params, record_uids):   # type: (KeeperParams, Iterable[str]) -> None
+        """Makes sure the records are in the index. Share information is requested for new records only."""
+        missing = []
+        for record_uid in record_uids:
+            record = params.record_cache.get(record_uid)
+            if not record:
+                continue
+            if record_uid in self.shares:
+                if 'shares' not in record:
+                    record['shares'] = self.shares[record_uid]
+            else:
+                missing.append(record_uid)
+        if not missing:
+            return
+        api.get_record_shares(params, missing)
+        for record_uid in missing:
+            record = params.record_cache.get(record_uid)
+            if record and 'shares' in record:
+                self.add_record(params, record_uid, record['shares'])
+
+    def add_record(self, params, record_uid, shares):    # type: (KeeperParams, str, dict) -> None
+        permissions = []    # type: List[RecordShare]
+        user_permissions = shares.get('user_permissions') or []
+        for up in user_permissions:
+            if up.get('owner') is True:
+                self.owners[record_uid] = up.get('username')
+            if not up.get('username'):
+                continue
+            permissions.append(RecordShare(ShareSource.Direct, up.get('username'),
+                                           can_edit=up.get('editable') or False,
+                                           can_share=up.get('shareable') or False,
+                                           expiration=up.get('expiration') or 0))
+
+        for sfp in shares.get('shared_folder_permissions') or []:
+            shared_folder_uid = sfp.get('shared_folder_uid')
+            can_share = sfp.get('reshareable') or False
+            can_edit = sfp.get('editable') or False
+            expiration = sfp.get('expiration') or 0
+            self.shared_folder_records.setdefault(shared_folder_uid, set()).add(record_uid)
+            shared_folder = params.shared_folder_cache.get(shared_folder_uid)
+            if not shared_folder:
+                permissions.append(RecordShare(ShareSource.SharedFolder, None, shared_folder_uid=shared_folder_uid,
+                                               can_edit=can_edit, can_share=can_share, expiration=expiration))
+                continue
+            for sfu in shared_folder.get('users') or []:
+                permissions.append(RecordShare(ShareSource.SharedFolder, sfu.get('username') or '',
+                                               shared_folder_uid=shared_folder_uid, can_edit=can_edit,
+                                               can_share=can_share, expiration=expiration))
+            for sft in shared_folder.get('teams') or []:
+                team_uid = sft.get('team_uid')
+                self.team_records.setdefault(team_uid, set()).add(record_uid)
+                team = params.team_cache.get(team_uid)
+                share = RecordShare(ShareSource.Team, sft.get('name'), team_uid=team_uid,
+                                    shared_folder_uid=shared_folder_uid, can_edit=can_edit, can_share=can_share,
+                                    expiration=expiration)
+                if team:
+                    share.can_edit = can_edit and not team.get('restrict_edit')
+                    share.can_share = can_share and not team.get('restrict_share')
+                    share.can_view = not team.get('restrict_view')
+                permissions.append(share)
+
+        self.shares[record_uid] = shares
+        self.permissions[record_uid] = permissions
+
+    def get_permissions(self, record_uid):   # type: (str) -> Optional[List[RecordShare]]
+        return self.permissions.get(record_uid)
+
+    def get_owner(self, record_uid):   # type: (str) -> Optional[str]
+        return self.owners.get(record_uid)
+
+    def get_record_folders(self, params, record_uid):   # type: (KeeperParams, str) -> List[str]
+        if self._record_folders is None:
+            record_folders = {}     # type: Dict[str, List[str]]
+            for folder_uid, uids in params.subfolder_record_cache.items():
+                if folder_uid:
+                    for uid in uids:
+                        record_folders.setdefault(uid, []).append(folder_uid)
+            self._record_folders = record_folders
+        return self._record_folders.get(record_uid) or []
+
+    def get_folder_path(self, params, folder_uid):   # type: (KeeperParams, str) -> str
+        path = self._folder_paths.get(folder_uid)
+        if path is None:
+            path = get_folder_path(params, folder_uid)
+            self._folder_paths[folder_uid] = path
+        return path
+
+
+def get_share_index(params, record_uids=None):
+    # type: (KeeperParams, Optional[Iterable[str]]) -> SharePermissionIndex
+    if params.share_index is None:
+        params.share_index = SharePermissionIndex()
+    if record_uids is not None:
+        params.share_index.load(params, record_uids)
+    return params.share_index
+
+
+def get_team_members(params):   # type: (KeeperParams) -> Dict[str, List[str]]
+    """Active members of the enterprise teams"""
+    members = {}    # type: Dict[str, List[str]]
+    if params.enterprise:
+        usernames = {x['enterprise_user_id']: x['username'] for x in params.enterprise.get('users') or []
+                     if x.get('status') == 'active'}
+        for tu in params.enterprise.get('team_users') or []:
+            username = usernames.get(tu['enterprise_user_id'])
+            if username:
+                members.setdefault(tu['team_uid'], []).append(username)
+    return members
@@ -4,7 +4,7 @@ from typing import Dict, List
 from keepercommander import api, utils
 from keepercommander.proto import enterprise_pb2
 from keepercommander.record import Record
-from keepercommander.subfolder import find_folders, get_folder_path
+from keepercommander.share_index import get_share_index
 
 
 def get_shared_records(params, record_uids, cache_only=False):
@@ -63,7 +63,7 @@ def get_shared_records(params, record_uids, cache_only=False):
         members = no_share_users.union(no_share_teams).union(no_share_team_members)
         return members
 
-    api.get_record_shares(params, record_uids)
+    get_share_index(params, record_uids)
     sf_teams = [shared_folder.get('teams', []) for shared_folder in params.shared_folder_cache.values()]
     sf_share_admins = fetch_sf_admins() if not cache_only else {}
     team_uids = {t.get('team_uid') for teams in sf_teams for t in teams}
@@ -166,8 +166,9 @@ class SharedRecord:
         self.user_permissions: Dict[str, SharePermissions] = {}
         self.revision = None
         self.params = params
-        self.folder_uids = list(find_folders(params, record.record_uid))
-        self.folder_paths = [get_folder_path(params, fuid) for fuid in self.folder_uids]
+        share_index = get_share_index(params)
+        self.folder_uids = list(share_index.get_record_folders(params, record.record_uid))
+        self.folder_paths = [share_index.get_folder_path(params, fuid) for fuid in self.folder_uids]
         self.team_members = team_members
 
         self.load(params, sf_sharing_admins, team_members, role_restricted_members)
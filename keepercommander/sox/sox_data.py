@@ -46,6 +46,10 @@ class SoxData:
         self._users = {}                        # type: Dict[int, sox_types.EnterpriseUser]
         self._teams = {}                        # type: Dict[str, sox_types.Team]
         self._shared_folders = {}               # type: Dict[str, sox_types.SharedFolder]
+        self._record_sfs = {}                   # type: Dict[str, Dict[str, int]]
+        self._record_owners = {}                # type: Dict[str, int]
+        self._user_sfs = {}                     # type: Dict[int, Set[str]]
+        self._user_permission_records = {}      # type: Dict[int, Set[str]]
         self.ec_private_key = get_ec_private_key(params)
         self.tree_key = params.enterprise.get('unencrypted_tree_key', b'')
         task = RebuildTask(True)
@@ -85,36 +89,54 @@ class SoxData:
     def get_shared_folders(self, sf_uids=None):
         return self._shared_folders if sf_uids is None else {uid: self._shared_folders.get(uid) for uid in sf_uids}
 
-    def get_record_sfs(self, record_uid):
-        get_ruids = lambda sf: [rp.record_uid for rp in sf.record_permissions]
-        return [sf.folder_uid for sf in self._shared_folders.values() if record_uid in get_ruids(sf)]
+    def get_record_sfs(self, record_uid):    # type: (str) -> List[str]
+        return list(self._record_sfs.get(record_uid) or ())
+
+    def get_record_sf_permissions(self, record_uid):    # type: (str) -> Dict[str, int]
+        """Shared folders that contain the record, with the record permission bits in each folder"""
+        return self._record_sfs.get(record_uid) or {}
 
     def get_record_owner(self, rec_uid):
-        owner = None
-        if rec_uid in self._records:
-            for user in self._users.values():
-                if rec_uid in user.records:
-                    owner = user
-                    break
-        return owner
+        user_uid = self._record_owners.get(rec_uid)
+        return self._users.get(user_uid) if user_uid is not None else None
 
     def get_vault_records(self, user_ref):
         user_id = user_ref if isinstance(user_ref, int) or user_ref.isdigit() else next((k for k, v in self._users.items() if v.email == user_ref), 0)
-        owned_sa_ruids = {ruid: rec for ruid, rec in self._records.items() if user_id in rec.user_permissions.keys()}
-
-        # Get SF-shared records
-        # Shared to team
-        user_teams = {tuid for tuid, t in self._teams.items() if user_id in t.users}
-        team_sf_uids = {sfuid for sfuid, sf in self._shared_folders.items() if sf.teams.intersection(user_teams)}
-        # Shared to user
-        user_sf_uids = {sfuid for sfuid, sf in self._shared_folders.items() if user_id in sf.users}
-        sf_uids = team_sf_uids.union(user_sf_uids)
-        user_sfs = [sf for uid, sf in self._shared_folders.items() if uid in sf_uids]
-        user_sf_rec_uids = {rp.record_uid for sf in user_sfs for rp in sf.record_permissions}
-
-        vault_record_uids = user_sf_rec_uids.union(owned_sa_ruids)
+        vault_record_uids = set(self._user_permission_records.get(user_id) or ())
+        for sf_uid in self._user_sfs.get(user_id) or ():
+            vault_record_uids.update(rp.record_uid for rp in self._shared_folders[sf_uid].record_permissions)
         return self.get_records(vault_record_uids)
 
+    def build_indexes(self):
+        """Builds the record to shared folder, record to owner and user to shared folder lookups"""
+        record_sfs = {}     # type: Dict[str, Dict[str, int]]
+        user_sfs = {}       # type: Dict[int, Set[str]]
+        team_users = {team_uid: team.users for team_uid, team in self._teams.items()}
+        for sf_uid, sf in self._shared_folders.items():
+            for rp in sf.record_permissions:
+                record_sfs.setdefault(rp.record_uid, {})[sf_uid] = rp.permission_bits
+            for user_uid in sf.users:
+                user_sfs.setdefault(user_uid, set()).add(sf_uid)
+            for team_uid in sf.teams:
+                for user_uid in team_users.get(team_uid) or ():
+                    user_sfs.setdefault(user_uid, set()).add(sf_uid)
+
+        record_owners = {}  # type: Dict[str, int]
+        for user_uid, user in self._users.items():
+            for record_uid in user.records:
+                if record_uid in self._records:
+                    record_owners.setdefault(record_uid, user_uid)
+
+        permission_records = {}     # type: Dict[int, Set[str]]
+        for record_uid, record in self._records.items():
+            for user_uid in record.user_permissions:
+                permission_records.setdefault(user_uid, set()).add(record_uid)
+
+        self._record_sfs = record_sfs
+        self._record_owners = record_owners
+        self._user_sfs = user_sfs
+        self._user_permission_records = permission_records
+
     def clear_records(self, uids=None):
         clear_lookup(self._records, uids)
 
@@ -267,5 +289,6 @@ class SoxData:
         self._records.update(load_records(self.storage, changes))
         if changes.is_full_sync or changes.load_compliance_data:
             self._users.update(load_users(self.storage))
+        self.build_indexes()
         if no_cache:
             self.storage.delete_db()
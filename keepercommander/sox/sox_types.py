@@ -118,7 +118,9 @@ class SharedFolder:
         self.record_permissions = []    # type: List[RecordPermissions]
         self.users = set()              # type: Set[int]
         self.teams = set()              # type: Set[str]
+        self._record_uids = set()       # type: Set[str]
 
     def update_record_permissions(self, permissions):  # type: (RecordPermissions) -> None
-        if not any([p for p in self.record_permissions if p.record_uid == permissions.record_uid]):
+        if permissions.record_uid not in self._record_uids:
+            self._record_uids.add(permissions.record_uid)
             self.record_permissions.append(permissions)
@@ -11,11 +11,11 @@
 
 import json
 import logging
-from typing import Any, List, Dict, Optional
+from typing import Any, List, Dict, Optional, Set
 
 import google
 
-from . import api, utils, crypto, convert_keys
+from . import api, utils, crypto, convert_keys, key_cache
 from .display import bcolors
 from .params import KeeperParams, RecordOwner
 from .proto import SyncDown_pb2, record_pb2, client_pb2, breachwatch_pb2
@@ -24,16 +24,78 @@ from .subfolder import RootFolderNode, UserFolderNode, SharedFolderNode, SharedF
 
 def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> None
     """Sync full or partial data down to the client"""
-
+    # While run-batch commands run concurrently, the caches are rebuilt only when no other command is using them
+    gate = params.cache_gate
+    if gate:
+        with gate.exclusive(), params.sync_lock:
+            _sync_down(params, record_types)
+    else:
+        with params.sync_lock:
+            _sync_down(params, record_types)
+
+
+class ShareChanges:
+    """UIDs of records, shared folders and teams whose share information changed during sync
+
+    Share information (record['shares']) is kept between syncs. Only the records that changed, or that are
+    shared through a changed shared folder, need to request it again.
+    """
+    def __init__(self):
+        self.record_uids = set()           # type: Set[str]
+        self.shared_folder_uids = set()    # type: Set[str]
+        self.team_uids = set()             # type: Set[str]
+        self.folders_changed = False
+
+    def add_response(self, response):   # type: (SyncDown_pb2.SyncDownResponse) -> None
+        encode = utils.base64_url_encode
+        self.record_uids.update(encode(x) for x in response.removedRecords)
+        self.record_uids.update(encode(x.recordUid) for x in response.records)
+        self.record_uids.update(encode(x.recordUid) for x in response.recordMetaData)
+        self.record_uids.update(encode(x.recordUid) for x in response.sharingChanges)
+        self.shared_folder_uids.update(encode(x) for x in response.removedSharedFolders)
+        self.team_uids.update(encode(x) for x in response.removedTeams)
+        self.team_uids.update(encode(x.teamUid) for x in response.teams)
+        for sf in response.sharedFolders:
+            self.shared_folder_uids.add(encode(sf.sharedFolderUid))
+        for items in (response.sharedFolderUsers, response.removedSharedFolderUsers,
+                      response.sharedFolderTeams, response.removedSharedFolderTeams):
+            self.shared_folder_uids.update(encode(x.sharedFolderUid) for x in items)
+        for items in (response.sharedFolderRecords, response.removedSharedFolderRecords):
+            for sfr in items:
+                self.shared_folder_uids.add(encode(sfr.sharedFolderUid))
+                self.record_uids.add(encode(sfr.recordUid))
+        if any(len(x) > 0 for x in (
+                response.userFolders, response.removedUserFolders, response.sharedFolders,
+                response.removedSharedFolders, response.userFolderSharedFolders,
+                response.removedUserFolderSharedFolders, response.sharedFolderFolders,
+                response.removedSharedFolderFolders, response.userFolderRecords, response.removedUserFolderRecords,
+                response.sharedFolderFolderRecords, response.removedSharedFolderFolderRecords)):
+            self.folders_changed = True
+
+    def apply(self, params):   # type: (KeeperParams) -> None
+        """Drops the cached share information of the changed records"""
+        if self.record_uids or self.shared_folder_uids:
+            for record_uid, record in params.record_cache.items():
+                shares = record.get('shares')
+                if shares is None:
+                    continue
+                if record_uid in self.record_uids or \
+                        any(x.get('shared_folder_uid') in self.shared_folder_uids
+                            for x in shares.get('shared_folder_permissions') or []):
+                    del record['shares']
+        share_index = params.share_index
+        if share_index is not None:
+            share_index.invalidate(self.record_uids, self.shared_folder_uids, self.team_uids)
+            if self.folders_changed:
+                share_index.clear_folders()
+
+
+def _sync_down(params, record_types):   # type: (KeeperParams, bool) -> None
     params.sync_data = False
     token = params.sync_down_token
     if not token:
         logging.info('Syncing...')
 
-    for record in params.record_cache.values():
-        if 'shares' in record:
-            del record['shares']
-
     def delete_record_key(rec_uid):
         if rec_uid in params.record_cache:
             record = params.record_cache[rec_uid]
@@ -71,6 +133,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
     request = SyncDown_pb2.SyncDownRequest()
     revision = params.revision
     full_sync = False
+    share_changes = ShareChanges()
     done = False
     while not done:
         if token:
@@ -78,6 +141,7 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
         response = api.communicate_rest(params, request, 'vault/sync_down', rs_type=SyncDown_pb2.SyncDownResponse)
         done = not response.hasMore
         token = response.continuationToken
+        share_changes.add_response(response)
         if response.cacheStatus == SyncDown_pb2.CLEAR:
             full_sync = True
             params.record_cache.clear()
@@ -128,6 +192,8 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
                     shared_folder = params.shared_folder_cache[shared_folder_uid]
                     if 'teams' in shared_folder:
                         shared_folder['teams'] = [x for x in shared_folder['teams'] if x['team_uid'] != team_uid]
+                # the team key is no longer available
+                key_cache.invalidate_keys(params, [team_uid])
                 if team_uid in params.team_cache:
                     del params.team_cache[team_uid]
 
@@ -584,6 +650,12 @@ def sync_down(params, record_types=False):   # type: (KeeperParams, bool) -> Non
 
     params.revision = revision
 
+    if full_sync:
+        if params.share_index is not None:
+            params.share_index.clear()
+    else:
+        share_changes.apply(params)
+
     for sf in params.shared_folder_cache.values():
         owner = sf.get('owner_username')
         if not owner:
@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from keepercommander import utils
+from keepercommander.commands.helpers.audit_store import AuditEventStore, query_local_events, get_created_range
+
+
+class TestAuditEventStore(TestCase):
+    def setUp(self):
+        self.store = AuditEventStore(':memory:', utils.generate_aes_key())
+        self.events = [{
+            'id': i + 1,
+            'created': 1700000000 + i * 600,
+            'audit_event_type': 'login' if i % 3 else 'record_add',
+            'username': 'user1@company.com' if i % 2 else 'user2@company.com',
+        } for i in range(30)]
+        self.fetch_count = 0
+
+    def tearDown(self):
+        self.store.close()
+
+    def fetch_page(self, min_ts, max_ts):
+        self.fetch_count += 1
+        page = [x for x in self.events if min_ts <= x['created'] <= max_ts]
+        return page[:10]
+
+    def test_incremental_ingest(self):
+        min_ts = self.events[0]['created']
+        max_ts = self.events[14]['created']
+        self.assertEqual(self.store.ingest(self.fetch_page, min_ts, max_ts), 15)
+        self.assertEqual(self.store.get_covered_range(), (min_ts, max_ts))
+
+        self.fetch_count = 0
+        self.store.ingest(self.fetch_page, min_ts, max_ts)
+        self.assertEqual(self.fetch_count, 0)
+
+        self.store.ingest(self.fetch_page, min_ts, self.events[-1]['created'])
+        events = list(self.store.get_events())
+        self.assertEqual(len(events), len(self.events))
+        self.assertEqual(events[0]['id'], self.events[-1]['id'])
+
+    def test_query_local_events(self):
+        self.store.ingest(self.fetch_page, self.events[0]['created'], self.events[-1]['created'])
+
+        rq = {'report_type': 'raw', 'filter': {'audit_event_type': ['record_add'], 'username': ['user2@company.com']}}
+        rows = query_local_events(self.store, rq)
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(x['audit_event_type'] == 'record_add' for x in rows))
+
+        rq = {'report_type': 'span', 'columns': ['audit_event_type'], 'aggregate': ['occurrences']}
+        rows = query_local_events(self.store, rq)
+        self.assertEqual({x['audit_event_type']: x['occurrences'] for x in rows}, {'login': 20, 'record_add': 10})
+
+        rq = {'report_type': 'hour', 'aggregate': ['occurrences'], 'order': 'ascending'}
+        rows = query_local_events(self.store, rq, limit=2)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(x['created'] % 3600 == 0 for x in rows))
+
+    def test_created_range(self):
+        self.assertEqual(get_created_range({'min': 10, 'max': 20, 'exclude_max': True}), (10, 19))
+        min_ts, max_ts = get_created_range('yesterday')
+        self.assertIn(max_ts - min_ts + 1, (23 * 60 * 60, 24 * 60 * 60, 25 * 60 * 60))
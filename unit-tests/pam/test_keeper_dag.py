@@ -0,0 +1,215 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from keepercommander.keeper_dag import DAG, EdgeType
+from keepercommander.keeper_dag.connection import commander
+from keepercommander.keeper_dag.connection.local import Connection
+from keepercommander.params import KeeperParams
+from keepercommander.keeper_dag.snapshot import DAGSnapshot
+
+
+class TestKeeperDag(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.snapshot_dir = os.path.join(self.temp_dir, 'snapshot')
+        self.conn = Connection(db_dir=self.temp_dir)
+        self.key = os.urandom(32)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def create_graph(self, count):
+        dag = DAG(conn=self.conn, key_bytes=self.key)
+        for i in range(count):
+            vertex = dag.add_vertex()
+            vertex.belongs_to_root(EdgeType.KEY, path=f'path{i}')
+            vertex.add_data({'name': f'vertex{i}'})
+        dag.save()
+        return dag
+
+    def test_snapshot_load(self):
+        self.create_graph(5)
+
+        dag = DAG(conn=self.conn, key_bytes=self.key, snapshot_dir=self.snapshot_dir)
+        dag.load()
+        snapshot = DAGSnapshot(self.snapshot_dir, stream_id=dag.uid, context=self.conn.snapshot_context)
+        data, sync_point = snapshot.load()
+        self.assertTrue(len(data) > 0)
+        self.assertTrue(sync_point > 0)
+
+        vertex = dag.add_vertex()
+        vertex.belongs_to_root(EdgeType.KEY, path='path5')
+        vertex.add_data({'name': 'vertex5'})
+        dag.save()
+
+        dag = DAG(conn=self.conn, key_bytes=self.key, snapshot_dir=self.snapshot_dir)
+        with mock.patch.object(self.conn, 'sync', wraps=self.conn.sync) as mock_sync:
+            dag.load()
+            self.assertEqual(mock_sync.call_args_list[0].kwargs['sync_point'], sync_point)
+        self.assertEqual(len(dag.search_content({'name': 'vertex5'})), 1)
+        self.assertEqual(len(dag.get_root.has_vertices()), 6)
+
+        full = DAG(conn=self.conn, key_bytes=self.key)
+        full.load()
+        self.assertEqual(sorted(x.uid for x in full.all_vertices), sorted(x.uid for x in dag.all_vertices))
+        self.assertTrue(snapshot.load()[1] > sync_point)
+
+    def test_snapshot_corrupt(self):
+        self.create_graph(2)
+        dag = DAG(conn=self.conn, key_bytes=self.key, snapshot_dir=self.snapshot_dir)
+        dag.load()
+        snapshot = DAGSnapshot(self.snapshot_dir, stream_id=dag.uid, context=self.conn.snapshot_context)
+        with open(snapshot.file_name, 'w') as fh:
+            fh.write('{')
+        self.assertEqual(snapshot.load(), ([], 0))
+
+        dag = DAG(conn=self.conn, key_bytes=self.key, snapshot_dir=self.snapshot_dir)
+        dag.load()
+        self.assertEqual(len(dag.get_root.has_vertices()), 2)
+
+    def test_snapshot_context(self):
+        self.create_graph(2)
+        dag = DAG(conn=self.conn, key_bytes=self.key, snapshot_dir=self.snapshot_dir)
+        dag.load()
+
+        other_dir = os.path.join(self.temp_dir, 'other')
+        os.makedirs(other_dir)
+        other_conn = Connection(db_dir=other_dir)
+        try:
+            self.assertNotEqual(other_conn.snapshot_context, self.conn.snapshot_context)
+            dag = DAG(conn=other_conn, key_bytes=self.key, snapshot_dir=self.snapshot_dir)
+            dag.load()
+            self.assertFalse(dag.has_graph)
+        finally:
+            other_conn.close()
+
+    def test_snapshot_dir_config(self):
+        params = KeeperParams(config={'dag_snapshot_dir': self.snapshot_dir})
+        conn = commander.Connection(params, encrypted_transmission_key=b'key', encrypted_session_token=b'token')
+        self.assertEqual(conn.snapshot_dir, self.snapshot_dir)
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(DAG(conn=conn, key_bytes=self.key).snapshot_dir, self.snapshot_dir)
+            self.assertIsNone(DAG(conn=self.conn, key_bytes=self.key).snapshot_dir)
+        with mock.patch.dict(os.environ, {'GS_SNAPSHOT_DIR': self.temp_dir}):
+            self.assertEqual(DAG(conn=conn, key_bytes=self.key).snapshot_dir, self.temp_dir)
+
+    def test_vertex_lookups(self):
+        dag = self.create_graph(3)
+        root = dag.get_root
+        first = dag.search_content({'name': 'vertex0'})[0]
+        second = dag.search_content({'name': 'vertex1'})[0]
+        second.belongs_to(first, EdgeType.LINK)
+
+        self.assertTrue(root.has(first))
+        self.assertTrue(first.has(second, EdgeType.LINK))
+        self.assertFalse(first.has(second, EdgeType.KEY))
+        self.assertFalse(second.has(first))
+        self.assertEqual([x.uid for x in second.belongs_to_vertices()], [root.uid, first.uid])
+        self.assertEqual(second.edge_count(first, EdgeType.LINK), 1)
+
+        second.disconnect_from(first)
+        self.assertEqual([x.uid for x in second.belongs_to_vertices()], [root.uid])
+        self.assertEqual(second.get_highest_edge_version(first.uid)[1].edge_type, EdgeType.DELETION)
+
+    def test_search_content_cache(self):
+        dag = self.create_graph(3)
+        vertex = dag.search_content({'name': 'vertex2'})[0]
+        vertex.add_data({'name': 'renamed'})
+        self.assertEqual(dag.search_content({'name': 'vertex2'}), [])
+        self.assertEqual(dag.search_content({'name': 'RENAMED'}, ignore_case=True), [vertex])
+        self.assertEqual(dag.search_content('renamed'), [vertex])
+        self.assertEqual(vertex.data_count(), 2)
+
+        dag.history_level = 1
+        vertex.add_data({'name': 'vertex2'})
+        self.assertEqual(vertex.data_count(), 1)
+        self.assertEqual(dag.search_content({'name': 'vertex2'}), [vertex])
+
+    def test_load_decrypt(self):
+        dag = self.create_graph(3)
+        parent = dag.search_content({'name': 'vertex0'})[0]
+        child = dag.add_vertex()
+        child.belongs_to(parent, EdgeType.KEY, path='child')
+        child.add_data({'name': 'child'})
+        grandchild = dag.add_vertex()
+        grandchild.belongs_to(child, EdgeType.KEY)
+        grandchild.add_data({'name': 'grandchild'})
+        dag.save()
+
+        with mock.patch.object(DAG, 'KEYCHAIN_PARALLEL_MIN', 1):
+            loaded = DAG(conn=self.conn, key_bytes=self.key)
+            loaded.load()
+        self.assertEqual(loaded.corrupt_uids, [])
+        vertex = loaded.get_vertex(grandchild.uid)
+        self.assertEqual(vertex.keychain, grandchild.keychain)
+        self.assertTrue(vertex.get_data().decrypt_pending)
+        self.assertEqual(vertex.content_as_dict, {'name': 'grandchild'})
+        self.assertFalse(vertex.get_data().decrypt_pending)
+        self.assertEqual(loaded.walk_down_path('path0/child').uid, child.uid)
+        self.assertEqual(len(loaded.search_content({'name': 'child'})), 2)
+
+    def test_batch_save(self):
+        dag = DAG(conn=self.conn, key_bytes=self.key, save_batch_count=7)
+        for i in range(20):
+            vertex = dag.add_vertex()
+            vertex.belongs_to_root(EdgeType.KEY, path=f'path{i}')
+            vertex.add_data({'name': f'vertex{i}'})
+
+        with mock.patch.object(self.conn, 'add_data', wraps=self.conn.add_data) as mock_add_data:
+            dag.save()
+            batches = [[x.type for x in call.args[0].dataList] for call in mock_add_data.call_args_list]
+        self.assertEqual(len(batches), 6)
+        self.assertTrue(all(EdgeType.DATA not in x for x in batches[:3]))
+        self.assertTrue(all(x == [EdgeType.DATA] * len(x) for x in batches[3:]))
+
+        loaded = DAG(conn=self.conn, key_bytes=self.key)
+        loaded.load()
+        self.assertEqual(len(loaded.get_root.has_vertices()), 20)
+        self.assertEqual(sorted(x.content_as_dict['name'] for x in loaded.get_root.has_vertices()),
+                         sorted(f'vertex{i}' for i in range(20)))
+
+    def test_batch_save_data_order(self):
+        dag = DAG(conn=self.conn, key_bytes=self.key, save_batch_count=2)
+        vertices = []
+        for i in range(3):
+            vertex = dag.add_vertex()
+            vertex.belongs_to_root(EdgeType.KEY, path=f'path{i}')
+            vertex.add_data({'name': f'vertex{i}'})
+            vertices.append(vertex)
+        vertices[0].add_data({'name': 'updated'})
+        vertices[0].add_data({'name': 'latest'})
+
+        with mock.patch.object(self.conn, 'add_data', wraps=self.conn.add_data) as mock_add_data:
+            dag.save()
+            batches = [[(x.ref.value, x.type) for x in call.args[0].dataList]
+                       for call in mock_add_data.call_args_list]
+        data_batches = [index for index, batch in enumerate(batches)
+                        for ref, edge_type in batch if ref == vertices[0].uid and edge_type == EdgeType.DATA]
+        self.assertEqual(len(data_batches), 3)
+        self.assertEqual(data_batches, sorted(set(data_batches)))
+
+        loaded = DAG(conn=self.conn, key_bytes=self.key)
+        loaded.load()
+        self.assertEqual(loaded.get_vertex(vertices[0].uid).content_as_dict, {'name': 'latest'})
+
+    def test_batch_save_deleted_vertex(self):
+        dag = self.create_graph(3)
+        dag.save_batch_count = 2
+        vertex = dag.search_content({'name': 'vertex1'})[0]
+        vertex.add_data({'name': 'renamed'})
+        vertex.delete()
+
+        with mock.patch.object(self.conn, 'add_data', wraps=self.conn.add_data) as mock_add_data:
+            dag.save()
+            edges = [(x.ref.value, x.type) for call in mock_add_data.call_args_list for x in call.args[0].dataList]
+        vertex_edges = [edge_type for ref, edge_type in edges if ref == vertex.uid]
+        self.assertEqual(vertex_edges[-1], EdgeType.DELETION)
+        self.assertIn(EdgeType.DATA, vertex_edges)
+
+        loaded = DAG(conn=self.conn, key_bytes=self.key)
+        loaded.load()
+        self.assertEqual(loaded.search_content({'name': 'renamed'}), [])
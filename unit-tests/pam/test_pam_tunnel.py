@@ -5,6 +5,7 @@ from unittest import mock
 from keepercommander.error import CommandError
 
 if sys.version_info >= (3, 8):
+    import asyncio
     import datetime
     import socket
     import string
@@ -14,7 +15,9 @@ if sys.version_info >= (3, 8):
     from cryptography.hazmat.primitives import serialization, hashes
     from cryptography.hazmat.primitives.asymmetric import ec
 
-    from keepercommander.commands.tunnel.port_forward.endpoint import (generate_random_bytes, find_open_port)
+    from keepercommander.commands.tunnel.port_forward.endpoint import (generate_random_bytes, find_open_port,
+                                                                       make_frame, make_control_message,
+                                                                       FrameBuffer, ControlMessage, SendScheduler)
 
     def generate_self_signed_cert(private_key):
         # Generate a self-signed certificate
@@ -156,3 +159,75 @@ if sys.version_info >= (3, 8):
             random_bytes1 = generate_random_bytes()
             random_bytes2 = generate_random_bytes()
             self.assertNotEqual(random_bytes1, random_bytes2)
+
+
+    class TestFrameBuffer(unittest.TestCase):
+        def test_split_frames(self):
+            frames = [make_frame(i + 1, bytes([i]) * (i * 100), timestamp_ms=i) for i in range(10)]
+            stream = b''.join(frames)
+            buff = FrameBuffer()
+            parsed = []
+            for pos in range(0, len(stream), 7):
+                buff.feed(stream[pos:pos + 7])
+                frame = buff.next_frame()
+                while frame is not None:
+                    parsed.append(frame)
+                    frame = buff.next_frame()
+            self.assertEqual(parsed, [(i + 1, i, bytes([i]) * (i * 100)) for i in range(10)])
+            self.assertEqual(len(buff), 0)
+
+        def test_control_message(self):
+            buff = FrameBuffer()
+            buff.feed(make_control_message(ControlMessage.Ping, (5).to_bytes(4, byteorder='big')))
+            connection_no, _, data = buff.next_frame()
+            self.assertEqual(connection_no, 0)
+            self.assertEqual(int.from_bytes(data[:2], byteorder='big'), ControlMessage.Ping)
+            self.assertEqual(int.from_bytes(data[2:], byteorder='big'), 5)
+            self.assertIsNone(buff.next_frame())
+
+        def test_invalid_terminator(self):
+            buff = FrameBuffer()
+            buff.feed(make_frame(1, b'data')[:-1] + b'x')
+            with self.assertRaises(ValueError):
+                buff.next_frame()
+
+
+    class TestSendScheduler(unittest.IsolatedAsyncioTestCase):
+        async def asyncSetUp(self):
+            self.sent = []
+
+            async def send(frame):
+                self.sent.append(frame)
+                await asyncio.sleep(0)
+
+            self.scheduler = SendScheduler(send, quantum=100, max_queue_size=1000)
+
+        async def asyncTearDown(self):
+            self.scheduler.stop()
+
+        async def test_round_robin(self):
+            for i in range(5):
+                await self.scheduler.put(1, b'b' * 100)
+            await self.scheduler.put(2, b'i' * 10)
+            await self.scheduler.drain(1)
+            await self.scheduler.drain(2)
+            self.assertEqual(len(self.sent), 6)
+            self.assertIn(b'i' * 10, self.sent[:2])
+
+        async def test_priority(self):
+            self.scheduler.set_priority(2, 3)
+            for i in range(4):
+                await self.scheduler.put(1, b'a' * 100)
+                await self.scheduler.put(2, b'b' * 100)
+            await self.scheduler.drain(1)
+            await self.scheduler.drain(2)
+            self.assertEqual([x[:1] for x in self.sent[:4]], [b'a', b'b', b'b', b'b'])
+
+        async def test_max_queue_size(self):
+            for i in range(10):
+                await self.scheduler.put(1, b'a' * 100)
+            self.assertLessEqual(self.scheduler.queued_size(1), 1000)
+            put = asyncio.create_task(self.scheduler.put(1, b'a' * 100))
+            self.scheduler.remove(1)
+            await asyncio.wait_for(put, 1)
+            self.assertEqual(self.scheduler.queued_size(1), 0)
@@ -16,7 +16,8 @@ if sys.version_info >= (3, 8):
                                                                        ConnectionNotFoundException,
                                                                        TERMINATOR, DATA_LENGTH, WebRTCConnection,
                                                                        ConnectionInfo, CloseConnectionReasons,
-                                                                       TIME_STAMP_LENGTH)
+                                                                       TIME_STAMP_LENGTH, BUFFER_THRESHOLD, FrameBuffer,
+                                                                       make_frame)
     from test_pam_tunnel import new_private_key
 
     # Only define the class if Python version is 3.8 or higher
@@ -88,6 +89,20 @@ if sys.version_info >= (3, 8):
 
                 self.assertTrue(expected_data in calls)
 
+        async def test_send_control_message_after_queued_frames(self):
+            frame = make_frame(1, b'data')
+            await self.pte.scheduler.put(1, frame)
+            await self.pte.send_control_message(ControlMessage.Ping, int.to_bytes(1, CONNECTION_NO_LENGTH,
+                                                                                  byteorder='big'), connection_no=1)
+            await self.pte.scheduler.drain(1)
+            sent = [c[0][0] for c in self.pte.pc.send_message.call_args_list]
+            self.assertEqual(sent[-2], frame)
+            buff = FrameBuffer()
+            buff.feed(sent[-1])
+            connection_no, _, data = buff.next_frame()
+            self.assertEqual(connection_no, 0)
+            self.assertEqual(int.from_bytes(data[:CONTROL_MESSAGE_NO_LENGTH], byteorder='big'), ControlMessage.Ping)
+
         async def test_send_control_message_with_error(self):
             # Initialize self.pte.tls_writer with a mock object
             self.pte.tls_writer = mock.MagicMock(spec=asyncio.StreamWriter)
@@ -349,6 +364,19 @@ if sys.version_info >= (3, 8):
                     int.to_bytes(1, CONNECTION_NO_LENGTH, byteorder='big')
                 )
 
+        async def test_handle_connection_priority(self):
+            pte = TunnelEntrance(self.host, self.port, self.pc, self.print_ready_event, self.logger, self.connect_task,
+                                 self.kill_server_event, target_host='10.0.0.1', target_port=22,
+                                 priorities={22: 3}, max_queue_size=2000)
+            try:
+                self.assertEqual(pte.scheduler.max_queue_size, 2000)
+                with mock.patch.object(pte, 'send_control_message', mock.AsyncMock()):
+                    await pte.handle_connection(mock.AsyncMock(spec=asyncio.StreamReader),
+                                                mock.AsyncMock(spec=asyncio.StreamWriter))
+                self.assertEqual(pte.scheduler._queues[1].priority, 3)
+            finally:
+                await pte.stop_server(CloseConnectionReasons.Normal)
+
         async def test_handle_connection_exception(self):
             mock_reader = mock.AsyncMock(spec=asyncio.StreamReader)
             mock_writer = mock.AsyncMock(spec=asyncio.StreamWriter)
@@ -410,3 +438,34 @@ if sys.version_info >= (3, 8):
 
             # Check if logger.info was called
             self.pte.logger.debug.assert_called_with("Endpoint TestEndpoint: Connection 9999 not found")
+
+        # Test that a sender blocked on a full data channel wakes up on the buffered amount low event
+        async def test_wait_for_buffer_low(self):
+            self.pte.kill_server_event = asyncio.Event()
+            self.pte.pc.buffer_low_event = asyncio.Event()
+            self.pte.pc.data_channel.bufferedAmount = BUFFER_THRESHOLD
+            task = asyncio.create_task(self.pte.wait_for_buffer_low())
+            await asyncio.sleep(.01)
+            self.assertFalse(task.done())
+            self.pte.pc.data_channel.bufferedAmount = 0
+            self.pte.pc.buffer_low_event.set()
+            await asyncio.wait_for(task, 1)
+
+        # Test that Pong grants a new credit window to the connection
+        async def test_pong_grants_window(self):
+            self.pte.kill_server_event = asyncio.Event()
+            self.pte.connections[1] = ConnectionInfo(mock.AsyncMock(), mock.AsyncMock(), 5, None, None, datetime.now())
+            c = self.pte.connections[1]
+            c.unacked_size = 1000
+            c.ping_time = 0
+            c.window_event.clear()
+            task = asyncio.create_task(self.pte.wait_for_window(1))
+            await asyncio.sleep(.01)
+            self.assertFalse(task.done())
+            await self.pte.process_control_message(ControlMessage.Pong, int.to_bytes(1, CONNECTION_NO_LENGTH,
+                                                                                     byteorder='big'))
+            await asyncio.wait_for(task, 1)
+            stats = self.pte.get_stats()[1]
+            self.assertEqual(stats['queue_messages'], 0)
+            self.assertEqual(stats['queue_size'], 0)
+            self.assertIsNotNone(stats['round_trip_latency'])
@@ -0,0 +1,160 @@
+"""
+Loopback benchmark for the PAM tunnel protocol.
+
+The tunnel entrance is connected to a fake data channel that acts as the tunnel exit: it opens connections,
+answers pings and echoes data frames back. A local client sends data through the tunnel entrance and reads
+the echo, so the whole data path (local reader, framing, data channel, parsing, local writer) is measured
+without a WebRTC connection.
+
+    python unit-tests/pam/tunnel_benchmark.py --size 64
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+
+from keepercommander.commands.tunnel.port_forward.endpoint import (
+    TunnelEntrance, FrameBuffer, ControlMessage, CloseConnectionReasons, make_frame, make_control_message,
+    CONNECTION_NO_LENGTH, CONTROL_MESSAGE_NO_LENGTH, BUFFER_TRUNCATION_THRESHOLD)
+
+
+class LoopbackDataChannel:
+    def __init__(self, exit_queue):  # type: (asyncio.Queue) -> None
+        self.readyState = 'open'
+        self.bufferedAmount = 0
+        self.exit_queue = exit_queue
+
+    def send(self, message):
+        self.exit_queue.put_nowait(message)
+
+
+class LoopbackConnection:
+    """
+    Fake WebRTCConnection. Messages sent by the tunnel entrance are handled by the fake tunnel exit,
+    which replies on the entrance's web_rtc_queue.
+    """
+    def __init__(self):
+        self.endpoint_name = 'benchmark'
+        self.closed = False
+        self.time_diff = timedelta(0)
+        self.buffer_low_event = asyncio.Event()
+        self.buffer_low_event.set()
+        self.web_rtc_queue = asyncio.Queue()
+        self.exit_queue = asyncio.Queue()
+        self.data_channel = LoopbackDataChannel(self.exit_queue)
+        self.data_frames = 0
+        self.exit_task = asyncio.create_task(self.run_exit())
+
+    def is_data_channel_open(self):
+        return not self.closed
+
+    def send_message(self, message):
+        self.data_channel.send(message)
+
+    async def close_webrtc_connection(self):
+        self.closed = True
+        self.exit_task.cancel()
+
+    async def run_exit(self):
+        buff = FrameBuffer()
+        while True:
+            buff.feed(await self.exit_queue.get())
+            frame = buff.next_frame()
+            while frame is not None:
+                connection_no, _, data = frame
+                if connection_no == 0:
+                    message_no = int.from_bytes(data[:CONTROL_MESSAGE_NO_LENGTH], byteorder='big')
+                    payload = data[CONTROL_MESSAGE_NO_LENGTH:CONTROL_MESSAGE_NO_LENGTH + CONNECTION_NO_LENGTH]
+                    if message_no == ControlMessage.OpenConnection:
+                        self.web_rtc_queue.put_nowait(make_control_message(ControlMessage.ConnectionOpened, payload))
+                    elif message_no == ControlMessage.Ping:
+                        self.web_rtc_queue.put_nowait(make_control_message(ControlMessage.Pong, payload))
+                else:
+                    self.data_frames += 1
+                    self.web_rtc_queue.put_nowait(make_frame(connection_no, data))
+                frame = buff.next_frame()
+
+
+async def run_loopback(total_size, chunk_size):  # type: (int, int) -> dict
+    logger = logging.getLogger('tunnel-benchmark')
+    logger.setLevel(logging.WARNING)
+    pc = LoopbackConnection()
+    kill_server_event = asyncio.Event()
+    entrance = TunnelEntrance('127.0.0.1', 0, pc, asyncio.Event(), logger=logger, kill_server_event=kill_server_event)
+    entrance.server = await asyncio.start_server(entrance.handle_connection, host='127.0.0.1', port=0)
+    port = entrance.server.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    chunk = os.urandom(chunk_size)
+
+    async def send():
+        sent = 0
+        while sent < total_size:
+            writer.write(chunk)
+            await writer.drain()
+            sent += len(chunk)
+
+    async def receive():
+        received = 0
+        while received < total_size:
+            data = await reader.read(65536)
+            if not data:
+                break
+            received += len(data)
+        return received
+
+    started = time.perf_counter()
+    _, received = await asyncio.gather(send(), receive())
+    elapsed = time.perf_counter() - started
+
+    writer.close()
+    await entrance.stop_server(CloseConnectionReasons.Normal)
+    return {
+        'frames': pc.data_frames,
+        'bytes': received,
+        'seconds': elapsed,
+    }
+
+
+def run_codec(total_size, chunk_size, read_size):  # type: (int, int, int) -> dict
+    chunk = os.urandom(chunk_size)
+    count = max(total_size // chunk_size, 1)
+    started = time.perf_counter()
+    stream = b''.join(make_frame(1, chunk) for _ in range(count))
+    buff = FrameBuffer()
+    frames = 0
+    for pos in range(0, len(stream), read_size):
+        buff.feed(stream[pos:pos + read_size])
+        while buff.next_frame() is not None:
+            frames += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'frames': frames,
+        'bytes': frames * chunk_size,
+        'seconds': elapsed,
+    }
+
+
+def log_result(name, result):  # type: (str, dict) -> None
+    seconds = result['seconds'] or 1e-9
+    logging.info('%-10s %10d frames  %12.0f frames/s  %10.1f MB/s', name, result['frames'],
+                 result['frames'] / seconds, result['bytes'] / seconds / 1024 / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PAM tunnel protocol loopback benchmark')
+    parser.add_argument('--size', type=int, default=32, help='megabytes to send through the tunnel')
+    parser.add_argument('--chunk', type=int, default=BUFFER_TRUNCATION_THRESHOLD, help='client write size')
+    parser.add_argument('--read', type=int, default=1500, help='codec only: size of data channel messages')
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    total_size = opts.size * 1024 * 1024
+    log_result('codec', run_codec(total_size, opts.chunk, opts.read))
+    log_result('loopback', asyncio.run(run_loopback(total_size, opts.chunk)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Synthetic-data benchmark for the compliance reports.
+
+SoxData is filled with generated users, teams, records and shared folders, and the time it takes to build
+the lookups and to generate the report data is measured. No enterprise connection is needed.
+
+    python unit-tests/sox_benchmark.py --records 100000 --folders 10000
+"""
+import argparse
+import logging
+import random
+import time
+
+from keepercommander.params import KeeperParams
+from keepercommander.sox import sox_types
+from keepercommander.sox.sox_data import SoxData
+
+
+class SyntheticSoxData(SoxData):
+    def __init__(self, users, teams, records, folders, records_per_folder, seed=0):
+        # type: (int, int, int, int, int, int) -> None
+        self.storage = None
+        self._records = {}
+        self._users = {}
+        self._teams = {}
+        self._shared_folders = {}
+        self._record_sfs = {}
+        self._record_owners = {}
+        self._user_sfs = {}
+        self._user_permission_records = {}
+        rnd = random.Random(seed)
+
+        for i in range(users):
+            user = sox_types.EnterpriseUser()
+            user.user_uid = i + 1
+            user.email = f'user{i + 1}@company.com'
+            self._users[user.user_uid] = user
+        user_uids = list(self._users)
+
+        for i in range(teams):
+            team = sox_types.Team()
+            team.team_uid = f'team{i}'
+            team.team_name = f'Team {i}'
+            team.users = rnd.sample(user_uids, min(len(user_uids), 10))
+            self._teams[team.team_uid] = team
+        team_uids = list(self._teams)
+
+        for i in range(records):
+            record = sox_types.Record()
+            record.record_uid = f'record{i}'
+            record.data = {'title': f'Record {i}', 'record_type': 'login', 'url': f'https://{i}.company.com/'}
+            record.shared = True
+            owner = self._users[rnd.choice(user_uids)]
+            owner.records.add(record.record_uid)
+            owner.active_records.add(record.record_uid)
+            record.user_permissions[owner.user_uid] = 1
+            self._records[record.record_uid] = record
+        record_uids = list(self._records)
+
+        for i in range(folders):
+            folder = sox_types.SharedFolder(f'folder{i}')
+            for record_uid in rnd.sample(record_uids, min(len(record_uids), records_per_folder)):
+                folder.update_record_permissions(sox_types.RecordPermissions(record_uid, rnd.choice((0, 4, 12))))
+            folder.users.update(rnd.sample(user_uids, min(len(user_uids), 3)))
+            if team_uids:
+                folder.teams.add(rnd.choice(team_uids))
+            self._shared_folders[folder.folder_uid] = folder
+
+        self.build_indexes()
+
+
+def measure(name, fn):
+    started = time.perf_counter()
+    result = fn()
+    logging.info('%-24s %10.3f s', name, time.perf_counter() - started)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compliance report benchmark on synthetic data')
+    parser.add_argument('--users', type=int, default=1000, help='number of enterprise users')
+    parser.add_argument('--teams', type=int, default=100, help='number of teams')
+    parser.add_argument('--records', type=int, default=100000, help='number of records')
+    parser.add_argument('--folders', type=int, default=10000, help='number of shared folders')
+    parser.add_argument('--folder-records', dest='folder_records', type=int, default=5,
+                        help='records per shared folder')
+    opts = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    from keepercommander.commands.compliance import ComplianceReportCommand
+
+    sd = measure('load', lambda: SyntheticSoxData(opts.users, opts.teams, opts.records, opts.folders,
+                                                  opts.folder_records))
+    measure('build indexes', sd.build_indexes)
+    cmd = ComplianceReportCommand()
+    rows = measure('compliance report',
+                   lambda: list(cmd.generate_report_data(KeeperParams(), {}, sd, 'csv', 0, 0)))
+    measure('record owners', lambda: [sd.get_record_owner(x) for x in sd.get_records()])
+    measure('vault records', lambda: [sd.get_vault_records(x) for x in list(sd.get_users())[:100]])
+    logging.info('%d report rows', len(rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,14 @@
+import os
+import shutil
+import tempfile
+import threading
 from unittest import TestCase, mock
 from collections import namedtuple
 
 from data_vault import VaultEnvironment, get_synced_params, get_connected_params
 from helper import KeeperApiHelper
-from keepercommander import api, generator
+from keepercommander import api, generator, crypto, utils, key_cache
+from keepercommander.proto import record_pb2, APIRequest_pb2
 
 vault_env = VaultEnvironment()
 
@@ -101,3 +106,135 @@ class TestSearch(TestCase):
         }
         with mock.patch('builtins.print'), mock.patch('builtins.input', return_value='decline'):
             self.assertFalse(api.accept_account_transfer_consent(params))
+
+
+class TestRecordShares(TestCase):
+    def setUp(self):
+        self.requests = []
+
+        def communicate_rest(params, rq, endpoint, rs_type=None, **kwargs):
+            self.requests.append(list(rq.recordUid))
+            rs = record_pb2.GetRecordDataWithAccessInfoResponse()
+            for record_uid in rq.recordUid:
+                info = rs.recordDataWithAccessInfo.add()
+                info.recordUid = record_uid
+                up = info.userPermission.add()
+                up.username = params.user
+                up.owner = True
+            return rs
+
+        mock.patch('keepercommander.api.communicate_rest', side_effect=communicate_rest).start()
+        mock.patch('keepercommander.api.RECORD_SHARES_CHUNK_SIZE', 1).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_get_record_shares(self):
+        params = get_synced_params()
+        record_uids = list(params.record_cache)
+        api.get_record_shares(params, record_uids)
+        self.assertEqual(len(self.requests), len(record_uids))
+        for record_uid in record_uids:
+            shares = params.record_cache[record_uid]['shares']
+            self.assertEqual(shares['user_permissions'][0]['username'], params.user)
+
+        api.get_record_shares(params, record_uids)
+        self.assertEqual(len(self.requests), len(record_uids))
+
+        params.record_cache[record_uids[0]]['revision'] += 1
+        api.get_record_shares(params, record_uids)
+        self.assertEqual(len(self.requests), len(record_uids) + 1)
+
+
+class TestKeyCache(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.params = get_synced_params()
+        self.params.config_filename = os.path.join(self.temp_dir, 'config.json')
+        self.team_key = utils.generate_aes_key()
+        self.requests = []
+
+        def communicate(params, rq):
+            self.requests.append(rq['command'])
+            return {
+                'result': 'success',
+                'keys': [{
+                    'team_uid': x,
+                    'key': utils.base64_url_encode(crypto.encrypt_aes_v1(self.team_key, params.data_key)),
+                    'type': 1
+                } for x in rq['teams']]
+            }
+
+        def communicate_rest(params, rq, endpoint, **kwargs):
+            self.requests.append(endpoint)
+            rs = APIRequest_pb2.GetPublicKeysResponse()
+            for username in rq.usernames:
+                pk = rs.keyResponses.add()
+                pk.username = username
+                pk.publicKey = utils.base64_url_decode(vault_env.encoded_public_key)
+            return rs
+
+        mock.patch('keepercommander.api.communicate', side_effect=communicate).start()
+        mock.patch('keepercommander.api.communicate_rest', side_effect=communicate_rest).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.params.clear_session()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def restart(self):
+        # a new process starts with an empty in-memory key cache
+        self.params.key_store.close()
+        self.params.key_store = None
+        self.params.key_cache.clear()
+
+    def test_team_keys(self):
+        team_uids = [utils.generate_uid() for _ in range(100)]
+        api.load_team_keys(self.params, team_uids)
+        self.assertEqual(self.requests, ['team_get_keys'] * 2)
+        self.assertTrue(all(self.params.key_cache[x].aes == self.team_key for x in team_uids))
+
+        self.restart()
+        api.load_team_keys(self.params, team_uids)
+        self.assertEqual(len(self.requests), 2)
+        self.assertTrue(all(self.params.key_cache[x].aes == self.team_key for x in team_uids))
+
+        key_cache.invalidate_keys(self.params, team_uids[:1])
+        self.assertNotIn(team_uids[0], self.params.key_cache)
+        self.restart()
+        api.load_team_keys(self.params, team_uids)
+        self.assertEqual(len(self.requests), 3)
+
+    def test_user_public_keys(self):
+        emails = ['user1@company.com', 'user2@company.com', self.params.user]
+        api.load_user_public_keys(self.params, emails)
+        self.assertEqual(len(self.requests), 1)
+
+        self.restart()
+        self.assertEqual(key_cache.get_key_store(self.params).get_keys(emails).keys(), set(emails[:2]))
+        api.load_user_public_keys(self.params, emails[:2])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.params.key_cache[emails[0]].rsa, self.params.key_cache[emails[1]].rsa)
+
+    def test_cross_thread(self):
+        team_uids = [utils.generate_uid() for _ in range(10)]
+        api.load_team_keys(self.params, team_uids)
+        store = key_cache.get_key_store(self.params)
+        errors = []
+
+        def run(target, *args):
+            def worker():
+                try:
+                    target(*args)
+                except Exception as e:
+                    errors.append(e)
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        run(lambda: self.assertEqual(len(store.get_keys(team_uids)), len(team_uids)))
+        run(key_cache.invalidate_keys, self.params, team_uids[:1])
+        self.assertEqual(errors, [])
+        self.assertEqual(store.get_keys(team_uids).keys(), set(team_uids[1:]))
@@ -0,0 +1,78 @@
+import threading
+import time
+from unittest import TestCase, mock
+
+from data_vault import get_connected_params
+from keepercommander import background_sync, cli
+
+
+class TestBackgroundSync(TestCase):
+    def setUp(self):
+        self.params = get_connected_params()
+        self.params.background_sync = True
+
+    def tearDown(self):
+        background_sync.stop_worker(self.params)
+
+    def test_request_sync(self):
+        synced = threading.Event()
+
+        def sync_down(params):
+            synced.set()
+            params.sync_data = False
+
+        with mock.patch('keepercommander.api.sync_down', side_effect=sync_down) as mock_sync_down:
+            self.assertTrue(background_sync.request_sync(self.params))
+            worker = self.params.sync_worker
+            self.assertIsNotNone(worker)
+            self.assertEqual(worker.interval, background_sync.DEFAULT_SYNC_INTERVAL)
+            self.assertTrue(worker.wait(5))
+            self.assertTrue(synced.is_set())
+            self.assertFalse(self.params.sync_data)
+            self.assertEqual(mock_sync_down.call_count, 1)
+
+    def test_command_lock(self):
+        with mock.patch('keepercommander.api.sync_down') as mock_sync_down:
+            background_sync.request_sync(self.params)
+            worker = self.params.sync_worker
+            self.assertTrue(worker.wait(5))
+            with background_sync.command_lock(self.params):
+                background_sync.request_sync(self.params)
+                self.assertFalse(worker.wait(.2))
+                self.assertEqual(mock_sync_down.call_count, 1)
+            self.assertTrue(worker.wait(5))
+            self.assertEqual(mock_sync_down.call_count, 2)
+
+    def test_disabled(self):
+        self.params.background_sync = False
+        self.assertFalse(background_sync.request_sync(self.params))
+        self.assertIsNone(self.params.sync_worker)
+        self.params.background_sync = 10
+        self.params.session_token = None
+        self.assertIsNone(background_sync.get_worker(self.params))
+
+    def test_command_after_write(self):
+        release = threading.Event()
+        synced = threading.Event()
+
+        def sync_down(params):
+            release.wait(5)
+            params.sync_data = False
+            synced.set()
+
+        def make_command(needs_fresh_vault):
+            command = mock.Mock()
+            command.is_authorised.return_value = False
+            command.needs_fresh_vault.return_value = needs_fresh_vault
+            command.execute_args.side_effect = lambda *args, **kwargs: synced.is_set()
+            return command
+
+        commands = {'read': make_command(False), 'update': make_command(True)}
+        with mock.patch('keepercommander.api.sync_down', side_effect=sync_down), \
+                mock.patch.dict('keepercommander.cli.commands', commands):
+            self.params.sync_data = True
+            cli.post_command(self.params)
+            self.assertTrue(self.params.sync_worker.is_pending)
+            self.assertFalse(cli.do_command(self.params, 'read'))
+            release.set()
+            self.assertTrue(cli.do_command(self.params, 'update'))
@@ -0,0 +1,72 @@
+import json
+import pickle
+from unittest import TestCase, mock
+
+from data_vault import get_synced_params
+from keepercommander import crypto, utils
+from keepercommander.commands import convert
+from keepercommander.proto import record_pb2
+
+
+class TestConvert(TestCase):
+    def setUp(self):
+        self.params = get_synced_params()
+        self.params.settings = {'record_types_enabled': True}
+        self.params.record_type_cache[1] = json.dumps({
+            '$id': 'login',
+            'fields': [{'$ref': 'login'}, {'$ref': 'password'}, {'$ref': 'url'}, {'$ref': 'fileRef'}]
+        })
+        self.requests = []    # type: list
+
+        def communicate_rest(params, rq, endpoint, **kwargs):
+            self.requests.append(rq)
+            rs = record_pb2.RecordsModifyResponse()
+            for rc in rq.records:
+                status = rs.records.add()
+                status.record_uid = rc.record_uid
+                status.status = record_pb2.RS_SUCCESS
+            return rs
+
+        mock.patch('keepercommander.api.communicate_rest', side_effect=communicate_rest).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_convert_batches(self):
+        record_uids = [x for x, r in self.params.record_cache.items() if r.get('version') == 2]
+        shared_folders = convert.get_record_shared_folders(self.params, set(record_uids))
+
+        cmd = convert.ConvertCommand()
+        with mock.patch('keepercommander.commands.convert.CONVERT_CHUNK_SIZE', 1), \
+                mock.patch('keepercommander.commands.convert.CONVERT_BATCH_SIZE', 1):
+            cmd.execute(self.params, quiet=True, ignore_owner=True, **{'record-uid-name-patterns': record_uids})
+
+        self.assertEqual(len(self.requests), len(record_uids))
+        converted = [rc for rq in self.requests for rc in rq.records]
+        self.assertEqual({utils.base64_url_encode(x.record_uid) for x in converted}, set(record_uids))
+        for rc in converted:
+            record_uid = utils.base64_url_encode(rc.record_uid)
+            record_key = self.params.record_cache[record_uid]['record_key_unencrypted']
+            data = json.loads(crypto.decrypt_aes_v2(rc.data, record_key))
+            self.assertEqual(data['type'], 'login')
+            self.assertEqual([utils.base64_url_encode(x.folder_uid) for x in rc.folder_key],
+                             shared_folders.get(record_uid) or [])
+            for fk in rc.folder_key:
+                sf = self.params.shared_folder_cache[utils.base64_url_encode(fk.folder_uid)]
+                self.assertEqual(crypto.decrypt_aes_v2(fk.record_folder_key, sf['shared_folder_key_unencrypted']),
+                                 record_key)
+        self.assertTrue(any(len(x.folder_key) > 0 for x in converted))
+
+    def test_jobs_without_account_keys(self):
+        shared_folders = convert.get_record_shared_folders(self.params, set(self.params.record_cache))
+        record_uid = next(x for x in shared_folders if shared_folders[x])
+        file_info = [{'key': utils.base64_url_encode(utils.generate_aes_key())}]
+        job = convert.prepare_conversion_job(self.params, record_uid, {'type': 'login', 'fields': []}, file_info,
+                                             shared_folders[record_uid])
+        job_bytes = pickle.dumps(job)
+        self.assertNotIn(self.params.data_key, job_bytes)
+        for shared_folder_uid in shared_folders[record_uid]:
+            self.assertNotIn(self.params.shared_folder_cache[shared_folder_uid]['shared_folder_key_unencrypted'],
+                             job_bytes)
+        self.assertEqual(crypto.decrypt_aes_v2(job['file_info'][0]['encrypted_key'], self.params.data_key),
+                         utils.base64_url_decode(file_info[0]['key']))
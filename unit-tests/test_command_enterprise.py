@@ -8,14 +8,39 @@ from data_enterprise import EnterpriseEnvironment, get_enterprise_data, enterpri
 from keepercommander import api, crypto, utils, vault
 from keepercommander.params import KeeperParams, PublicKeys
 from keepercommander.error import CommandError
-from data_vault import VaultEnvironment, get_connected_params
+from data_vault import VaultEnvironment, get_connected_params, get_synced_params
 from keepercommander.commands import enterprise, aram
+from keepercommander.commands.helpers import audit_store
 
 
 vault_env = VaultEnvironment()
 ent_env = EnterpriseEnvironment()
 
 
+class FakeAuditLogExport(aram.AuditLogBaseExport):
+    def __init__(self, fail_on_chunk=None):
+        super(FakeAuditLogExport, self).__init__()
+        self.fail_on_chunk = fail_on_chunk
+        self.exported = []
+
+    def default_record_title(self):
+        return 'Audit Log: Test'
+
+    def get_properties(self, record, props):
+        pass
+
+    def chunk_size(self):
+        return 2
+
+    def convert_event(self, props, event):
+        return event['id']
+
+    def export_events(self, props, events):
+        if self.fail_on_chunk is not None and len(self.exported) // 2 == self.fail_on_chunk:
+            raise OSError('Connection reset')
+        self.exported.extend(events)
+
+
 class TestEnterprise(TestCase):
     expected_commands = []
 
@@ -241,6 +266,97 @@ class TestEnterprise(TestCase):
         }
         splunk.convert_event(props, self.get_audit_event())
 
+    def test_audit_log_syslog_port_reuses_connection(self):
+        syslog = aram.AuditLogSyslogPortExport()
+        props = {
+            'is_udp': False,
+            'is_ssl': False,
+            'host': 'localhost',
+            'port': 514,
+            'is_octet_counting': False
+        }
+        with mock.patch.object(syslog, 'connect') as mock_connect:
+            sock = mock.Mock()
+            mock_connect.return_value = sock
+            syslog.export_events(props, ['event 1', 'event 2'])
+            syslog.export_events(props, ['event 3'])
+            self.assertEqual(mock_connect.call_count, 1)
+            self.assertEqual(sock.sendall.call_count, 2)
+            self.assertFalse(syslog.should_cancel)
+
+            sock.sendall.side_effect = [OSError(), None]
+            syslog.export_events(props, ['event 4'])
+            self.assertEqual(mock_connect.call_count, 2)
+            self.assertFalse(syslog.should_cancel)
+
+            syslog.clean_up()
+            self.assertIsNone(syslog.sock)
+
+    def run_audit_log(self, params, record, export, checkpoint_interval=60):
+        self.audit_requests = []
+        self.stored_checkpoints = []
+
+        def communicate(_, rq):
+            if rq['command'] == 'get_audit_event_dimensions':
+                return {'result': 'success', 'dimensions': {'audit_event_type': []}}
+            self.audit_requests.append(rq['filter']['created'].copy())
+            if rq['report_type'] == 'span':
+                return {'result': 'success', 'audit_event_overview_report_rows': [{'occurrences': 5}]}
+            created_min = rq['filter']['created'].get('min', 0)
+            return {'result': 'success',
+                    'audit_event_overview_report_rows': [x for x in self.audit_events if x['created'] >= created_min]}
+
+        def update_record(_, rec):
+            self.stored_checkpoints.append(aram.AuditLogBaseExport.get_record_custom(rec, 'last_event_time'))
+
+        load_record = vault.KeeperRecord.load
+        self.communicate_mock.side_effect = communicate
+        with mock.patch('keepercommander.commands.aram.AuditLogJsonExport', return_value=export), \
+                mock.patch('keepercommander.commands.aram.AUDIT_LOG_QUEUE_SIZE', 1), \
+                mock.patch('keepercommander.commands.aram.AUDIT_LOG_CHECKPOINT_INTERVAL', checkpoint_interval), \
+                mock.patch('keepercommander.record_management.update_record', side_effect=update_record), \
+                mock.patch('keepercommander.api.sync_down'), \
+                mock.patch('keepercommander.vault.KeeperRecord.load',
+                           side_effect=lambda p, uid: record if uid == record.record_uid else load_record(p, uid)):
+            aram.AuditLogCommand().execute(params, target='json', record=record.record_uid)
+
+    def test_audit_log_checkpoint_resume(self):
+        params = get_synced_params()
+        params.enterprise = {'enterprise_name': 'Enterprise'}
+        record = next(x for x in (vault.KeeperRecord.load(params, uid) for uid in params.record_cache)
+                      if isinstance(x, vault.PasswordRecord))
+        now = int(datetime.now().timestamp())
+        self.audit_events = [{'id': str(i), 'created': now - 100 + i} for i in range(5)]
+
+        export = FakeAuditLogExport(fail_on_chunk=1)
+        with self.assertRaises(OSError):
+            self.run_audit_log(params, record, export)
+        self.assertEqual(export.exported, ['0', '1'])
+        checkpoint = str(self.audit_events[1]['created'])
+        self.assertEqual(self.stored_checkpoints, [checkpoint])
+        self.assertEqual(aram.AuditLogBaseExport.get_record_custom(record, 'last_event_time'), checkpoint)
+
+        export = FakeAuditLogExport()
+        self.run_audit_log(params, record, export)
+        self.assertEqual(self.audit_requests[0]['min'], self.audit_events[1]['created'])
+        self.assertEqual(export.exported, ['1', '2', '3', '4'])
+        self.assertEqual(len(self.stored_checkpoints), 1)
+        self.assertGreaterEqual(int(self.stored_checkpoints[0]), now)
+
+    def test_audit_log_periodic_checkpoint(self):
+        params = get_synced_params()
+        params.enterprise = {'enterprise_name': 'Enterprise'}
+        record = next(x for x in (vault.KeeperRecord.load(params, uid) for uid in params.record_cache)
+                      if isinstance(x, vault.PasswordRecord))
+        now = int(datetime.now().timestamp())
+        self.audit_events = [{'id': str(i), 'created': now - 100 + i} for i in range(5)]
+
+        export = FakeAuditLogExport()
+        self.run_audit_log(params, record, export, checkpoint_interval=0)
+        self.assertEqual(export.exported, ['0', '1', '2', '3', '4'])
+        self.assertEqual(self.stored_checkpoints[:3], [str(self.audit_events[x]['created']) for x in (1, 3, 4)])
+        self.assertEqual(len(self.stored_checkpoints), 4)
+
     def test_audit_audit_report_parse_date_filter(self):
         cmd = aram.AuditReportCommand()
 
@@ -283,6 +399,18 @@ class TestEnterprise(TestCase):
         arr.sort()
         self.assertListEqual(arr, [0, 1, 2, 3, 4, 5, 6, 7])
 
+    def test_audit_report_local_cache_requires_created(self):
+        params = get_connected_params()
+        cmd = aram.AuditReportCommand()
+        store = audit_store.AuditEventStore(':memory:', utils.generate_aes_key())
+        try:
+            self.assertIsNone(cmd.query_audit_store(params, store, {'report_type': 'raw'}, None))
+            rq = {'report_type': 'raw', 'filter': {'created': {'max': int(datetime.now().timestamp())}}}
+            self.assertIsNone(cmd.query_audit_store(params, store, rq, None))
+            self.communicate_mock.assert_not_called()
+        finally:
+            store.close()
+
     def test_enterprise_push_command(self):
         params = get_connected_params()
         api.query_enterprise(params)
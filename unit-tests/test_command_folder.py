@@ -147,6 +147,18 @@ class TestFolder(TestCase):
         cmd.execute(params, src=root_record_uid, dst=user_folder.uid)
         self.assertTrue(KeeperApiHelper.is_expect_empty())
 
+    def test_move_batches(self):
+        params = get_synced_params()
+        cmd = folder.FolderMoveCommand()
+
+        user_folder = next(iter([x for x in params.folder_cache.values() if x.type == 'user_folder']))
+        root_record_uids = list(params.subfolder_record_cache[''])
+
+        with mock.patch('keepercommander.commands.folder.FOLDER_BATCH_SIZE', 1):
+            KeeperApiHelper.communicate_expect(['move'] * len(root_record_uids))
+            cmd.execute(params, src=root_record_uids + ['Invalid Record', user_folder.uid])
+            self.assertTrue(KeeperApiHelper.is_expect_empty())
+
     def test_move_invalid_input(self):
         params = get_synced_params()
         cmd = folder.FolderMoveCommand()
@@ -9,7 +9,7 @@ from data_vault import get_synced_params, VaultEnvironment
 from helper import KeeperApiHelper
 
 from keepercommander import api, utils, crypto, attachment, vault
-from keepercommander.commands import record, record_edit
+from keepercommander.commands import record, record_edit, record_file_report
 from keepercommander.error import CommandError
 
 
@@ -312,3 +312,67 @@ class TestRecord(TestCase):
         cmd = record_edit.RecordDeleteAttachmentCommand()
         cmd.execute(params, name=[rec.attachments[0].id], record=rec.title)
         self.assertTrue(KeeperApiHelper.is_expect_empty())
+
+    def test_file_report_try_download(self):
+        params = get_synced_params()
+        rec = next(x for x in (vault.KeeperRecord.load(params, uid) for uid in params.record_cache)
+                   if isinstance(x, vault.PasswordRecord) and x.attachments)
+
+        def execute(rq):
+            self.assertEqual([x['command'] for x in rq['requests']], ['request_download'])
+            return {
+                'results': [{
+                    'result': 'success',
+                    'downloads': [{'url': f'https://files/{x}'} for x in rq['requests'][0]['file_ids']]
+                }]
+            }
+
+        def session_get(url, **kwargs):
+            self.assertEqual(kwargs['headers'], {'Range': 'bytes=0-1'})
+            self.assertIn('timeout', kwargs)
+            rs = mock.MagicMock(status_code=206)
+            rs.__enter__.return_value = rs
+            return rs
+
+        KeeperApiHelper.communicate_expect([execute])
+        cmd = record_file_report.RecordFileReportCommand()
+        with mock.patch('requests.Session.get', side_effect=session_get):
+            report = cmd.execute(params, try_download=True, format='json')
+        self.assertTrue(KeeperApiHelper.is_expect_empty())
+        rows = json.loads(report)
+        self.assertEqual([(x['file_id'], x['downloadable']) for x in rows],
+                         [(x.id, 'OK') for x in rec.attachments])
+
+    def test_file_report_failed_batch(self):
+        params = get_synced_params()
+        record_uid = next(x for x in params.record_cache
+                          if isinstance(vault.KeeperRecord.load(params, x), vault.PasswordRecord)
+                          and vault.KeeperRecord.load(params, x).attachments)
+        copy_uid = utils.generate_uid()
+        rec = params.record_cache[record_uid].copy()
+        extra = json.loads(rec['extra_unencrypted'])
+        extra['files'][0]['id'] = 'IJKLMNOP'
+        rec['record_uid'] = copy_uid
+        rec['extra_unencrypted'] = json.dumps(extra).encode('utf-8')
+        params.record_cache[copy_uid] = rec
+        params.meta_data_cache[copy_uid] = params.meta_data_cache[record_uid]
+
+        def communicate(params, rq):
+            file_ids = rq['requests'][0]['file_ids']
+            if file_ids != ['IJKLMNOP']:
+                raise Exception('execute failed')
+            return {'results': [{'result': 'success', 'downloads': [{'url': f'https://files/{x}'} for x in file_ids]}]}
+
+        def session_get(url, **kwargs):
+            self.assertEqual(url, 'https://files/IJKLMNOP')
+            rs = mock.MagicMock(status_code=206)
+            rs.__enter__.return_value = rs
+            return rs
+
+        self.communicate_mock.side_effect = communicate
+        cmd = record_file_report.RecordFileReportCommand()
+        with mock.patch('keepercommander.attachment.REQUEST_DOWNLOAD_CHUNK_SIZE', 1), \
+                mock.patch('requests.Session.get', side_effect=session_get):
+            report = cmd.execute(params, try_download=True, format='json')
+        rows = json.loads(report)
+        self.assertEqual([(x['file_id'], x['downloadable']) for x in rows], [('ABCDEFGH', 'Error'), ('IJKLMNOP', 'OK')])
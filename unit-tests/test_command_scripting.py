@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
+
+from data_vault import get_synced_params
+from keepercommander import api, cli  # registers the commands before scripting is imported
+from keepercommander.commands import scripting
+
+
+class TestRunBatch(TestCase):
+    def test_batch_phases(self):
+        lines = ['record-add -t one', 'record-add -t two', 'barrier', 'cd folder', 'share-record -e a@b.com one',
+                 '', 'd', 'record-add -t three']
+        phases = scripting.get_batch_phases([(i + 1, x) for i, x in enumerate(lines)])
+        self.assertEqual([[x[0] for x in phase] for phase in phases], [[1, 2], [4], [5], [7], [8]])
+
+    def test_parallel_run(self):
+        params = get_synced_params()
+        active = []
+        max_active = []
+        lock = threading.Lock()
+
+        def do_command(_, command, concurrent=False):
+            with lock:
+                active.append(command)
+                max_active.append(len(active))
+            time.sleep(.05)
+            with lock:
+                active.remove(command)
+            if command == 'fail':
+                raise Exception('Failed')
+
+        commands = [(1, 'one'), (2, 'two'), (3, 'fail'), (4, 'barrier'), (5, 'four')]
+        with mock.patch('keepercommander.cli.do_command', side_effect=do_command), \
+                mock.patch('keepercommander.cli.post_command') as mock_post_command, \
+                tempfile.TemporaryDirectory() as temp_dir:
+            log_file = os.path.join(temp_dir, 'run.csv')
+            runner = scripting.BatchRunner(params, 4, log_file=log_file, quiet=True)
+            results = runner.run(commands)
+            self.assertTrue(os.path.isfile(log_file))
+            with open(log_file, encoding='utf-8') as f:
+                self.assertEqual(len(f.readlines()), 5)
+        self.assertEqual(max(max_active), 3)
+        self.assertEqual(mock_post_command.call_count, 1)
+        self.assertEqual(sorted(x['line'] for x in results), [1, 2, 3, 5])
+        self.assertEqual([x['line'] for x in results if x['status'] != 'success'], [3])
+
+    def test_throttled_run(self):
+        params = get_synced_params()
+        max_active = []
+        active = []
+        lock = threading.Lock()
+
+        def do_command(_, command, concurrent=False):
+            with lock:
+                active.append(command)
+                max_active.append(len(active))
+                params.rest_context.throttle_count += 1
+            time.sleep(.02)
+            with lock:
+                active.remove(command)
+
+        with mock.patch('keepercommander.cli.do_command', side_effect=do_command), \
+                mock.patch('keepercommander.cli.post_command'):
+            runner = scripting.BatchRunner(params, 4, quiet=True)
+            runner.run([(i, f'command {i}') for i in range(12)])
+        self.assertEqual(max_active[-1], 1)
+
+    def test_syncing_commands(self):
+        params = get_synced_params()
+        lock = threading.Lock()
+        readers = []
+        readers_during_sync = []
+
+        def sync_down(p, record_types=False):
+            with lock:
+                readers_during_sync.append(len(readers))
+            time.sleep(.05)
+            p.sync_data = False
+
+        def do_command(p, command, concurrent=False):
+            if command.startswith('sync'):
+                p.sync_data = True
+                api.sync_down(p)
+            with lock:
+                readers.append(command)
+            time.sleep(.02)
+            with lock:
+                readers.remove(command)
+
+        commands = [(1, 'sync one'), (2, 'read two'), (3, 'sync three'), (4, 'read four')]
+        with mock.patch('keepercommander.sync_down._sync_down', side_effect=sync_down), \
+                mock.patch('keepercommander.cli.do_command', side_effect=do_command):
+            runner = scripting.BatchRunner(params, 4, quiet=True)
+            results = runner.run(commands)
+        self.assertTrue(all(x['status'] == 'success' for x in results))
+        self.assertEqual(readers_during_sync, [0, 0])
+        self.assertIsNone(params.cache_gate)
@@ -0,0 +1,82 @@
+import json
+from unittest import TestCase, mock
+
+from data_vault import get_synced_params
+from keepercommander.commands import verify_records
+from keepercommander.proto import record_pb2
+
+
+class TestVerifyRecords(TestCase):
+    def setUp(self):
+        self.params = get_synced_params()
+        self.requests = []
+
+        def communicate(params, rq):
+            self.requests.append(rq['command'])
+            return {
+                'result': 'success',
+                'update_records': [{'record_uid': x['record_uid'], 'status': 'success'} for x in rq['update_records']]
+            }
+
+        def communicate_rest(params, rq, endpoint, **kwargs):
+            self.requests.append(endpoint)
+            rs = record_pb2.RecordsModifyResponse()
+            for upd_rq in rq.records:
+                status = rs.records.add()
+                status.record_uid = upd_rq.record_uid
+                status.status = record_pb2.RS_SUCCESS
+            return rs
+
+        mock.patch('keepercommander.api.communicate', side_effect=communicate).start()
+        mock.patch('keepercommander.api.communicate_rest', side_effect=communicate_rest).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def break_records(self):
+        for record in self.params.record_cache.values():
+            data = json.loads(record['data_unencrypted'])
+            if record.get('version') == 2:
+                data.pop('link', None)
+            elif record.get('version') == 3:
+                data['fields'][0]['value'] = data['fields'][0]['value'][0]
+                data['custom'].append({'type': 'unknownType', 'value': ['']})
+            record['data_unencrypted'] = json.dumps(data).encode('utf-8')
+
+    def test_rules(self):
+        data = {
+            'type': 'login',
+            'fields': [{'type': 'oneTimeCode', 'value': []}, {'type': 'date', 'value': ['2024-01-01', 1700000000000]}],
+            'custom': [{'type': 'text', 'value': 'text'},
+                       {'type': 'oneTimeCode', 'value': ['otpauth://totp/Test?secret=JBSWY3DPEHPK3PXP']}]
+        }
+        problems = verify_records.verify_record_data(3, data)
+        self.assertEqual(problems, ['Field value is not a list', 'Invalid date value', 'TOTP in custom fields'])
+        self.assertEqual(data['fields'][1]['value'], [1700000000000])
+        self.assertEqual(data['custom'], [{'type': 'text', 'value': ['text']}])
+        self.assertEqual(verify_records.verify_record_data(3, data), [])
+
+    def test_parallel_scan(self):
+        self.break_records()
+        expected = verify_records.verify_records(self.params)
+        with mock.patch('keepercommander.commands.verify_records.VERIFY_SCAN_CHUNK_SIZE', 1):
+            self.assertEqual(verify_records.verify_records(self.params), expected)
+        self.assertEqual(len(expected), len(self.params.record_cache))
+
+    def test_dry_run(self):
+        self.break_records()
+        cmd = verify_records.VerifyRecordsCommand()
+        with mock.patch('builtins.print'), mock.patch('keepercommander.commands.verify_records.user_choice') as mock_choice:
+            cmd.execute(self.params, dry_run=True)
+            mock_choice.assert_not_called()
+        self.assertEqual(self.requests, [])
+
+    def test_batches(self):
+        self.break_records()
+        cmd = verify_records.VerifyRecordsCommand()
+        with mock.patch('builtins.print'), \
+                mock.patch('keepercommander.commands.verify_records.user_choice', return_value='y'), \
+                mock.patch('keepercommander.commands.verify_records.RECORDS_V2_BATCH_SIZE', 1):
+            cmd.execute(self.params)
+        self.assertEqual(sorted(self.requests), ['record_update', 'record_update', 'vault/records_update'])
+        self.assertTrue(self.params.sync_data)
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase, skipIf
+
+from keepercommander.commands import base
+
+# Budget for "import keepercommander.cli", in milliseconds. Checked only when set, timings vary on shared runners
+IMPORT_TIME_BUDGET = int(os.getenv('KEEPER_IMPORT_TIME_BUDGET') or '0')
+# Modules that should only be imported when a command that needs them is used
+LAZY_MODULES = {'keepercommander.commands.discoveryrotation', 'keepercommander.commands.tunnel.port_forward.endpoint',
+                'aiortc'}
+
+
+def get_import_times(module_name):
+    env = dict(os.environ)
+    package_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(base.__file__))))
+    env['PYTHONPATH'] = os.pathsep.join(x for x in (package_path, env.get('PYTHONPATH')) if x)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, universal_newlines=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) // 1000
+    return times
+
+
+class TestImportTime(TestCase):
+    @skipIf(sys.version_info < (3, 7), '-X importtime requires Python 3.7')
+    def test_cli_import_time(self):
+        times = get_import_times('keepercommander.cli')
+        self.assertIn('keepercommander.cli', times)
+        self.assertEqual(LAZY_MODULES.intersection(times), set())
+        if IMPORT_TIME_BUDGET > 0:
+            self.assertLess(times['keepercommander.cli'], IMPORT_TIME_BUDGET)
+
+    def test_lazy_command(self):
+        commands = base.CommandRegistry()
+        base.register_lazy_command(commands, 'record-add', '.record_edit', 'RecordAddCommand')
+        self.assertFalse(commands.is_loaded('record-add'))
+        self.assertIn('record-add', commands)
+        command = commands.get('record-add')
+        self.assertIsInstance(command, base.Command)
+        self.assertTrue(commands.is_loaded('record-add'))
+        self.assertIs(commands['record-add'], command)
+
+        commands = {}
+        base.register_lazy_command(commands, 'record-add', '.record_edit', 'RecordAddCommand')
+        self.assertIsInstance(commands['record-add'], base.Command)
@@ -0,0 +1,104 @@
+import datetime
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+
+from keepercommander import utils
+from keepercommander.commands.helpers import billing_store
+from keepercommander.commands import msp
+from keepercommander.commands.msp import MSPBillingReportCommand, BillingSummary, DailySnapshot
+from keepercommander.params import KeeperParams
+
+
+class TestMspBilling(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = billing_store.BillingSnapshotStore(os.path.join(self.temp_dir, 'billing.db'),
+                                                        utils.generate_aes_key())
+        self.params = KeeperParams()
+        self.params.user = 'msp@company.com'
+        MSPBillingReportCommand.SNAPSHOT_CACHE.clear()
+        MSPBillingReportCommand.COMPANY_CACHE.clear()
+        self.fetched = []
+
+        def fetch_daily_snapshots(_, year, month):
+            self.fetched.append((year, month))
+            date_no = datetime.date(year, month, 1).toordinal()
+            return {
+                'companies': [[10, 'Company 10'], [20, 'Company 20']],
+                'snapshots': [[10, date_no, [[1, 5], [300, 5]]], [10, date_no + 1, [[1, 7]]],
+                              [20, date_no + 1, [[1, 2], [10000, 1]]]]
+            }
+        mock.patch.object(MSPBillingReportCommand, 'fetch_daily_snapshots', side_effect=fetch_daily_snapshots).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        MSPBillingReportCommand.SNAPSHOT_CACHE.clear()
+        MSPBillingReportCommand.COMPANY_CACHE.clear()
+
+    def test_period_snapshots(self):
+        now = datetime.date.today()
+        current_month = (now.year, now.month)
+        months = [(2023, 11), (2023, 12), (2024, 1), current_month]
+        snapshots = MSPBillingReportCommand.get_period_snapshots(self.params, months, self.store)
+        self.assertEqual(sorted(self.fetched), months)
+        self.assertEqual(len(snapshots), 12)
+        self.assertEqual(MSPBillingReportCommand.COMPANY_CACHE[20], 'Company 20')
+
+        MSPBillingReportCommand.SNAPSHOT_CACHE.clear()
+        self.fetched.clear()
+        self.assertEqual(MSPBillingReportCommand.get_period_snapshots(self.params, months, self.store), snapshots)
+        self.assertEqual(self.fetched, [current_month])
+
+    def test_summary(self):
+        snapshots = MSPBillingReportCommand.get_period_snapshots(self.params, [(2024, 1), (2024, 2)], self.store)
+        summary = BillingSummary(snapshots)
+        jan1 = datetime.date(2024, 1, 1).toordinal()
+        feb2 = datetime.date(2024, 2, 2).toordinal()
+        self.assertEqual(summary.reported_days, feb2 - jan1 + 1)
+        self.assertEqual(summary.get_max_product_count(1), 9)
+        self.assertEqual(summary.get_max_product_count(1, 10), 7)
+        self.assertEqual(summary.get_max_product_count(300, 20), 0)
+        self.assertEqual(summary.get_bounding_snapshots(10), ({1: 5, 300: 5}, {1: 7}))
+        start, end = summary.get_bounding_snapshots()
+        self.assertEqual(start, DailySnapshot.merge_units([{1: 5, 300: 5}, {1: 2, 10000: 1}]))
+        self.assertEqual(end, {1: (9, 2), 10000: (1, 1)})
+
+
+class TestManagedCompanyFanOut(TestCase):
+    def setUp(self):
+        self.params = KeeperParams()
+        msp.mc_params_dict.clear()
+        self.logins = []
+
+        def login(_, mc_id):
+            self.logins.append(mc_id)
+            mc_params = KeeperParams()
+            mc_params.enterprise_id = mc_id
+            return mc_params
+        mock.patch('keepercommander.api.login_and_get_mc_params_login_v3', side_effect=login).start()
+        mock.patch('keepercommander.api.query_enterprise').start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        msp.mc_params_dict.clear()
+
+    def test_fan_out(self):
+        def action(mc_params, mc_id):
+            if mc_id == 3:
+                raise Exception('MC error')
+            return mc_params.enterprise_id * 10
+
+        results = msp.for_each_managed_company(self.params, [1, 2, 3, 4], action, max_workers=2)
+        self.assertEqual(list(results), [1, 2, 3, 4])
+        self.assertEqual(results[2], (20, None))
+        self.assertIsNone(results[3][0])
+        self.assertEqual(str(results[3][1]), 'MC error')
+        self.assertEqual(sorted(self.logins), [1, 2, 3, 4])
+
+        results = msp.for_each_managed_company(self.params, [2, 5], action)
+        self.assertEqual(results[5], (50, None))
+        self.assertEqual(sorted(self.logins), [1, 2, 3, 4, 5])
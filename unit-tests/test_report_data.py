@@ -0,0 +1,46 @@
+import datetime
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from keepercommander.commands import base
+
+
+class TestReportData(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.headers = ['#', 'name', 'count', 'members', 'created']
+        self.rows = [[i, ('B', 'a', None, 'c')[i % 4], i % 7, [f'user{i}', 'admin'],
+                      datetime.datetime(2024, 1, 1 + i % 28)] for i in range(50)]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def read_file(self, name):
+        with open(os.path.join(self.temp_dir, name), encoding='utf-8') as fd:
+            return fd.read()
+
+    def test_stream_same_as_dump(self):
+        for fmt in ('csv', 'json'):
+            for options in ({}, {'sort_by': 2, 'sort_desc': True}, {'group_by': 1}, {'sort_by': 4}):
+                dump_name = os.path.join(self.temp_dir, 'dump.' + fmt)
+                stream_name = os.path.join(self.temp_dir, 'stream.' + fmt)
+                base.dump_report_data([list(x) for x in self.rows], self.headers, title='Report', fmt=fmt,
+                                      filename=dump_name, **options)
+                base.stream_report_data((list(x) for x in self.rows), self.headers, title='Report', fmt=fmt,
+                                        filename=stream_name, **options)
+                self.assertEqual(self.read_file('dump.' + fmt), self.read_file('stream.' + fmt), f'{fmt}: {options}')
+
+        base.stream_report_data(iter([]), self.headers, fmt='json', filename=os.path.join(self.temp_dir, 'empty'))
+        self.assertEqual(self.read_file('empty.json'), '[]')
+
+    def test_external_sort(self):
+        rows = list(base.sort_report_rows(iter(self.rows), 2, chunk_size=8))
+        self.assertEqual(rows, sorted(self.rows, key=lambda x: x[2]))
+        rows = list(base.sort_report_rows(iter(self.rows), 1, reverse=True, chunk_size=8))
+        self.assertEqual(rows, sorted(self.rows, key=lambda x: base.get_str_key(x[1]), reverse=True))
+
+    def test_stream_table(self):
+        report = base.stream_report_data(iter(self.rows), self.headers, fmt='csv')
+        self.assertEqual(report, base.dump_report_data([list(x) for x in self.rows], self.headers, fmt='csv'))
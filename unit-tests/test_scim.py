@@ -0,0 +1,238 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import TestCase
+from urllib.parse import urlparse, parse_qsl
+
+from keepercommander import utils
+from keepercommander.commands.helpers import scim_store
+from keepercommander.commands.scim import ScimClient, ScimPushCommand, ScimUser, ScimGroup, load_scim_entity
+
+
+class ScimStubServer:
+    """In-process SCIM endpoint that keeps users and groups in memory"""
+    def __init__(self, page_size=2, bulk=False):
+        self.page_size = page_size
+        self.bulk = bulk
+        self.throttle = 0
+        self.resources = {'Users': {}, 'Groups': {}}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.next_id = 1
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, body=None, headers=None):
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/scim+json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def handle_method(self, method):
+                url = urlparse(self.path)
+                path = url.path[len('/scim'):]
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length)) if length else None
+                with stub.lock:
+                    stub.requests.append((method, path))
+                    if stub.throttle > 0:
+                        stub.throttle -= 1
+                        self.send_json(429, headers={'Retry-After': '0'})
+                        return
+                    if method == 'GET' and path == '/ServiceProviderConfig':
+                        self.send_json(200, {'bulk': {'supported': stub.bulk, 'maxOperations': 3}})
+                    elif method == 'GET':
+                        self.send_json(200, stub.get_page(path, dict(parse_qsl(url.query))))
+                    elif method == 'POST' and path == '/Bulk':
+                        operations = []
+                        for op in payload['Operations']:
+                            status, body = stub.apply(op['method'], op['path'], op.get('data'))
+                            operations.append({'bulkId': op['bulkId'], 'method': op['method'],
+                                               'status': str(status), 'response': body})
+                        self.send_json(200, {'Operations': operations})
+                    else:
+                        status, body = stub.apply(method, path, payload)
+                        self.send_json(status, body)
+
+            def do_GET(self):
+                self.handle_method('GET')
+
+            def do_POST(self):
+                self.handle_method('POST')
+
+            def do_PATCH(self):
+                self.handle_method('PATCH')
+
+            def do_DELETE(self):
+                self.handle_method('DELETE')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/scim'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add(self, resource_type, resource):
+        resource['id'] = str(self.next_id)
+        self.next_id += 1
+        self.resources[resource_type][resource['id']] = resource
+        return resource
+
+    def get_page(self, path, query):
+        resources = list(self.resources[path.strip('/')].values())
+        start_index = int(query.get('startIndex') or 1)
+        count = min(int(query.get('count') or self.page_size), self.page_size)
+        page = resources[start_index - 1:start_index - 1 + count]
+        return {'totalResults': len(resources), 'startIndex': start_index, 'itemsPerPage': len(page),
+                'Resources': page}
+
+    def apply(self, method, path, payload):
+        comps = path.strip('/').split('/')
+        resources = self.resources[comps[0]]
+        if method == 'POST':
+            return 201, self.add(comps[0], dict(payload))
+        resource = resources.get(comps[1])
+        if not resource:
+            return 404, {'detail': 'not found'}
+        if method == 'DELETE':
+            del resources[comps[1]]
+            return 204, None
+        for op in payload['Operations']:
+            if op.get('path') == 'groups':
+                groups = {x['value'] for x in resource.get('groups') or []}
+                values = {x['value'] for x in op['value']}
+                groups = groups | values if op['op'] == 'add' else groups - values
+                resource['groups'] = [{'value': x} for x in sorted(groups)]
+            else:
+                resource.update(op['value'])
+        return 200, resource
+
+
+class TestScimPush(TestCase):
+    def setUp(self):
+        self.stub = ScimStubServer()
+
+    def tearDown(self):
+        self.stub.close()
+
+    def test_paged_resources(self):
+        for i in range(5):
+            self.stub.add('Users', {'userName': f'user{i}@company.com', 'active': True})
+        client = ScimClient(self.stub.url, 'token')
+        users = client.get_resources('/Users')
+        client.close()
+        self.assertEqual([x['userName'] for x in users], [f'user{i}@company.com' for i in range(5)])
+        self.assertEqual(self.stub.requests.count(('GET', '/Users')), 3)
+
+    def test_throttled(self):
+        self.stub.throttle = 2
+        rs = ScimPushCommand.post_scim_resource(f'{self.stub.url}/Groups', 'token', {'displayName': 'Group'})
+        self.assertEqual(rs['displayName'], 'Group')
+        self.assertEqual(self.stub.requests, [('POST', '/Groups')] * 3)
+
+    def push(self, client):
+        self.stub.add('Users', {'userName': 'update@company.com', 'externalId': 'ext1', 'displayName': 'Old',
+                                'active': True})
+        self.stub.add('Users', {'userName': 'delete@company.com', 'active': True})
+        self.stub.add('Groups', {'displayName': 'Unmanaged'})
+
+        external_users = {}
+        for user_id, email in (('ext1', 'update@company.com'), ('ext2', 'add@company.com')):
+            user = ScimUser()
+            user.id = user_id
+            user.email = email
+            user.full_name = email.split('@')[0]
+            user.active = True
+            user.groups.append('grp1')
+            external_users[user_id] = user
+        group = ScimGroup()
+        group.id = 'grp1'
+        group.name = 'Group 1'
+
+        keeper_users = {}
+        keeper_groups = {}
+        for element in ScimPushCommand.scim_keeper(client):
+            if isinstance(element, ScimUser):
+                keeper_users[element.id] = element
+            else:
+                keeper_groups[element.id] = element
+        ScimPushCommand.sync_groups(client, keeper_groups, {group.id: group}, destructive=1)
+        ScimPushCommand.sync_users(client, keeper_users, external_users)
+        ScimPushCommand.sync_membership(client, keeper_groups, keeper_users, external_users, destructive=1)
+        client.close()
+
+        groups = list(self.stub.resources['Groups'].values())
+        self.assertEqual([(x['displayName'], x['externalId']) for x in groups], [('Group 1', 'grp1')])
+        users = {x['userName']: x for x in self.stub.resources['Users'].values()}
+        self.assertEqual(set(users), {'update@company.com', 'add@company.com'})
+        self.assertEqual(users['update@company.com']['displayName'], 'update')
+        for user in users.values():
+            self.assertEqual(user['groups'], [{'value': groups[0]['id']}])
+
+        # keeper_users and keeper_groups reflect the pushed state: nothing to push on the next run
+        request_count = len(self.stub.requests)
+        client = ScimClient(self.stub.url, 'token')
+        ScimPushCommand.sync_groups(client, keeper_groups, {group.id: group}, destructive=1)
+        ScimPushCommand.sync_users(client, keeper_users, external_users)
+        ScimPushCommand.sync_membership(client, keeper_groups, keeper_users, external_users, destructive=1)
+        client.close()
+        self.assertEqual(len(self.stub.requests), request_count)
+        self.assertEqual(client.errors, 0)
+
+    def test_push(self):
+        self.push(ScimClient(self.stub.url, 'token', max_workers=4))
+        self.assertNotIn(('POST', '/Bulk'), self.stub.requests)
+
+    def test_push_bulk(self):
+        self.stub.bulk = True
+        self.push(ScimClient(self.stub.url, 'token', bulk=True))
+        methods = {x for x in self.stub.requests if x[0] != 'GET'}
+        self.assertEqual(methods, {('POST', '/Bulk')})
+
+
+class TestScimSnapshotStore(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = scim_store.ScimSnapshotStore(os.path.join(self.temp_dir, 'scim.db'), utils.generate_aes_key())
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_snapshot(self):
+        self.assertFalse(self.store.is_valid('ad:record_uid'))
+        user = ScimUser()
+        user.id = 'ext1'
+        user.email = 'user@company.com'
+        user.groups.append('CN=Group')
+        group = ScimGroup()
+        group.id = '12'
+        group.name = 'Group'
+        self.store.save('ad:record_uid', {
+            scim_store.SOURCE_USER: [(user.id, vars(user))],
+            scim_store.KEEPER_GROUP: [(group.id, vars(group))],
+        }, keeper_loaded=0, source_state={'usn': 100})
+
+        self.assertTrue(self.store.is_valid('ad:record_uid'))
+        self.assertFalse(self.store.is_valid('google:record_uid'))
+        self.assertFalse(self.store.is_keeper_current())
+        self.assertEqual(self.store.get_metadata()['source_state'], {'usn': 100})
+        loaded = load_scim_entity(ScimUser(), self.store.get_entities(scim_store.SOURCE_USER)['ext1'])
+        self.assertEqual((loaded.email, loaded.groups), (user.email, user.groups))
+        self.assertEqual(self.store.get_entities(scim_store.KEEPER_GROUP)['12']['name'], 'Group')
+        self.assertEqual(self.store.get_entities(scim_store.KEEPER_USER), {})
+
+        self.store.clear()
+        self.assertFalse(self.store.is_valid('ad:record_uid'))
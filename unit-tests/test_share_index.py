@@ -0,0 +1,96 @@
+import json
+from unittest import TestCase, mock
+
+from data_vault import get_synced_params
+from keepercommander import utils
+from keepercommander.commands import record
+from keepercommander.proto import SyncDown_pb2
+from keepercommander.share_index import get_share_index, ShareSource
+from keepercommander.sync_down import ShareChanges
+
+
+class TestShareIndex(TestCase):
+    def setUp(self):
+        self.params = get_synced_params()
+        self.requested = []
+        shared_folder = next(iter(self.params.shared_folder_cache.values()))
+        self.shared_folder_uid = shared_folder['shared_folder_uid']
+        self.team_uid = shared_folder['teams'][0]['team_uid']
+        self.sf_record_uid = shared_folder['records'][0]['record_uid']
+        self.direct_record_uid = next(x['record_uid'] for x in self.params.record_cache.values()
+                                      if x['shared'] and x['record_uid'] != self.sf_record_uid)
+        sf_record_uid = self.sf_record_uid
+        shared_folder_uid = self.shared_folder_uid
+
+        def get_record_shares(params, record_uids):
+            record_uids = list(record_uids)
+            self.requested.append(sorted(record_uids))
+            for record_uid in record_uids:
+                shares = {
+                    'user_permissions': [
+                        {'username': params.user, 'owner': True, 'shareable': True, 'editable': True},
+                        {'username': 'user2@company.com', 'owner': False, 'shareable': False, 'editable': True},
+                    ],
+                    'shared_folder_permissions': []
+                }
+                if record_uid == sf_record_uid:
+                    shares['shared_folder_permissions'].append(
+                        {'shared_folder_uid': shared_folder_uid, 'reshareable': True, 'editable': True})
+                params.record_cache[record_uid]['shares'] = shares
+
+        mock.patch('keepercommander.api.get_record_shares', side_effect=get_record_shares).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_index(self):
+        self.params.team_cache[self.team_uid].update({'restrict_edit': False, 'restrict_share': True})
+        index = get_share_index(self.params, [self.sf_record_uid, self.direct_record_uid])
+        self.assertEqual(self.requested, [sorted([self.sf_record_uid, self.direct_record_uid])])
+        self.assertEqual(index.get_owner(self.sf_record_uid), self.params.user)
+
+        permissions = index.get_permissions(self.sf_record_uid)
+        self.assertEqual([x.source for x in permissions],
+                         [ShareSource.Direct, ShareSource.Direct, ShareSource.SharedFolder, ShareSource.Team])
+        team = permissions[-1]
+        self.assertEqual((team.shared_to, team.team_uid, team.can_edit, team.can_share), ('Team 1', self.team_uid, True, False))
+        self.assertEqual(len(index.get_permissions(self.direct_record_uid)), 2)
+
+        for r in self.params.record_cache.values():
+            r.pop('shares', None)
+        get_share_index(self.params, [self.sf_record_uid, self.direct_record_uid])
+        self.assertEqual(len(self.requested), 1)
+        self.assertIn('shares', self.params.record_cache[self.sf_record_uid])
+
+        index.invalidate(shared_folder_uids=[self.shared_folder_uid])
+        get_share_index(self.params, [self.sf_record_uid, self.direct_record_uid])
+        self.assertEqual(self.requested[-1], [self.sf_record_uid])
+
+    def test_shared_records_report(self):
+        cmd = record.SharedRecordsReport()
+        report = json.loads(cmd.execute(self.params, format='json'))
+        self.assertEqual([(x['record_uid'], x['share_type']) for x in report],
+                         [(self.sf_record_uid, 'Direct Share'), (self.sf_record_uid, 'Share Team Folder')])
+
+    def test_share_changes(self):
+        rs = SyncDown_pb2.SyncDownResponse()
+        rs.removedTeams.append(utils.base64_url_decode(self.team_uid))
+        sfu = rs.sharedFolderUsers.add()
+        sfu.sharedFolderUid = utils.base64_url_decode(self.shared_folder_uid)
+        sc = rs.sharingChanges.add()
+        sc.recordUid = utils.base64_url_decode(self.direct_record_uid)
+        changes = ShareChanges()
+        changes.add_response(rs)
+        self.assertEqual(changes.record_uids, {self.direct_record_uid})
+        self.assertEqual(changes.shared_folder_uids, {self.shared_folder_uid})
+        self.assertEqual(changes.team_uids, {self.team_uid})
+        self.assertFalse(changes.folders_changed)
+
+        for record_uid in (self.sf_record_uid, self.direct_record_uid):
+            self.params.record_cache[record_uid]['shares'] = {'user_permissions': [], 'shared_folder_permissions': []}
+        self.params.record_cache[self.sf_record_uid]['shares']['shared_folder_permissions'].append(
+            {'shared_folder_uid': 'unchanged_sf_uid'})
+        changes.shared_folder_uids.clear()
+        changes.apply(self.params)
+        self.assertIn('shares', self.params.record_cache[self.sf_record_uid])
+        self.assertNotIn('shares', self.params.record_cache[self.direct_record_uid])
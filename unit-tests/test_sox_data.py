@@ -0,0 +1,28 @@
+from unittest import TestCase
+
+from sox_benchmark import SyntheticSoxData
+
+
+class TestSoxDataIndexes(TestCase):
+    def setUp(self):
+        self.sd = SyntheticSoxData(users=20, teams=4, records=200, folders=30, records_per_folder=10, seed=1)
+
+    def test_record_lookups(self):
+        folders = self.sd.get_shared_folders()
+        for record_uid in self.sd.get_records():
+            expected = [sf_uid for sf_uid, sf in folders.items()
+                        if any(rp.record_uid == record_uid for rp in sf.record_permissions)]
+            self.assertEqual(self.sd.get_record_sfs(record_uid), expected)
+            owner = next(u for u in self.sd.get_users().values() if record_uid in u.records)
+            self.assertIs(self.sd.get_record_owner(record_uid), owner)
+        self.assertIsNone(self.sd.get_record_owner('unknown'))
+
+    def test_vault_records(self):
+        for user_uid, user in self.sd.get_users().items():
+            team_uids = {t.team_uid for t in self.sd.get_teams().values() if user_uid in t.users}
+            expected = {r_uid for r_uid, r in self.sd.get_records().items() if user_uid in r.user_permissions}
+            for sf in self.sd.get_shared_folders().values():
+                if user_uid in sf.users or sf.teams.intersection(team_uids):
+                    expected.update(rp.record_uid for rp in sf.record_permissions)
+            self.assertEqual(set(self.sd.get_vault_records(user_uid)), expected)
+            self.assertEqual(set(self.sd.get_vault_records(user.email)), expected)
@@ -1,3 +1,4 @@
+import threading
 from unittest import TestCase, mock
 
 from data_vault import VaultEnvironment, get_synced_params
@@ -8,6 +9,26 @@ vault_env = VaultEnvironment()
 
 
 class TestSyncDown(TestCase):
+    def test_sessions_sync_concurrently(self):
+        params1 = get_synced_params()
+        params2 = get_synced_params()
+        started = threading.Event()
+        release = threading.Event()
+
+        def _sync_down(params, record_types=False):
+            if params is params1:
+                started.set()
+                release.wait(5)
+
+        with mock.patch('keepercommander.sync_down._sync_down', side_effect=_sync_down):
+            thread = threading.Thread(target=sync_down, args=(params1,))
+            thread.start()
+            self.assertTrue(started.wait(5))
+            sync_down(params2)
+            self.assertTrue(thread.is_alive())
+            release.set()
+            thread.join()
+
     def test_full_sync(self):
         params = get_synced_params()
 